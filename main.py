@@ -142,6 +142,8 @@ def parse_arguments():
                         default="INFO", help="Mức độ ghi log")
     parser.add_argument("--export-feedback", action="store_true", help="Xuất dữ liệu phản hồi")
     parser.add_argument("--export-dir", type=str, help="Thư mục xuất dữ liệu phản hồi")
+    parser.add_argument("--rebuild-optimization-state", action="store_true",
+                        help="Dựng lại trạng thái tối ưu hóa từ toàn bộ phản hồi đã lưu rồi ghi snapshot")
     parser.add_argument("--model", type=str, help="Chỉ định mô hình cụ thể để sử dụng")
     parser.add_argument("--group-discussion", action="store_true", help="Bật chế độ thảo luận nhóm")
     parser.add_argument("--no-group-discussion", action="store_true", help="Tắt chế độ thảo luận nhóm")
@@ -159,6 +161,7 @@ def main():
     log_level = getattr(logging, args.log_level)
     setup_logging(log_level)
     logger = logging.getLogger("main")
+    assistant = None
     
     try:
         # Khởi tạo trợ lý
@@ -192,6 +195,12 @@ def main():
             logger.info(f"Đã xuất dữ liệu phản hồi đến {export_path}")
             return
             
+        # Dựng lại trạng thái tối ưu hóa nếu được yêu cầu
+        if args.rebuild_optimization_state:
+            replayed = assistant.feedback_manager.rebuild_state()
+            logger.info(f"Đã dựng lại trạng thái tối ưu hóa từ {replayed} phản hồi")
+            return
+            
         # Khởi động API server nếu được yêu cầu
         if args.api:
             from src.api.server import start_api_server
@@ -216,6 +225,9 @@ def main():
     except Exception as e:
         logger.error(f"Lỗi không mong đợi: {e}", exc_info=True)
     finally:
+        # Áp dụng các phản hồi đang chờ và ghi snapshot trước khi thoát
+        if assistant is not None:
+            assistant.close()
         total_time = time.time() - start_time
         logger.info(f"Tổng thời gian chạy: {total_time:.2f}s")
 
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Script chuyển phản hồi, so sánh và thống kê cũ ra kho lưu trữ (file JSONL nén theo tháng),
+giữ cơ sở dữ liệu phản hồi nhỏ gọn
+"""
+
+import os
+import sys
+import argparse
+import logging
+from datetime import datetime
+
+# Thêm thư mục gốc vào đường dẫn
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cli.setup import setup_logging
+from src.integration.interfaces import AssistantFactory
+from src.optimization.feedback_store import FeedbackStore
+
+logger = logging.getLogger("archive_data")
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Chuyển dữ liệu phản hồi cũ vào kho lưu trữ")
+    parser.add_argument("--config", type=str, default="config/default.yml",
+                        help="Đường dẫn file cấu hình")
+    parser.add_argument("--db", type=str, help="Đường dẫn cơ sở dữ liệu phản hồi (mặc định theo cấu hình)")
+    parser.add_argument("--archive-dir", type=str, help="Thư mục lưu trữ (mặc định theo cấu hình)")
+    parser.add_argument("--feedback-days", type=int, help="Số ngày giữ phản hồi và so sánh trong cơ sở dữ liệu")
+    parser.add_argument("--stats-days", type=int, help="Số ngày giữ thống kê trong cơ sở dữ liệu")
+    parser.add_argument("--status", action="store_true", help="Chỉ hiển thị các tháng đã lưu trữ")
+    parser.add_argument("--log-level", type=str, default="INFO",
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="Mức độ ghi log")
+
+    return parser.parse_args()
+
+def print_status(store: FeedbackStore) -> None:
+    """Hiển thị các tháng đã lưu trữ và kích thước kho lưu trữ"""
+    print(f"Kho lưu trữ: {store.archive.archive_dir}")
+    for table, stats in store.archive.get_stats().items():
+        months = f"{stats['months'][0]} - {stats['months'][-1]}" if stats["months"] else "chưa có"
+        print(f"  {table:<12} {stats['files']:>4} tháng ({months}), {stats['bytes'] / (1024 * 1024):.2f}MB")
+
+def main():
+    """Main function"""
+    args = parse_args()
+
+    # Thiết lập logging
+    setup_logging(getattr(logging, args.log_level))
+
+    config = AssistantFactory.load_config(args.config)
+    system_config = config.get("system", {})
+    db_path = args.db or system_config.get("feedback_db", "data/feedback.db")
+
+    retention_options = dict(system_config.get("feedback_retention") or {})
+    for key, value in [("archive_dir", args.archive_dir), ("feedback_days", args.feedback_days),
+                       ("stats_days", args.stats_days)]:
+        if value is not None:
+            retention_options[key] = value
+
+    store = FeedbackStore(db_path, system_config.get("feedback_db_options"),
+                          text_compression=system_config.get("feedback_text_compression"),
+                          retention_options=retention_options)
+
+    if args.status:
+        print_status(store)
+        store.close()
+        return
+
+    before = store.get_summary_counts()
+    archived = store.archive_old_data(datetime.now())
+    after = store.get_summary_counts()
+    store.close()
+
+    logger.info(f"Đã chuyển {archived.get('feedback', 0)} phản hồi, {archived.get('comparisons', 0)} so sánh, "
+                f"{archived.get('stats', 0)} thống kê vào {store.archive.archive_dir}")
+    if any(before.get(key) != after.get(key) for key in ["feedback_count", "comparison_count", "score_count"]):
+        logger.warning("Số liệu tổng hợp thay đổi sau khi lưu trữ")
+    logger.info("Chạy scripts/fix_database.py --vacuum để thu nhỏ file cơ sở dữ liệu nếu cần")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Script đo hiệu năng các thành phần tối ưu hóa
+
+Mỗi lệnh con nằm trong một module của scripts/benchmarks/.
+"""
+
+import os
+import sys
+import argparse
+import importlib
+import logging
+
+# Thêm thư mục gốc vào đường dẫn
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cli.setup import setup_logging
+
+logger = logging.getLogger("benchmark")
+
+# Các module đo hiệu năng trong scripts/benchmarks/, mỗi module thêm lệnh con của nó qua register()
+BENCHMARK_MODULES = [
+    "query_similarity",
+    "template_select",
+    "prompt_render",
+    "model_select",
+    "router_sim",
+    "state_restore",
+    "keyword_sketch",
+    "fit_preferences",
+    "batched_updates",
+    "concurrency",
+    "feedback_store",
+    "feedback_iter",
+    "report_stats",
+    "schema_migration",
+    "feedback_stats",
+    "text_dedupe",
+    "backup",
+    "retention",
+    "export_shards",
+    "delta_export",
+    "export_pipeline",
+    "hash_split",
+]
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Đo hiệu năng các thành phần tối ưu hóa")
+    parser.add_argument("--log-level", type=str, default="INFO",
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="Mức độ ghi log")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    for name in BENCHMARK_MODULES:
+        importlib.import_module(f"benchmarks.{name}").register(subparsers)
+
+    return parser.parse_args()
+
+def main():
+    """Main function"""
+    args = parse_args()
+
+    # Thiết lập logging
+    setup_logging(getattr(logging, args.log_level))
+
+    args.run(args)
+
+if __name__ == "__main__":
+    main()
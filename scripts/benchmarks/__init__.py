@@ -0,0 +1,4 @@
+"""
+Các phép đo hiệu năng của scripts/benchmark.py, mỗi module một lệnh con (register() thêm lệnh,
+run() chạy phép đo)
+"""
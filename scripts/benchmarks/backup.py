@@ -0,0 +1,132 @@
+"""
+Lệnh backup của scripts/benchmark.py: sao lưu/khôi phục bằng dump SQL so với SQLite backup API khi đang có người ghi
+"""
+
+import os
+import random
+import time
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.common import generate_query, print_results
+
+def register(subparsers) -> None:
+    """Thêm lệnh backup"""
+    parser = subparsers.add_parser(
+        "backup", help="Sao lưu/khôi phục bằng dump SQL so với SQLite backup API khi đang có người ghi")
+    parser.add_argument("--records", type=int, default=20000,
+                        help="Số bản ghi phản hồi (default: 20000)")
+    parser.add_argument("--pages", type=int, default=1024,
+                        help="Số trang chép mỗi bước (default: 1024)")
+    parser.add_argument("--pause", type=float, default=0.01,
+                        help="Thời gian nghỉ giữa các bước (giây, default: 0.01)")
+    parser.set_defaults(run=run)
+
+def benchmark_backup(records: int, pages: int, pause: float) -> Dict[str, Any]:
+    """
+    Sao lưu và khôi phục cơ sở dữ liệu phản hồi trong khi một luồng khác ghi liên tục:
+    dump SQL (iterdump, cách cũ) so với SQLite backup API chép theo bước.
+
+    Args:
+        records: Số bản ghi phản hồi (mỗi phản hồi kèm một so sánh)
+        pages: Số trang chép mỗi bước của backup API
+        pause: Thời gian nghỉ giữa các bước (giây)
+
+    Returns:
+        Dict chứa thời gian sao lưu/khôi phục, thời gian chờ của luồng ghi và kết quả kiểm tra
+    """
+    import sqlite3
+    import tempfile
+    import threading
+    from datetime import datetime, timedelta
+    from src.optimization.feedback_store import FeedbackStore
+
+    rng = random.Random(41)
+    models = [f"model-{i}" for i in range(5)]
+    start_time = datetime(2024, 1, 1)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_path = os.path.join(work_dir, "feedback.db")
+        store = FeedbackStore(db_path, backup_options={"pages": pages, "pause": pause, "keep": 2})
+        for offset in range(0, records, 5000):
+            feedback, comparisons = [], []
+            for i in range(offset, min(records, offset + 5000)):
+                timestamp = (start_time + timedelta(minutes=i)).isoformat()
+                chosen, rejected = rng.sample(models, 2)
+                query = generate_query(rng)
+                feedback.append({"id": f"fb_{i}", "timestamp": timestamp, "query": query,
+                                 "responses": {chosen: generate_query(rng, 60), rejected: generate_query(rng, 60)},
+                                 "selected_response": chosen, "feedback_score": round(rng.random(), 2)})
+                comparisons.append({"id": f"comp_{i}", "timestamp": timestamp, "query": query,
+                                    "chosen": feedback[-1]["responses"][chosen],
+                                    "rejected": feedback[-1]["responses"][rejected],
+                                    "chosen_model": chosen, "rejected_model": rejected})
+            store.save_feedback_batch(feedback, comparisons)
+        expected = store.get_summary_counts()
+        results["db_mb"] = os.path.getsize(db_path) / (1024 * 1024)
+
+        def with_writer(action) -> Tuple[float, List[float]]:
+            done = threading.Event()
+            waits: List[float] = []
+
+            def writer() -> None:
+                writer_conn = sqlite3.connect(db_path)
+                writer_conn.execute("PRAGMA busy_timeout=60000")
+                i = 0
+                while not done.is_set():
+                    start = time.perf_counter()
+                    with writer_conn:
+                        writer_conn.execute("INSERT INTO stats (id, timestamp, stat_type, value) "
+                                            "VALUES (?, ?, 'bench', 1.0)", (f"w_{time.time_ns()}_{i}",
+                                                                             datetime.now().isoformat()))
+                    waits.append(time.perf_counter() - start)
+                    i += 1
+                    time.sleep(0.002)
+                writer_conn.close()
+
+            thread = threading.Thread(target=writer)
+            thread.start()
+            start = time.perf_counter()
+            action()
+            elapsed = time.perf_counter() - start
+            done.set()
+            thread.join()
+            return elapsed, waits
+
+        # Cách cũ: dump SQL từng dòng
+        dump_path = os.path.join(work_dir, "feedback.sql")
+
+        def dump() -> None:
+            with open(dump_path, 'wb') as f:
+                for line in store.connections.get_connection().iterdump():
+                    f.write(f"{line}\n".encode('utf-8'))
+
+        elapsed, waits = with_writer(dump)
+        results["dump_backup_s"] = elapsed
+        results["dump_max_write_wait_ms"] = max(waits) * 1000 if waits else 0.0
+        results["dump_mb"] = os.path.getsize(dump_path) / (1024 * 1024)
+
+        # Backup API theo bước
+        backup_path = os.path.join(work_dir, "feedback_backup.db")
+        steps = []
+        elapsed, waits = with_writer(lambda: store.backup_database(
+            backup_path, progress=lambda copied, total: steps.append(copied)))
+        results["api_backup_s"] = elapsed
+        results["api_max_write_wait_ms"] = max(waits) * 1000 if waits else 0.0
+        results["api_steps"] = len(steps)
+
+        for label, path in [("dump", dump_path), ("api", backup_path)]:
+            start = time.perf_counter()
+            restored = store.restore_database(path)
+            results[f"{label}_restore_s"] = time.perf_counter() - start
+            results[f"{label}_restore_ok"] = restored and store.get_summary_counts() == expected
+
+        results["rotated_backups"] = len(os.listdir(store.backup_dir))
+        store.close()
+
+    return results
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_backup(args.records, args.pages, args.pause)
+    print_results("FeedbackStore.backup_database", results)
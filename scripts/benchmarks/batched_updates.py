@@ -0,0 +1,82 @@
+"""
+Lệnh batched-updates của scripts/benchmark.py: cập nhật trọng số theo lô so với cập nhật tuần tự
+"""
+
+import random
+import time
+from typing import Any, Dict
+
+from benchmarks.common import SIMULATED_QUERIES, print_results
+
+def register(subparsers) -> None:
+    """Thêm lệnh batched-updates"""
+    parser = subparsers.add_parser(
+        "batched-updates", help="Cập nhật trọng số theo lô so với cập nhật tuần tự")
+    parser.add_argument("--events", type=int, default=20000,
+                        help="Số phản hồi (default: 20000)")
+    parser.add_argument("--interval", type=int, default=10,
+                        help="Số phản hồi mỗi lô (default: 10)")
+    parser.add_argument("--config", type=str, default="config/default.yml",
+                        help="Đường dẫn file cấu hình")
+    parser.set_defaults(run=run)
+
+def benchmark_batched_updates(config_path: str, events: int, interval: int) -> Dict[str, Any]:
+    """
+    So sánh cập nhật trọng số theo lô trên luồng nền với cập nhật tuần tự trên luồng yêu cầu:
+    thời gian trên luồng yêu cầu và kiểm tra hai cách cho cùng trạng thái
+
+    Args:
+        config_path: Đường dẫn file cấu hình
+        events: Số phản hồi
+        interval: Số phản hồi mỗi lô
+
+    Returns:
+        Dict chứa thời gian mỗi phản hồi trên luồng yêu cầu và kết quả đối chiếu
+    """
+    import copy
+    import json
+    from src.integration.interfaces import AssistantFactory
+    from src.optimization.preference_optimizer import PreferenceOptimizer
+
+    config = AssistantFactory.load_config(config_path)
+    model_names = [model["name"] for model in config.get("models", [])]
+    rng = random.Random(13)
+    feedback = []
+    for _ in range(events):
+        query, _ = rng.choice(SIMULATED_QUERIES)
+        responses = {name: "..." for name in rng.sample(model_names, k=rng.randint(1, len(model_names)))}
+        feedback.append((query, responses, rng.choice(list(responses)), round(rng.random(), 2)))
+
+    def make_optimizer(periodic: bool) -> PreferenceOptimizer:
+        optimizer_config = copy.deepcopy(config)
+        preference = optimizer_config.setdefault("optimization", {}).setdefault("preference", {})
+        preference.update({"periodic_update": periodic, "update_interval": interval})
+        return PreferenceOptimizer(optimizer_config)
+
+    sequential = make_optimizer(False)
+    start = time.perf_counter()
+    for event in feedback:
+        sequential.submit_feedback(*event)
+    sequential_time = time.perf_counter() - start
+
+    batched = make_optimizer(True)
+    start = time.perf_counter()
+    for event in feedback:
+        batched.submit_feedback(*event)
+    submit_time = time.perf_counter() - start
+    batched.stop_updates()
+
+    stats = batched.get_update_stats()
+    return {
+        "events": events,
+        "sequential_us": sequential_time * 1e6 / events,
+        "batched_submit_us": submit_time * 1e6 / events,
+        "batches": stats["batches"],
+        "state_match": (json.dumps(sequential.get_state(), sort_keys=True)
+                        == json.dumps(batched.get_state(), sort_keys=True))
+    }
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_batched_updates(args.config, args.events, args.interval)
+    print_results("PreferenceOptimizer.submit_feedback", results)
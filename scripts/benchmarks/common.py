@@ -0,0 +1,70 @@
+"""
+Dữ liệu giả lập và hàm dùng chung của các phép đo trong scripts/benchmarks/
+"""
+
+import random
+from typing import Any, Dict, List
+
+# Từ vựng dùng để sinh truy vấn giả lập
+VOCABULARY = [
+    "làm thế nào", "tại sao", "so sánh", "giải thích", "liệt kê", "ví dụ",
+    "lập trình", "python", "thuật toán", "dữ liệu", "mô hình", "học máy",
+    "kinh doanh", "marketing", "sức khỏe", "dinh dưỡng", "du lịch", "âm nhạc",
+    "hiệu suất", "bảo mật", "cơ sở dữ liệu", "mạng", "phân tích", "chiến lược",
+    "từng bước", "chi tiết", "ưu điểm", "nhược điểm", "tóm tắt", "đánh giá"
+]
+
+# Truy vấn mô phỏng: (truy vấn, mô hình đáp ứng tốt -> chất lượng)
+SIMULATED_QUERIES = [
+    ("Xin chào", {"*": 0.9}),
+    ("Thủ đô của Pháp là gì?", {"*": 0.9}),
+    ("Tóm tắt ngắn gọn đoạn văn này", {"*": 0.85}),
+    ("Viết code python sắp xếp nhanh và phân tích độ phức tạp thuật toán",
+     {"qwen2.5-coder:7b": 0.95, "deepseek-r1:8b": 0.7, "*": 0.3}),
+    ("Tại sao lạm phát ảnh hưởng đến chiến lược đầu tư dài hạn? Phân tích chi tiết",
+     {"deepseek-r1:8b": 0.95, "qwen2.5-coder:7b": 0.5, "*": 0.4}),
+]
+
+def generate_query(rng: random.Random, word_count: int = 8) -> str:
+    """Sinh một truy vấn giả lập từ từ vựng"""
+    words = [rng.choice(VOCABULARY) for _ in range(word_count)]
+    return " ".join(words) + f" {rng.randint(0, 10 ** 6)}?"
+
+def percentile(values: List[float], pct: float) -> float:
+    """Tính phân vị của danh sách giá trị (pct là tỷ lệ 0-1, ví dụ 0.99)"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(len(ordered) * pct))
+    return ordered[index]
+
+def analysis_fixture_grid() -> List[Dict[str, Any]]:
+    """Lưới phân tích truy vấn bao phủ mọi nhánh của quy tắc điểm mạnh"""
+    import itertools
+
+    grid = []
+    for flags in itertools.product([False, True], repeat=6):
+        for complexity in [0, 2.99, 3, 5, 7, 7.01, 10]:
+            for query_type in ["how_to", "comparison", "what_is", "opinion", "list", "why", "statement"]:
+                for domain in ["technology", "science", "business", "arts", "health", "general"]:
+                    grid.append({
+                        "requires_code": flags[0],
+                        "requires_reasoning": flags[1],
+                        "requires_creativity": flags[2],
+                        "complexity": complexity,
+                        "query_type": query_type,
+                        "domain": domain,
+                        "format_requirements": {
+                            "requires_step_by_step": flags[3],
+                            "requires_examples": flags[4],
+                            "requires_comparison": flags[5]
+                        }
+                    })
+    return grid
+
+def print_results(name: str, results: Dict[str, Any]) -> None:
+    """In kết quả đo"""
+    print(f"\n=== {name} ===")
+    for key, value in results.items():
+        if isinstance(value, float):
+            print(f"  {key:<20} {value:.4f}")
+        else:
+            print(f"  {key:<20} {value}")
@@ -0,0 +1,140 @@
+"""
+Lệnh concurrency của scripts/benchmark.py: nhiều luồng chọn mô hình song song với luồng cập nhật phản hồi
+"""
+
+import math
+import random
+import time
+from typing import Any, Dict
+
+from benchmarks.common import SIMULATED_QUERIES, analysis_fixture_grid, print_results
+
+def register(subparsers) -> None:
+    """Thêm lệnh concurrency"""
+    parser = subparsers.add_parser(
+        "concurrency", help="Nhiều luồng chọn mô hình song song với luồng cập nhật phản hồi")
+    parser.add_argument("--threads", type=int, default=8,
+                        help="Số luồng chọn mô hình (default: 8)")
+    parser.add_argument("--selects", type=int, default=20000,
+                        help="Số lần chọn mô hình mỗi luồng (default: 20000)")
+    parser.add_argument("--events", type=int, default=20000,
+                        help="Số phản hồi (default: 20000)")
+    parser.add_argument("--config", type=str, default="config/default.yml",
+                        help="Đường dẫn file cấu hình")
+    parser.set_defaults(run=run)
+
+def benchmark_concurrency(config_path: str, threads: int, selects: int, events: int) -> Dict[str, Any]:
+    """
+    Chạy nhiều luồng select_best_model (và score_models có điều chỉnh theo từ khóa) song song với
+    một luồng cập nhật phản hồi, kiểm tra trạng thái cuối trùng với áp dụng tuần tự cùng các phản
+    hồi và đo thông lượng chọn mô hình
+
+    Args:
+        config_path: Đường dẫn file cấu hình
+        threads: Số luồng chọn mô hình
+        selects: Số lần chọn mô hình mỗi luồng
+        events: Số phản hồi
+
+    Returns:
+        Dict chứa thông lượng, số lỗi và kết quả kiểm tra nhất quán
+    """
+    import json
+    import threading
+    from src.integration.interfaces import AssistantFactory
+    from src.optimization.preference_optimizer import PreferenceOptimizer
+
+    config = AssistantFactory.load_config(config_path)
+    # Bật điều chỉnh theo từ khóa để luồng đọc dùng cả sketch hiệu suất
+    config.setdefault("optimization", {}).setdefault("preference", {})["keyword_performance_weight"] = 0.2
+    model_names = [model["name"] for model in config.get("models", [])]
+    rng = random.Random(17)
+    feedback = []
+    for _ in range(events):
+        query, _ = rng.choice(SIMULATED_QUERIES)
+        responses = {name: "..." for name in rng.sample(model_names, k=rng.randint(1, len(model_names)))}
+        feedback.append((query, responses, rng.choice(list(responses)), round(rng.random(), 2)))
+    grid = analysis_fixture_grid()
+
+    def learned_state(optimizer: PreferenceOptimizer) -> str:
+        """Trạng thái học được từ phản hồi (bỏ số lần chọn, chỉ luồng đọc làm tăng)"""
+        state = optimizer.get_state()
+        state.pop("model_selection_count")
+        return json.dumps(state, sort_keys=True)
+
+    # Thông lượng một luồng, không có cập nhật
+    baseline = PreferenceOptimizer(config)
+    start = time.perf_counter()
+    for i in range(selects):
+        baseline.select_best_model(grid[i % len(grid)])
+    single_rate = selects / (time.perf_counter() - start)
+
+    optimizer = PreferenceOptimizer(config)
+    initial_count = sum(optimizer.get_state()["model_selection_count"].values())
+    weight_names = set(optimizer.model_weights)
+    score_names = set(optimizer.score_models(grid[0]))
+    errors = []
+    torn_reads = [0]
+    barrier = threading.Barrier(threads + 1)
+
+    def reader(offset: int) -> None:
+        barrier.wait()
+        try:
+            for i in range(selects):
+                optimizer.select_best_model(grid[(offset + i) % len(grid)])
+                weights = optimizer.model_weights
+                if weights.keys() != weight_names or not all(
+                        optimizer.min_weight <= weight <= optimizer.max_weight for weight in weights.values()):
+                    torn_reads[0] += 1
+                # Đọc sketch hiệu suất theo từ khóa trong khi luồng ghi thay thế nó (thưa hơn vì
+                # trích xuất từ khóa chậm hơn nhiều so với chọn mô hình)
+                if i % 10 == 0:
+                    query, _ = SIMULATED_QUERIES[(offset + i) % len(SIMULATED_QUERIES)]
+                    scores = optimizer.score_models(grid[(offset + i) % len(grid)], query=query)
+                    if scores.keys() != score_names or not all(math.isfinite(score) for score in scores.values()):
+                        torn_reads[0] += 1
+        except Exception as e:
+            errors.append(e)
+
+    def writer() -> None:
+        barrier.wait()
+        try:
+            for event in feedback:
+                optimizer.submit_feedback(*event)
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=reader, args=(i * 997,)) for i in range(threads)]
+    workers.append(threading.Thread(target=writer))
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    optimizer.stop_updates()
+
+    sequential = PreferenceOptimizer(config)
+    for event in feedback:
+        sequential.submit_feedback(*event)
+    sequential.stop_updates()
+
+    # Mỗi lần chọn tăng bộ đếm đúng một lần
+    expected_count = initial_count + threads * selects
+    actual_count = sum(optimizer.get_state()["model_selection_count"].values())
+
+    return {
+        "threads": threads,
+        "selects": threads * selects,
+        "events": events,
+        "single_thread_ops": single_rate,
+        "concurrent_ops": threads * selects / elapsed,
+        "errors": len(errors),
+        "torn_reads": torn_reads[0],
+        "count_match": actual_count == expected_count,
+        "state_match": learned_state(optimizer) == learned_state(sequential)
+    }
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_concurrency(args.config, args.threads, args.selects, args.events)
+    print_results("PreferenceOptimizer (đa luồng)", results)
@@ -0,0 +1,122 @@
+"""
+Lệnh delta-export của scripts/benchmark.py: xuất tăng dần theo bộ đếm thay đổi export_seq và ghép thành bản đầy đủ
+"""
+
+import json
+import os
+import random
+import time
+from typing import Any, Dict
+
+from benchmarks.common import generate_query, print_results
+
+def register(subparsers) -> None:
+    """Thêm lệnh delta-export"""
+    parser = subparsers.add_parser(
+        "delta-export", help="Xuất tăng dần theo bộ đếm thay đổi export_seq và ghép thành bản đầy đủ")
+    parser.add_argument("--records", type=int, default=100000,
+                        help="Số bản ghi phản hồi ban đầu (default: 100000)")
+    parser.add_argument("--new-records", type=int, default=1000,
+                        help="Số bản ghi phản hồi mới mỗi lần xuất tăng dần (default: 1000)")
+    parser.add_argument("--rounds", type=int, default=3,
+                        help="Số lần xuất tăng dần (default: 3)")
+    parser.set_defaults(run=run)
+
+def benchmark_delta_export(records: int, new_records: int, rounds: int) -> Dict[str, Any]:
+    """
+    Xuất tăng dần: lần đầu xuất toàn bộ, các lần sau chỉ xuất bản ghi mới (thời gian phải theo số
+    bản ghi mới chứ không theo kích thước cơ sở dữ liệu), rồi ghép thành bản đầy đủ và kiểm tra
+    mỗi bản ghi xuất hiện đúng một lần.
+
+    Args:
+        records: Số bản ghi phản hồi ban đầu (mỗi phản hồi kèm một so sánh)
+        new_records: Số bản ghi phản hồi mới mỗi lần xuất tăng dần
+        rounds: Số lần xuất tăng dần
+
+    Returns:
+        Dict chứa kết quả đo
+    """
+    import tempfile
+    from datetime import datetime, timedelta
+    from src.optimization.delta_export import consolidate, export_delta
+    from src.optimization.feedback_store import FeedbackStore
+    from src.utils.export import open_shard, verify_manifest
+
+    rng = random.Random(48)
+    models = [f"model-{i}" for i in range(5)]
+    start_time = datetime(2024, 1, 1)
+    to_item = lambda record: {"id": record["id"], "query": record.get("query", "")}
+    results: Dict[str, Any] = {}
+
+    def add_records(store: FeedbackStore, first: int, count: int) -> None:
+        for offset in range(first, first + count, 5000):
+            feedback, comparisons = [], []
+            for i in range(offset, min(first + count, offset + 5000)):
+                timestamp = (start_time + timedelta(minutes=i)).isoformat()
+                chosen, rejected = rng.sample(models, 2)
+                query = generate_query(rng)
+                responses = {chosen: generate_query(rng, 60), rejected: generate_query(rng, 60)}
+                feedback.append({"id": f"fb_{i}", "timestamp": timestamp, "query": query,
+                                 "responses": responses, "selected_response": chosen,
+                                 "feedback_score": round(rng.random(), 2)})
+                comparisons.append({"id": f"comp_{i}", "timestamp": timestamp, "query": query,
+                                    "chosen": responses[chosen], "rejected": responses[rejected],
+                                    "chosen_model": chosen, "rejected_model": rejected})
+            store.save_feedback_batch(feedback, comparisons)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        store = FeedbackStore(os.path.join(work_dir, "feedback.db"))
+        target_dir = os.path.join(work_dir, "nightly")
+        add_records(store, 0, records)
+
+        start = time.perf_counter()
+        export_delta(store, target_dir, to_item)
+        results["full_export_s"] = time.perf_counter() - start
+
+        total = records
+        delta_times = []
+        counts_ok = True
+        for _ in range(rounds):
+            add_records(store, total, new_records)
+            total += new_records
+            start = time.perf_counter()
+            manifest_path = export_delta(store, target_dir, to_item)
+            delta_times.append(time.perf_counter() - start)
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                streams = json.load(f)["streams"]
+            counts_ok = counts_ok and streams == {"feedback": new_records, "comparisons": new_records}
+
+        # Không có dữ liệu mới: không tạo phần tăng dần rỗng
+        start = time.perf_counter()
+        empty_ok = export_delta(store, target_dir, to_item) is None
+        results["noop_export_s"] = time.perf_counter() - start
+        store.close()
+
+        start = time.perf_counter()
+        snapshot_manifest = consolidate(target_dir, prune=True)
+        results["consolidate_s"] = time.perf_counter() - start
+
+        with open(snapshot_manifest, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        snapshot_dir = os.path.dirname(snapshot_manifest)
+        ids = set()
+        rows_read = 0
+        for shard in manifest["shards"]:
+            with open_shard(os.path.join(snapshot_dir, shard["file"])) as shard_file:
+                for line in shard_file:
+                    ids.add(json.loads(line)["id"])
+                    rows_read += 1
+
+        results["delta_export_s"] = sum(delta_times) / len(delta_times) if delta_times else 0.0
+        results["speedup"] = results["full_export_s"] / results["delta_export_s"] if delta_times else 0.0
+        results["snapshot_rows"] = rows_read
+        results["remaining_dirs"] = sorted(os.listdir(target_dir))
+        results["valid"] = (counts_ok and empty_ok and not verify_manifest(snapshot_manifest)
+                            and rows_read == 2 * total and len(ids) == rows_read)
+
+    return results
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_delta_export(args.records, args.new_records, args.rounds)
+    print_results("export_delta / consolidate", results)
@@ -0,0 +1,113 @@
+"""
+Lệnh export-pipeline của scripts/benchmark.py: xuất nhiều định dạng trong một lượt đọc so với xuất từng định dạng
+"""
+
+import os
+import random
+import time
+from typing import Any, Dict, List
+
+from benchmarks.common import generate_query, print_results
+
+def register(subparsers) -> None:
+    """Thêm lệnh export-pipeline"""
+    parser = subparsers.add_parser(
+        "export-pipeline", help="Xuất nhiều định dạng trong một lượt đọc so với xuất từng định dạng")
+    parser.add_argument("--records", type=int, default=20000,
+                        help="Số bản ghi phản hồi (default: 20000)")
+    parser.add_argument("--formats", type=str, nargs="+", default=["jsonl", "json", "csv"],
+                        help="Các định dạng xuất (default: jsonl json csv)")
+    parser.add_argument("--split", action="store_true", help="Chia thành tập train/eval")
+    parser.set_defaults(run=run)
+
+def benchmark_export_pipeline(records: int, formats: List[str], split: bool) -> Dict[str, Any]:
+    """
+    Xuất nhiều định dạng: mỗi định dạng một lần đọc cơ sở dữ liệu (cách cũ) so với một lượt đọc
+    chia cho các thread ghi, kèm kiểm tra số bản ghi và cách chia tập giống nhau giữa các định dạng.
+
+    Args:
+        records: Số bản ghi phản hồi (mỗi phản hồi kèm một so sánh)
+        formats: Các định dạng xuất
+        split: Chia thành tập train/eval
+
+    Returns:
+        Dict chứa thông lượng (bản ghi/giây) của hai cách
+    """
+    import tempfile
+    from datetime import datetime, timedelta
+    from export_rlhf import (export_feedback_pipeline, export_feedback_to_csv, export_feedback_to_json,
+                             export_feedback_to_jsonl, iter_export_records)
+    from src.optimization.feedback_store import FeedbackStore
+
+    rng = random.Random(49)
+    models = [f"model-{i}" for i in range(5)]
+    start_time = datetime(2024, 1, 1)
+    results: Dict[str, Any] = {}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        store = FeedbackStore(os.path.join(work_dir, "feedback.db"))
+        for offset in range(0, records, 5000):
+            feedback, comparisons = [], []
+            for i in range(offset, min(records, offset + 5000)):
+                timestamp = (start_time + timedelta(minutes=i)).isoformat()
+                chosen, rejected = rng.sample(models, 2)
+                query = generate_query(rng)
+                responses = {chosen: generate_query(rng, 60), rejected: generate_query(rng, 60)}
+                feedback.append({"id": f"fb_{i}", "timestamp": timestamp, "query": query,
+                                 "responses": responses, "selected_response": chosen,
+                                 "feedback_score": round(rng.random(), 2)})
+                comparisons.append({"id": f"comp_{i}", "timestamp": timestamp, "query": query,
+                                    "chosen": responses[chosen], "rejected": responses[rejected],
+                                    "chosen_model": chosen, "rejected_model": rejected})
+            store.save_feedback_batch(feedback, comparisons)
+        rows = 2 * records
+
+        # Mỗi định dạng một lần đọc
+        sequential_dir = os.path.join(work_dir, "sequential")
+        os.makedirs(sequential_dir)
+        start = time.perf_counter()
+        for export_format in formats:
+            data = iter_export_records(store)
+            if export_format == "jsonl":
+                export_feedback_to_jsonl(data, os.path.join(sequential_dir, "jsonl"), split=split)
+            elif export_format == "json":
+                export_feedback_to_json(data, os.path.join(sequential_dir, "export.json"), split=split)
+            elif export_format == "csv":
+                export_feedback_to_csv(data, os.path.join(sequential_dir, "csv"), split=split)
+        sequential_s = time.perf_counter() - start
+
+        # Một lượt đọc, mỗi định dạng một thread
+        pipeline_dir = os.path.join(work_dir, "pipeline")
+        os.makedirs(pipeline_dir)
+        start = time.perf_counter()
+        stats = export_feedback_pipeline(iter_export_records(store), pipeline_dir, formats, "bench", split=split)
+        pipeline_s = time.perf_counter() - start
+        store.close()
+
+        counts = []
+        pipeline_results = stats["results"]
+        if "jsonl" in pipeline_results:
+            counts.append(pipeline_results["jsonl"]["total_rows"])
+        for export_format in ["json", "csv"]:
+            if export_format in pipeline_results:
+                counts.append(pipeline_results[export_format]["total"])
+        same_split = True
+        if split and "json" in pipeline_results and "jsonl" in pipeline_results:
+            streams = pipeline_results["jsonl"]["streams"]
+            same_split = (streams.get("eval_feedback", 0) == pipeline_results["json"]["eval_feedback"]
+                          and streams.get("eval_comparisons", 0) == pipeline_results["json"]["eval_comparisons"])
+
+        results["rows"] = rows
+        results["sequential_s"] = sequential_s
+        results["sequential_rows_per_s"] = rows / sequential_s
+        results["pipeline_s"] = pipeline_s
+        results["pipeline_rows_per_s"] = stats["rows_per_sec"]
+        results["speedup"] = sequential_s / pipeline_s
+        results["valid"] = stats["rows"] == rows and all(count == rows for count in counts) and same_split
+
+    return results
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_export_pipeline(args.records, args.formats, args.split)
+    print_results("export_feedback_pipeline", results)
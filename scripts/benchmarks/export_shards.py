@@ -0,0 +1,101 @@
+"""
+Lệnh export-shards của scripts/benchmark.py: xuất JSONL theo phân đoạn có nén và manifest: bộ nhớ đỉnh theo số bản ghi
+"""
+
+import json
+import os
+import random
+import time
+from typing import Any, Dict, List
+
+from benchmarks.common import generate_query, print_results
+
+def register(subparsers) -> None:
+    """Thêm lệnh export-shards"""
+    parser = subparsers.add_parser(
+        "export-shards", help="Xuất JSONL theo phân đoạn có nén và manifest: bộ nhớ đỉnh theo số bản ghi")
+    parser.add_argument("--records", type=int, nargs="+", default=[10000, 40000],
+                        help="Các số bản ghi phản hồi cần đo (default: 10000 40000)")
+    parser.add_argument("--rows-per-shard", type=int, default=10000,
+                        help="Số dòng mỗi file (default: 10000)")
+    parser.add_argument("--compression", type=str, choices=["none", "gzip", "zstd"], default="gzip",
+                        help="Thuật toán nén (default: gzip)")
+    parser.set_defaults(run=run)
+
+def benchmark_export_shards(sizes: List[int], rows_per_shard: int, compression: str) -> Dict[str, Any]:
+    """
+    Xuất dữ liệu phản hồi ra các file JSONL theo phân đoạn: bộ nhớ đỉnh theo số bản ghi (phải
+    gần như không đổi), thời gian, kích thước, kiểm tra manifest và đọc lại số dòng.
+
+    Args:
+        sizes: Các số bản ghi phản hồi cần đo (mỗi phản hồi kèm một so sánh)
+        rows_per_shard: Số dòng mỗi file
+        compression: none, gzip hoặc zstd
+
+    Returns:
+        Dict chứa kết quả đo theo từng kích thước
+    """
+    import tempfile
+    import tracemalloc
+    from datetime import datetime, timedelta
+    from src.optimization.feedback_collector import FeedbackCollector
+    from src.optimization.feedback_store import FeedbackStore
+    from src.utils.export import open_shard, verify_manifest
+
+    rng = random.Random(47)
+    models = [f"model-{i}" for i in range(5)]
+    start_time = datetime(2024, 1, 1)
+    results = {}
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as work_dir:
+            store = FeedbackStore(os.path.join(work_dir, "feedback.db"))
+            for offset in range(0, size, 5000):
+                feedback, comparisons = [], []
+                for i in range(offset, min(size, offset + 5000)):
+                    timestamp = (start_time + timedelta(minutes=i)).isoformat()
+                    chosen, rejected = rng.sample(models, 2)
+                    query = generate_query(rng)
+                    responses = {chosen: generate_query(rng, 60), rejected: generate_query(rng, 60)}
+                    feedback.append({"id": f"fb_{i}", "timestamp": timestamp, "query": query,
+                                     "responses": responses, "selected_response": chosen,
+                                     "feedback_score": round(rng.random(), 2)})
+                    comparisons.append({"id": f"comp_{i}", "timestamp": timestamp, "query": query,
+                                        "chosen": responses[chosen], "rejected": responses[rejected],
+                                        "chosen_model": chosen, "rejected_model": rejected})
+                store.save_feedback_batch(feedback, comparisons)
+
+            collector = FeedbackCollector(store, {})
+            start = time.perf_counter()
+            manifest_path = collector.export_feedback_shards(os.path.join(work_dir, "exports"),
+                                                             rows_per_shard, compression)
+            elapsed = time.perf_counter() - start
+
+            # Đo bộ nhớ ở lần xuất riêng vì tracemalloc làm chậm đáng kể
+            tracemalloc.start()
+            collector.export_feedback_shards(os.path.join(work_dir, "exports_traced"), rows_per_shard, compression)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            store.close()
+
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            export_dir = os.path.dirname(manifest_path)
+            rows_read = 0
+            for shard in manifest["shards"]:
+                with open_shard(os.path.join(export_dir, shard["file"])) as shard_file:
+                    rows_read += sum(1 for _ in shard_file)
+
+            results[f"export_s_{size}"] = elapsed
+            results[f"peak_mb_{size}"] = peak / (1024 * 1024)
+            results[f"shards_{size}"] = len(manifest["shards"])
+            results[f"export_mb_{size}"] = sum(shard["bytes"] for shard in manifest["shards"]) / (1024 * 1024)
+            results[f"valid_{size}"] = (not verify_manifest(manifest_path) and rows_read == 2 * size
+                                        and manifest["streams"] == {"feedback": size, "comparisons": size})
+
+    return results
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_export_shards(args.records, args.rows_per_shard, args.compression)
+    print_results("FeedbackCollector.export_feedback_shards", results)
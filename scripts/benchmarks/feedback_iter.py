@@ -0,0 +1,79 @@
+"""
+Lệnh feedback-iter của scripts/benchmark.py: bộ nhớ đỉnh khi đọc toàn bộ phản hồi: get_all_feedback so với iter_feedback
+"""
+
+import os
+import random
+import time
+from typing import Any, Dict, Tuple
+
+from benchmarks.common import generate_query, print_results
+
+def register(subparsers) -> None:
+    """Thêm lệnh feedback-iter"""
+    parser = subparsers.add_parser(
+        "feedback-iter", help="Bộ nhớ đỉnh khi đọc toàn bộ phản hồi: get_all_feedback so với iter_feedback")
+    parser.add_argument("--records", type=int, default=20000,
+                        help="Số bản ghi phản hồi (default: 20000)")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="Số bản ghi mỗi lô (default: 1000)")
+    parser.set_defaults(run=run)
+
+def benchmark_feedback_iter(records: int, batch_size: int) -> Dict[str, Any]:
+    """
+    Đo bộ nhớ đỉnh và thời gian khi duyệt toàn bộ phản hồi và so sánh: nạp danh sách
+    bằng get_all_feedback so với duyệt theo lô bằng iter_feedback/iter_comparisons
+
+    Args:
+        records: Số bản ghi phản hồi (mỗi phản hồi kèm một so sánh)
+        batch_size: Số bản ghi mỗi lô
+
+    Returns:
+        Dict chứa bộ nhớ đỉnh (MB), thời gian và số bản ghi đọc được của mỗi cách
+    """
+    import itertools
+    import tempfile
+    import tracemalloc
+    from src.optimization.feedback_store import FeedbackStore
+
+    rng = random.Random(23)
+    with tempfile.TemporaryDirectory() as work_dir:
+        store = FeedbackStore(os.path.join(work_dir, "feedback.db"))
+        for first in range(0, records, 1000):
+            feedback, comparisons = [], []
+            for i in range(first, min(records, first + 1000)):
+                responses = {"model-a": generate_query(rng, 60), "model-b": generate_query(rng, 60)}
+                feedback.append({"id": f"fb_bench_{i}", "query": generate_query(rng), "responses": responses,
+                                 "selected_response": "model-a", "feedback_score": round(rng.random(), 2)})
+                comparisons.append({"id": f"comp_bench_{i}", "query": feedback[-1]["query"],
+                                    "chosen": responses["model-a"], "rejected": responses["model-b"],
+                                    "chosen_model": "model-a", "rejected_model": "model-b"})
+            store.save_feedback_batch(feedback, comparisons)
+
+        def measure(read) -> Tuple[float, float, int]:
+            tracemalloc.start()
+            start = time.perf_counter()
+            count = read()
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return peak / 1e6, elapsed, count
+
+        list_peak, list_time, list_count = measure(lambda: len(store.get_all_feedback()))
+        iter_peak, iter_time, iter_count = measure(lambda: sum(1 for _ in itertools.chain(
+            store.iter_feedback(batch_size=batch_size), store.iter_comparisons(batch_size=batch_size))))
+        store.close()
+
+    return {
+        "rows": records * 2,
+        "list_peak_mb": list_peak,
+        "iter_peak_mb": iter_peak,
+        "list_s": list_time,
+        "iter_s": iter_time,
+        "rows_match": list_count == iter_count
+    }
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_feedback_iter(args.records, args.batch_size)
+    print_results("FeedbackStore.iter_feedback", results)
@@ -0,0 +1,110 @@
+"""
+Lệnh feedback-stats của scripts/benchmark.py: thống kê từ bảng tổng hợp do trigger duy trì so với quét toàn bộ bảng
+"""
+
+import os
+import random
+import time
+from typing import Any, Dict, List
+
+from benchmarks.common import generate_query, print_results
+
+def register(subparsers) -> None:
+    """Thêm lệnh feedback-stats"""
+    parser = subparsers.add_parser(
+        "feedback-stats", help="Thống kê từ bảng tổng hợp do trigger duy trì so với quét toàn bộ bảng")
+    parser.add_argument("--records", type=int, nargs="+", default=[10000, 100000],
+                        help="Các số bản ghi phản hồi cần đo (default: 10000 100000)")
+    parser.set_defaults(run=run)
+
+def benchmark_feedback_stats(sizes: List[int]) -> Dict[str, Any]:
+    """
+    So sánh thời gian lấy thống kê từ bảng tổng hợp do trigger duy trì (get_feedback_stats,
+    get_summary_counts) với COUNT/AVG trên toàn bộ bảng phản hồi, và kiểm tra kết quả khớp nhau
+    sau khi ghi, ghi đè và xóa bản ghi
+
+    Args:
+        sizes: Các số bản ghi phản hồi cần đo (mỗi phản hồi kèm một so sánh)
+
+    Returns:
+        Dict chứa thời gian của mỗi cách theo kích thước
+    """
+    import tempfile
+    from datetime import datetime, timedelta
+    from src.optimization.feedback_store import FeedbackStore
+
+    rng = random.Random(37)
+    models = [f"model-{i}" for i in range(5)]
+    templates = ["default", "analytical", "creative", None]
+    start_time = datetime(2024, 1, 1)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size in sizes:
+            store = FeedbackStore(os.path.join(work_dir, f"stats_{size}.db"))
+            for first in range(0, size, 5000):
+                feedback, comparisons = [], []
+                for i in range(first, min(size, first + 5000)):
+                    timestamp = (start_time + timedelta(minutes=i)).isoformat()
+                    chosen, rejected = rng.sample(models, 2)
+                    record = {"id": f"fb_{i}", "timestamp": timestamp, "query": generate_query(rng),
+                              "responses": {chosen: "..."}, "selected_response": chosen,
+                              "feedback_score": rng.choice([None, round(rng.random(), 1)])}
+                    template = rng.choice(templates)
+                    if template:
+                        record["template_used"] = template
+                    feedback.append(record)
+                    comparisons.append({"id": f"comp_{i}", "timestamp": timestamp, "query": record["query"],
+                                        "chosen": "...", "rejected": "...",
+                                        "chosen_model": chosen, "rejected_model": rejected})
+                store.save_feedback_batch(feedback, comparisons)
+
+            # Ghi đè và xóa một phần để kiểm tra trigger UPDATE/DELETE
+            for i in range(0, size, 97):
+                store.save_feedback({"id": f"fb_{i}", "timestamp": start_time.isoformat(), "query": "q",
+                                     "responses": {}, "selected_response": models[0], "feedback_score": 1.0})
+            for i in range(0, size, 89):
+                store.delete_feedback(f"fb_{i}")
+                store.delete_comparison(f"comp_{i}")
+
+            start = time.perf_counter()
+            stats = store.get_feedback_stats()
+            total = store.get_total_count()
+            rollup_time = time.perf_counter() - start
+
+            conn = store.connections.get_connection()
+            start = time.perf_counter()
+            scan = conn.execute('''
+            SELECT COUNT(feedback_score),
+                   SUM(CASE WHEN feedback_score >= 0.8 THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN feedback_score <= 0.3 THEN 1 ELSE 0 END),
+                   AVG(feedback_score)
+            FROM feedback
+            ''').fetchone()
+            models_scan = dict(conn.execute(
+                "SELECT selected_response, COUNT(*) FROM feedback GROUP BY selected_response").fetchall())
+            templates_scan = dict(conn.execute(
+                "SELECT json_extract(metadata, '$.template_used') AS t, COUNT(*) FROM feedback "
+                "WHERE t IS NOT NULL GROUP BY t").fetchall())
+            total_scan = (conn.execute("SELECT COUNT(*) FROM feedback").fetchone()[0]
+                          + conn.execute("SELECT COUNT(*) FROM comparisons").fetchone()[0])
+            scan_time = time.perf_counter() - start
+            store.close()
+
+            results[f"rollup_ms_{size}"] = rollup_time * 1000
+            results[f"scan_ms_{size}"] = scan_time * 1000
+            results[f"stats_match_{size}"] = (
+                stats["total_feedback"] == scan[0]
+                and stats["positive_feedback"] == scan[1]
+                and stats["negative_feedback"] == scan[2]
+                and abs(stats["average_score"] - scan[3]) < 1e-9
+                and stats["model_distribution"] == models_scan
+                and {name: entry["count"] for name, entry in stats["template_stats"].items()} == templates_scan
+                and total == total_scan)
+
+    return results
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_feedback_stats(args.records)
+    print_results("FeedbackStore.get_feedback_stats", results)
@@ -0,0 +1,133 @@
+"""
+Lệnh feedback-store của scripts/benchmark.py: thông lượng ghi/đọc của FeedbackStore: kết nối bền vững so với mở mỗi lần
+"""
+
+import os
+import random
+import time
+from typing import Any, Dict
+
+from benchmarks.common import generate_query, print_results
+
+def register(subparsers) -> None:
+    """Thêm lệnh feedback-store"""
+    parser = subparsers.add_parser(
+        "feedback-store", help="Thông lượng ghi/đọc của FeedbackStore: kết nối bền vững so với mở mỗi lần")
+    parser.add_argument("--records", type=int, default=5000,
+                        help="Số bản ghi phản hồi (default: 5000)")
+    parser.add_argument("--reads", type=int, default=5000,
+                        help="Số lần đọc (default: 5000)")
+    parser.set_defaults(run=run)
+
+def benchmark_feedback_store(records: int, reads: int) -> Dict[str, Any]:
+    """
+    So sánh thông lượng ghi và đọc của FeedbackStore giữa cách cũ (mở rồi đóng kết nối ở mỗi
+    thao tác, PRAGMA mặc định) và kết nối bền vững theo luồng với WAL
+
+    Args:
+        records: Số bản ghi phản hồi
+        reads: Số lần đọc mỗi loại truy vấn
+
+    Returns:
+        Dict chứa số thao tác mỗi giây của từng cách
+    """
+    import tempfile
+    from src.optimization.feedback_store import FeedbackStore
+
+    rng = random.Random(19)
+    feedback = []
+    for i in range(records):
+        feedback.append({
+            "id": f"fb_bench_{i}",
+            "conversation_id": f"conv_{i % 50}",
+            "query": generate_query(rng),
+            "responses": {"model-a": generate_query(rng, 40), "model-b": generate_query(rng, 40)},
+            "selected_response": rng.choice(["model-a", "model-b"]),
+            "feedback_score": round(rng.random(), 2)
+        })
+    read_ids = [f"fb_bench_{rng.randrange(records)}" for _ in range(reads)]
+
+    def run(store: FeedbackStore, per_operation: bool) -> Dict[str, float]:
+        # Cách cũ: kết nối bị đóng sau mỗi thao tác, thao tác sau phải mở lại
+        after = store.close if per_operation else (lambda: None)
+
+        start = time.perf_counter()
+        for record in feedback:
+            store.save_feedback(record)
+            after()
+        insert_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for feedback_id in read_ids:
+            store.get_feedback(feedback_id)
+            after()
+        read_time = time.perf_counter() - start
+
+        # Các truy vấn đếm mà FeedbackOptimizationManager.get_stats gọi liên tiếp
+        start = time.perf_counter()
+        for _ in range(reads // 10):
+            store.get_total_count()
+            after()
+            store.get_count_by_score(min_score=0.7)
+            after()
+            store.get_count_by_score(max_score=0.3)
+            after()
+            store.get_count_by_score(min_score=0.3, max_score=0.7)
+            after()
+        count_time = time.perf_counter() - start
+
+        return {
+            "insert_ops": records / insert_time,
+            "read_ops": reads / read_time,
+            "stats_calls": (reads // 10) / count_time
+        }
+
+    # Không đặt PRAGMA nào để tái hiện cấu hình trước đây
+    legacy_options = {"journal_mode": None, "synchronous": None, "mmap_size": None,
+                      "cache_size": None, "busy_timeout": None}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        legacy = run(FeedbackStore(os.path.join(work_dir, "legacy.db"), legacy_options), True)
+        persistent_store = FeedbackStore(os.path.join(work_dir, "persistent.db"))
+        persistent = run(persistent_store, False)
+        connections = persistent_store.connections.get_stats()
+        persistent_store.close()
+
+        # Mỗi phản hồi kèm các so sánh cặp như FeedbackCollector tạo ra:
+        # từng lệnh ghi riêng so với một giao dịch executemany
+        comparisons = [[{"id": f"comp_bench_{i}_{j}", "query": record["query"],
+                         "chosen": record["responses"]["model-a"], "rejected": record["responses"]["model-b"],
+                         "chosen_model": "model-a", "rejected_model": f"model-{j}"} for j in range(3)]
+                       for i, record in enumerate(feedback)]
+
+        separate_store = FeedbackStore(os.path.join(work_dir, "separate.db"))
+        start = time.perf_counter()
+        for record, record_comparisons in zip(feedback, comparisons):
+            separate_store.save_feedback(record)
+            for comparison in record_comparisons:
+                separate_store.save_comparison(comparison)
+        separate_time = time.perf_counter() - start
+        separate_store.close()
+
+        batched_store = FeedbackStore(os.path.join(work_dir, "batched.db"))
+        start = time.perf_counter()
+        for record, record_comparisons in zip(feedback, comparisons):
+            batched_store.save_feedback_batch([record], record_comparisons)
+        batched_time = time.perf_counter() - start
+        batched_rows = batched_store.get_total_count()
+        batched_store.close()
+
+    results = {"records": records, "reads": reads}
+    for key in legacy:
+        results[f"legacy_{key}"] = legacy[key]
+        results[f"persistent_{key}"] = persistent[key]
+    results["connections_opened"] = connections["connections_opened"]
+    results["separate_commit_ops"] = records / separate_time
+    results["single_commit_ops"] = records / batched_time
+    results["single_commit_rows"] = batched_rows
+    return results
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_feedback_store(args.records, args.reads)
+    print_results("FeedbackStore", results)
@@ -0,0 +1,87 @@
+"""
+Lệnh fit-preferences của scripts/benchmark.py: ước lượng Bradley-Terry theo lô từ toàn bộ so sánh cặp trong cơ sở dữ liệu
+"""
+
+import os
+import random
+import time
+from typing import Any, Dict
+
+from benchmarks.common import generate_query, print_results
+
+def register(subparsers) -> None:
+    """Thêm lệnh fit-preferences"""
+    parser = subparsers.add_parser(
+        "fit-preferences", help="Ước lượng Bradley-Terry theo lô từ toàn bộ so sánh cặp trong cơ sở dữ liệu")
+    parser.add_argument("--comparisons", type=int, default=1000000,
+                        help="Số so sánh cặp (default: 1000000)")
+    parser.add_argument("--batch-size", type=int, default=50000,
+                        help="Số so sánh đọc mỗi lô (default: 50000)")
+    parser.add_argument("--config", type=str, default="config/default.yml",
+                        help="Đường dẫn file cấu hình")
+    parser.set_defaults(run=run)
+
+def benchmark_fit_preferences(config_path: str, comparisons: int, batch_size: int) -> Dict[str, Any]:
+    """
+    Đo thời gian đọc và ước lượng Bradley-Terry của fit_preferences trên cơ sở dữ liệu có nhiều
+    so sánh cặp sinh từ độ mạnh đã biết, kèm kiểm tra thứ hạng ước lượng khớp thứ hạng thật
+
+    Args:
+        config_path: Đường dẫn file cấu hình
+        comparisons: Số so sánh cặp
+        batch_size: Số so sánh đọc mỗi lô
+
+    Returns:
+        Dict chứa thời gian đọc, thời gian ước lượng và kết quả kiểm tra thứ hạng
+    """
+    import tempfile
+    from fit_preferences import fit_preference_state, load_comparisons
+    from src.integration.interfaces import AssistantFactory
+    from src.optimization.feedback_store import FeedbackStore
+    from src.optimization.preference_optimizer import PreferenceOptimizer
+
+    rng = random.Random(53)
+    optimizer = PreferenceOptimizer(AssistantFactory.load_config(config_path))
+    strengths = {f"model-{i}": 2.0 ** (i / 2) for i in range(8)}
+    models = list(strengths)
+    prefixes = ["làm thế nào", "tại sao", "là gì", "so sánh", "ví dụ", "liệt kê", "đánh giá", ""]
+    queries = [f"{rng.choice(prefixes)} {generate_query(rng)}" for _ in range(2000)]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        store = FeedbackStore(os.path.join(work_dir, "feedback.db"))
+        start = time.perf_counter()
+        for offset in range(0, comparisons, 10000):
+            batch = []
+            for i in range(offset, min(comparisons, offset + 10000)):
+                first, second = rng.sample(models, 2)
+                if rng.random() >= strengths[first] / (strengths[first] + strengths[second]):
+                    first, second = second, first
+                batch.append({"id": f"comp_bench_{i}", "query": rng.choice(queries), "chosen": "a",
+                              "rejected": "b", "chosen_model": first, "rejected_model": second})
+            store.save_comparisons_batch(batch)
+        insert_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        winners, losers, groups, model_names, query_types = load_comparisons(store, optimizer, batch_size)
+        load_time = time.perf_counter() - start
+        store.close()
+
+    start = time.perf_counter()
+    _, summary = fit_preference_state(winners, losers, groups, model_names, query_types, optimizer, 1.0, 20)
+    fit_time = time.perf_counter() - start
+
+    fitted_order = sorted(summary, key=lambda name: summary[name]["elo"])
+    return {
+        "comparisons": len(winners),
+        "query_types": len(query_types),
+        "insert_s": insert_time,
+        "load_s": load_time,
+        "fit_s": fit_time,
+        "total_s": load_time + fit_time,
+        "ranking_match": fitted_order == sorted(strengths, key=strengths.get)
+    }
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_fit_preferences(args.config, args.comparisons, args.batch_size)
+    print_results("fit_preferences (Bradley-Terry)", results)
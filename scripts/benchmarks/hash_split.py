@@ -0,0 +1,109 @@
+"""
+Lệnh hash-split của scripts/benchmark.py: chia train/eval theo hash của hội thoại: tất định, không rò rỉ, một lượt đọc
+"""
+
+import json
+import os
+import random
+from typing import Any, Dict
+
+from benchmarks.common import generate_query, print_results
+
+def register(subparsers) -> None:
+    """Thêm lệnh hash-split"""
+    parser = subparsers.add_parser(
+        "hash-split", help="Chia train/eval theo hash của hội thoại: tất định, không rò rỉ, một lượt đọc")
+    parser.add_argument("--records", type=int, default=20000,
+                        help="Số bản ghi phản hồi (default: 20000)")
+    parser.add_argument("--conversations", type=int, default=2000,
+                        help="Số hội thoại (default: 2000)")
+    parser.add_argument("--eval-ratio", type=float, default=0.1,
+                        help="Tỷ lệ tập eval (default: 0.1)")
+    parser.set_defaults(run=run)
+
+def benchmark_hash_split(records: int, conversations: int, eval_ratio: float) -> Dict[str, Any]:
+    """
+    Chia train/eval theo hash của conversation_id khi xuất: hai lần xuất phải cho cùng cách chia,
+    không hội thoại nào nằm ở cả hai tập, tỷ lệ hội thoại thuộc tập eval gần eval_ratio, và số
+    bản ghi từng tập trong manifest khớp với dữ liệu đã ghi.
+
+    Args:
+        records: Số bản ghi phản hồi (mỗi phản hồi kèm một so sánh)
+        conversations: Số hội thoại
+        eval_ratio: Tỷ lệ tập eval
+
+    Returns:
+        Dict chứa kết quả đo
+    """
+    import tempfile
+    from datetime import datetime, timedelta
+    from export_rlhf import export_feedback_pipeline, iter_export_records
+    from src.optimization.feedback_store import FeedbackStore
+    from src.utils.export import open_shard
+
+    rng = random.Random(50)
+    models = [f"model-{i}" for i in range(5)]
+    start_time = datetime(2024, 1, 1)
+    results: Dict[str, Any] = {}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        store = FeedbackStore(os.path.join(work_dir, "feedback.db"))
+        for offset in range(0, records, 5000):
+            feedback, comparisons = [], []
+            for i in range(offset, min(records, offset + 5000)):
+                timestamp = (start_time + timedelta(minutes=i)).isoformat()
+                conversation_id = f"conv_{rng.randrange(conversations)}"
+                chosen, rejected = rng.sample(models, 2)
+                query = generate_query(rng)
+                responses = {chosen: generate_query(rng, 60), rejected: generate_query(rng, 60)}
+                feedback.append({"id": f"fb_{i}", "timestamp": timestamp, "conversation_id": conversation_id,
+                                 "query": query, "responses": responses, "selected_response": chosen,
+                                 "feedback_score": round(rng.random(), 2)})
+                comparisons.append({"id": f"comp_{i}", "timestamp": timestamp, "conversation_id": conversation_id,
+                                    "query": query, "chosen": responses[chosen], "rejected": responses[rejected],
+                                    "chosen_model": chosen, "rejected_model": rejected})
+            store.save_feedback_batch(feedback, comparisons)
+
+        runs = []
+        for run in range(2):
+            stats = export_feedback_pipeline(iter_export_records(store), os.path.join(work_dir, f"run{run}"),
+                                             ["jsonl"], "bench", split=True, eval_ratio=eval_ratio)
+            runs.append(stats)
+        store.close()
+
+        # Đọc lại lần xuất thứ nhất: tập của từng hội thoại và số bản ghi từng tập
+        manifest = runs[0]["results"]["jsonl"]
+        export_dir = os.path.join(work_dir, "run0", "rlhf_export_bench")
+        parts_by_conversation: Dict[str, set] = {}
+        part_rows = {"train": 0, "eval": 0}
+        for shard in manifest["shards"]:
+            part = shard["stream"].split("_", 1)[0]
+            with open_shard(os.path.join(export_dir, shard["file"])) as shard_file:
+                for line in shard_file:
+                    parts_by_conversation.setdefault(json.loads(line)["conversation_id"], set()).add(part)
+                    part_rows[part] += 1
+
+        split_counts = manifest["metadata"]["split_counts"]
+        leaked = sum(1 for parts in parts_by_conversation.values() if len(parts) > 1)
+        eval_conversations = sum(1 for parts in parts_by_conversation.values() if parts == {"eval"})
+        second = runs[1]["results"]["jsonl"]
+
+        results["rows_per_s"] = runs[0]["rows_per_sec"]
+        results["eval_rows"] = split_counts.get("eval", {}).get("total", 0)
+        results["train_rows"] = split_counts.get("train", {}).get("total", 0)
+        results["eval_conversation_ratio"] = eval_conversations / len(parts_by_conversation)
+        results["leaked_conversations"] = leaked
+        results["reproducible"] = (second["metadata"]["split_counts"] == split_counts
+                                   and [shard["sha256"] for shard in second["shards"]]
+                                   == [shard["sha256"] for shard in manifest["shards"]])
+        results["valid"] = (leaked == 0 and results["reproducible"]
+                            and part_rows == {part: split_counts.get(part, {}).get("total", 0)
+                                              for part in part_rows}
+                            and abs(results["eval_conversation_ratio"] - eval_ratio) < 0.05)
+
+    return results
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_hash_split(args.records, args.conversations, args.eval_ratio)
+    print_results("classify_item (hash split)", results)
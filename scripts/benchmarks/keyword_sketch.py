@@ -0,0 +1,87 @@
+"""
+Lệnh keyword-sketch của scripts/benchmark.py: bộ nhớ và sai số của sketch hiệu suất theo từ khóa so với từ điển đầy đủ
+"""
+
+import random
+import time
+from typing import Any, Dict
+
+from benchmarks.common import print_results
+
+def register(subparsers) -> None:
+    """Thêm lệnh keyword-sketch"""
+    parser = subparsers.add_parser(
+        "keyword-sketch", help="Bộ nhớ và sai số của sketch hiệu suất theo từ khóa so với từ điển đầy đủ")
+    parser.add_argument("--events", type=int, default=200000,
+                        help="Số lần ghi nhận (từ khóa, mô hình, điểm) (default: 200000)")
+    parser.add_argument("--vocabulary", type=int, default=100000,
+                        help="Số từ khóa phân biệt (default: 100000)")
+    parser.add_argument("--width", type=int, default=1024, help="Số ô mỗi hàng (default: 1024)")
+    parser.add_argument("--depth", type=int, default=4, help="Số hàng (default: 4)")
+    parser.set_defaults(run=run)
+
+def benchmark_keyword_sketch(events: int, vocabulary: int, width: int, depth: int) -> Dict[str, Any]:
+    """
+    So sánh sketch hiệu suất theo từ khóa với từ điển đầy đủ (cách lưu cũ): bộ nhớ và
+    sai số ước lượng điểm trung bình của các từ khóa phổ biến
+
+    Args:
+        events: Số lần ghi nhận
+        vocabulary: Số từ khóa phân biệt
+        width: Số ô mỗi hàng
+        depth: Số hàng
+
+    Returns:
+        Dict chứa bộ nhớ, sai số và thời gian cập nhật/ước lượng
+    """
+    import tracemalloc
+    from src.optimization.performance_sketch import KeywordPerformanceSketch
+
+    rng = random.Random(5)
+    models = ["deepseek-r1:1.5b", "qwen2.5-coder:7b", "deepseek-r1:8b"]
+    # Phân bố Zipf: một số từ khóa rất phổ biến, phần lớn hiếm gặp
+    keyword_weights = [1.0 / (rank + 1) for rank in range(vocabulary)]
+    keywords = rng.choices([f"kw{i}" for i in range(vocabulary)], weights=keyword_weights, k=events)
+    quality = {model: rng.random() for model in models}
+    samples = [(keyword, rng.choice(models)) for keyword in keywords]
+    samples = [(keyword, model, min(1.0, max(0.0, rng.gauss(quality[model], 0.2))))
+               for keyword, model in samples]
+
+    tracemalloc.start()
+    exact: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for keyword, model, score in samples:
+        current = exact.setdefault(keyword, {}).setdefault(model, {"score": 0.5, "count": 0})
+        current["score"] = (current["score"] * current["count"] + score) / (current["count"] + 1)
+        current["count"] += 1
+    exact_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    sketch = KeywordPerformanceSketch(width=width, depth=depth)
+    start = time.perf_counter()
+    for keyword, model, score in samples:
+        sketch.add(keyword, model, score)
+    add_time = time.perf_counter() - start
+
+    # Sai số trên 100 từ khóa phổ biến nhất
+    errors = []
+    start = time.perf_counter()
+    for i in range(100):
+        for model, perf in exact.get(f"kw{i}", {}).items():
+            estimate = sketch.estimate(f"kw{i}", model)
+            errors.append(abs(estimate[0] - perf["score"]))
+    estimate_time = time.perf_counter() - start
+
+    return {
+        "distinct_keywords": len(exact),
+        "dict_memory_kb": exact_bytes / 1024,
+        "sketch_memory_kb": sketch.memory_bytes() / 1024,
+        "top100_mean_abs_err": sum(errors) / len(errors) if errors else 0.0,
+        "top100_max_abs_err": max(errors) if errors else 0.0,
+        "add_us": add_time * 1e6 / events,
+        "estimate_us": estimate_time * 1e6 / max(1, len(errors))
+    }
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_keyword_sketch(args.events, args.vocabulary, args.width, args.depth)
+    print_results("KeywordPerformanceSketch", results)
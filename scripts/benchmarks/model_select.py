@@ -0,0 +1,150 @@
+"""
+Lệnh model-select của scripts/benchmark.py: đối chiếu và đo chấm điểm mô hình dạng ma trận với cách tính từng mô hình
+"""
+
+import random
+import time
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.common import analysis_fixture_grid, print_results
+
+def register(subparsers) -> None:
+    """Thêm lệnh model-select"""
+    parser = subparsers.add_parser(
+        "model-select", help="Đối chiếu và đo chấm điểm mô hình dạng ma trận với cách tính từng mô hình")
+    parser.add_argument("--extra-models", type=int, default=20,
+                        help="Số mô hình giả lập thêm vào cấu hình (default: 20)")
+    parser.add_argument("--config", type=str, default="config/default.yml",
+                        help="Đường dẫn file cấu hình")
+    parser.set_defaults(run=run)
+
+def reference_required_strengths(categories: List[str], query_analysis: Dict[str, Any]) -> Dict[str, float]:
+    """Cách xác định điểm mạnh cần thiết bằng chuỗi if trước khi có bảng quy tắc (dùng để đối chiếu)"""
+    required = {category: 0.1 for category in categories}
+    if query_analysis.get("requires_code", False):
+        required.update({"programming": 0.9, "algorithms": 0.7, "technical_explanation": 0.6})
+    if query_analysis.get("requires_reasoning", False):
+        required.update({"reasoning": 0.8, "critical_thinking": 0.7, "analysis": 0.7, "evaluation": 0.6})
+    if query_analysis.get("requires_creativity", False):
+        required["creative"] = 0.9
+    complexity = query_analysis.get("complexity", 0)
+    if complexity > 7:
+        required.update({"comprehensive": 0.8, "thorough": 0.7, "balanced": 0.6})
+    elif complexity < 3:
+        required.update({"conciseness": 0.8, "clarity": 0.7})
+    query_type = query_analysis.get("query_type", "")
+    if query_type == "how_to":
+        required.update({"technical_explanation": 0.7, "clarity": 0.7})
+    elif query_type == "comparison":
+        required.update({"balanced": 0.8, "analysis": 0.7})
+    elif query_type == "what_is":
+        required.update({"general_knowledge": 0.7, "clarity": 0.6})
+    elif query_type == "opinion":
+        required.update({"critical_thinking": 0.8, "evaluation": 0.7})
+    elif query_type == "list":
+        required.update({"comprehensive": 0.7, "clarity": 0.6})
+    format_reqs = query_analysis.get("format_requirements", {})
+    if format_reqs.get("requires_step_by_step", False):
+        required["clarity"] = 0.8
+    if format_reqs.get("requires_examples", False):
+        required["technical_explanation"] = 0.7
+    if format_reqs.get("requires_comparison", False):
+        required.update({"balanced": 0.8, "analysis": 0.7})
+    domain = query_analysis.get("domain", "")
+    if domain == "technology":
+        required.update({"technical_explanation": 0.8, "programming": 0.7})
+    elif domain == "science":
+        required.update({"analysis": 0.8, "reasoning": 0.7})
+    elif domain == "business":
+        required.update({"analysis": 0.7, "balanced": 0.7})
+    elif domain == "arts":
+        required["creative"] = 0.8
+    return required
+
+def reference_select(optimizer, model_names: List[str], query_analysis: Dict[str, Any]) -> Tuple[str, Dict[str, float]]:
+    """Cách chấm điểm từng mô hình bằng vòng lặp dict (dùng để đối chiếu)"""
+    required = reference_required_strengths(optimizer.strength_categories, query_analysis)
+    scores = {}
+    for name in model_names:
+        strengths = optimizer.model_strengths.get(name, {})
+        score = 0.0
+        total_weight = 0.0
+        for category, importance in required.items():
+            if importance > 0.1:
+                score += strengths.get(category, 0.5) * importance
+                total_weight += importance
+        if total_weight == 0:
+            score = sum(strengths.values()) / len(strengths) if strengths else 0.5
+        else:
+            score = score / total_weight
+        scores[name] = score * optimizer.model_weights.get(name, optimizer.default_weight)
+    return max(scores.items(), key=lambda x: x[1])[0], scores
+
+def benchmark_model_select(config_path: str, extra_models: int) -> Dict[str, Any]:
+    """
+    Đối chiếu kết quả chọn mô hình dạng ma trận với cách tính cũ trên lưới phân tích cố định
+
+    Args:
+        config_path: Đường dẫn file cấu hình
+        extra_models: Số mô hình giả lập thêm
+
+    Returns:
+        Dict chứa số ca lệch và thời gian chọn trung bình
+    """
+    from src.integration.interfaces import AssistantFactory
+    from src.optimization.preference_optimizer import PreferenceOptimizer
+
+    config = AssistantFactory.load_config(config_path)
+    rng = random.Random(7)
+    categories = PreferenceOptimizer(config).strength_categories
+    models = list(config.get("models", []))
+    for i in range(extra_models):
+        strengths = {category: round(rng.uniform(0.3, 1.0), 2)
+                     for category in rng.sample(categories, rng.randint(0, len(categories)))}
+        models.append({"name": f"synthetic-{i}", "strengths": strengths})
+    config["models"] = models
+
+    optimizer = PreferenceOptimizer(config)
+    optimizer.load_state({"model_weights": {name: round(rng.uniform(0.5, 2.0), 3) for name in optimizer.model_weights}})
+    model_names = [model["name"] for model in models]
+
+    grid = analysis_fixture_grid()
+    mismatches = 0
+    max_score_diff = 0.0
+    reference_time = 0.0
+    vectorized_time = 0.0
+    for analysis in grid:
+        start = time.perf_counter()
+        expected, expected_scores = reference_select(optimizer, model_names, analysis)
+        reference_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = optimizer.select_best_model(analysis)
+        vectorized_time += time.perf_counter() - start
+
+        scores = optimizer._score_models(model_names, analysis)
+        max_score_diff = max(max_score_diff, max(abs(expected_scores[name] - score)
+                                                 for name, score in zip(model_names, scores)))
+        if actual != expected:
+            mismatches += 1
+
+    # Lượt thứ hai: mọi chữ ký đã có trong bộ nhớ tạm
+    start = time.perf_counter()
+    for analysis in grid:
+        optimizer.select_best_model(analysis)
+    warm_time = time.perf_counter() - start
+
+    return {
+        "models": len(model_names),
+        "fixture_cases": len(grid),
+        "mismatches": mismatches,
+        "max_score_diff": max_score_diff,
+        "reference_us": reference_time * 1e6 / len(grid),
+        "vectorized_us": vectorized_time * 1e6 / len(grid),
+        "vectorized_warm_us": warm_time * 1e6 / len(grid)
+    }
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_model_select(args.config, args.extra_models)
+    print_results("PreferenceOptimizer.select_best_model", results)
@@ -0,0 +1,88 @@
+"""
+Lệnh prompt-render của scripts/benchmark.py: tốc độ định dạng prompt bằng mẫu đã biên dịch
+"""
+
+import time
+from typing import Any, Dict
+
+from benchmarks.common import print_results
+
+def register(subparsers) -> None:
+    """Thêm lệnh prompt-render"""
+    parser = subparsers.add_parser(
+        "prompt-render", help="Tốc độ định dạng prompt bằng mẫu đã biên dịch")
+    parser.add_argument("--iterations", type=int, default=20000,
+                        help="Số lần định dạng (default: 20000)")
+    parser.set_defaults(run=run)
+
+def benchmark_prompt_render(iterations: int) -> Dict[str, Any]:
+    """
+    So sánh định dạng prompt bằng mẫu đã biên dịch với thay thế str.replace tuần tự
+
+    Args:
+        iterations: Số lần định dạng
+
+    Returns:
+        Dict chứa kết quả đo
+    """
+    from src.optimization.response_optimizer import ResponseOptimizer, FORMAT_INSTRUCTIONS
+    from src.utils.prompt_templates import compile_template
+
+    optimizer = ResponseOptimizer({"system": {"config_dir": "config"}})
+    template_str = ("Bạn là chuyên gia trong lĩnh vực {domain}. Hãy trả lời câu hỏi sau một cách "
+                    "chính xác, đầy đủ và phù hợp với độ phức tạp {complexity}:\n\n{query}\n\n"
+                    "Loại câu hỏi: {query_type}. Chủ đề liên quan: {topics}.\n"
+                    "Yêu cầu định dạng: {format_requirements}\n\n"
+                    "Lưu ý:\n1. Giải thích rõ ràng các khái niệm nền tảng\n"
+                    "2. Đưa ra ví dụ cụ thể khi cần thiết\n3. Xử lý các trường hợp đặc biệt\n"
+                    "4. Tóm tắt các điểm chính ở cuối câu trả lời\n5. Trả lời bằng {languages}")
+    analysis = optimizer.analyze_query("Làm thế nào để so sánh ưu nhược điểm các thuật toán sắp xếp, "
+                                       "liệt kê từng bước với ví dụ code python?")
+    query = "Làm thế nào để so sánh các thuật toán sắp xếp?"
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        # Cách cũ: 12 lần str.replace và dựng lại các đoạn hướng dẫn mỗi lần
+        replacements = {
+            "{query}": query,
+            "{domain}": analysis.get("domain", "general"),
+            "{complexity}": str(analysis.get("complexity", 0)),
+            "{query_type}": analysis.get("query_type", "general"),
+            "{topics}": ", ".join(analysis.get("topics", [])),
+            "{requires_code}": "true" if analysis.get("requires_code") else "false",
+            "{requires_reasoning}": "true" if analysis.get("requires_reasoning") else "false",
+            "{requires_creativity}": "true" if analysis.get("requires_creativity") else "false",
+            "{format_requirements}": " ".join(
+                FORMAT_INSTRUCTIONS[req] for req, value in analysis.get("format_requirements", {}).items()
+                if value),
+            "{sentiment}": analysis.get("sentiment", "neutral"),
+            "{urgency}": analysis.get("urgency", "normal"),
+            "{languages}": ", ".join(analysis.get("languages", ["vietnamese"])),
+        }
+        prompt = template_str
+        for key, value in replacements.items():
+            prompt = prompt.replace(key, value)
+        complexity = analysis.get("complexity", 0)
+        prompt += "\n\n" + optimizer._build_additional_instructions(
+            "high" if complexity > 7 else "low" if complexity < 3 else "medium",
+            bool(analysis.get("requires_code")), bool(analysis.get("requires_reasoning")),
+            bool(analysis.get("requires_creativity")), "vietnamese" in analysis.get("languages", []),
+            analysis.get("urgency") == "high")
+    replace_us = (time.perf_counter() - start) * 1e6 / iterations
+
+    compile_template(template_str)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        optimizer._optimize_prompt_from_template(query, analysis, {"template": template_str})
+    compiled_us = (time.perf_counter() - start) * 1e6 / iterations
+
+    return {
+        "iterations": iterations,
+        "str_replace_us": replace_us,
+        "compiled_us": compiled_us
+    }
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_prompt_render(args.iterations)
+    print_results("CompiledTemplate", results)
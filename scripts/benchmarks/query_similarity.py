@@ -0,0 +1,78 @@
+"""
+Lệnh query-similarity của scripts/benchmark.py: độ trễ tra cứu chỉ mục tương đồng truy vấn
+"""
+
+import logging
+import random
+import time
+from typing import Any, Dict
+
+from benchmarks.common import generate_query, percentile, print_results
+
+logger = logging.getLogger("benchmark")
+
+def register(subparsers) -> None:
+    """Thêm lệnh query-similarity"""
+    parser = subparsers.add_parser(
+        "query-similarity", help="Độ trễ tra cứu chỉ mục tương đồng truy vấn")
+    parser.add_argument("--size", type=int, default=1000000,
+                        help="Số truy vấn lưu trong chỉ mục (default: 1000000)")
+    parser.add_argument("--lookups", type=int, default=10000,
+                        help="Số lần tra cứu để đo (default: 10000)")
+    parser.set_defaults(run=run)
+
+def benchmark_query_similarity(size: int, lookups: int) -> Dict[str, Any]:
+    """
+    Đo độ trễ tra cứu QuerySimilarityIndex với số lượng truy vấn lớn
+
+    Args:
+        size: Số truy vấn lưu trong chỉ mục
+        lookups: Số lần tra cứu
+
+    Returns:
+        Dict chứa kết quả đo
+    """
+    from src.optimization.query_similarity import QuerySimilarityIndex
+
+    rng = random.Random(0)
+    index = QuerySimilarityIndex(threshold=0.85, max_entries=size)
+
+    start = time.perf_counter()
+    stored = []
+    for i in range(size):
+        query = generate_query(rng)
+        index.add(query, {"id": i})
+        if i % max(1, size // lookups) == 0:
+            stored.append(query)
+        if i and i % 100000 == 0:
+            logger.info(f"Đã thêm {i} truy vấn")
+    build_time = time.perf_counter() - start
+
+    # Truy vấn gần giống (thay đổi nhỏ) và truy vấn mới hoàn toàn
+    latencies = []
+    hits = 0
+    for i in range(lookups):
+        if i % 2 == 0 and stored:
+            query = rng.choice(stored) + " nhé"
+        else:
+            query = generate_query(rng)
+        t0 = time.perf_counter()
+        if index.lookup(query) is not None:
+            hits += 1
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    return {
+        "entries": len(index),
+        "build_seconds": build_time,
+        "lookups": lookups,
+        "hit_rate": hits / lookups if lookups else 0,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "mean_ms": sum(latencies) / len(latencies) if latencies else 0
+    }
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_query_similarity(args.size, args.lookups)
+    print_results("QuerySimilarityIndex", results)
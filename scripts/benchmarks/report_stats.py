@@ -0,0 +1,81 @@
+"""
+Lệnh report-stats của scripts/benchmark.py: tổng hợp báo cáo bằng GROUP BY trong SQL so với duyệt từng dòng trong Python
+"""
+
+import os
+import random
+import time
+from typing import Any, Dict, List
+
+from benchmarks.common import generate_query, print_results
+
+def register(subparsers) -> None:
+    """Thêm lệnh report-stats"""
+    parser = subparsers.add_parser(
+        "report-stats", help="Tổng hợp báo cáo bằng GROUP BY trong SQL so với duyệt từng dòng trong Python")
+    parser.add_argument("--records", type=int, nargs="+", default=[10000, 50000],
+                        help="Các số bản ghi phản hồi cần đo (default: 10000 50000)")
+    parser.set_defaults(run=run)
+
+def benchmark_report_stats(sizes: List[int]) -> Dict[str, Any]:
+    """
+    So sánh thời gian tổng hợp số liệu báo cáo bằng FeedbackStore.get_report_stats (GROUP BY
+    trên chỉ mục bao phủ) với duyệt và đếm từng bản ghi trong Python
+
+    Args:
+        sizes: Các số bản ghi phản hồi cần đo (mỗi phản hồi kèm một so sánh)
+
+    Returns:
+        Dict chứa thời gian của mỗi cách theo kích thước
+    """
+    import tempfile
+    from datetime import datetime, timedelta
+    from src.optimization.feedback_store import FeedbackStore
+
+    rng = random.Random(29)
+    models = [f"model-{i}" for i in range(5)]
+    start_time = datetime(2024, 1, 1)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size in sizes:
+            store = FeedbackStore(os.path.join(work_dir, f"report_{size}.db"))
+            for first in range(0, size, 5000):
+                feedback, comparisons = [], []
+                for i in range(first, min(size, first + 5000)):
+                    timestamp = (start_time + timedelta(minutes=i)).isoformat()
+                    chosen, rejected = rng.sample(models, 2)
+                    feedback.append({"id": f"fb_{i}", "timestamp": timestamp, "query": generate_query(rng),
+                                     "responses": {chosen: generate_query(rng, 40)}, "selected_response": chosen,
+                                     "feedback_score": round(rng.random(), 2)})
+                    comparisons.append({"id": f"comp_{i}", "timestamp": timestamp, "query": feedback[-1]["query"],
+                                        "chosen": "...", "rejected": "...",
+                                        "chosen_model": chosen, "rejected_model": rejected})
+                store.save_feedback_batch(feedback, comparisons)
+
+            start = time.perf_counter()
+            report = store.get_report_stats()
+            sql_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            counts: Dict[str, int] = {}
+            for item in store.iter_feedback():
+                counts[item["selected_response"]] = counts.get(item["selected_response"], 0) + 1
+            wins: Dict[str, int] = {}
+            for item in store.iter_comparisons():
+                wins[item["chosen_model"]] = wins.get(item["chosen_model"], 0) + 1
+            python_time = time.perf_counter() - start
+            store.close()
+
+            results[f"sql_ms_{size}"] = sql_time * 1000
+            results[f"python_ms_{size}"] = python_time * 1000
+            results[f"counts_match_{size}"] = (
+                all(report["models"][name]["count"] == count for name, count in counts.items())
+                and all(report["models"][name]["wins"] == count for name, count in wins.items()))
+
+    return results
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_report_stats(args.records)
+    print_results("FeedbackStore.get_report_stats", results)
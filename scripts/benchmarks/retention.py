@@ -0,0 +1,124 @@
+"""
+Lệnh retention của scripts/benchmark.py: chuyển dữ liệu cũ vào kho lưu trữ theo tháng và đọc lại qua include_archived
+"""
+
+import os
+import random
+import time
+from typing import Any, Dict
+
+from benchmarks.common import generate_query, print_results
+
+def register(subparsers) -> None:
+    """Thêm lệnh retention"""
+    parser = subparsers.add_parser(
+        "retention", help="Chuyển dữ liệu cũ vào kho lưu trữ theo tháng và đọc lại qua include_archived")
+    parser.add_argument("--records", type=int, default=50000,
+                        help="Số bản ghi phản hồi (default: 50000)")
+    parser.add_argument("--days", type=int, default=730,
+                        help="Số ngày dữ liệu trải dài (default: 730)")
+    parser.add_argument("--retention-days", type=int, default=180,
+                        help="Số ngày giữ dữ liệu trong cơ sở dữ liệu (default: 180)")
+    parser.set_defaults(run=run)
+
+def benchmark_retention(records: int, days: int, retention_days: int) -> Dict[str, Any]:
+    """
+    Chuyển dữ liệu cũ của cơ sở dữ liệu phản hồi vào kho lưu trữ theo tháng: kích thước cơ sở dữ
+    liệu trước/sau (đã VACUUM), thời gian lưu trữ, số liệu tổng hợp không đổi và đọc lại đủ bản ghi
+    qua include_archived.
+
+    Args:
+        records: Số bản ghi phản hồi (mỗi phản hồi kèm một so sánh và một thống kê)
+        days: Số ngày dữ liệu trải dài (tính đến hiện tại)
+        retention_days: Số ngày giữ dữ liệu trong cơ sở dữ liệu
+
+    Returns:
+        Dict chứa kích thước, thời gian và kết quả kiểm tra
+    """
+    import tempfile
+    from datetime import datetime, timedelta
+    from src.optimization.feedback_store import FeedbackStore
+
+    rng = random.Random(43)
+    models = [f"model-{i}" for i in range(5)]
+    now = datetime(2025, 1, 1)
+    start_time = now - timedelta(days=days)
+    step = timedelta(days=days) / records
+    results = {}
+
+    def used_mb(store: FeedbackStore) -> float:
+        conn = store.connections.get_connection()
+        conn.execute("VACUUM")
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return conn.execute("PRAGMA page_count").fetchone()[0] * page_size / (1024 * 1024)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        store = FeedbackStore(os.path.join(work_dir, "feedback.db"),
+                              retention_options={"feedback_days": retention_days, "stats_days": retention_days})
+        conn = store.connections.get_connection()
+        for offset in range(0, records, 5000):
+            feedback, comparisons, stats = [], [], []
+            for i in range(offset, min(records, offset + 5000)):
+                timestamp = (start_time + step * i).isoformat()
+                chosen, rejected = rng.sample(models, 2)
+                query = generate_query(rng)
+                responses = {chosen: generate_query(rng, 60), rejected: generate_query(rng, 60)}
+                feedback.append({"id": f"fb_{i}", "timestamp": timestamp, "query": query, "responses": responses,
+                                 "selected_response": chosen, "feedback_score": round(rng.random(), 2),
+                                 "template_used": f"template-{i % 3}"})
+                comparisons.append({"id": f"comp_{i}", "timestamp": timestamp, "query": query,
+                                    "chosen": responses[chosen], "rejected": responses[rejected],
+                                    "chosen_model": chosen, "rejected_model": rejected})
+                stats.append((f"latency_{i}", timestamp, "latency", rng.random() * 5, None))
+            store.save_feedback_batch(feedback, comparisons)
+            with conn:
+                conn.executemany("INSERT INTO stats VALUES (?, ?, ?, ?, ?)", stats)
+
+        counts_before = store.get_summary_counts()
+        stats_before = store.get_feedback_stats()
+        latency_before = store.get_stat_summary("latency")["latency"]
+        results["before_mb"] = used_mb(store)
+
+        start = time.perf_counter()
+        archived = store.archive_old_data(now)
+        results["archive_s"] = time.perf_counter() - start
+        results["archived_feedback"] = archived["feedback"]
+        results["archived_stats"] = archived["stats"]
+        results["after_mb"] = used_mb(store)
+        results["archive_mb"] = sum(table["bytes"] for table in store.archive.get_stats().values()) / (1024 * 1024)
+
+        counts_after = store.get_summary_counts()
+        stats_after = store.get_feedback_stats()
+        latency_after = store.get_stat_summary("latency")["latency"]
+        results["rollups_unchanged"] = (
+            all(counts_before[key] == counts_after[key] for key in ["feedback_count", "comparison_count", "score_count"])
+            and abs(counts_before["score_sum"] - counts_after["score_sum"]) < 1e-6
+            and stats_before["template_stats"].keys() == stats_after["template_stats"].keys()
+            and latency_before["count"] == latency_after["count"]
+            and abs(latency_before["sum"] - latency_after["sum"]) < 1e-6)
+
+        start = time.perf_counter()
+        feedback_ids = [item["id"] for item in store.iter_feedback(include_archived=True)]
+        results["unified_read_s"] = time.perf_counter() - start
+        comparison_count = sum(1 for _ in store.iter_comparisons(include_archived=True, descending=True))
+        results["unified_read_ok"] = (
+            feedback_ids == sorted(feedback_ids, key=lambda item_id: int(item_id.split("_")[1]))
+            and len(set(feedback_ids)) == records and comparison_count == records)
+
+        # Khoảng thời gian chỉ nằm trong kho lưu trữ
+        month_start = (start_time + timedelta(days=31)).replace(day=1)
+        month_end = (month_start + timedelta(days=32)).replace(day=1)
+        in_month = sum(1 for _ in store.iter_feedback(since=month_start.isoformat(), until=month_end.isoformat(),
+                                                      model="model-0", include_archived=True))
+        expected = sum(1 for i in range(records)
+                       if month_start <= start_time + step * i < month_end)
+        results["archived_month_rows"] = in_month
+        results["archived_month_ok"] = 0 < in_month < expected
+        store.close()
+
+    return results
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_retention(args.records, args.days, args.retention_days)
+    print_results("FeedbackStore.archive_old_data", results)
@@ -0,0 +1,122 @@
+"""
+Lệnh schema-migration của scripts/benchmark.py: nâng cấp schema theo lô trong khi một luồng khác vẫn ghi vào cơ sở dữ liệu
+"""
+
+import os
+import random
+import time
+from typing import Any, Dict, List
+
+from benchmarks.common import generate_query, percentile, print_results
+
+def register(subparsers) -> None:
+    """Thêm lệnh schema-migration"""
+    parser = subparsers.add_parser(
+        "schema-migration", help="Nâng cấp schema theo lô trong khi một luồng khác vẫn ghi vào cơ sở dữ liệu")
+    parser.add_argument("--records", type=int, default=100000,
+                        help="Số bản ghi phản hồi của cơ sở dữ liệu cũ (default: 100000)")
+    parser.add_argument("--batch-size", type=int, default=5000,
+                        help="Số dòng mỗi lô khi điền dữ liệu (default: 5000)")
+    parser.set_defaults(run=run)
+
+def benchmark_schema_migration(records: int, batch_size: int) -> Dict[str, Any]:
+    """
+    Nâng cấp một cơ sở dữ liệu phản hồi theo schema cũ (chưa có ts_epoch, bảng models) lên
+    phiên bản mới nhất, trong khi một luồng khác ghi liên tục vào bảng stats. So sánh thời gian
+    chờ khóa ghi lớn nhất khi điền dữ liệu theo lô với điền trong một giao dịch.
+
+    Args:
+        records: Số bản ghi phản hồi (mỗi phản hồi kèm một so sánh)
+        batch_size: Số dòng mỗi lô khi điền dữ liệu
+
+    Returns:
+        Dict chứa thời gian nâng cấp và thời gian chờ của luồng ghi theo từng cách
+    """
+    import shutil
+    import sqlite3
+    import tempfile
+    import threading
+    from datetime import datetime, timedelta
+    from src.optimization.feedback_store import FeedbackStore
+    from src.optimization.schema_migrations import (FEEDBACK_COLUMNS, COMPARISON_COLUMNS, STATS_COLUMNS,
+                                                    SCHEMA_VERSION, migrate)
+
+    rng = random.Random(31)
+    models = [f"model-{i}" for i in range(5)]
+    start_time = datetime(2024, 1, 1)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        legacy_path = os.path.join(work_dir, "legacy.db")
+        conn = sqlite3.connect(legacy_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"CREATE TABLE feedback ({FEEDBACK_COLUMNS})")
+        conn.execute(f"CREATE TABLE comparisons ({COMPARISON_COLUMNS})")
+        conn.execute(f"CREATE TABLE stats ({STATS_COLUMNS})")
+        with conn:
+            for i in range(records):
+                timestamp = (start_time + timedelta(minutes=i)).isoformat()
+                chosen, rejected = rng.sample(models, 2)
+                conn.execute("INSERT INTO feedback VALUES (?, ?, '', ?, '{}', ?, ?, NULL, NULL)",
+                             (f"fb_{i}", timestamp, generate_query(rng), chosen, round(rng.random(), 2)))
+                conn.execute("INSERT INTO comparisons VALUES (?, ?, '', ?, '...', '...', ?, ?, NULL)",
+                             (f"comp_{i}", timestamp, generate_query(rng), chosen, rejected))
+        conn.close()
+
+        for label, size in [("batched", batch_size), ("single", records)]:
+            db_path = os.path.join(work_dir, f"{label}.db")
+            shutil.copy(legacy_path, db_path)
+
+            done = threading.Event()
+            waits: List[float] = []
+
+            def writer() -> None:
+                writer_conn = sqlite3.connect(db_path)
+                writer_conn.execute("PRAGMA busy_timeout=60000")
+                i = 0
+                while not done.is_set():
+                    start = time.perf_counter()
+                    with writer_conn:
+                        writer_conn.execute("INSERT INTO stats VALUES (?, ?, 'bench', 1.0, NULL)",
+                                            (f"{label}_{i}", datetime.now().isoformat()))
+                    waits.append(time.perf_counter() - start)
+                    i += 1
+                    time.sleep(0.001)
+                writer_conn.close()
+
+            thread = threading.Thread(target=writer)
+            thread.start()
+
+            migrate_conn = sqlite3.connect(db_path)
+            migrate_conn.execute("PRAGMA busy_timeout=60000")
+            start = time.perf_counter()
+            version = migrate(migrate_conn, size)
+            migrate_time = time.perf_counter() - start
+            pending = migrate_conn.execute(
+                "SELECT COUNT(*) FROM feedback WHERE ts_epoch IS NULL OR model_id IS NULL").fetchone()[0]
+            migrate_conn.close()
+
+            done.set()
+            thread.join()
+
+            results[f"{label}_migrate_s"] = migrate_time
+            results[f"{label}_writes"] = len(waits)
+            results[f"{label}_max_write_wait_ms"] = max(waits) * 1000 if waits else 0.0
+            results[f"{label}_p99_write_wait_ms"] = percentile(waits, 0.99) * 1000 if waits else 0.0
+            results[f"{label}_complete"] = version == SCHEMA_VERSION and pending == 0
+
+        # Số liệu báo cáo sau nâng cấp phải khớp với số bản ghi gốc
+        store = FeedbackStore(os.path.join(work_dir, "batched.db"))
+        report = store.get_report_stats()
+        store.close()
+        results["report_counts_match"] = (
+            report["general"]["total_feedback"] == records
+            and sum(entry["wins"] for entry in report["models"].values()) == records
+            and sum(day["feedback_count"] for day in report["daily"].values()) == records)
+
+    return results
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_schema_migration(args.records, args.batch_size)
+    print_results("schema_migrations.migrate", results)
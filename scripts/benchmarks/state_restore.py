@@ -0,0 +1,130 @@
+"""
+Lệnh state-restore của scripts/benchmark.py: khôi phục trạng thái từ snapshot so với dựng lại từ toàn bộ phản hồi
+"""
+
+import os
+import random
+import time
+from typing import Any, Dict
+
+from benchmarks.common import SIMULATED_QUERIES, print_results
+
+def register(subparsers) -> None:
+    """Thêm lệnh state-restore"""
+    parser = subparsers.add_parser(
+        "state-restore", help="Khôi phục trạng thái từ snapshot so với dựng lại từ toàn bộ phản hồi")
+    parser.add_argument("--feedback", type=int, default=5000,
+                        help="Số phản hồi có trước snapshot (default: 5000)")
+    parser.add_argument("--incremental", type=int, default=200,
+                        help="Số phản hồi mới sau snapshot (default: 200)")
+    parser.add_argument("--config", type=str, default="config/default.yml",
+                        help="Đường dẫn file cấu hình")
+    parser.set_defaults(run=run)
+
+def benchmark_state_restore(config_path: str, feedback_count: int, incremental: int) -> Dict[str, Any]:
+    """
+    So sánh thời gian dựng lại trạng thái từ toàn bộ phản hồi với khi khởi động từ snapshot
+    rồi chỉ áp dụng lại các phản hồi mới, kiểm tra hai cách cho cùng trạng thái và việc áp
+    dụng lại cho cùng hiệu suất mẫu prompt như khi xử lý phản hồi trực tiếp
+
+    Args:
+        config_path: Đường dẫn file cấu hình
+        feedback_count: Số phản hồi có trước snapshot
+        incremental: Số phản hồi mới sau snapshot
+
+    Returns:
+        Dict chứa thời gian khởi động và kết quả đối chiếu trạng thái
+    """
+    import copy
+    import json
+    import tempfile
+    from datetime import datetime, timedelta
+    from src.integration.interfaces import AssistantFactory
+    from src.optimization.manager import FeedbackOptimizationManager
+
+    base_config = AssistantFactory.load_config(config_path)
+    model_names = [model["name"] for model in base_config.get("models", [])]
+    rng = random.Random(11)
+    start_time = datetime(2024, 1, 1)
+
+    def make_config(work_dir: str, state_name: str) -> Dict[str, Any]:
+        config = copy.deepcopy(base_config)
+        config.setdefault("system", {})["feedback_db"] = os.path.join(work_dir, "feedback.db")
+        optimization = config.setdefault("optimization", {})
+        optimization.setdefault("routing", {})["strategy"] = "linucb"
+        # Phân tích truy vấn tất định để hai cách dựng lại cho cùng kết quả
+        optimization.setdefault("query_analysis", {})["use_cached_categories"] = False
+        optimization["state"] = {"enabled": True, "path": os.path.join(work_dir, state_name),
+                                 "rebuild_from_feedback": True}
+        return config
+
+    def add_feedback(store, first: int, count: int) -> None:
+        for i in range(first, first + count):
+            query, _ = rng.choice(SIMULATED_QUERIES)
+            responses = {name: f"Câu trả lời của {name}" for name in
+                         rng.sample(model_names, k=rng.randint(1, len(model_names)))}
+            store.save_feedback({
+                "id": f"fb_bench_{i}",
+                "timestamp": (start_time + timedelta(milliseconds=i)).isoformat(),
+                "conversation_id": f"conv_{i % 50}",
+                "query": query,
+                "responses": responses,
+                "selected_response": rng.choice(list(responses)),
+                "feedback_score": round(rng.random(), 2),
+                "template_used": rng.choice(["default", "technical", "creative"])
+            })
+
+    def state_of(manager) -> str:
+        return json.dumps({
+            "preference_optimizer": manager.preference_optimizer.get_state(),
+            "response_optimizer": manager.response_optimizer.get_state(),
+            "bandit_router": manager.bandit_router.get_state()
+        }, sort_keys=True)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        config = make_config(work_dir, "state.json")
+        seed_manager = FeedbackOptimizationManager(config)
+        add_feedback(seed_manager.feedback_store, 0, feedback_count)
+
+        # Chưa có snapshot: dựng lại từ toàn bộ phản hồi rồi ghi snapshot
+        start = time.perf_counter()
+        FeedbackOptimizationManager(config).rebuild_state()
+        full_rebuild = time.perf_counter() - start
+
+        add_feedback(seed_manager.feedback_store, feedback_count, incremental)
+
+        # Tải snapshot và chỉ áp dụng lại phản hồi mới
+        start = time.perf_counter()
+        restored = FeedbackOptimizationManager(config)
+        snapshot_restore = time.perf_counter() - start
+
+        # Đối chiếu với dựng lại toàn bộ (snapshot khác, chưa tồn tại)
+        rebuilt = FeedbackOptimizationManager(make_config(work_dir, "state_full.json"))
+        rebuilt.rebuild_state()
+
+        # Xử lý phản hồi trực tiếp với mẫu prompt của optimize_query, rồi dựng lại từ kho
+        live_dir = os.path.join(work_dir, "live")
+        os.makedirs(live_dir)
+        live = FeedbackOptimizationManager(make_config(live_dir, "state.json"))
+        for i in range(incremental):
+            query, _ = rng.choice(SIMULATED_QUERIES)
+            template_used = live.optimize_query(query).get("template_used")
+            live.process_feedback(f"conv_{i % 50}", query, {name: f"Câu trả lời của {name}" for name in model_names},
+                                  rng.choice(model_names), round(rng.random(), 2), template_used=template_used)
+        replayed = FeedbackOptimizationManager(make_config(live_dir, "state_replay.json"))
+        replayed.rebuild_state()
+
+        return {
+            "feedback_rows": feedback_count + incremental,
+            "full_rebuild_s": full_rebuild,
+            "snapshot_restore_s": snapshot_restore,
+            "snapshot_bytes": os.path.getsize(os.path.join(work_dir, "state.json")),
+            "state_match": state_of(restored) == state_of(rebuilt),
+            "template_replay_match": (live.response_optimizer.get_state()
+                                      == replayed.response_optimizer.get_state())
+        }
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_state_restore(args.config, args.feedback, args.incremental)
+    print_results("StateStore", results)
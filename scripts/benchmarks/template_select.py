@@ -0,0 +1,116 @@
+"""
+Lệnh template-select của scripts/benchmark.py: lựa chọn mẫu prompt qua chỉ mục so với duyệt toàn bộ
+"""
+
+import random
+import time
+from typing import Any, Dict, List
+
+from benchmarks.common import print_results
+
+def register(subparsers) -> None:
+    """Thêm lệnh template-select"""
+    parser = subparsers.add_parser(
+        "template-select", help="Lựa chọn mẫu prompt qua chỉ mục so với duyệt toàn bộ")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000],
+                        help="Các kích thước thư viện mẫu cần đo")
+    parser.add_argument("--queries", type=int, default=2000,
+                        help="Số phân tích truy vấn giả lập (default: 2000)")
+    parser.set_defaults(run=run)
+
+DOMAINS = ["programming", "science", "business", "health", "education", "arts", "technology", "general"]
+
+QUERY_TYPES = ["how_to", "why", "what_is", "comparison", "list", "example", "opinion", "general"]
+
+USE_CASES = QUERY_TYPES + ["code", "reasoning", "creative"]
+
+def generate_templates(rng: random.Random, count: int) -> List[Dict[str, Any]]:
+    """Sinh thư viện mẫu prompt giả lập"""
+    return [{
+        "name": f"template_{i}",
+        "template": "{query}",
+        "domains": rng.sample(DOMAINS, rng.randint(1, 2)),
+        # Use case lặp lại được tính điểm nhiều lần
+        "use_cases": [rng.choice(USE_CASES) for _ in range(rng.randint(1, 3))],
+        "complexity": rng.choice(["low", "medium", "high"])
+    } for i in range(count)]
+
+def generate_analysis(rng: random.Random) -> Dict[str, Any]:
+    """Sinh kết quả phân tích truy vấn giả lập"""
+    return {
+        "domain": rng.choice(DOMAINS + ["unknown"]),
+        "query_type": rng.choice(QUERY_TYPES),
+        "requires_code": rng.random() < 0.3,
+        "requires_reasoning": rng.random() < 0.3,
+        "requires_creativity": rng.random() < 0.2,
+        # Gồm cả các giá trị ở biên của ngưỡng độ phức tạp
+        "complexity": rng.choice([0, 2.9, 3, 5, 7, 7.1, 10, rng.uniform(0, 10)])
+    }
+
+def full_scan_best_match(templates: List[Dict[str, Any]], analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Cách chấm điểm toàn bộ danh sách mẫu trước khi có chỉ mục (dùng để đối chiếu)"""
+    scores = []
+    for template in templates:
+        score = 0
+        if analysis.get("domain") in template.get("domains", []):
+            score += 3
+        elif "general" in template.get("domains", []):
+            score += 1
+        for use_case in template.get("use_cases", []):
+            if use_case == analysis.get("query_type"):
+                score += 2
+            if use_case == "code" and analysis.get("requires_code"):
+                score += 2
+            if use_case == "reasoning" and analysis.get("requires_reasoning"):
+                score += 2
+            if use_case == "creative" and analysis.get("requires_creativity"):
+                score += 2
+        template_complexity = template.get("complexity", "medium")
+        if (template_complexity == "high" and analysis.get("complexity", 0) > 7) or \
+           (template_complexity == "medium" and 3 <= analysis.get("complexity", 0) <= 7) or \
+           (template_complexity == "low" and analysis.get("complexity", 0) < 3):
+            score += 2
+        scores.append((template, score))
+    return max(scores, key=lambda x: x[1])[0]
+
+def benchmark_template_select(sizes: List[int], queries: int) -> Dict[str, Any]:
+    """
+    So sánh thời gian chọn mẫu qua TemplateIndex với duyệt toàn bộ danh sách
+
+    Args:
+        sizes: Các kích thước thư viện mẫu
+        queries: Số phân tích truy vấn
+
+    Returns:
+        Dict chứa kết quả đo theo từng kích thước
+    """
+    from src.optimization.template_index import TemplateIndex
+
+    results = {}
+    for size in sizes:
+        rng = random.Random(size)
+        templates = generate_templates(rng, size)
+        analyses = [generate_analysis(rng) for _ in range(queries)]
+
+        start = time.perf_counter()
+        expected = [full_scan_best_match(templates, analysis) for analysis in analyses]
+        scan_ms = (time.perf_counter() - start) * 1000 / queries
+
+        start = time.perf_counter()
+        index = TemplateIndex(templates)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        actual = [index.best_match(analysis) for analysis in analyses]
+        index_ms = (time.perf_counter() - start) * 1000 / queries
+
+        mismatches = sum(1 for a, b in zip(expected, actual) if a is not b)
+        results[f"{size}_templates"] = (f"full_scan={scan_ms:.4f}ms index={index_ms:.4f}ms "
+                                        f"build={build_ms:.1f}ms mismatches={mismatches}")
+
+    return results
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_template_select(args.sizes, args.queries)
+    print_results("TemplateIndex", results)
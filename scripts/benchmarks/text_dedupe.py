@@ -0,0 +1,106 @@
+"""
+Lệnh text-dedupe của scripts/benchmark.py: kích thước database trước/sau khi lưu câu trả lời theo hash trong bảng texts
+"""
+
+import json
+import os
+import random
+import time
+from typing import Any, Dict
+
+from benchmarks.common import generate_query, print_results
+
+def register(subparsers) -> None:
+    """Thêm lệnh text-dedupe"""
+    parser = subparsers.add_parser(
+        "text-dedupe", help="Kích thước database trước/sau khi lưu câu trả lời theo hash trong bảng texts")
+    parser.add_argument("--records", type=int, default=20000,
+                        help="Số bản ghi phản hồi (default: 20000)")
+    parser.add_argument("--distinct", type=int, default=500,
+                        help="Số câu trả lời khác nhau (default: 500)")
+    parser.add_argument("--batch-size", type=int, default=5000,
+                        help="Số dòng mỗi lô khi điền dữ liệu (default: 5000)")
+    parser.set_defaults(run=run)
+
+def benchmark_text_dedupe(records: int, distinct: int, batch_size: int) -> Dict[str, Any]:
+    """
+    Nâng cấp một cơ sở dữ liệu phản hồi có nhiều câu trả lời lặp lại lên bảng texts (lưu theo hash,
+    có nén), so sánh kích thước trước và sau (đã VACUUM) và kiểm tra đọc lại đúng nội dung.
+
+    Args:
+        records: Số bản ghi phản hồi (mỗi phản hồi kèm một so sánh)
+        distinct: Số câu trả lời khác nhau
+        batch_size: Số dòng mỗi lô khi điền dữ liệu
+
+    Returns:
+        Dict chứa kích thước database trước/sau, thời gian nâng cấp và kết quả kiểm tra
+    """
+    import sqlite3
+    import tempfile
+    from datetime import datetime, timedelta
+    from src.optimization.feedback_store import FeedbackStore
+    from src.optimization.schema_migrations import FEEDBACK_COLUMNS, COMPARISON_COLUMNS, STATS_COLUMNS, migrate
+    from src.optimization.text_store import get_text_stats
+
+    rng = random.Random(37)
+    models = [f"model-{i}" for i in range(4)]
+    answers = [" ".join(generate_query(rng, 12) for _ in range(rng.randint(2, 20))) for _ in range(distinct)]
+    start_time = datetime(2024, 1, 1)
+    expected_feedback, expected_comparisons = {}, {}
+    results = {}
+
+    def used_bytes(conn: sqlite3.Connection) -> int:
+        conn.execute("VACUUM")
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return conn.execute("PRAGMA page_count").fetchone()[0] * page_size
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_path = os.path.join(work_dir, "feedback.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute(f"CREATE TABLE feedback ({FEEDBACK_COLUMNS})")
+        conn.execute(f"CREATE TABLE comparisons ({COMPARISON_COLUMNS})")
+        conn.execute(f"CREATE TABLE stats ({STATS_COLUMNS})")
+        with conn:
+            for i in range(records):
+                timestamp = (start_time + timedelta(minutes=i)).isoformat()
+                responses = {model: rng.choice(answers) for model in rng.sample(models, 2)}
+                chosen_model, rejected_model = list(responses)
+                expected_feedback[f"fb_{i}"] = responses
+                expected_comparisons[f"comp_{i}"] = (responses[chosen_model], responses[rejected_model])
+                conn.execute("INSERT INTO feedback VALUES (?, ?, '', ?, ?, ?, ?, NULL, NULL)",
+                             (f"fb_{i}", timestamp, generate_query(rng), json.dumps(responses, ensure_ascii=False),
+                              chosen_model, round(rng.random(), 2)))
+                conn.execute("INSERT INTO comparisons VALUES (?, ?, '', ?, ?, ?, ?, ?, NULL)",
+                             (f"comp_{i}", timestamp, generate_query(rng), responses[chosen_model],
+                              responses[rejected_model], chosen_model, rejected_model))
+
+        # Phiên bản ngay trước khi có bảng texts
+        migrate(conn, batch_size, target_version=5)
+        results["before_mb"] = used_bytes(conn) / (1024 * 1024)
+
+        start = time.perf_counter()
+        migrate(conn, batch_size)
+        results["migrate_s"] = time.perf_counter() - start
+        results["after_mb"] = used_bytes(conn) / (1024 * 1024)
+        results["size_ratio"] = results["after_mb"] / results["before_mb"]
+
+        text_stats = get_text_stats(conn)
+        results["texts"] = text_stats["texts"]
+        results["compression_ratio"] = text_stats["stored_bytes"] / max(1, text_stats["original_bytes"])
+        conn.close()
+
+        store = FeedbackStore(db_path)
+        start = time.perf_counter()
+        feedback_ok = all(expected_feedback[item["id"]] == item["responses"] for item in store.iter_feedback())
+        comparisons_ok = all(expected_comparisons[item["id"]] == (item["chosen"], item["rejected"])
+                             for item in store.iter_comparisons())
+        results["read_back_s"] = time.perf_counter() - start
+        results["round_trip_ok"] = feedback_ok and comparisons_ok
+        store.close()
+
+    return results
+
+def run(args) -> None:
+    """Chạy phép đo với tham số dòng lệnh"""
+    results = benchmark_text_dedupe(args.records, args.distinct, args.batch_size)
+    print_results("text_store (bảng texts)", results)
@@ -7,15 +7,22 @@ import os
 import sys
 import argparse
 import logging
+import csv
 import json
+import itertools
+import shutil
+import tempfile
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterable, Iterator, Tuple
 
 # Thêm thư mục gốc vào đường dẫn
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from src.optimization.delta_export import consolidate, export_delta, load_watermark
 from src.optimization.feedback_store import FeedbackStore
 from src.cli.setup import setup_logging
+from src.utils.export import (DEFAULT_PIPELINE_OPTIONS, DEFAULT_SHARD_OPTIONS, SPLIT_BUCKETS, ExportPipeline,
+                              ShardedJsonlWriter, hash_split)
 
 def parse_args():
     """Parse command line arguments"""
@@ -24,13 +31,36 @@ def parse_args():
                         help="Đường dẫn đến file cơ sở dữ liệu phản hồi")
     parser.add_argument("--output-dir", type=str, default="data/rlhf_exports",
                         help="Thư mục xuất dữ liệu")
-    parser.add_argument("--format", type=str, choices=["jsonl", "json", "csv"], default="jsonl",
-                        help="Định dạng xuất (default: jsonl)")
+    parser.add_argument("--format", type=str, nargs="+", choices=["jsonl", "json", "csv"], default=["jsonl"],
+                        help="Một hoặc nhiều định dạng xuất, ghi song song trong một lượt đọc (default: jsonl)")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_PIPELINE_OPTIONS["queue_size"],
+                        help=f"Số lô tối đa chờ ghi của mỗi định dạng "
+                             f"(default: {DEFAULT_PIPELINE_OPTIONS['queue_size']})")
     parser.add_argument("--min-score", type=float, help="Chỉ xuất phản hồi với điểm cao hơn")
     parser.add_argument("--max-feedback", type=int, help="Giới hạn số lượng phản hồi")
+    parser.add_argument("--rows-per-shard", type=int, default=DEFAULT_SHARD_OPTIONS["rows_per_shard"],
+                        help=f"Số dòng mỗi file khi xuất jsonl, 0 để không chia "
+                             f"(default: {DEFAULT_SHARD_OPTIONS['rows_per_shard']})")
+    parser.add_argument("--compression", type=str, choices=["none", "gzip", "zstd"],
+                        default=DEFAULT_SHARD_OPTIONS["compression"],
+                        help=f"Nén file jsonl (default: {DEFAULT_SHARD_OPTIONS['compression']})")
     parser.add_argument("--split", action="store_true", help="Chia thành tập train/eval")
     parser.add_argument("--eval-ratio", type=float, default=0.1, 
                         help="Tỷ lệ tập eval khi chia (default: 0.1)")
+    parser.add_argument("--split-key", type=str, choices=["conversation_id", "prompt"], default="conversation_id",
+                        help="Khóa chia tập theo hash: mọi bản ghi cùng khóa thuộc cùng một tập "
+                             "(default: conversation_id)")
+    parser.add_argument("--split-seed", type=str, default="",
+                        help="Chuỗi trộn vào hash để có cách chia khác (default: rỗng)")
+    parser.add_argument("--target", type=str,
+                        help="Tên đích xuất tăng dần: chỉ xuất dữ liệu mới kể từ lần xuất trước vào "
+                             "<output-dir>/<target> (chỉ định dạng jsonl, bỏ qua --max-feedback và --split)")
+    parser.add_argument("--consolidate", action="store_true",
+                        help="Ghép các phần tăng dần của --target thành một bản đầy đủ")
+    parser.add_argument("--prune", action="store_true",
+                        help="Khi ghép, xóa các phần tăng dần và bản đầy đủ cũ đã được ghép")
+    parser.add_argument("--reset", action="store_true",
+                        help="Xóa mốc và mọi phần đã xuất của --target để xuất lại từ đầu")
     parser.add_argument("--backup", action="store_true", help="Sao lưu cơ sở dữ liệu trước khi xuất")
     parser.add_argument("--log-level", type=str, default="INFO", 
                         choices=["DEBUG", "INFO", "WARNING", "ERROR"],
@@ -38,257 +68,489 @@ def parse_args():
     
     return parser.parse_args()
 
-def export_feedback_to_jsonl(feedback_data: List[Dict], output_file: str) -> int:
+def to_rlhf_item(item: Dict) -> Dict:
     """
-    Xuất dữ liệu phản hồi sang định dạng JSONL
+    Chuyển đổi một bản ghi phản hồi hoặc so sánh sang định dạng RLHF
     
     Args:
-        feedback_data: Danh sách phản hồi
-        output_file: Đường dẫn file xuất
+        item: Bản ghi từ FeedbackStore
         
     Returns:
-        Số lượng bản ghi đã xuất
+        Bản ghi theo định dạng RLHF
     """
-    count = 0
-    with open(output_file, 'w', encoding='utf-8') as f:
-        for item in feedback_data:
-            # Chuyển đổi sang định dạng RLHF
-            if item.get("type") == "pairwise_comparison":
-                # Bản ghi so sánh
-                rlhf_item = {
-                    "prompt": item.get("query", ""),
-                    "chosen": item.get("chosen", ""),
-                    "rejected": item.get("rejected", ""),
-                    "chosen_model": item.get("chosen_model", ""),
-                    "rejected_model": item.get("rejected_model", ""),
-                    "conversation_id": item.get("conversation_id", ""),
-                    "timestamp": item.get("timestamp", "")
-                }
-            else:
-                # Bản ghi phản hồi
-                selected_response = item.get("selected_response", "")
-                responses = item.get("responses", {})
-                response_text = responses.get(selected_response, "")
-                
-                rlhf_item = {
-                    "prompt": item.get("query", ""),
-                    "response": response_text,
-                    "score": item.get("feedback_score"),
-                    "model": selected_response,
-                    "feedback": item.get("feedback_text"),
-                    "conversation_id": item.get("conversation_id", ""),
-                    "timestamp": item.get("timestamp", "")
-                }
-                
-            f.write(json.dumps(rlhf_item, ensure_ascii=False) + '\n')
-            count += 1
-            
-    return count
+    if item.get("type") == "pairwise_comparison":
+        # Bản ghi so sánh
+        return {
+            "prompt": item.get("query", ""),
+            "chosen": item.get("chosen", ""),
+            "rejected": item.get("rejected", ""),
+            "chosen_model": item.get("chosen_model", ""),
+            "rejected_model": item.get("rejected_model", ""),
+            "conversation_id": item.get("conversation_id", ""),
+            "timestamp": item.get("timestamp", "")
+        }
+        
+    # Bản ghi phản hồi
+    selected_response = item.get("selected_response", "")
+    responses = item.get("responses", {})
+    
+    return {
+        "prompt": item.get("query", ""),
+        "response": responses.get(selected_response, ""),
+        "score": item.get("feedback_score"),
+        "model": selected_response,
+        "feedback": item.get("feedback_text"),
+        "conversation_id": item.get("conversation_id", ""),
+        "timestamp": item.get("timestamp", "")
+    }
 
-def export_feedback_to_json(feedback_data: List[Dict], output_file: str, 
-                           split: bool = False, eval_ratio: float = 0.1) -> Dict:
+def classify_item(item: Dict, split: bool = False, eval_ratio: float = 0.1,
+                  split_key: str = "conversation_id", split_seed: str = "") -> Tuple[str, str, Dict]:
     """
-    Xuất dữ liệu phản hồi sang định dạng JSON
+    Chuyển một bản ghi sang định dạng RLHF và xác định phần (train/eval) và loại của nó. Phần được
+    chọn theo hash của khóa chia tập nên tất định (lặp lại được giữa các lần xuất) và mọi bản ghi
+    cùng khóa, ví dụ cùng hội thoại, nằm trong cùng một tập. Bản ghi thiếu khóa dùng prompt.
     
     Args:
-        feedback_data: Danh sách phản hồi
-        output_file: Đường dẫn file xuất
+        item: Bản ghi từ FeedbackStore
         split: Chia thành tập train/eval
+        eval_ratio: Tỷ lệ khóa thuộc tập eval khi chia
+        split_key: Trường của bản ghi RLHF dùng làm khóa chia tập (conversation_id hoặc prompt)
+        split_seed: Chuỗi trộn vào hash để có cách chia khác
+        
+    Returns:
+        Tuple (train hoặc eval, feedback hoặc comparisons, bản ghi RLHF)
+    """
+    kind = "comparisons" if item.get("type") == "pairwise_comparison" else "feedback"
+    rlhf_item = to_rlhf_item(item)
+    part = "train"
+    if split:
+        key = rlhf_item.get(split_key) or rlhf_item.get("prompt", "")
+        part = hash_split(str(key), eval_ratio, split_seed)
+    return part, kind, rlhf_item
+
+def split_metadata(split: bool, eval_ratio: float, split_key: str, split_seed: str,
+                   counts: Dict[Tuple[str, str], int]) -> Dict:
+    """
+    Thông tin chia tập ghi kèm dữ liệu xuất (đủ để tái tạo cách chia)
+    
+    Args:
+        split: Có chia tập hay không
         eval_ratio: Tỷ lệ tập eval
+        split_key: Khóa chia tập
+        split_seed: Chuỗi trộn vào hash
+        counts: Số bản ghi theo (phần, loại)
         
     Returns:
-        Dict thống kê số lượng bản ghi đã xuất
+        Dict thông tin chia tập và số bản ghi của từng tập
     """
-    # Phân loại dữ liệu
-    comparisons = []
-    feedback = []
-    
-    for item in feedback_data:
-        if item.get("type") == "pairwise_comparison":
-            comparisons.append({
-                "prompt": item.get("query", ""),
-                "chosen": item.get("chosen", ""),
-                "rejected": item.get("rejected", ""),
-                "chosen_model": item.get("chosen_model", ""),
-                "rejected_model": item.get("rejected_model", ""),
-                "conversation_id": item.get("conversation_id", ""),
-                "timestamp": item.get("timestamp", "")
-            })
-        else:
-            selected_response = item.get("selected_response", "")
-            responses = item.get("responses", {})
-            response_text = responses.get(selected_response, "")
-            
-            feedback.append({
-                "prompt": item.get("query", ""),
-                "response": response_text,
-                "score": item.get("feedback_score"),
-                "model": selected_response,
-                "feedback": item.get("feedback_text"),
-                "conversation_id": item.get("conversation_id", ""),
-                "timestamp": item.get("timestamp", "")
-            })
-    
-    # Chia thành tập train/eval nếu cần
-    if split and feedback:
-        import random
-        random.shuffle(feedback)
-        split_idx = max(1, int(len(feedback) * (1 - eval_ratio)))
-        train_feedback = feedback[:split_idx]
-        eval_feedback = feedback[split_idx:]
-    else:
-        train_feedback = feedback
-        eval_feedback = []
+    split_counts = {part: {"feedback": 0, "comparisons": 0, "total": 0}
+                    for part in (["train", "eval"] if split else ["train"])}
+    for (part, kind), count in counts.items():
+        split_counts[part][kind] += count
+        split_counts[part]["total"] += count
+    if not split:
+        return {"split": False, "eval_ratio": None, "split_counts": split_counts}
+    return {
+        "split": True,
+        "eval_ratio": eval_ratio,
+        "split_method": "hash",
+        "split_key": split_key,
+        "split_seed": split_seed,
+        "split_buckets": SPLIT_BUCKETS,
+        "split_counts": split_counts
+    }
+
+def _make_temp_dir(path: str) -> str:
+    """Tạo thư mục tạm cạnh path (cùng hệ thống file nên có thể đổi tên sang path)"""
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    return tempfile.mkdtemp(prefix=f".{os.path.basename(path)}.", dir=parent)
+
+def _publish_files(temp_dir: str, output_dir: str, names: List[str]) -> None:
+    """Chuyển các file đã ghi xong từ thư mục tạm sang thư mục xuất theo thứ tự, rồi xóa thư mục tạm"""
+    os.makedirs(output_dir, exist_ok=True)
+    for name in names:
+        os.replace(os.path.join(temp_dir, name), os.path.join(output_dir, name))
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+class JsonlSink:
+    """
+    Ghi bản ghi đã phân loại ra các file JSONL theo phân đoạn kèm manifest.json. Các file được ghi
+    vào thư mục tạm và chỉ được chuyển sang thư mục xuất (manifest sau cùng) khi đóng thành công.
+    """
+    
+    def __init__(self, output_dir: str, rows_per_shard: int = DEFAULT_SHARD_OPTIONS["rows_per_shard"],
+                 compression: str = DEFAULT_SHARD_OPTIONS["compression"],
+                 split: bool = False, eval_ratio: float = 0.1,
+                 split_key: str = "conversation_id", split_seed: str = ""):
+        self.output_dir = output_dir
+        self.temp_dir = _make_temp_dir(output_dir)
+        self.writer = ShardedJsonlWriter(self.temp_dir, rows_per_shard, compression)
+        self.split = split
+        self.eval_ratio = eval_ratio
+        self.split_key = split_key
+        self.split_seed = split_seed
+        self.counts: Dict[Tuple[str, str], int] = {}
+        
+    def write(self, classified: Tuple[str, str, Dict]) -> None:
+        part, kind, item = classified
+        self.writer.write(item, f"{part}_{kind}" if self.split else kind)
+        self.counts[(part, kind)] = self.counts.get((part, kind), 0) + 1
         
-    if split and comparisons:
-        import random
-        random.shuffle(comparisons)
-        split_idx = max(1, int(len(comparisons) * (1 - eval_ratio)))
-        train_comparisons = comparisons[:split_idx]
-        eval_comparisons = comparisons[split_idx:]
-    else:
-        train_comparisons = comparisons
-        eval_comparisons = []
-    
-    # Tạo cấu trúc dữ liệu xuất
-    export_data = {
-        "metadata": {
+    def close(self) -> Dict:
+        metadata = {"version": "1.0.0"}
+        metadata.update(split_metadata(self.split, self.eval_ratio, self.split_key, self.split_seed, self.counts))
+        try:
+            manifest = self.writer.close(metadata)
+            _publish_files(self.temp_dir, self.output_dir,
+                           [shard["file"] for shard in manifest["shards"]] + ["manifest.json"])
+        except Exception:
+            self.abort()
+            raise
+        return manifest
+    
+    def abort(self) -> None:
+        self.writer.abort()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+class JsonSink:
+    """
+    Ghi bản ghi đã phân loại ra một file JSON. Mỗi phần (train/eval, phản hồi/so sánh) được ghi
+    tạm ra file đã định dạng sẵn, khi đóng chỉ cần chép nối các file tạm vào file JSON, nên không
+    cần giữ toàn bộ dữ liệu trong bộ nhớ hay phân tích lại các bản ghi. File JSON cũng được ghi
+    trong thư mục tạm và chỉ được đổi tên thành output_file khi hoàn tất.
+    """
+    
+    def __init__(self, output_file: str, split: bool = False, eval_ratio: float = 0.1,
+                 split_key: str = "conversation_id", split_seed: str = ""):
+        self.output_file = output_file
+        self.split = split
+        self.eval_ratio = eval_ratio
+        self.split_key = split_key
+        self.split_seed = split_seed
+        self.sections = [(part, kind) for part in (["train", "eval"] if split else ["train"])
+                         for kind in ["feedback", "comparisons"]]
+        self.counts = {section: 0 for section in self.sections}
+        self.temp_dir = _make_temp_dir(output_file)
+        self.temp_files = {section: open(os.path.join(self.temp_dir, f"{section[0]}_{section[1]}.json"),
+                                         'w+', encoding='utf-8')
+                           for section in self.sections}
+        
+    def write(self, classified: Tuple[str, str, Dict]) -> None:
+        part, kind, item = classified
+        section = (part, kind)
+        # Thụt lề như json.dump với indent=2 ở vị trí của bản ghi trong file
+        item_json = json.dumps(item, ensure_ascii=False, indent=2).replace('\n', '\n      ')
+        self.temp_files[section].write(("," if self.counts[section] else "") + "\n      " + item_json)
+        self.counts[section] += 1
+        
+    def close(self) -> Dict:
+        metadata = {
             "timestamp": datetime.now().isoformat(),
-            "version": "1.0.0",
-            "split": split
-        },
-        "train": {
-            "feedback": train_feedback,
-            "comparisons": train_comparisons
+            "version": "1.0.0"
         }
+        metadata.update(split_metadata(self.split, self.eval_ratio, self.split_key, self.split_seed,
+                                       self.counts))
+        temp_output = os.path.join(self.temp_dir, "export.json")
+        try:
+            with open(temp_output, 'w', encoding='utf-8') as f:
+                metadata_json = json.dumps(metadata, ensure_ascii=False, indent=2).replace('\n', '\n  ')
+                f.write(f'{{\n  "metadata": {metadata_json}')
+                for part in ["train", "eval"] if self.split else ["train"]:
+                    f.write(f',\n  "{part}": {{')
+                    for index, kind in enumerate(["feedback", "comparisons"]):
+                        temp_file = self.temp_files[(part, kind)]
+                        temp_file.seek(0)
+                        f.write(f'{"," if index else ""}\n    "{kind}": [')
+                        shutil.copyfileobj(temp_file, f)
+                        f.write('\n    ]')
+                    f.write('\n  }')
+                f.write('\n}\n')
+            os.replace(temp_output, self.output_file)
+        finally:
+            self.abort()
+            
+        counts = self.counts
+        feedback_count = counts[("train", "feedback")] + counts.get(("eval", "feedback"), 0)
+        comparison_count = counts[("train", "comparisons")] + counts.get(("eval", "comparisons"), 0)
+        return {
+            "total": feedback_count + comparison_count,
+            "feedback": feedback_count,
+            "comparisons": comparison_count,
+            "train_feedback": counts[("train", "feedback")],
+            "train_comparisons": counts[("train", "comparisons")],
+            "eval_feedback": counts.get(("eval", "feedback"), 0),
+            "eval_comparisons": counts.get(("eval", "comparisons"), 0),
+            "output_file": self.output_file
+        }
+    
+    def abort(self) -> None:
+        for temp_file in self.temp_files.values():
+            temp_file.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+class CsvSink:
+    """
+    Ghi bản ghi đã phân loại ra các file CSV ({loại}.csv, hoặc {phần}_{loại}.csv khi chia tập).
+    Các file được ghi vào thư mục tạm và chỉ được chuyển sang thư mục xuất khi đóng thành công.
+    """
+    
+    FIELDNAMES = {
+        "feedback": ["prompt", "response", "score", "model", "feedback",
+                     "conversation_id", "timestamp"],
+        "comparisons": ["prompt", "chosen", "rejected", "chosen_model",
+                        "rejected_model", "conversation_id", "timestamp"]
     }
     
-    if split:
-        export_data["eval"] = {
-            "feedback": eval_feedback,
-            "comparisons": eval_comparisons
+    def __init__(self, output_dir: str, split: bool = False):
+        self.output_dir = output_dir
+        self.split = split
+        self.counts: Dict[Tuple[str, str], int] = {}
+        self.paths: Dict[Tuple[str, str], str] = {}
+        self.files = {}
+        self.writers = {}
+        self.temp_dir = _make_temp_dir(output_dir)
+        
+    def write(self, classified: Tuple[str, str, Dict]) -> None:
+        part, kind, item = classified
+        section = (part, kind)
+        # Chỉ tạo file khi có bản ghi đầu tiên của phần đó
+        if section not in self.writers:
+            name = f"{part}_{kind}" if self.split else kind
+            self.paths[section] = os.path.join(self.output_dir, f"{name}.csv")
+            self.files[section] = open(os.path.join(self.temp_dir, f"{name}.csv"), 'w',
+                                       encoding='utf-8', newline='')
+            self.writers[section] = csv.DictWriter(self.files[section], fieldnames=self.FIELDNAMES[kind])
+            self.writers[section].writeheader()
+            self.counts[section] = 0
+            
+        self.writers[section].writerow(item)
+        self.counts[section] += 1
+        
+    def close(self) -> Dict:
+        try:
+            for f in self.files.values():
+                f.close()
+            _publish_files(self.temp_dir, self.output_dir,
+                           [os.path.basename(path) for path in self.paths.values()])
+        except Exception:
+            self.abort()
+            raise
+            
+        feedback_count = sum(count for (_, kind), count in self.counts.items() if kind == "feedback")
+        comparison_count = sum(count for (_, kind), count in self.counts.items() if kind == "comparisons")
+        return {
+            "total": feedback_count + comparison_count,
+            "feedback": feedback_count,
+            "comparisons": comparison_count,
+            "feedback_file": self.paths.get(("train", "feedback")) if not self.split else None,
+            "comparison_file": self.paths.get(("train", "comparisons")) if not self.split else None,
+            "files": {os.path.basename(path): self.counts[section] for section, path in sorted(self.paths.items())}
         }
     
-    # Ghi ra file
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(export_data, f, ensure_ascii=False, indent=2)
+    def abort(self) -> None:
+        for f in self.files.values():
+            f.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+def _write_all(sink: Any, feedback_data: Iterable[Dict], split: bool = False, eval_ratio: float = 0.1,
+               split_key: str = "conversation_id", split_seed: str = "") -> Dict:
+    """Ghi toàn bộ dữ liệu ra một bộ ghi trên luồng hiện tại"""
+    try:
+        for item in feedback_data:
+            sink.write(classify_item(item, split, eval_ratio, split_key, split_seed))
+    except Exception:
+        sink.abort()
+        raise
+    return sink.close()
+
+def export_feedback_to_jsonl(feedback_data: Iterable[Dict], output_dir: str,
+                             rows_per_shard: int = DEFAULT_SHARD_OPTIONS["rows_per_shard"],
+                             compression: str = DEFAULT_SHARD_OPTIONS["compression"],
+                             split: bool = False, eval_ratio: float = 0.1,
+                             split_key: str = "conversation_id", split_seed: str = "") -> Dict:
+    """
+    Xuất dữ liệu phản hồi sang các file JSONL theo phân đoạn (feedback-*, comparisons-*, hoặc
+    train_*/eval_* khi chia tập) kèm manifest.json chứa số dòng và SHA-256 của từng file
+    
+    Args:
+        feedback_data: Các bản ghi phản hồi (có thể là iterator)
+        output_dir: Thư mục xuất
+        rows_per_shard: Số dòng mỗi file (<= 0 để không chia)
+        compression: none, gzip hoặc zstd
+        split: Chia thành tập train/eval
+        eval_ratio: Tỷ lệ tập eval
+        split_key: Khóa chia tập (conversation_id hoặc prompt)
+        split_seed: Chuỗi trộn vào hash khi chia tập
         
-    return {
-        "total": len(feedback) + len(comparisons),
-        "feedback": len(feedback),
-        "comparisons": len(comparisons),
-        "train_feedback": len(train_feedback),
-        "train_comparisons": len(train_comparisons),
-        "eval_feedback": len(eval_feedback) if split else 0,
-        "eval_comparisons": len(eval_comparisons) if split else 0
-    }
+    Returns:
+        Nội dung manifest
+    """
+    return _write_all(JsonlSink(output_dir, rows_per_shard, compression, split, eval_ratio, split_key, split_seed),
+                      feedback_data, split, eval_ratio, split_key, split_seed)
+
+def export_feedback_to_json(feedback_data: Iterable[Dict], output_file: str, 
+                           split: bool = False, eval_ratio: float = 0.1,
+                           split_key: str = "conversation_id", split_seed: str = "") -> Dict:
+    """
+    Xuất dữ liệu phản hồi sang định dạng JSON. Khi chia tập, bản ghi được đưa vào tập eval theo
+    hash của khóa chia tập (xem classify_item).
+    
+    Args:
+        feedback_data: Các bản ghi phản hồi (có thể là iterator)
+        output_file: Đường dẫn file xuất
+        split: Chia thành tập train/eval
+        eval_ratio: Tỷ lệ tập eval
+        split_key: Khóa chia tập (conversation_id hoặc prompt)
+        split_seed: Chuỗi trộn vào hash khi chia tập
+        
+    Returns:
+        Dict thống kê số lượng bản ghi đã xuất
+    """
+    return _write_all(JsonSink(output_file, split, eval_ratio, split_key, split_seed),
+                      feedback_data, split, eval_ratio, split_key, split_seed)
 
-def export_feedback_to_csv(feedback_data: List[Dict], output_dir: str) -> Dict:
+def export_feedback_to_csv(feedback_data: Iterable[Dict], output_dir: str,
+                           split: bool = False, eval_ratio: float = 0.1,
+                           split_key: str = "conversation_id", split_seed: str = "") -> Dict:
     """
     Xuất dữ liệu phản hồi sang định dạng CSV
     
     Args:
-        feedback_data: Danh sách phản hồi
+        feedback_data: Các bản ghi phản hồi (có thể là iterator)
         output_dir: Thư mục xuất
+        split: Chia thành tập train/eval (file train_*.csv và eval_*.csv)
+        eval_ratio: Tỷ lệ tập eval
+        split_key: Khóa chia tập (conversation_id hoặc prompt)
+        split_seed: Chuỗi trộn vào hash khi chia tập
         
     Returns:
         Dict thống kê số lượng bản ghi đã xuất
     """
-    import csv
-    
-    # Phân loại dữ liệu
-    comparisons = []
-    feedback = []
-    
-    for item in feedback_data:
-        if item.get("type") == "pairwise_comparison":
-            comparisons.append({
-                "prompt": item.get("query", ""),
-                "chosen": item.get("chosen", ""),
-                "rejected": item.get("rejected", ""),
-                "chosen_model": item.get("chosen_model", ""),
-                "rejected_model": item.get("rejected_model", ""),
-                "conversation_id": item.get("conversation_id", ""),
-                "timestamp": item.get("timestamp", "")
-            })
-        else:
-            selected_response = item.get("selected_response", "")
-            responses = item.get("responses", {})
-            response_text = responses.get(selected_response, "")
-            
-            feedback.append({
-                "prompt": item.get("query", ""),
-                "response": response_text,
-                "score": item.get("feedback_score"),
-                "model": selected_response,
-                "feedback": item.get("feedback_text"),
-                "conversation_id": item.get("conversation_id", ""),
-                "timestamp": item.get("timestamp", "")
-            })
-    
-    # Xuất phản hồi
-    feedback_file = os.path.join(output_dir, "feedback.csv")
-    feedback_count = 0
-    if feedback:
-        with open(feedback_file, 'w', encoding='utf-8', newline='') as f:
-            fieldnames = ["prompt", "response", "score", "model", "feedback", 
-                        "conversation_id", "timestamp"]
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            
-            for item in feedback:
-                writer.writerow(item)
-                feedback_count += 1
-    
-    # Xuất so sánh
-    comparison_file = os.path.join(output_dir, "comparisons.csv")
-    comparison_count = 0
-    if comparisons:
-        with open(comparison_file, 'w', encoding='utf-8', newline='') as f:
-            fieldnames = ["prompt", "chosen", "rejected", "chosen_model", 
-                        "rejected_model", "conversation_id", "timestamp"]
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
+    return _write_all(CsvSink(output_dir, split), feedback_data, split, eval_ratio, split_key, split_seed)
+
+def export_feedback_pipeline(feedback_data: Iterable[Dict], output_dir: str, formats: List[str],
+                             timestamp: str, rows_per_shard: int = DEFAULT_SHARD_OPTIONS["rows_per_shard"],
+                             compression: str = DEFAULT_SHARD_OPTIONS["compression"],
+                             split: bool = False, eval_ratio: float = 0.1,
+                             split_key: str = "conversation_id", split_seed: str = "",
+                             queue_size: int = DEFAULT_PIPELINE_OPTIONS["queue_size"]) -> Dict:
+    """
+    Xuất dữ liệu phản hồi sang nhiều định dạng trong một lượt đọc: dữ liệu được đọc và phân loại
+    (train/eval, phản hồi/so sánh) một lần, mỗi định dạng được ghi trên thread riêng
+    
+    Args:
+        feedback_data: Các bản ghi phản hồi (có thể là iterator)
+        output_dir: Thư mục xuất
+        formats: Các định dạng (jsonl, json, csv)
+        timestamp: Hậu tố tên file/thư mục xuất
+        rows_per_shard: Số dòng mỗi file JSONL
+        compression: Nén file JSONL (none, gzip hoặc zstd)
+        split: Chia thành tập train/eval
+        eval_ratio: Tỷ lệ tập eval
+        split_key: Khóa chia tập (conversation_id hoặc prompt)
+        split_seed: Chuỗi trộn vào hash khi chia tập
+        queue_size: Số lô tối đa chờ ghi của mỗi định dạng
+        
+    Returns:
+        Dict với số bản ghi, thời gian, thông lượng (rows_per_sec) và kết quả của từng định dạng
+    """
+    output_subdir = os.path.join(output_dir, f"rlhf_export_{timestamp}")
+    sinks = {}
+    for export_format in formats:
+        if export_format == "jsonl":
+            sinks["jsonl"] = JsonlSink(output_subdir, rows_per_shard, compression, split, eval_ratio,
+                                       split_key, split_seed)
+        elif export_format == "json":
+            sinks["json"] = JsonSink(os.path.join(output_dir, f"rlhf_export_{timestamp}.json"), split,
+                                     eval_ratio, split_key, split_seed)
+        elif export_format == "csv":
+            sinks["csv"] = CsvSink(output_subdir, split)
             
-            for item in comparisons:
-                writer.writerow(item)
-                comparison_count += 1
-                
-    return {
-        "total": feedback_count + comparison_count,
-        "feedback": feedback_count,
-        "comparisons": comparison_count,
-        "feedback_file": feedback_file if feedback_count > 0 else None,
-        "comparison_file": comparison_file if comparison_count > 0 else None
-    }
+    pipeline = ExportPipeline(sinks, queue_size=queue_size)
+    return pipeline.run(classify_item(item, split, eval_ratio, split_key, split_seed) for item in feedback_data)
 
-def filter_feedback_data(feedback_data: List[Dict], min_score: Optional[float] = None,
-                        max_count: Optional[int] = None) -> List[Dict]:
+def iter_export_records(store: FeedbackStore, min_score: Optional[float] = None,
+                        max_count: Optional[int] = None) -> Iterator[Dict]:
     """
-    Lọc dữ liệu phản hồi theo điểm và số lượng
+    Duyệt dữ liệu cần xuất (phản hồi rồi so sánh, mới nhất trước), lọc theo điểm và số lượng
     
     Args:
-        feedback_data: Danh sách phản hồi
-        min_score: Điểm tối thiểu
+        store: Kho phản hồi
+        min_score: Điểm tối thiểu (chỉ áp dụng cho phản hồi)
         max_count: Số lượng tối đa
         
     Returns:
-        Danh sách phản hồi đã lọc
+        Iterator các bản ghi
     """
-    # Lọc theo điểm
-    if min_score is not None:
-        feedback_data = [
-            item for item in feedback_data
-            if (item.get("type") == "pairwise_comparison") or 
-               (item.get("feedback_score") is not None and 
-                item.get("feedback_score") >= min_score)
-        ]
+    records = itertools.chain(
+        store.iter_feedback(min_score=min_score, descending=True),
+        store.iter_comparisons(descending=True)
+    )
     
     # Giới hạn số lượng
     if max_count is not None and max_count > 0:
-        feedback_data = feedback_data[:max_count]
+        records = itertools.islice(records, max_count)
         
-    return feedback_data
+    return records
+
+def to_delta_item(item: Dict) -> Dict:
+    """Bản ghi RLHF kèm id gốc, để các phần tăng dần có thể đối chiếu với cơ sở dữ liệu"""
+    return {"id": item.get("id"), **to_rlhf_item(item)}
+
+def run_incremental(store: FeedbackStore, args: argparse.Namespace, logger: logging.Logger) -> None:
+    """
+    Xuất tăng dần hoặc ghép các phần tăng dần của một đích xuất
+    
+    Args:
+        store: Kho phản hồi
+        args: Tham số dòng lệnh
+        logger: Logger của script
+    """
+    target_dir = os.path.join(args.output_dir, args.target)
+    if args.reset and os.path.isdir(target_dir):
+        shutil.rmtree(target_dir)
+        logger.info(f"Đã xóa mốc và dữ liệu đã xuất của {target_dir}")
+    
+    if args.consolidate:
+        try:
+            manifest_path = consolidate(target_dir, rows_per_shard=args.rows_per_shard,
+                                        compression=args.compression, prune=args.prune)
+        except ValueError as e:
+            logger.error(f"Không thể ghép các phần tăng dần: {e}")
+            return
+        if manifest_path:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            logger.info(f"Bản đầy đủ {os.path.dirname(manifest_path)}: {manifest['total_rows']} bản ghi")
+        return
+    
+    min_score = args.min_score
+    predicate = None
+    if min_score is not None:
+        predicate = lambda record: (record.get("type") == "pairwise_comparison"
+                                    or (record.get("feedback_score") is not None
+                                        and record["feedback_score"] >= min_score))
+    
+    os.makedirs(target_dir, exist_ok=True)
+    try:
+        manifest_path = export_delta(store, target_dir, to_delta_item, rows_per_shard=args.rows_per_shard,
+                                     compression=args.compression, predicate=predicate)
+    except ValueError as e:
+        logger.error(f"Không thể xuất tăng dần: {e}")
+        return
+    watermark = load_watermark(target_dir)
+    if manifest_path is None:
+        logger.info(f"Không có dữ liệu mới kể từ lần xuất {watermark['delta']} của {args.target}")
+        return
+    
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    logger.info(f"Đã xuất phần tăng dần {watermark['delta']} của {args.target}: "
+                f"{manifest['total_rows']} bản ghi trong {os.path.dirname(manifest_path)}")
+    for stream, count in sorted(manifest["streams"].items()):
+        logger.info(f"  - {stream}: {count} bản ghi")
 
 def main():
     """Main function"""
@@ -314,50 +576,66 @@ def main():
         else:
             logger.warning("Không thể sao lưu cơ sở dữ liệu")
     
-    # Lấy tất cả phản hồi
-    logger.info("Đang lấy dữ liệu phản hồi...")
-    feedback_data = store.get_all_feedback()
-    logger.info(f"Đã lấy {len(feedback_data)} bản ghi phản hồi")
+    # Xuất tăng dần theo mốc của đích xuất
+    if args.target:
+        run_incremental(store, args, logger)
+        return
+    if args.consolidate or args.reset:
+        logger.error("--consolidate và --reset cần --target")
+        return
     
-    # Lọc dữ liệu
-    feedback_data = filter_feedback_data(
-        feedback_data, 
+    # Duyệt dữ liệu theo lô thay vì nạp toàn bộ
+    feedback_data = iter_export_records(
+        store,
         min_score=args.min_score,
         max_count=args.max_feedback
     )
-    logger.info(f"Còn lại {len(feedback_data)} bản ghi sau khi lọc")
     
-    if not feedback_data:
+    first_item = next(feedback_data, None)
+    if first_item is None:
         logger.warning("Không có dữ liệu để xuất")
         return
+    feedback_data = itertools.chain([first_item], feedback_data)
     
     # Tạo tên file
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
-    # Xuất dữ liệu theo định dạng
-    if args.format == "jsonl":
-        output_file = os.path.join(args.output_dir, f"rlhf_export_{timestamp}.jsonl")
-        count = export_feedback_to_jsonl(feedback_data, output_file)
-        logger.info(f"Đã xuất {count} bản ghi sang {output_file}")
-        
-    elif args.format == "json":
-        output_file = os.path.join(args.output_dir, f"rlhf_export_{timestamp}.json")
-        stats = export_feedback_to_json(
-            feedback_data, output_file, 
-            split=args.split, eval_ratio=args.eval_ratio
+    # Xuất mọi định dạng trong một lượt đọc
+    formats = list(dict.fromkeys(args.format))
+    try:
+        stats = export_feedback_pipeline(
+            feedback_data, args.output_dir, formats, timestamp,
+            rows_per_shard=args.rows_per_shard, compression=args.compression,
+            split=args.split, eval_ratio=args.eval_ratio, split_key=args.split_key,
+            split_seed=args.split_seed, queue_size=args.queue_size
         )
-        logger.info(f"Đã xuất {stats['total']} bản ghi sang {output_file}")
+    except Exception as e:
+        logger.error(f"Lỗi khi xuất dữ liệu: {e}")
+        return
+    
+    logger.info(f"Đã đọc {stats['rows']} bản ghi trong {stats['seconds']:.2f}s "
+                f"({stats['rows_per_sec']:.0f} bản ghi/giây), xuất {len(formats)} định dạng")
+    output_subdir = os.path.join(args.output_dir, f"rlhf_export_{timestamp}")
+    results = stats["results"]
+    
+    if "jsonl" in results:
+        manifest = results["jsonl"]
+        logger.info(f"[jsonl] Đã xuất {manifest['total_rows']} bản ghi thành {len(manifest['shards'])} file trong {output_subdir}")
+        for stream, count in sorted(manifest["streams"].items()):
+            logger.info(f"  - {stream}: {count} bản ghi")
+        
+    if "json" in results:
+        json_stats = results["json"]
+        logger.info(f"[json] Đã xuất {json_stats['total']} bản ghi sang {json_stats['output_file']}")
         if args.split:
-            logger.info(f"  - Train: {stats['train_feedback']} phản hồi, {stats['train_comparisons']} so sánh")
-            logger.info(f"  - Eval: {stats['eval_feedback']} phản hồi, {stats['eval_comparisons']} so sánh")
+            logger.info(f"  - Train: {json_stats['train_feedback']} phản hồi, {json_stats['train_comparisons']} so sánh")
+            logger.info(f"  - Eval: {json_stats['eval_feedback']} phản hồi, {json_stats['eval_comparisons']} so sánh")
             
-    elif args.format == "csv":
-        output_subdir = os.path.join(args.output_dir, f"rlhf_export_{timestamp}")
-        os.makedirs(output_subdir, exist_ok=True)
-        stats = export_feedback_to_csv(feedback_data, output_subdir)
-        logger.info(f"Đã xuất {stats['total']} bản ghi sang {output_subdir}")
-        logger.info(f"  - {stats['feedback']} phản hồi: {os.path.basename(stats['feedback_file']) if stats['feedback_file'] else 'None'}")
-        logger.info(f"  - {stats['comparisons']} so sánh: {os.path.basename(stats['comparison_file']) if stats['comparison_file'] else 'None'}")
+    if "csv" in results:
+        csv_stats = results["csv"]
+        logger.info(f"[csv] Đã xuất {csv_stats['total']} bản ghi sang {output_subdir}")
+        for name, count in csv_stats["files"].items():
+            logger.info(f"  - {name}: {count} bản ghi")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+"""
+Script tính lại trọng số sở thích mô hình theo lô từ toàn bộ so sánh cặp trong cơ sở dữ liệu
+phản hồi (Bradley-Terry), rồi ghi kết quả làm trạng thái khởi đầu của PreferenceOptimizer
+"""
+
+import os
+import sys
+import argparse
+import logging
+import time
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+# Thêm thư mục gốc vào đường dẫn
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cli.setup import setup_logging
+from src.integration.interfaces import AssistantFactory
+from src.optimization.bradley_terry import build_win_matrices, fit_bradley_terry, expected_win_rates, to_elo
+from src.optimization.feedback_store import FeedbackStore
+from src.optimization.preference_optimizer import PreferenceOptimizer
+from src.optimization.state_store import StateStore
+
+logger = logging.getLogger("fit_preferences")
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Tính lại trọng số sở thích mô hình từ so sánh cặp (Bradley-Terry)")
+    parser.add_argument("--config", type=str, default="config/default.yml",
+                        help="Đường dẫn file cấu hình")
+    parser.add_argument("--db", type=str, help="Đường dẫn cơ sở dữ liệu phản hồi (mặc định theo cấu hình)")
+    parser.add_argument("--state", type=str, help="Đường dẫn file snapshot trạng thái (mặc định theo cấu hình)")
+    parser.add_argument("--prior", type=float, default=1.0,
+                        help="Số trận ảo mỗi cặp mô hình để làm mịn (default: 1.0)")
+    parser.add_argument("--min-comparisons", type=int, default=20,
+                        help="Số so sánh tối thiểu của mô hình trong một loại truy vấn (default: 20)")
+    parser.add_argument("--batch-size", type=int, default=50000,
+                        help="Số so sánh đọc mỗi lô (default: 50000)")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ in kết quả, không ghi snapshot")
+    parser.add_argument("--log-level", type=str, default="INFO",
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="Mức độ ghi log")
+
+    return parser.parse_args()
+
+def load_comparisons(store: FeedbackStore, optimizer: PreferenceOptimizer,
+                     batch_size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[str], List[str]]:
+    """
+    Đọc toàn bộ so sánh cặp theo lô và mã hóa thành mảng chỉ số
+
+    Args:
+        store: Kho phản hồi
+        optimizer: PreferenceOptimizer dùng để suy luận loại truy vấn
+        batch_size: Số so sánh mỗi lô
+
+    Returns:
+        Tuple (chỉ số mô hình thắng, chỉ số mô hình thua, chỉ số loại truy vấn,
+        danh sách tên mô hình, danh sách loại truy vấn)
+    """
+    model_index: Dict[str, int] = {}
+    type_index: Dict[str, int] = {}
+    query_types: Dict[str, int] = {}
+    winner_batches, loser_batches, group_batches = [], [], []
+
+    for rows in store.iter_comparison_pairs(batch_size):
+        winners = np.empty(len(rows), dtype=np.int32)
+        losers = np.empty(len(rows), dtype=np.int32)
+        groups = np.empty(len(rows), dtype=np.int32)
+
+        for i, (query, chosen_model, rejected_model) in enumerate(rows):
+            group = query_types.get(query)
+            if group is None:
+                query_type = optimizer.infer_query_type(query)
+                group = type_index.setdefault(query_type, len(type_index))
+                query_types[query] = group
+
+            winners[i] = model_index.setdefault(chosen_model, len(model_index))
+            losers[i] = model_index.setdefault(rejected_model, len(model_index))
+            groups[i] = group
+
+        winner_batches.append(winners)
+        loser_batches.append(losers)
+        group_batches.append(groups)
+
+    if not winner_batches:
+        empty = np.empty(0, dtype=np.int32)
+        return empty, empty, empty, [], []
+
+    return (np.concatenate(winner_batches), np.concatenate(loser_batches), np.concatenate(group_batches),
+            list(model_index), list(type_index))
+
+def fit_preference_state(winners: np.ndarray, losers: np.ndarray, groups: np.ndarray,
+                         model_names: List[str], query_types: List[str],
+                         optimizer: PreferenceOptimizer, prior: float,
+                         min_comparisons: int) -> Tuple[Dict[str, Any], Dict[str, Dict[str, float]]]:
+    """
+    Ước lượng độ mạnh theo mô hình và theo loại truy vấn, rồi chuyển thành trạng thái của
+    PreferenceOptimizer
+
+    Args:
+        winners: Chỉ số mô hình thắng
+        losers: Chỉ số mô hình thua
+        groups: Chỉ số loại truy vấn
+        model_names: Tên mô hình theo chỉ số
+        query_types: Loại truy vấn theo chỉ số
+        optimizer: PreferenceOptimizer cung cấp giới hạn trọng số
+        prior: Số trận ảo mỗi cặp mô hình
+        min_comparisons: Số so sánh tối thiểu của mô hình trong một loại truy vấn
+
+    Returns:
+        Tuple (trạng thái cho PreferenceOptimizer.load_state, bảng tóm tắt theo mô hình)
+    """
+    n_items = len(model_names)
+    wins = build_win_matrices(winners, losers, groups, n_items, len(query_types))
+
+    overall = fit_bradley_terry(wins.sum(axis=0), prior=prior)
+    by_type = fit_bradley_terry(wins, prior=prior)
+    overall_win_rates = expected_win_rates(overall)
+    type_win_rates = expected_win_rates(by_type)
+
+    # Số so sánh của từng mô hình (tổng và theo loại truy vấn)
+    type_games = wins.sum(axis=2) + wins.sum(axis=1)
+    games = type_games.sum(axis=0)
+
+    # Mô hình có độ mạnh trung bình (trung bình nhân = 1) nhận trọng số mặc định
+    weights = np.clip(optimizer.default_weight * overall, optimizer.min_weight, optimizer.max_weight)
+
+    performance_cache: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for group, query_type in enumerate(query_types):
+        entries = {
+            model_name: {"score": float(type_win_rates[group, i]), "count": int(type_games[group, i])}
+            for i, model_name in enumerate(model_names)
+            if type_games[group, i] >= min_comparisons
+        }
+        if entries:
+            performance_cache[f"type:{query_type}"] = entries
+
+    state = {
+        "model_weights": {name: float(weights[i]) for i, name in enumerate(model_names)},
+        "model_win_rate": {name: float(overall_win_rates[i]) for i, name in enumerate(model_names)},
+        "model_performance_cache": performance_cache
+    }
+
+    elo = to_elo(overall)
+    summary = {
+        name: {
+            "elo": float(elo[i]),
+            "weight": float(weights[i]),
+            "win_rate": float(overall_win_rates[i]),
+            "comparisons": int(games[i])
+        }
+        for i, name in enumerate(model_names)
+    }
+
+    return state, summary
+
+def write_state(state_store: StateStore, preference_state: Dict[str, Any]) -> bool:
+    """
+    Ghi trạng thái đã ước lượng vào snapshot, giữ nguyên trạng thái của các thành phần khác
+
+    Mốc last_feedback_seq của snapshot được giữ nguyên: mẫu prompt và router chưa được áp dụng
+    các phản hồi mới hơn mốc, nên lần khởi động sau vẫn phải áp dụng lại chúng.
+
+    Args:
+        state_store: Kho snapshot
+        preference_state: Trạng thái của PreferenceOptimizer
+
+    Returns:
+        True nếu ghi thành công
+    """
+    snapshot = state_store.load() or {"components": {}, "last_feedback_seq": 0}
+    components = snapshot["components"]
+
+    current = components.get("preference_optimizer", {})
+    current.update(preference_state)
+    components["preference_optimizer"] = current
+
+    return state_store.save(components, snapshot.get("last_feedback_seq", 0))
+
+def main():
+    """Main function"""
+    args = parse_args()
+
+    # Thiết lập logging
+    setup_logging(getattr(logging, args.log_level))
+
+    config = AssistantFactory.load_config(args.config)
+    db_path = args.db or config.get("system", {}).get("feedback_db", "data/feedback.db")
+    state_path = args.state or config.get("optimization", {}).get("state", {}).get(
+        "path", "data/optimizer_state.json")
+
+    feedback_store = FeedbackStore(db_path, config.get("system", {}).get("feedback_db_options"),
+                                   text_compression=config.get("system", {}).get("feedback_text_compression"))
+    optimizer = PreferenceOptimizer(config)
+
+    start = time.perf_counter()
+    winners, losers, groups, model_names, query_types = load_comparisons(
+        feedback_store, optimizer, args.batch_size)
+    load_time = time.perf_counter() - start
+
+    if len(winners) == 0:
+        logger.warning("Không có so sánh cặp nào để ước lượng")
+        return
+
+    start = time.perf_counter()
+    state, summary = fit_preference_state(winners, losers, groups, model_names, query_types,
+                                          optimizer, args.prior, args.min_comparisons)
+    fit_time = time.perf_counter() - start
+
+    logger.info(f"Đã đọc {len(winners)} so sánh của {len(model_names)} mô hình, "
+                f"{len(query_types)} loại truy vấn trong {load_time:.2f}s, ước lượng trong {fit_time:.3f}s")
+
+    print(f"\n{'Mô hình':<30} {'Elo':>8} {'Trọng số':>9} {'Tỷ lệ thắng':>12} {'So sánh':>9}")
+    for name, row in sorted(summary.items(), key=lambda x: -x[1]["elo"]):
+        print(f"{name:<30} {row['elo']:>8.1f} {row['weight']:>9.3f} {row['win_rate']:>12.3f} {row['comparisons']:>9}")
+
+    if args.dry_run:
+        return
+
+    if write_state(StateStore(state_path), state):
+        logger.info(f"Đã ghi trạng thái khởi đầu vào {state_path}")
+    else:
+        logger.error(f"Không thể ghi trạng thái vào {state_path}")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 """
-Script sửa chữa cấu trúc database
+Script nâng cấp cấu trúc database phản hồi lên phiên bản schema mới nhất
 """
 
 import os
@@ -8,12 +8,17 @@ import sys
 import argparse
 import sqlite3
 import logging
-import shutil
 from datetime import datetime
+from typing import Dict, Optional
 
 # Thêm thư mục gốc vào đường dẫn
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from src.optimization.schema_migrations import (DEFAULT_BATCH_SIZE, MIGRATIONS, SCHEMA_VERSION,
+                                                get_schema_version, migrate)
+from src.optimization.text_store import get_text_stats, prune_unreferenced_texts
+from src.utils.export import backup_sqlite_database
+
 # Khởi tạo logger mặc định
 logger = logging.getLogger("fix_database")
 
@@ -29,259 +34,194 @@ def setup_logging(log_level=logging.INFO):
 
 def parse_args():
     """Parse command line arguments"""
-    parser = argparse.ArgumentParser(description="Sửa chữa cấu trúc database")
+    parser = argparse.ArgumentParser(description="Nâng cấp cấu trúc database phản hồi")
     parser.add_argument("--db", type=str, default="data/feedback.db",
                         help="Đường dẫn đến file cơ sở dữ liệu phản hồi")
     parser.add_argument("--backup", action="store_true",
-                        help="Tạo bản sao lưu trước khi sửa chữa")
-    parser.add_argument("--force", action="store_true",
-                        help="Ghi đè nếu bảng đã tồn tại")
-    parser.add_argument("--verbose", action="store_true",
-                        help="Hiển thị chi tiết quá trình sửa chữa")
+                        help="Tạo bản sao lưu trước khi nâng cấp")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Số dòng cập nhật mỗi giao dịch khi điền dữ liệu (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--target-version", type=int,
+                        help=f"Phiên bản schema đích (mặc định: {SCHEMA_VERSION})")
+    parser.add_argument("--prune-texts", action="store_true",
+                        help="Xóa văn bản câu trả lời không còn bản ghi nào tham chiếu")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="Chạy VACUUM để thu hồi dung lượng trống (khóa database trong lúc chạy)")
+    parser.add_argument("--status", action="store_true",
+                        help="Chỉ hiển thị phiên bản schema và các bản nâng cấp còn thiếu")
     parser.add_argument("--log-level", type=str, default="INFO",
                         choices=["DEBUG", "INFO", "WARNING", "ERROR"],
                         help="Mức độ ghi log")
-    
+
     return parser.parse_args()
 
-def fix_database_schema(db_path: str, force: bool = False, backup: bool = True) -> bool:
+def backup_database(conn: sqlite3.Connection, db_path: str) -> Optional[str]:
+    """
+    Sao lưu database bằng SQLite backup API theo bước (bao gồm cả dữ liệu còn trong file WAL)
+
+    Args:
+        conn: Kết nối đến database
+        db_path: Đường dẫn đến file database
+
+    Returns:
+        Đường dẫn bản sao lưu hoặc None nếu thất bại
+    """
+    backup_path = f"{db_path}.backup_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    try:
+        backup_sqlite_database(conn, backup_path, progress=lambda copied, total: logger.debug(
+            f"Đã sao lưu {copied}/{total} trang"))
+        logger.info(f"Đã sao lưu database vào {backup_path}")
+        return backup_path
+    except Exception as e:
+        logger.error(f"Không thể sao lưu database: {e}")
+        return None
+
+def database_size(conn: sqlite3.Connection, db_path: str) -> Dict[str, int]:
     """
-    Sửa lỗi schema trong database feedback
-    
+    Kích thước database
+
+    Args:
+        conn: Kết nối đến database
+        db_path: Đường dẫn đến file database
+
+    Returns:
+        Dict với kích thước file (gồm file WAL), dung lượng các trang và dung lượng trang trống (byte)
+    """
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    file_bytes = sum(os.path.getsize(path) for path in [db_path, f"{db_path}-wal"] if os.path.exists(path))
+    return {
+        "file_bytes": file_bytes,
+        "page_bytes": conn.execute("PRAGMA page_count").fetchone()[0] * page_size,
+        "free_bytes": conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size
+    }
+
+def format_size(size: int) -> str:
+    """Định dạng số byte dễ đọc"""
+    return f"{size / (1024 * 1024):.2f}MB"
+
+def log_size(label: str, size: Dict[str, int]) -> None:
+    """Ghi log kích thước database"""
+    logger.info(f"Kích thước {label}: file {format_size(size['file_bytes'])}, "
+                f"dữ liệu {format_size(size['page_bytes'] - size['free_bytes'])}, "
+                f"trống {format_size(size['free_bytes'])}")
+
+def fix_database_schema(db_path: str, backup: bool = True, batch_size: int = DEFAULT_BATCH_SIZE,
+                        target_version: Optional[int] = None, prune_texts: bool = False,
+                        vacuum: bool = False) -> bool:
+    """
+    Nâng cấp schema của database feedback và báo cáo kích thước trước/sau
+
     Args:
         db_path: Đường dẫn đến file database
-        force: True để ghi đè nếu bảng đã tồn tại
-        backup: True để tạo bản sao lưu trước khi sửa chữa
-        
+        backup: True để tạo bản sao lưu trước khi nâng cấp
+        batch_size: Số dòng cập nhật mỗi giao dịch khi điền dữ liệu
+        target_version: Phiên bản schema đích (mặc định: mới nhất)
+        prune_texts: True để xóa văn bản không còn được tham chiếu
+        vacuum: True để chạy VACUUM sau khi nâng cấp
+
     Returns:
-        True nếu sửa thành công, False nếu không
+        True nếu nâng cấp thành công, False nếu không
     """
     # Kiểm tra xem file có tồn tại không
     if not os.path.exists(db_path):
         logger.error(f"Database không tồn tại: {db_path}")
         return False
-    
-    # Sao lưu database nếu được yêu cầu
-    if backup:
-        backup_path = f"{db_path}.backup_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        try:
-            shutil.copy2(db_path, backup_path)
-            logger.info(f"Đã sao lưu database vào {backup_path}")
-        except Exception as e:
-            logger.error(f"Không thể sao lưu database: {e}")
-            if not force:
-                return False
-    
+
     conn = None
     try:
-        # Kết nối đến database
         conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Kiểm tra cấu trúc cơ sở dữ liệu
-        logger.info("Kiểm tra cấu trúc cơ sở dữ liệu...")
-        
-        # Kiểm tra bảng feedback
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='feedback'")
-        feedback_exists = cursor.fetchone() is not None
-        
-        if feedback_exists:
-            logger.info("Bảng feedback đã tồn tại, kiểm tra cấu trúc...")
-            cursor.execute("PRAGMA table_info(feedback)")
-            columns = {col[1]: col for col in cursor.fetchall()}
-            
-            if "conversation_id" not in columns:
-                logger.warning("Cột conversation_id không tồn tại trong bảng feedback, tiến hành sửa chữa...")
-                
-                # Tạo bảng tạm với cấu trúc mới
-                cursor.execute('''
-                CREATE TABLE feedback_temp (
-                    id TEXT PRIMARY KEY,
-                    timestamp TEXT NOT NULL,
-                    conversation_id TEXT NOT NULL,
-                    query TEXT NOT NULL,
-                    responses TEXT NOT NULL,
-                    selected_response TEXT NOT NULL,
-                    feedback_score REAL,
-                    feedback_text TEXT,
-                    metadata TEXT
-                )
-                ''')
-                
-                # Sao chép dữ liệu
-                try:
-                    # Lấy tên của các cột hiện có
-                    existing_columns = list(columns.keys())
-                    column_str = ", ".join(existing_columns)
-                    
-                    # Sao chép dữ liệu và thêm giá trị mặc định cho conversation_id
-                    cursor.execute(f"INSERT INTO feedback_temp ({column_str}, conversation_id) SELECT {column_str}, '' FROM feedback")
-                    copy_count = cursor.rowcount
-                    logger.info(f"Đã sao chép {copy_count} dòng dữ liệu từ bảng cũ")
-                    
-                    # Xóa bảng cũ
-                    cursor.execute("DROP TABLE feedback")
-                    
-                    # Đổi tên bảng tạm thành feedback
-                    cursor.execute("ALTER TABLE feedback_temp RENAME TO feedback")
-                    
-                    # Tạo lại các chỉ mục
-                    cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_conversation ON feedback(conversation_id)')
-                    cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback(timestamp)')
-                    
-                    logger.info("Đã sửa chữa thành công bảng feedback")
-                    
-                except Exception as e:
-                    logger.error(f"Lỗi khi sao chép dữ liệu: {e}")
-                    conn.rollback()
-                    return False
-            else:
-                logger.info("Cấu trúc bảng feedback đã đúng")
-        else:
-            logger.info("Bảng feedback không tồn tại, tạo mới...")
-            cursor.execute('''
-            CREATE TABLE feedback (
-                id TEXT PRIMARY KEY,
-                timestamp TEXT NOT NULL,
-                conversation_id TEXT NOT NULL,
-                query TEXT NOT NULL,
-                responses TEXT NOT NULL,
-                selected_response TEXT NOT NULL,
-                feedback_score REAL,
-                feedback_text TEXT,
-                metadata TEXT
-            )
-            ''')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_conversation ON feedback(conversation_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback(timestamp)')
-            logger.info("Đã tạo bảng feedback mới")
-        
-        # Kiểm tra bảng comparisons
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='comparisons'")
-        comparisons_exists = cursor.fetchone() is not None
-        
-        if not comparisons_exists:
-            logger.info("Bảng comparisons không tồn tại, tạo mới...")
-            cursor.execute('''
-            CREATE TABLE comparisons (
-                id TEXT PRIMARY KEY,
-                timestamp TEXT NOT NULL,
-                conversation_id TEXT NOT NULL,
-                query TEXT NOT NULL,
-                chosen TEXT NOT NULL,
-                rejected TEXT NOT NULL,
-                chosen_model TEXT NOT NULL,
-                rejected_model TEXT NOT NULL,
-                metadata TEXT
-            )
-            ''')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_comparisons_conversation ON comparisons(conversation_id)')
-            logger.info("Đã tạo bảng comparisons mới")
-        else:
-            logger.info("Bảng comparisons đã tồn tại")
-            
-            # Kiểm tra cấu trúc bảng comparisons
-            cursor.execute("PRAGMA table_info(comparisons)")
-            columns = {col[1]: col for col in cursor.fetchall()}
-            
-            if "conversation_id" not in columns:
-                logger.warning("Cột conversation_id không tồn tại trong bảng comparisons, tiến hành sửa chữa...")
-                
-                # Tạo bảng tạm
-                cursor.execute('''
-                CREATE TABLE comparisons_temp (
-                    id TEXT PRIMARY KEY,
-                    timestamp TEXT NOT NULL,
-                    conversation_id TEXT NOT NULL,
-                    query TEXT NOT NULL,
-                    chosen TEXT NOT NULL,
-                    rejected TEXT NOT NULL,
-                    chosen_model TEXT NOT NULL,
-                    rejected_model TEXT NOT NULL,
-                    metadata TEXT
-                )
-                ''')
-                
-                try:
-                    # Lấy tên của các cột hiện có
-                    existing_columns = list(columns.keys())
-                    column_str = ", ".join(existing_columns)
-                    
-                    # Sao chép dữ liệu 
-                    cursor.execute(f"INSERT INTO comparisons_temp ({column_str}, conversation_id) SELECT {column_str}, '' FROM comparisons")
-                    copy_count = cursor.rowcount
-                    logger.info(f"Đã sao chép {copy_count} dòng dữ liệu từ bảng comparisons")
-                    
-                    # Xóa bảng cũ
-                    cursor.execute("DROP TABLE comparisons")
-                    
-                    # Đổi tên bảng tạm
-                    cursor.execute("ALTER TABLE comparisons_temp RENAME TO comparisons")
-                    
-                    # Tạo lại chỉ mục
-                    cursor.execute('CREATE INDEX IF NOT EXISTS idx_comparisons_conversation ON comparisons(conversation_id)')
-                    
-                    logger.info("Đã sửa chữa thành công bảng comparisons")
-                except Exception as e:
-                    logger.error(f"Lỗi khi sao chép dữ liệu comparisons: {e}")
-        
-        # Kiểm tra bảng stats
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='stats'")
-        stats_exists = cursor.fetchone() is not None
-        
-        if not stats_exists:
-            logger.info("Bảng stats không tồn tại, tạo mới...")
-            cursor.execute('''
-            CREATE TABLE stats (
-                id TEXT PRIMARY KEY,
-                timestamp TEXT NOT NULL,
-                stat_type TEXT NOT NULL,
-                value REAL NOT NULL,
-                metadata TEXT
-            )
-            ''')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_stats_type ON stats(stat_type)')
-            logger.info("Đã tạo bảng stats mới")
+        # Ứng dụng có thể đang ghi trong lúc nâng cấp: chờ khóa thay vì lỗi ngay
+        conn.execute("PRAGMA busy_timeout=5000")
+
+        before = database_size(conn, db_path)
+        log_size("trước", before)
+
+        version = get_schema_version(conn)
+        target = SCHEMA_VERSION if target_version is None else target_version
+        if version >= target:
+            logger.info(f"Schema đã ở phiên bản {version}, không cần nâng cấp")
         else:
-            logger.info("Bảng stats đã tồn tại")
-        
-        conn.commit()
-        logger.info("Sửa chữa database hoàn tất thành công!")
+            if backup and not backup_database(conn, db_path):
+                return False
+
+            new_version = migrate(conn, batch_size, target_version)
+            logger.info(f"Đã nâng cấp schema từ phiên bản {version} lên {new_version}")
+
+        if prune_texts and get_schema_version(conn) >= 6:
+            logger.info(f"Đã xóa {prune_unreferenced_texts(conn)} văn bản không còn được tham chiếu")
+
+        if vacuum:
+            logger.info("Đang chạy VACUUM...")
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        after = database_size(conn, db_path)
+        log_size("sau", after)
+        used_before = before["page_bytes"] - before["free_bytes"]
+        used_after = after["page_bytes"] - after["free_bytes"]
+        if used_before:
+            logger.info(f"Dữ liệu thay đổi {format_size(used_after - used_before)} "
+                        f"({(used_after - used_before) / used_before:+.1%})")
         return True
-        
+
     except Exception as e:
-        logger.error(f"Lỗi khi sửa chữa database: {e}")
-        if conn:
-            conn.rollback()
+        logger.error(f"Lỗi khi nâng cấp database: {e}")
         return False
     finally:
         if conn:
             conn.close()
 
+def print_status(db_path: str) -> None:
+    """Hiển thị phiên bản schema hiện tại và các bản nâng cấp còn thiếu"""
+    conn = sqlite3.connect(db_path)
+    try:
+        version = get_schema_version(conn)
+        size = database_size(conn, db_path)
+        texts = get_text_stats(conn) if version >= 6 else None
+    finally:
+        conn.close()
+
+    print(f"Database: {db_path}")
+    print(f"Kích thước: file {format_size(size['file_bytes'])}, trống {format_size(size['free_bytes'])}")
+    if texts:
+        print(f"Bảng texts: {texts['texts']} văn bản, {format_size(texts['original_bytes'])} gốc, "
+              f"{format_size(texts['stored_bytes'])} sau khi nén")
+    print(f"Phiên bản schema: {version} (mới nhất: {SCHEMA_VERSION})")
+    for migration_version, description, _ in MIGRATIONS:
+        state = "đã áp dụng" if migration_version <= version else "chưa áp dụng"
+        print(f"  {migration_version}. {description} - {state}")
+
 def main():
     """Main function"""
     args = parse_args()
-    
+
     # Thiết lập logging
     global logger
     log_level = getattr(logging, args.log_level)
     logger = setup_logging(log_level)
-    
+
+    if args.status:
+        if not os.path.exists(args.db):
+            logger.error(f"Database không tồn tại: {args.db}")
+            sys.exit(1)
+        print_status(args.db)
+        return
+
     # In thông tin
-    logger.info(f"Bắt đầu sửa chữa database: {args.db}")
+    logger.info(f"Bắt đầu nâng cấp database: {args.db}")
     if args.backup:
-        logger.info("Sẽ tạo bản sao lưu trước khi sửa chữa")
-    if args.force:
-        logger.info("Chế độ force được bật: sẽ ghi đè các bảng hiện có nếu cần")
-    
-    # Sửa chữa database
-    success = fix_database_schema(args.db, force=args.force, backup=args.backup)
-    
+        logger.info("Sẽ tạo bản sao lưu trước khi nâng cấp")
+
+    # Nâng cấp database
+    success = fix_database_schema(args.db, backup=args.backup, batch_size=args.batch_size,
+                                  target_version=args.target_version, prune_texts=args.prune_texts,
+                                  vacuum=args.vacuum)
+
     if success:
-        logger.info("Sửa chữa database thành công!")
+        logger.info("Nâng cấp database thành công!")
     else:
-        logger.error("Sửa chữa database thất bại!")
+        logger.error("Nâng cấp database thất bại!")
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -40,177 +40,68 @@ def parse_args():
     
     return parser.parse_args()
 
-def filter_by_period(data: List[Dict], period: str) -> List[Dict]:
+def period_start(period: str) -> Optional[str]:
     """
-    Lọc dữ liệu theo khoảng thời gian
+    Tính thời điểm bắt đầu của khoảng thời gian phân tích
     
     Args:
-        data: Danh sách dữ liệu
         period: Khoảng thời gian (day, week, month, all)
         
     Returns:
-        Danh sách dữ liệu đã lọc
+        Thời điểm ISO hoặc None nếu lấy toàn bộ
     """
-    if period == "all":
-        return data
-        
-    now = datetime.now()
-    
-    if period == "day":
-        start_time = now - timedelta(days=1)
-    elif period == "week":
-        start_time = now - timedelta(days=7)
-    elif period == "month":
-        start_time = now - timedelta(days=30)
-    else:
-        return data
-        
-    # Chuyển đổi sang datetime và lọc
-    filtered_data = []
-    for item in data:
-        timestamp_str = item.get("timestamp", "")
-        try:
-            timestamp = datetime.fromisoformat(timestamp_str)
-            if timestamp >= start_time:
-                filtered_data.append(item)
-        except (ValueError, TypeError):
-            # Bỏ qua nếu định dạng timestamp không hợp lệ
-            continue
-            
-    return filtered_data
+    days = {"day": 1, "week": 7, "month": 30}.get(period)
+    if days is None:
+        return None
+    return (datetime.now() - timedelta(days=days)).isoformat()
 
-def filter_by_model(data: List[Dict], model_name: str) -> List[Dict]:
+def generate_stats(store: FeedbackStore, period: str = "all", model_name: Optional[str] = None) -> Dict[str, Any]:
     """
-    Lọc dữ liệu theo tên mô hình
+    Tạo thống kê từ dữ liệu phản hồi. Việc lọc và tổng hợp được thực hiện bằng GROUP BY trong
+    SQL (FeedbackStore.get_report_stats), Python chỉ tính các giá trị dẫn xuất. Bản ghi đã chuyển
+    vào kho lưu trữ (archive_old_data) vẫn được tính, nên báo cáo không bị thiếu cho các khoảng
+    thời gian trước hạn lưu giữ.
     
     Args:
-        data: Danh sách dữ liệu
-        model_name: Tên mô hình
+        store: Kho phản hồi
+        period: Khoảng thời gian (day, week, month, all)
+        model_name: Tên mô hình (tùy chọn)
         
     Returns:
-        Danh sách dữ liệu đã lọc
+        Dict chứa các thống kê (rỗng nếu không tổng hợp được)
     """
-    if not model_name:
-        return data
-        
-    filtered_data = []
-    for item in data:
-        if item.get("type") == "pairwise_comparison":
-            if (item.get("chosen_model") == model_name or 
-                item.get("rejected_model") == model_name):
-                filtered_data.append(item)
-        else:
-            if item.get("selected_response") == model_name:
-                filtered_data.append(item)
-                
-    return filtered_data
-
-def generate_stats(feedback_data: List[Dict]) -> Dict[str, Any]:
-    """
-    Tạo thống kê từ dữ liệu phản hồi
-    
-    Args:
-        feedback_data: Danh sách phản hồi
+    report = store.get_report_stats(since=period_start(period), model=model_name or None)
+    if not report:
+        return {}
         
-    Returns:
-        Dict chứa các thống kê
-    """
-    # Phân loại dữ liệu
-    feedback_items = [item for item in feedback_data if item.get("type") != "pairwise_comparison"]
-    comparison_items = [item for item in feedback_data if item.get("type") == "pairwise_comparison"]
-    
-    # Thống kê chung
-    total_feedback = len(feedback_items)
-    total_comparisons = len(comparison_items)
-    
-    # Thống kê điểm phản hồi
-    scores = [item.get("feedback_score") for item in feedback_items if item.get("feedback_score") is not None]
-    avg_score = sum(scores) / len(scores) if scores else 0
-    
-    score_distribution = {
-        "excellent": sum(1 for s in scores if s >= 0.8),
-        "good": sum(1 for s in scores if 0.6 <= s < 0.8),
-        "average": sum(1 for s in scores if 0.4 <= s < 0.6),
-        "poor": sum(1 for s in scores if 0.2 <= s < 0.4),
-        "bad": sum(1 for s in scores if s < 0.2)
-    }
-    
-    # Thống kê theo mô hình
-    model_stats = {}
-    for item in feedback_items:
-        model = item.get("selected_response", "unknown")
-        if model not in model_stats:
-            model_stats[model] = {
-                "count": 0,
-                "scores": [],
-                "wins": 0,
-                "losses": 0
-            }
-        
-        model_stats[model]["count"] += 1
-        if item.get("feedback_score") is not None:
-            model_stats[model]["scores"].append(item.get("feedback_score"))
-    
-    # Thêm thông tin từ so sánh cặp
-    for item in comparison_items:
-        chosen = item.get("chosen_model", "unknown")
-        rejected = item.get("rejected_model", "unknown")
-        
-        if chosen not in model_stats:
-            model_stats[chosen] = {"count": 0, "scores": [], "wins": 0, "losses": 0}
-        if rejected not in model_stats:
-            model_stats[rejected] = {"count": 0, "scores": [], "wins": 0, "losses": 0}
-            
-        model_stats[chosen]["wins"] += 1
-        model_stats[rejected]["losses"] += 1
+    general = report["general"]
     
     # Tính toán thêm các thống kê cho mỗi mô hình
+    model_stats = report["models"]
     for model, stats in model_stats.items():
-        stats["avg_score"] = sum(stats["scores"]) / len(stats["scores"]) if stats["scores"] else 0
+        stats["avg_score"] = stats["score_sum"] / stats["score_count"] if stats["score_count"] else 0
         stats["win_rate"] = (stats["wins"] / (stats["wins"] + stats["losses"])) if (stats["wins"] + stats["losses"]) > 0 else 0
         
-    # Thống kê theo thời gian
-    timestamps = [datetime.fromisoformat(item.get("timestamp", datetime.now().isoformat())) 
-                 for item in feedback_data if item.get("timestamp")]
-    earliest = min(timestamps) if timestamps else datetime.now()
-    latest = max(timestamps) if timestamps else datetime.now()
-    timespan = (latest - earliest).days + 1
-    
-    # Thống kê theo ngày
-    daily_stats = {}
-    for item in feedback_data:
-        try:
-            date_str = datetime.fromisoformat(item.get("timestamp", "")).strftime("%Y-%m-%d")
-            if date_str not in daily_stats:
-                daily_stats[date_str] = {
-                    "feedback_count": 0,
-                    "comparison_count": 0,
-                    "scores": []
-                }
-                
-            if item.get("type") == "pairwise_comparison":
-                daily_stats[date_str]["comparison_count"] += 1
-            else:
-                daily_stats[date_str]["feedback_count"] += 1
-                if item.get("feedback_score") is not None:
-                    daily_stats[date_str]["scores"].append(item.get("feedback_score"))
-                    
-        except (ValueError, TypeError, AttributeError):
-            continue
-    
     # Tính điểm trung bình theo ngày
+    daily_stats = dict(sorted(report["daily"].items()))
     for date, stats in daily_stats.items():
-        stats["avg_score"] = sum(stats["scores"]) / len(stats["scores"]) if stats["scores"] else None
+        stats["avg_score"] = stats["score_sum"] / stats["score_count"] if stats["score_count"] else None
+        
+    # Thống kê theo thời gian
+    earliest = datetime.fromisoformat(general["earliest"]) if general["earliest"] else datetime.now()
+    latest = datetime.fromisoformat(general["latest"]) if general["latest"] else datetime.now()
     
     return {
         "general": {
-            "total_feedback": total_feedback,
-            "total_comparisons": total_comparisons,
-            "avg_score": avg_score,
-            "score_distribution": score_distribution,
+            "total_feedback": general["total_feedback"],
+            "total_comparisons": general["total_comparisons"],
+            "archived_feedback": general["archived_feedback"],
+            "archived_comparisons": general["archived_comparisons"],
+            "avg_score": general["score_sum"] / general["score_count"] if general["score_count"] else 0,
+            "score_distribution": general["score_distribution"],
             "earliest_date": earliest.isoformat(),
             "latest_date": latest.isoformat(),
-            "timespan_days": timespan
+            "timespan_days": (latest - earliest).days + 1
         },
         "models": model_stats,
         "daily": daily_stats
@@ -562,6 +453,7 @@ def generate_markdown_report(stats: Dict[str, Any], chart_files: List[str], outp
 
 - **Tổng số phản hồi:** {stats["general"]["total_feedback"]}
 - **Tổng số so sánh:** {stats["general"]["total_comparisons"]}
+- **Đọc từ kho lưu trữ:** {stats["general"]["archived_feedback"]} phản hồi, {stats["general"]["archived_comparisons"]} so sánh
 - **Điểm trung bình:** {stats["general"]["avg_score"]:.2f}
 - **Khoảng thời gian:** {stats["general"]["timespan_days"]} ngày ({stats["general"]["earliest_date"]} đến {stats["general"]["latest_date"]})
 
@@ -646,6 +538,8 @@ def export_to_csv(stats: Dict[str, Any], output_dir: str) -> List[str]:
         writer.writerow(['Metric', 'Value'])
         writer.writerow(['Total Feedback', stats["general"]["total_feedback"]])
         writer.writerow(['Total Comparisons', stats["general"]["total_comparisons"]])
+        writer.writerow(['Archived Feedback', stats["general"]["archived_feedback"]])
+        writer.writerow(['Archived Comparisons', stats["general"]["archived_comparisons"]])
         writer.writerow(['Average Score', stats["general"]["avg_score"]])
         writer.writerow(['Timespan (days)', stats["general"]["timespan_days"]])
         writer.writerow(['Earliest Date', stats["general"]["earliest_date"]])
@@ -735,25 +629,20 @@ def main():
     # Khởi tạo FeedbackStore
     store = FeedbackStore(args.db)
     
-    # Lấy tất cả phản hồi
-    logger.info("Đang lấy dữ liệu phản hồi...")
-    feedback_data = store.get_all_feedback()
-    logger.info(f"Đã lấy {len(feedback_data)} bản ghi phản hồi")
-    
-    # Lọc dữ liệu
-    feedback_data = filter_by_period(feedback_data, args.period)
-    if args.model:
-        feedback_data = filter_by_model(feedback_data, args.model)
-    logger.info(f"Còn lại {len(feedback_data)} bản ghi sau khi lọc")
+    # Lọc và tổng hợp trong cơ sở dữ liệu
+    logger.info("Đang tạo thống kê...")
+    stats = generate_stats(store, args.period, args.model)
+    if not stats:
+        logger.error("Không thể tổng hợp thống kê")
+        return
+    logger.info(f"Đã tổng hợp {stats['general']['total_feedback']} phản hồi và "
+                f"{stats['general']['total_comparisons']} so sánh (trong đó {stats['general']['archived_feedback']} "
+                f"phản hồi và {stats['general']['archived_comparisons']} so sánh từ kho lưu trữ)")
     
-    if not feedback_data:
+    if stats["general"]["total_feedback"] + stats["general"]["total_comparisons"] == 0:
         logger.warning("Không có dữ liệu để tạo báo cáo")
         return
     
-    # Tạo thống kê
-    logger.info("Đang tạo thống kê...")
-    stats = generate_stats(feedback_data)
-    
     # Tạo biểu đồ nếu yêu cầu
     chart_files = []
     if args.visualize:
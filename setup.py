@@ -30,6 +30,10 @@ setup(
         "pydantic>=1.9.0",
         "colorlog>=6.7.0",
     ],
+    extras_require={
+        # Nén câu trả lời trong cơ sở dữ liệu phản hồi bằng zstd (mặc định dùng zlib)
+        "zstd": ["zstandard>=0.21.0"],
+    },
     entry_points={
         "console_scripts": [
             "passt=main:main",
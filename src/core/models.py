@@ -6,7 +6,9 @@ import os
 import time
 import json
 import logging
+import threading
 import requests
+from collections import deque
 from typing import Dict, List, Any, Optional, Tuple, Union
 
 logger = logging.getLogger(__name__)
@@ -45,6 +47,12 @@ class ModelManager:
         # Thông tin hiệu suất
         self.performance_stats = {}
         
+        # Cửa sổ độ trễ gần đây của từng mô hình (để tính p50/p95) và số yêu cầu đang xử lý
+        self.latency_window = self.ollama_config.get("latency_window", 200)
+        self.latency_samples: Dict[str, deque] = {}
+        self.active_requests = 0
+        self._stats_lock = threading.Lock()
+        
         logger.info(f"Đã khởi tạo ModelManager với {len(self.models)} mô hình")
         
     def _load_models(self) -> Dict[str, Dict[str, Any]]:
@@ -65,6 +73,15 @@ class ModelManager:
                 
         return models_dict
     
+    def reload_models(self) -> None:
+        """
+        Tải lại danh sách mô hình từ cấu hình hiện tại
+        
+        Bảng mô hình mới được gán thay thế, bộ đệm và thống kê hiệu suất được giữ nguyên.
+        """
+        self.models = self._load_models()
+        logger.info(f"Đã tải lại {len(self.models)} mô hình")
+    
     def list_models(self) -> List[str]:
         """
         Lấy danh sách tên các mô hình hiện có
@@ -130,6 +147,8 @@ class ModelManager:
             
         # Gửi truy vấn đến API
         start_time = time.time()
+        with self._stats_lock:
+            self.active_requests += 1
         try:
             response = self._query_ollama(model_name, prompt, system_prompt, model_params)
             
@@ -167,6 +186,10 @@ class ModelManager:
             }
             
             return error_result
+            
+        finally:
+            with self._stats_lock:
+                self.active_requests -= 1
     
     def _query_ollama(self, model_name: str, prompt: str, 
                     system_prompt: str, params: Dict[str, Any]) -> Dict[str, Any]:
@@ -231,28 +254,35 @@ class ModelManager:
             completion_time: Thời gian hoàn thành (giây)
             token_count: Số lượng token đã xử lý
         """
-        if model_name not in self.performance_stats:
-            self.performance_stats[model_name] = {
-                "count": 0,
-                "total_time": 0,
-                "total_tokens": 0,
-                "avg_time": 0,
-                "avg_tokens": 0,
-                "tokens_per_second": 0
+        with self._stats_lock:
+            samples = self.latency_samples.get(model_name)
+            if samples is None:
+                samples = deque(maxlen=self.latency_window)
+                self.latency_samples[model_name] = samples
+            samples.append(completion_time)
+            
+            # Copy-on-write: tạo bản ghi mới rồi thay thế cả dict, để luồng đọc
+            # không bao giờ thấy thống kê đang cập nhật dở
+            previous = self.performance_stats.get(model_name, {})
+            count = previous.get("count", 0) + 1
+            total_time = previous.get("total_time", 0) + completion_time
+            total_tokens = previous.get("total_tokens", 0) + token_count
+            
+            stats = {
+                "count": count,
+                "total_time": total_time,
+                "total_tokens": total_tokens,
+                # Các giá trị trung bình
+                "avg_time": total_time / count,
+                "avg_tokens": total_tokens / count,
+                # Tốc độ xử lý token
+                "tokens_per_second": (token_count / completion_time if completion_time > 0
+                                      else previous.get("tokens_per_second", 0))
             }
             
-        stats = self.performance_stats[model_name]
-        stats["count"] += 1
-        stats["total_time"] += completion_time
-        stats["total_tokens"] += token_count
-        
-        # Cập nhật các giá trị trung bình
-        stats["avg_time"] = stats["total_time"] / stats["count"]
-        stats["avg_tokens"] = stats["total_tokens"] / stats["count"]
-        
-        # Tốc độ xử lý token
-        if completion_time > 0:
-            stats["tokens_per_second"] = token_count / completion_time
+            performance_stats = dict(self.performance_stats)
+            performance_stats[model_name] = stats
+            self.performance_stats = performance_stats
     
     def get_performance_stats(self, model_name: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -268,10 +298,42 @@ class ModelManager:
             return self.performance_stats.get(model_name, {})
         return self.performance_stats
     
+    def get_latency_stats(self, model_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Lấy độ trễ p50/p95 trên cửa sổ các yêu cầu gần đây
+        
+        Args:
+            model_name: Tên mô hình cụ thể (tùy chọn)
+            
+        Returns:
+            Dict chứa p50, p95, số mẫu và tốc độ token của mô hình
+            (hoặc Dict tên mô hình -> thống kê nếu không chỉ định mô hình)
+        """
+        with self._stats_lock:
+            samples_by_model = {name: sorted(samples) for name, samples in self.latency_samples.items()
+                                if model_name is None or name == model_name}
+                                
+        latency_stats = {}
+        for name, samples in samples_by_model.items():
+            if not samples:
+                continue
+            latency_stats[name] = {
+                "p50": samples[min(len(samples) - 1, int(len(samples) * 0.50))],
+                "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                "samples": len(samples),
+                "tokens_per_second": self.performance_stats.get(name, {}).get("tokens_per_second", 0)
+            }
+            
+        if model_name:
+            return latency_stats.get(model_name, {})
+        return latency_stats
+    
     def clear_cache(self) -> None:
         """Xóa bộ đệm câu trả lời"""
         self.response_cache.clear()
         
     def reset_stats(self) -> None:
         """Đặt lại thống kê hiệu suất"""
-        self.performance_stats.clear()
\ No newline at end of file
+        with self._stats_lock:
+            self.performance_stats = {}
+            self.latency_samples.clear()
\ No newline at end of file
@@ -52,8 +52,13 @@ class EnhancedPersonalAssistant:
         self.current_conversation_id = None
         self.conversation_history = []
         
-        # Bộ nhớ cache cho các câu trả lời
+        # Bộ nhớ cache cho các câu trả lời, thời gian trả lời và mẫu prompt đã dùng tương ứng
         self.response_cache = {}
+        self.response_latency = {}
+        self.template_cache = {}
+        
+        # Bộ theo dõi tự động tải lại cấu hình (được gán bởi AssistantFactory nếu bật)
+        self.config_watcher = None
         
         logger.info("Đã khởi tạo Enhanced Personal Assistant với RLHF và DPO")
         
@@ -86,6 +91,7 @@ class EnhancedPersonalAssistant:
         # Tối ưu hóa truy vấn nếu được bật
         optimized_query = query
         query_analysis = {}
+        template_used = None
         
         if self.optimization_enabled:
             try:
@@ -95,6 +101,7 @@ class EnhancedPersonalAssistant:
                 if optimization_result:
                     optimized_query = optimization_result.get("optimized_prompt", query)
                     query_analysis = optimization_result.get("analysis", {})
+                    template_used = optimization_result.get("template_used")
             except Exception as e:
                 logger.error(f"Lỗi khi tối ưu hóa truy vấn: {e}")
         
@@ -104,7 +111,7 @@ class EnhancedPersonalAssistant:
         
         if self.auto_select_model and not selected_model:
             try:
-                selected_model = self.feedback_manager.select_best_model(
+                selected_model, selection_rationale = self.feedback_manager.select_model_with_info(
                     query, query_analysis)
                 
                 if selected_model:
@@ -112,7 +119,8 @@ class EnhancedPersonalAssistant:
                     model_selection_info = {
                         "auto_selected": True,
                         "model": selected_model,
-                        "reason": "Dựa trên phân tích điểm mạnh của mô hình và yêu cầu của câu hỏi"
+                        "reason": "Dựa trên phân tích điểm mạnh của mô hình và yêu cầu của câu hỏi",
+                        **selection_rationale
                     }
             except Exception as e:
                 logger.error(f"Lỗi khi tự động chọn mô hình: {e}")
@@ -165,7 +173,8 @@ class EnhancedPersonalAssistant:
             "optimized": self.optimization_enabled,
             "auto_model_selection": model_selection_info if self.auto_select_model else {},
             "group_discussion": group_discussion_info if group_discussion_used else {},
-            "query_analysis": query_analysis if self.optimization_enabled else {}
+            "query_analysis": query_analysis if self.optimization_enabled else {},
+            "template_used": template_used
         }
         
         # Lưu kết quả vào cache
@@ -203,7 +212,9 @@ class EnhancedPersonalAssistant:
             responses=cached_responses,
             selected_response=selected_response,
             feedback_score=feedback_score,
-            feedback_text=feedback_text
+            feedback_text=feedback_text,
+            latencies=self.response_latency.get(query),
+            template_used=self.template_cache.get(query)
         )
         
         return success
@@ -222,6 +233,8 @@ class EnhancedPersonalAssistant:
         self.current_conversation_id = f"conv_{int(time.time())}"
         self.conversation_history = []
         self.response_cache = {}
+        self.response_latency = {}
+        self.template_cache = {}
         
     def toggle_optimization(self, enabled: bool) -> None:
         """
@@ -286,6 +299,9 @@ class EnhancedPersonalAssistant:
             }
         }
         
+        if self.config_watcher is not None:
+            stats["config_reload"] = self.config_watcher.get_stats()
+        
         return stats
     
     def export_feedback_data(self, export_dir: Optional[str] = None) -> str:
@@ -300,6 +316,12 @@ class EnhancedPersonalAssistant:
         """
         return self.feedback_manager.export_feedback_data(export_dir)
     
+    def close(self) -> None:
+        """Dừng tự động tải lại cấu hình rồi đóng Feedback Optimization Manager"""
+        if self.config_watcher is not None:
+            self.config_watcher.stop()
+        self.feedback_manager.close()
+    
     def _update_conversation_history(self, query: str, response: str) -> None:
         """
         Cập nhật lịch sử hội thoại
@@ -343,6 +365,9 @@ class EnhancedPersonalAssistant:
             self.response_cache[query] = {}
             
         self.response_cache[query][model_used] = response
+        self.response_latency.setdefault(query, {})[model_used] = result.get("completion_time", 0)
+        if result.get("template_used"):
+            self.template_cache[query] = result["template_used"]
     
     def _get_cached_responses(self, query: str) -> Dict[str, str]:
         """
@@ -13,6 +13,7 @@ from src.core.assistant import PersonalAssistant
 from src.core.group_discussion import GroupDiscussionManager
 from src.optimization.manager import FeedbackOptimizationManager
 from src.integration.enhanced_assistant import EnhancedPersonalAssistant
+from src.utils.config_watcher import ConfigWatcher
 
 logger = logging.getLogger(__name__)
 
@@ -42,14 +43,11 @@ class AssistantFactory:
             config_dir = os.path.dirname(config_path)
             
             # Tải cấu hình mô hình
-            models_path = os.path.join(config_dir, "models.yml")
-            if os.path.exists(models_path):
-                with open(models_path, 'r', encoding='utf-8') as f:
-                    models_config = yaml.safe_load(f)
-                if models_config:
-                    config["models"] = models_config.get("models", [])
-                    if "group_discussion" in models_config:
-                        config["group_discussion"] = models_config["group_discussion"]
+            models_config = AssistantFactory.load_models_config(config_dir)
+            if models_config:
+                config["models"] = models_config.get("models", [])
+                if "group_discussion" in models_config:
+                    config["group_discussion"] = models_config["group_discussion"]
             
             # Tải cấu hình tối ưu hóa
             optimization_path = os.path.join(config_dir, "optimization.yml")
@@ -57,7 +55,8 @@ class AssistantFactory:
                 with open(optimization_path, 'r', encoding='utf-8') as f:
                     optimization_config = yaml.safe_load(f)
                 if optimization_config:
-                    config["optimization"] = optimization_config
+                    # File có khóa gốc "optimization", bỏ lớp bọc ngoài nếu có
+                    config["optimization"] = optimization_config.get("optimization", optimization_config)
             
             # Thiết lập đường dẫn đến thư mục cấu hình
             if "system" not in config:
@@ -77,6 +76,63 @@ class AssistantFactory:
                 }
             }
     
+    @staticmethod
+    def load_models_config(config_dir: str) -> Optional[Dict[str, Any]]:
+        """
+        Đọc file cấu hình mô hình (models.yml).
+        
+        Args:
+            config_dir: Thư mục cấu hình
+            
+        Returns:
+            Dict cấu hình mô hình hoặc None nếu không có file
+        """
+        models_path = os.path.join(config_dir, "models.yml")
+        if not os.path.exists(models_path):
+            return None
+            
+        with open(models_path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+    
+    @staticmethod
+    def create_config_watcher(config: Dict[str, Any], model_manager: ModelManager,
+                              feedback_manager: FeedbackOptimizationManager) -> ConfigWatcher:
+        """
+        Tạo bộ theo dõi tự động tải lại mẫu prompt và cấu hình mô hình.
+        
+        Args:
+            config: Cấu hình hệ thống (dùng chung giữa các thành phần)
+            model_manager: Đối tượng quản lý mô hình
+            feedback_manager: Đối tượng quản lý tối ưu hóa phản hồi
+            
+        Returns:
+            Đối tượng ConfigWatcher (chưa khởi động)
+        """
+        system_config = config.get("system", {})
+        config_dir = system_config.get("config_dir", "config")
+        watcher = ConfigWatcher(interval=system_config.get("reload_interval", 2.0))
+        
+        def reload_templates(path: str) -> bool:
+            return feedback_manager.response_optimizer.reload_templates()
+        
+        def reload_models(path: str) -> bool:
+            models_config = AssistantFactory.load_models_config(config_dir)
+            if not models_config or not isinstance(models_config.get("models"), list):
+                logger.error(f"File cấu hình mô hình không hợp lệ: {path}")
+                return False
+                
+            # Gán thay thế trong cấu hình dùng chung rồi để các thành phần tự tải lại
+            if "group_discussion" in models_config:
+                config["group_discussion"] = models_config["group_discussion"]
+            config["models"] = models_config["models"]
+            model_manager.reload_models()
+            feedback_manager.preference_optimizer.reload_models()
+            return True
+        
+        watcher.watch(os.path.join(config_dir, "prompt_templates.yml"), reload_templates)
+        watcher.watch(os.path.join(config_dir, "models.yml"), reload_models)
+        return watcher
+    
     @staticmethod
     def create_model_manager(config: Dict[str, Any]) -> ModelManager:
         """
@@ -134,18 +190,20 @@ class AssistantFactory:
             raise
     
     @staticmethod
-    def create_feedback_optimization_manager(config: Dict[str, Any]) -> FeedbackOptimizationManager:
+    def create_feedback_optimization_manager(config: Dict[str, Any],
+                                             model_manager: Optional[ModelManager] = None) -> FeedbackOptimizationManager:
         """
         Tạo đối tượng quản lý tối ưu hóa phản hồi.
         
         Args:
             config: Cấu hình hệ thống
+            model_manager: Đối tượng quản lý mô hình, cung cấp độ trễ thực đo (tùy chọn)
             
         Returns:
             Đối tượng FeedbackOptimizationManager đã được cấu hình
         """
         try:
-            feedback_manager = FeedbackOptimizationManager(config)
+            feedback_manager = FeedbackOptimizationManager(config, model_manager)
             return feedback_manager
         except Exception as e:
             logger.error(f"Lỗi khi tạo FeedbackOptimizationManager: {e}")
@@ -167,7 +225,7 @@ class AssistantFactory:
             model_manager = AssistantFactory.create_model_manager(config)
             base_assistant = AssistantFactory.create_base_assistant(config, model_manager)
             group_manager = AssistantFactory.create_group_discussion_manager(config, model_manager)
-            feedback_manager = AssistantFactory.create_feedback_optimization_manager(config)
+            feedback_manager = AssistantFactory.create_feedback_optimization_manager(config, model_manager)
             
             # Tạo trợ lý nâng cao
             enhanced_assistant = EnhancedPersonalAssistant(
@@ -189,6 +247,12 @@ class AssistantFactory:
             if not feedback_config.get("enabled", True):
                 enhanced_assistant.toggle_feedback_collection(False)
             
+            # Tự động tải lại cấu hình khi file thay đổi
+            if config.get("system", {}).get("hot_reload", False):
+                watcher = AssistantFactory.create_config_watcher(config, model_manager, feedback_manager)
+                watcher.start()
+                enhanced_assistant.config_watcher = watcher
+            
             logger.info("Đã tạo EnhancedPersonalAssistant thành công")
             return enhanced_assistant
             
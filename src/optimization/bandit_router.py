@@ -0,0 +1,315 @@
+"""
+Module định tuyến mô hình bằng contextual bandit (LinUCB)
+"""
+
+import logging
+import re
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Danh mục đặc trưng lấy từ kết quả phân tích của ResponseOptimizer
+QUERY_TYPES = ["how_to", "why", "what_is", "comparison", "example", "list",
+               "opinion", "prediction", "question", "statement"]
+DOMAINS = ["technology", "business", "science", "health", "education", "arts", "lifestyle", "general"]
+FORMAT_REQUIREMENTS = ["requires_list", "requires_step_by_step", "requires_examples", "requires_summary",
+                       "requires_comparison", "requires_pros_cons", "requires_table", "requires_diagram"]
+
+FEATURE_NAMES = (
+    ["bias", "complexity", "requires_code", "requires_reasoning", "requires_creativity", "urgent"]
+    + [f"query_type:{query_type}" for query_type in QUERY_TYPES]
+    + [f"domain:{domain}" for domain in DOMAINS]
+    + FORMAT_REQUIREMENTS
+)
+
+_MODEL_SIZE_PATTERN = re.compile(r"(\d+(?:\.\d+)?)b\b", re.IGNORECASE)
+
+def estimate_model_cost(model_name: str, models_config: List[Dict[str, Any]]) -> float:
+    """
+    Ước lượng chi phí tương đối (0-1) của mô hình theo kích thước tham số trong tên
+    (ví dụ "deepseek-r1:8b" -> 8B) so với mô hình lớn nhất trong cấu hình
+
+    Args:
+        model_name: Tên mô hình
+        models_config: Danh sách cấu hình mô hình
+
+    Returns:
+        Chi phí tương đối (0.5 nếu không xác định được kích thước)
+    """
+    sizes = {}
+    for model_config in models_config:
+        name = model_config.get("name", "")
+        match = _MODEL_SIZE_PATTERN.search(name)
+        if match:
+            sizes[name] = float(match.group(1))
+
+    largest = max(sizes.values()) if sizes else 0.0
+    if model_name not in sizes or largest <= 0:
+        return 0.5
+
+    return sizes[model_name] / largest
+
+class LinUCBRouter:
+    """
+    Định tuyến truy vấn tới mô hình bằng LinUCB (disjoint):
+    - Mỗi mô hình có một mô hình tuyến tính riêng ước lượng phần thưởng từ đặc trưng truy vấn
+    - Phần thưởng = chất lượng - latency_weight * độ trễ chuẩn hóa - cost_weight * chi phí mô hình
+    - Chọn mô hình có cận trên tin cậy (UCB) cao nhất để vừa khai thác vừa khám phá
+    - Ma trận nghịch đảo được cập nhật bằng công thức Sherman-Morrison, O(d^2) mỗi phản hồi
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Khởi tạo router
+
+        Args:
+            config: Cấu hình hệ thống
+        """
+        self.config = config
+        self.routing_config = config.get("optimization", {}).get("routing", {})
+
+        self.alpha = self.routing_config.get("alpha", 0.5)
+        self.ridge_lambda = self.routing_config.get("ridge_lambda", 1.0)
+        self.latency_weight = self.routing_config.get("latency_weight", 0.2)
+        self.latency_reference = self.routing_config.get("latency_reference", 10.0)
+        self.cost_weight = self.routing_config.get("cost_weight", 0.2)
+        self.prior_weight = self.routing_config.get("prior_weight", 0.1)
+        self.model_costs = dict(self.routing_config.get("model_costs", {}))
+
+        self.dimension = len(FEATURE_NAMES)
+
+        # Tham số của từng mô hình: bộ (A^-1, b, theta = A^-1 b) không bị sửa tại chỗ. Luồng ghi
+        # (giữ _lock) tạo bộ mới rồi gán thay thế một lần, nên luồng đọc không cần khóa và không
+        # bao giờ thấy A^-1 và theta của hai lần cập nhật khác nhau
+        self._arms: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        self._update_count: Dict[str, int] = {}
+        self._selection_count: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def build_features(self, query_analysis: Dict[str, Any]) -> np.ndarray:
+        """
+        Chuyển kết quả phân tích truy vấn thành vector đặc trưng
+
+        Args:
+            query_analysis: Kết quả phân tích truy vấn
+
+        Returns:
+            Vector đặc trưng độ dài self.dimension
+        """
+        features = np.zeros(self.dimension, dtype=np.float64)
+        features[0] = 1.0
+        features[1] = min(float(query_analysis.get("complexity", 0) or 0), 10.0) / 10.0
+        features[2] = 1.0 if query_analysis.get("requires_code") else 0.0
+        features[3] = 1.0 if query_analysis.get("requires_reasoning") else 0.0
+        features[4] = 1.0 if query_analysis.get("requires_creativity") else 0.0
+        features[5] = 1.0 if query_analysis.get("urgency") == "high" else 0.0
+
+        offset = 6
+        query_type = query_analysis.get("query_type")
+        if query_type in QUERY_TYPES:
+            features[offset + QUERY_TYPES.index(query_type)] = 1.0
+
+        offset += len(QUERY_TYPES)
+        domain = query_analysis.get("domain")
+        if domain in DOMAINS:
+            features[offset + DOMAINS.index(domain)] = 1.0
+
+        offset += len(DOMAINS)
+        format_reqs = query_analysis.get("format_requirements", {})
+        for i, requirement in enumerate(FORMAT_REQUIREMENTS):
+            if format_reqs.get(requirement):
+                features[offset + i] = 1.0
+
+        return features
+
+    def select(self, query_analysis: Dict[str, Any], model_names: List[str],
+               prior_scores: Optional[Dict[str, float]] = None) -> Optional[str]:
+        """
+        Chọn mô hình có cận trên tin cậy cao nhất
+
+        Args:
+            query_analysis: Kết quả phân tích truy vấn
+            model_names: Danh sách mô hình khả dụng
+            prior_scores: Điểm tiên nghiệm của mô hình (ví dụ: điểm theo điểm mạnh), dùng khi chưa có dữ liệu
+
+        Returns:
+            Tên mô hình được chọn hoặc None
+        """
+        if not model_names:
+            return None
+
+        scores = self.score(query_analysis, model_names, prior_scores)
+        best_model = max(scores.items(), key=lambda x: x[1])[0]
+
+        with self._lock:
+            self._selection_count[best_model] = self._selection_count.get(best_model, 0) + 1
+
+        return best_model
+
+    def score(self, query_analysis: Dict[str, Any], model_names: List[str],
+              prior_scores: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        """
+        Tính điểm UCB của từng mô hình
+
+        Args:
+            query_analysis: Kết quả phân tích truy vấn
+            model_names: Danh sách mô hình
+            prior_scores: Điểm tiên nghiệm của mô hình (tùy chọn)
+
+        Returns:
+            Dict tên mô hình -> điểm UCB
+        """
+        features = self.build_features(query_analysis)
+        prior_scores = prior_scores or {}
+
+        scores = {}
+        for model_name in model_names:
+            a_inv, theta = self._get_arm(model_name)
+            expected = float(theta @ features)
+            uncertainty = float(np.sqrt(max(features @ a_inv @ features, 0.0)))
+            scores[model_name] = (expected + self.alpha * uncertainty
+                                  + self.prior_weight * prior_scores.get(model_name, 0.0))
+
+        return scores
+
+    def update(self, query_analysis: Dict[str, Any], model_name: str, quality: float,
+               latency: Optional[float] = None) -> float:
+        """
+        Cập nhật mô hình tuyến tính của một mô hình từ phản hồi
+
+        Args:
+            query_analysis: Kết quả phân tích truy vấn
+            model_name: Tên mô hình đã trả lời
+            quality: Điểm chất lượng (0-1)
+            latency: Thời gian trả lời (giây, tùy chọn)
+
+        Returns:
+            Phần thưởng đã dùng để cập nhật
+        """
+        reward = self.compute_reward(model_name, quality, latency)
+        features = self.build_features(query_analysis)
+
+        with self._lock:
+            a_inv, b, _ = self._arms.get(model_name) or self._new_arm()
+
+            # Sherman-Morrison: (A + x x^T)^-1 = A^-1 - (A^-1 x)(A^-1 x)^T / (1 + x^T A^-1 x)
+            a_inv_x = a_inv @ features
+            a_inv = a_inv - np.outer(a_inv_x, a_inv_x) / (1.0 + features @ a_inv_x)
+            b = b + reward * features
+
+            self._arms[model_name] = (a_inv, b, a_inv @ b)
+            self._update_count[model_name] = self._update_count.get(model_name, 0) + 1
+
+        return reward
+
+    def compute_reward(self, model_name: str, quality: float, latency: Optional[float] = None) -> float:
+        """
+        Tính phần thưởng từ chất lượng, độ trễ và chi phí
+
+        Args:
+            model_name: Tên mô hình
+            quality: Điểm chất lượng (0-1)
+            latency: Thời gian trả lời (giây, tùy chọn)
+
+        Returns:
+            Phần thưởng
+        """
+        reward = float(quality) - self.cost_weight * self.get_model_cost(model_name)
+        if latency is not None and self.latency_reference > 0:
+            reward -= self.latency_weight * min(latency / self.latency_reference, 1.0)
+        return reward
+
+    def get_model_cost(self, model_name: str) -> float:
+        """
+        Lấy chi phí tương đối (0-1) của mô hình
+
+        Lấy từ routing.model_costs nếu có, nếu không ước lượng theo kích thước mô hình.
+
+        Args:
+            model_name: Tên mô hình
+
+        Returns:
+            Chi phí tương đối
+        """
+        if model_name in self.model_costs:
+            return float(self.model_costs[model_name])
+
+        cost = estimate_model_cost(model_name, self.config.get("models", []))
+        self.model_costs[model_name] = cost
+        return cost
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Lấy thống kê của router
+
+        Returns:
+            Dict chứa tham số và số lần chọn/cập nhật của từng mô hình
+        """
+        with self._lock:
+            return {
+                "strategy": "linucb",
+                "alpha": self.alpha,
+                "dimension": self.dimension,
+                "latency_weight": self.latency_weight,
+                "cost_weight": self.cost_weight,
+                "selection_count": dict(self._selection_count),
+                "update_count": dict(self._update_count)
+            }
+
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Lấy tham số đã học để lưu snapshot
+
+        Returns:
+            Dict chứa A^-1, b và số lần chọn/cập nhật của từng mô hình
+        """
+        with self._lock:
+            return {
+                "dimension": self.dimension,
+                "arms": {
+                    model_name: {
+                        "a_inv": a_inv.tolist(),
+                        "b": b.tolist()
+                    }
+                    for model_name, (a_inv, b, _) in self._arms.items()
+                },
+                "selection_count": dict(self._selection_count),
+                "update_count": dict(self._update_count)
+            }
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        """
+        Khôi phục tham số từ snapshot (bỏ qua nếu số chiều đặc trưng đã thay đổi)
+
+        Args:
+            state: Trạng thái do get_state tạo ra
+        """
+        if state.get("dimension") != self.dimension:
+            logger.warning("Bỏ qua trạng thái LinUCB do số chiều đặc trưng không khớp")
+            return
+
+        with self._lock:
+            for model_name, arm in state.get("arms", {}).items():
+                a_inv = np.array(arm["a_inv"], dtype=np.float64)
+                b = np.array(arm["b"], dtype=np.float64)
+                self._arms[model_name] = (a_inv, b, a_inv @ b)
+            self._selection_count.update(state.get("selection_count", {}))
+            self._update_count.update(state.get("update_count", {}))
+
+    def _get_arm(self, model_name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Lấy (A^-1, theta) của mô hình, khởi tạo (khi giữ khóa) nếu chưa có"""
+        arm = self._arms.get(model_name)
+        if arm is None:
+            with self._lock:
+                arm = self._arms.get(model_name)
+                if arm is None:
+                    arm = self._new_arm()
+                    self._arms[model_name] = arm
+        return arm[0], arm[2]
+
+    def _new_arm(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Tham số ban đầu (A^-1, b, theta) của một mô hình chưa có dữ liệu"""
+        return np.eye(self.dimension) / self.ridge_lambda, np.zeros(self.dimension), np.zeros(self.dimension)
@@ -0,0 +1,109 @@
+"""
+Module ước lượng độ mạnh của mô hình từ so sánh cặp theo mô hình Bradley-Terry
+"""
+
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def build_win_matrices(winners: np.ndarray, losers: np.ndarray, groups: np.ndarray,
+                       n_items: int, n_groups: int) -> np.ndarray:
+    """
+    Gộp các so sánh cặp thành ma trận số trận thắng theo nhóm (bỏ so sánh mô hình với chính nó)
+
+    Args:
+        winners: Chỉ số mô hình thắng của từng so sánh
+        losers: Chỉ số mô hình thua của từng so sánh
+        groups: Chỉ số nhóm (ví dụ: loại truy vấn) của từng so sánh
+        n_items: Số mô hình
+        n_groups: Số nhóm
+
+    Returns:
+        Mảng (n_groups, n_items, n_items), phần tử [g, i, j] là số lần i thắng j trong nhóm g
+    """
+    distinct = winners != losers
+    winners, losers, groups = winners[distinct], losers[distinct], groups[distinct]
+    flat_index = (groups.astype(np.int64) * n_items + winners) * n_items + losers
+    counts = np.bincount(flat_index, minlength=n_groups * n_items * n_items)
+    return counts.reshape(n_groups, n_items, n_items).astype(np.float64)
+
+def fit_bradley_terry(wins: np.ndarray, prior: float = 1.0, max_iterations: int = 500,
+                      tolerance: float = 1e-8) -> np.ndarray:
+    """
+    Ước lượng độ mạnh Bradley-Terry bằng thuật toán MM (Hunter, 2004), cho nhiều nhóm cùng lúc.
+
+    Chi phí mỗi vòng lặp là O(nhóm x mô hình^2), không phụ thuộc vào số so sánh
+    vì các so sánh đã được gộp thành ma trận thắng.
+
+    Args:
+        wins: Ma trận thắng (n_items, n_items) hoặc (n_groups, n_items, n_items)
+        prior: Số trận ảo mỗi cặp thắng nhau (làm mịn, tránh độ mạnh 0 hoặc vô hạn)
+        max_iterations: Số vòng lặp tối đa
+        tolerance: Ngưỡng hội tụ của thay đổi tương đối lớn nhất
+
+    Returns:
+        Độ mạnh cùng hình dạng (n_items,) hoặc (n_groups, n_items), trung bình nhân bằng 1
+        (toàn 1 khi có ít hơn 2 mô hình)
+    """
+    if wins.shape[-1] < 2:
+        return np.ones(wins.shape[:-1])
+
+    single = wins.ndim == 2
+    wins = wins[np.newaxis] if single else wins
+    n_items = wins.shape[-1]
+
+    off_diagonal = 1.0 - np.eye(n_items)
+    wins = wins + prior * off_diagonal
+    games = wins + np.swapaxes(wins, 1, 2)
+    total_wins = wins.sum(axis=2)
+
+    strengths = np.ones(wins.shape[:2])
+    for iteration in range(max_iterations):
+        pair_sums = strengths[:, :, np.newaxis] + strengths[:, np.newaxis, :]
+        denominator = (games / pair_sums).sum(axis=2)
+        updated = total_wins / denominator
+
+        # Chuẩn hóa trung bình nhân về 1 trong từng nhóm
+        updated /= np.exp(np.log(updated).mean(axis=1, keepdims=True))
+
+        change = np.max(np.abs(updated - strengths) / strengths)
+        strengths = updated
+        if change < tolerance:
+            logger.debug(f"Bradley-Terry hội tụ sau {iteration + 1} vòng lặp")
+            break
+
+    return strengths[0] if single else strengths
+
+def expected_win_rates(strengths: np.ndarray) -> np.ndarray:
+    """
+    Xác suất thắng kỳ vọng của mỗi mô hình trước một đối thủ ngẫu nhiên khác
+
+    Args:
+        strengths: Độ mạnh (n_items,) hoặc (n_groups, n_items)
+
+    Returns:
+        Mảng cùng hình dạng với strengths
+    """
+    n_items = strengths.shape[-1]
+    if n_items < 2:
+        return np.full(strengths.shape, 0.5)
+
+    probabilities = strengths[..., :, np.newaxis] / (strengths[..., :, np.newaxis] + strengths[..., np.newaxis, :])
+    # Bỏ cặp mô hình với chính nó (xác suất 0.5)
+    return (probabilities.sum(axis=-1) - 0.5) / (n_items - 1)
+
+def to_elo(strengths: np.ndarray, base: float = 1500.0) -> np.ndarray:
+    """
+    Đổi độ mạnh Bradley-Terry sang thang điểm Elo
+
+    Args:
+        strengths: Độ mạnh
+        base: Điểm Elo của mô hình có độ mạnh 1
+
+    Returns:
+        Điểm Elo
+    """
+    return base + 400.0 * np.log10(strengths)
@@ -0,0 +1,122 @@
+"""
+Module quản lý kết nối SQLite dùng lại cho kho phản hồi
+"""
+
+import sqlite3
+import threading
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Cấu hình PRAGMA mặc định cho mỗi kết nối
+DEFAULT_CONNECTION_OPTIONS = {
+    "journal_mode": "WAL",       # Người đọc không chặn người ghi
+    "synchronous": "NORMAL",     # An toàn với WAL, fsync ít hơn FULL
+    "mmap_size": 268435456,      # 256MB ánh xạ bộ nhớ cho thao tác đọc
+    "cache_size": -65536,        # 64MB bộ nhớ đệm trang (giá trị âm tính theo KiB)
+    "busy_timeout": 5000         # Chờ khóa ghi tối đa 5 giây thay vì lỗi ngay
+}
+
+class SQLiteConnectionManager:
+    """
+    Quản lý kết nối SQLite bền vững theo luồng:
+    - Mỗi luồng dùng lại một kết nối riêng thay vì mở/đóng ở mỗi thao tác
+    - Các PRAGMA (WAL, synchronous, mmap, cache) được thiết lập một lần khi mở kết nối
+    - close_all() đóng mọi kết nối; các luồng tự mở lại kết nối mới ở lần dùng sau
+    """
+
+    def __init__(self, db_path: str, options: Optional[Dict[str, Any]] = None):
+        """
+        Khởi tạo bộ quản lý kết nối
+
+        Args:
+            db_path: Đường dẫn đến file cơ sở dữ liệu SQLite
+            options: Ghi đè các PRAGMA mặc định (tùy chọn)
+        """
+        self.db_path = db_path
+        self.options = dict(DEFAULT_CONNECTION_OPTIONS)
+        self.options.update(options or {})
+
+        self._local = threading.local()
+        # Kết nối theo luồng: ident -> (luồng, kết nối)
+        self._connections: Dict[int, Tuple[threading.Thread, sqlite3.Connection]] = {}
+        self._lock = threading.Lock()
+        # Tăng mỗi lần close_all() để các luồng biết kết nối cũ đã bị đóng
+        self._generation = 0
+        self._opened = 0
+
+    def get_connection(self) -> sqlite3.Connection:
+        """
+        Lấy kết nối của luồng hiện tại, mở mới nếu chưa có
+
+        Returns:
+            Kết nối SQLite
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.generation == self._generation:
+            return conn
+
+        conn = self._open()
+        current = threading.current_thread()
+        with self._lock:
+            stale = self._prune_finished_threads()
+            self._connections[current.ident] = (current, conn)
+            self._opened += 1
+            self._local.generation = self._generation
+        self._local.conn = conn
+
+        for stale_conn in stale:
+            self._close(stale_conn)
+        return conn
+
+    def _prune_finished_threads(self) -> List[sqlite3.Connection]:
+        """Gỡ kết nối của các luồng đã kết thúc (gọi khi đang giữ khóa)"""
+        finished = [ident for ident, (thread, _) in self._connections.items() if not thread.is_alive()]
+        return [self._connections.pop(ident)[1] for ident in finished]
+
+    def _open(self) -> sqlite3.Connection:
+        """Mở kết nối mới và thiết lập PRAGMA"""
+        # Kết nối chỉ được dùng bởi luồng đã mở nó; tắt kiểm tra để close_all() đóng được từ luồng khác
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        for name in ["journal_mode", "synchronous", "mmap_size", "cache_size", "busy_timeout"]:
+            value = self.options.get(name)
+            if value is None:
+                continue
+            try:
+                conn.execute(f"PRAGMA {name}={value}")
+            except sqlite3.Error as e:
+                logger.warning(f"Không thể thiết lập PRAGMA {name}={value}: {e}")
+
+        return conn
+
+    def close_all(self) -> None:
+        """Đóng mọi kết nối đang mở (ví dụ: trước khi thay thế file cơ sở dữ liệu)"""
+        with self._lock:
+            connections = [conn for _, conn in self._connections.values()]
+            self._connections = {}
+            self._generation += 1
+
+        for conn in connections:
+            self._close(conn)
+
+    def _close(self, conn: sqlite3.Connection) -> None:
+        """Đóng một kết nối, bỏ qua lỗi"""
+        try:
+            conn.close()
+        except Exception as e:
+            logger.error(f"Lỗi khi đóng kết nối SQLite: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Lấy thống kê kết nối
+
+        Returns:
+            Dict chứa số kết nối đang mở và tổng số lần mở kết nối
+        """
+        with self._lock:
+            return {
+                "open_connections": len(self._connections),
+                "connections_opened": self._opened,
+                "journal_mode": self.options.get("journal_mode")
+            }
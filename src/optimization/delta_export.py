@@ -0,0 +1,207 @@
+"""
+Module xuất dữ liệu RLHF tăng dần theo mốc (watermark): mỗi lần xuất chỉ ghi các phản hồi và
+so sánh được thêm hoặc cập nhật sau lần xuất trước (theo bộ đếm thay đổi export_seq), và ghép
+các phần tăng dần thành một bản đầy đủ
+"""
+
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.optimization.feedback_store import FeedbackStore
+from src.utils.export import DEFAULT_SHARD_OPTIONS, ShardedJsonlWriter, open_shard, verify_manifest
+
+logger = logging.getLogger(__name__)
+
+# Các bảng được xuất và tên luồng dữ liệu tương ứng
+DELTA_TABLES = ["feedback", "comparisons"]
+
+WATERMARK_FILE = "watermark.json"
+
+def load_watermark(target_dir: str) -> Dict[str, Any]:
+    """
+    Đọc mốc xuất của một đích xuất
+
+    Args:
+        target_dir: Thư mục của đích xuất
+
+    Returns:
+        Dict với số thứ tự phần tăng dần cuối cùng (delta) và giá trị export_seq cuối cùng đã xuất (seq)
+
+    Raises:
+        ValueError: Nếu mốc được ghi theo định dạng cũ (rowid) và cần xuất lại từ đầu
+    """
+    path = os.path.join(target_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {"delta": 0, "seq": 0, "updated_at": None}
+    with open(path, 'r', encoding='utf-8') as f:
+        watermark = json.load(f)
+    if "seq" not in watermark:
+        raise ValueError(f"Mốc xuất của {target_dir} theo rowid không còn được hỗ trợ, hãy xuất lại từ đầu (--reset)")
+    return watermark
+
+def _save_watermark(target_dir: str, watermark: Dict[str, Any]) -> None:
+    """Ghi mốc xuất (ghi file tạm rồi đổi tên để không bao giờ dở dang)"""
+    path = os.path.join(target_dir, WATERMARK_FILE)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(watermark, f, ensure_ascii=False, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+def _numbered_dirs(target_dir: str, prefix: str) -> List[Tuple[int, str]]:
+    """Các thư mục {prefix}-NNNNNN đã hoàn tất (có manifest), theo thứ tự số tăng dần"""
+    if not os.path.isdir(target_dir):
+        return []
+    found = []
+    for name in os.listdir(target_dir):
+        number = name[len(prefix) + 1:]
+        path = os.path.join(target_dir, name)
+        if (name.startswith(f"{prefix}-") and number.isdigit()
+                and os.path.exists(os.path.join(path, "manifest.json"))):
+            found.append((int(number), path))
+    return sorted(found)
+
+def export_delta(store: FeedbackStore, target_dir: str, to_item: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 rows_per_shard: int = DEFAULT_SHARD_OPTIONS["rows_per_shard"],
+                 compression: str = DEFAULT_SHARD_OPTIONS["compression"],
+                 predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                 batch_size: int = 1000) -> Optional[str]:
+    """
+    Xuất các phản hồi và so sánh được thêm hoặc cập nhật sau mốc của đích xuất thành thư mục
+    delta-NNNNNN (các file JSONL theo phân đoạn kèm manifest), rồi dời mốc. Bản ghi bị ghi đè
+    được xuất lại ở phần tăng dần sau; khi ghép, bản mới nhất của mỗi id được giữ. Mốc chỉ được
+    ghi sau khi phần tăng dần hoàn tất, nên lần xuất bị ngắt sẽ được làm lại từ đầu ở lần sau.
+
+    Args:
+        store: Kho phản hồi
+        target_dir: Thư mục của đích xuất
+        to_item: Hàm chuyển bản ghi của kho phản hồi sang bản ghi xuất (phải giữ trường id)
+        rows_per_shard: Số dòng mỗi file
+        compression: none, gzip hoặc zstd
+        predicate: Chỉ xuất bản ghi thỏa điều kiện (mốc vẫn được dời qua bản ghi bị bỏ qua)
+        batch_size: Số bản ghi đọc mỗi lô
+
+    Returns:
+        Đường dẫn manifest của phần tăng dần, hoặc None nếu không có dữ liệu mới
+
+    Raises:
+        ValueError: Nếu bộ đếm của cơ sở dữ liệu thấp hơn mốc (cơ sở dữ liệu đã bị thay bằng
+            file khác), khi đó cần xuất lại từ đầu
+    """
+    watermark = load_watermark(target_dir)
+    start_seq = watermark["seq"]
+    end_seq = store.get_export_seq()
+
+    if end_seq < start_seq:
+        raise ValueError(f"Bộ đếm thay đổi của cơ sở dữ liệu ({end_seq}) thấp hơn mốc của {target_dir} "
+                         f"({start_seq}): cơ sở dữ liệu đã bị thay thế, hãy xuất lại từ đầu (--reset)")
+    if end_seq == start_seq:
+        logger.info(f"Không có dữ liệu mới kể từ lần xuất {watermark['delta']} của {target_dir}")
+        return None
+
+    delta = watermark["delta"] + 1
+    delta_dir = os.path.join(target_dir, f"delta-{delta:06d}")
+    # Phần còn dở của lần xuất bị ngắt trước đó
+    if os.path.exists(delta_dir):
+        shutil.rmtree(delta_dir)
+
+    with ShardedJsonlWriter(delta_dir, rows_per_shard, compression) as writer:
+        for table in DELTA_TABLES:
+            for record in store.iter_changes(table, start_seq, end_seq, batch_size):
+                if predicate is None or predicate(record):
+                    writer.write(to_item(record), table)
+        manifest = writer.close({"delta": delta, "seq_range": [start_seq, end_seq]})
+
+    _save_watermark(target_dir, {
+        "delta": delta,
+        "seq": end_seq,
+        "updated_at": datetime.now().isoformat()
+    })
+    logger.info(f"Đã xuất phần tăng dần {delta}: {manifest['total_rows']} bản ghi vào {delta_dir}")
+    return writer.manifest_path
+
+def _shard_files(source: str, stream: str) -> List[str]:
+    """Đường dẫn các file phân đoạn của một luồng dữ liệu theo manifest"""
+    with open(os.path.join(source, "manifest.json"), 'r', encoding='utf-8') as f:
+        return [os.path.join(source, shard["file"]) for shard in json.load(f)["shards"] if shard["stream"] == stream]
+
+def consolidate(target_dir: str, rows_per_shard: int = DEFAULT_SHARD_OPTIONS["rows_per_shard"],
+                compression: str = DEFAULT_SHARD_OPTIONS["compression"], prune: bool = False) -> Optional[str]:
+    """
+    Ghép bản đầy đủ gần nhất (snapshot-NNNNNN) với các phần tăng dần sau nó thành bản đầy đủ mới.
+    Bản ghi bị ghi đè có mặt ở nhiều phần: lượt đọc đầu tìm phần chứa bản mới nhất của mỗi id
+    (chỉ giữ id trong bộ nhớ), lượt sau chép nguyên dòng từ phần đó mà không mã hóa lại.
+    Bản ghi đã bị xóa hoặc chuyển vào kho lưu trữ vẫn nằm trong bản đầy đủ.
+
+    Args:
+        target_dir: Thư mục của đích xuất
+        rows_per_shard: Số dòng mỗi file của bản đầy đủ
+        compression: none, gzip hoặc zstd
+        prune: True để xóa mọi phần tăng dần và bản đầy đủ cũ đã nằm trong bản đầy đủ mới
+
+    Returns:
+        Đường dẫn manifest của bản đầy đủ, hoặc None nếu chưa có dữ liệu
+
+    Raises:
+        ValueError: Nếu file của bản đầy đủ hoặc phần tăng dần không khớp manifest
+    """
+    snapshots = _numbered_dirs(target_dir, "snapshot")
+    base_number, base_dir = snapshots[-1] if snapshots else (0, None)
+    deltas = [(number, path) for number, path in _numbered_dirs(target_dir, "delta") if number > base_number]
+
+    if not deltas:
+        if base_dir:
+            logger.info(f"Bản đầy đủ {base_dir} đã bao gồm mọi phần tăng dần")
+            return os.path.join(base_dir, "manifest.json")
+        logger.info(f"Chưa có phần tăng dần nào trong {target_dir}")
+        return None
+
+    sources = ([base_dir] if base_dir else []) + [path for _, path in deltas]
+    for source in sources:
+        invalid = verify_manifest(os.path.join(source, "manifest.json"))
+        if invalid:
+            raise ValueError(f"File không khớp manifest trong {source}: {', '.join(invalid)}")
+
+    last_number = deltas[-1][0]
+    snapshot_dir = os.path.join(target_dir, f"snapshot-{last_number:06d}")
+    tmp_dir = f"{snapshot_dir}.tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+
+    with ShardedJsonlWriter(tmp_dir, rows_per_shard, compression) as writer:
+        for stream in DELTA_TABLES:
+            # Mỗi id xuất hiện nhiều nhất một lần trong một phần: ghi nhận phần mới nhất chứa nó
+            latest: Dict[Any, int] = {}
+            for index, source in enumerate(sources):
+                for path in _shard_files(source, stream):
+                    with open_shard(path) as shard_file:
+                        for line in shard_file:
+                            latest[json.loads(line).get("id")] = index
+
+            for index, source in enumerate(sources):
+                for path in _shard_files(source, stream):
+                    with open_shard(path) as shard_file:
+                        for line in shard_file:
+                            if latest[json.loads(line).get("id")] == index:
+                                writer.write_line(line, stream)
+        manifest = writer.close({
+            "snapshot": last_number,
+            "base_snapshot": base_number or None,
+            "deltas": [number for number, _ in deltas]
+        })
+    os.replace(tmp_dir, snapshot_dir)
+
+    logger.info(f"Đã ghép {len(deltas)} phần tăng dần thành bản đầy đủ {snapshot_dir} "
+                f"({manifest['total_rows']} bản ghi)")
+
+    if prune:
+        # Gồm cả các phần tăng dần đã được ghép ở lần ghép trước mà không xóa
+        merged = [path for number, path in _numbered_dirs(target_dir, "delta") if number <= last_number]
+        merged += [path for _, path in snapshots]
+        for path in merged:
+            shutil.rmtree(path)
+        logger.info(f"Đã xóa {len(merged)} thư mục đã được ghép")
+
+    return os.path.join(snapshot_dir, "manifest.json")
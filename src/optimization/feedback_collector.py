@@ -7,10 +7,12 @@ import json
 import time
 import random
 import logging
+import uuid
 from typing import Dict, List, Any, Optional, Tuple, Set, Union
 from datetime import datetime
 
 from src.optimization.feedback_store import FeedbackStore
+from src.utils.export import DEFAULT_SHARD_OPTIONS, ShardedJsonlWriter
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +39,11 @@ class FeedbackCollector:
         self.collect_comparisons = self.feedback_config.get("collect_comparisons", True)
         self.feedback_cache_size = self.feedback_config.get("feedback_cache_size", 1000)
         
+        # Cấu hình xuất dữ liệu: jsonl (chia phân đoạn, nén, có manifest) hoặc json (một file)
+        self.export_config = dict(DEFAULT_SHARD_OPTIONS)
+        self.export_config["format"] = "jsonl"
+        self.export_config.update(self.feedback_config.get("export", {}))
+        
         # Bộ nhớ cache cho phản hồi
         self.feedback_cache = {}
         
@@ -48,7 +55,8 @@ class FeedbackCollector:
     def collect_feedback(self, conversation_id: str, query: str, 
                         responses: Dict[str, str], selected_response: str,
                         feedback_score: Optional[float] = None,
-                        feedback_text: Optional[str] = None) -> Optional[str]:
+                        feedback_text: Optional[str] = None,
+                        metadata: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """
         Thu thập phản hồi về câu trả lời
         
@@ -59,9 +67,10 @@ class FeedbackCollector:
             selected_response: Tên mô hình được chọn
             feedback_score: Điểm đánh giá (0-1, tùy chọn)
             feedback_text: Phản hồi dạng văn bản (tùy chọn)
+            metadata: Thông tin bổ sung lưu kèm bản ghi (ví dụ: mẫu prompt đã dùng)
             
         Returns:
-            ID phản hồi nếu thành công, None nếu không
+            Bản ghi phản hồi đã lưu (gồm id và timestamp) nếu thành công, None nếu không
         """
         if not self.enabled:
             return None
@@ -69,7 +78,7 @@ class FeedbackCollector:
         try:
             # Tạo bản ghi phản hồi
             feedback_record = {
-                "id": f"fb_{int(time.time())}_{random.randint(1000, 9999)}",
+                "id": f"fb_{int(time.time())}_{uuid.uuid4().hex[:12]}",
                 "timestamp": datetime.now().isoformat(),
                 "conversation_id": conversation_id,
                 "query": query,
@@ -78,19 +87,26 @@ class FeedbackCollector:
                 "feedback_score": feedback_score,
                 "feedback_text": feedback_text
             }
-            
-            # Lưu vào cơ sở dữ liệu
-            feedback_id = self.store.save_feedback(feedback_record)
-            
-            # Lưu vào cache
-            self._update_feedback_cache(feedback_id, feedback_record)
+            if metadata:
+                for key, value in metadata.items():
+                    feedback_record.setdefault(key, value)
             
             # Nếu cần thu thập so sánh, tạo các bản ghi so sánh cặp
+            comparisons = []
             if self.collect_comparisons and len(responses) > 1:
-                self._create_pairwise_comparisons(
+                comparisons = self._create_pairwise_comparisons(
                     conversation_id, query, responses, selected_response)
+                    
+            # Lưu phản hồi cùng các so sánh trong một giao dịch
+            saved_ids = self.store.save_feedback_batch([feedback_record], comparisons)
+            if not saved_ids:
+                return None
+            feedback_record["id"] = saved_ids[0]
+            
+            # Lưu vào cache
+            self._update_feedback_cache(feedback_record["id"], feedback_record)
                 
-            return feedback_id
+            return feedback_record
             
         except Exception as e:
             logger.error(f"Lỗi khi thu thập phản hồi: {e}")
@@ -123,38 +139,96 @@ class FeedbackCollector:
     
     def export_feedback_data(self, export_dir: str) -> str:
         """
-        Xuất dữ liệu phản hồi sang định dạng JSON cho RLHF
+        Xuất dữ liệu phản hồi cho RLHF theo định dạng cấu hình (optimization.feedback.export)
         
         Args:
             export_dir: Thư mục đích cho dữ liệu xuất
             
         Returns:
-            Đường dẫn đến file xuất
+            Đường dẫn đến manifest (jsonl) hoặc file xuất (json)
         """
+        if self.export_config.get("format") == "jsonl":
+            return self.export_feedback_shards(export_dir, self.export_config["rows_per_shard"],
+                                               self.export_config["compression"], self.export_config["level"])
+            
         os.makedirs(export_dir, exist_ok=True)
         
         try:
-            # Lấy tất cả phản hồi
-            all_feedback = self.store.get_all_feedback()
-            
             # Tạo tên file với timestamp
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             export_file = os.path.join(export_dir, f"feedback_export_{timestamp}.json")
             
-            # Chuyển đổi định dạng dữ liệu
-            export_data = self._convert_to_rlhf_format(all_feedback)
-            
-            # Ghi ra file
+            # Ghi lần lượt từng bản ghi để bộ nhớ không phụ thuộc vào kích thước cơ sở dữ liệu
+            feedback_count = 0
+            comparison_count = 0
             with open(export_file, 'w', encoding='utf-8') as f:
-                json.dump(export_data, f, ensure_ascii=False, indent=2)
+                f.write('{\n  "feedback": [')
+                for record in self.store.iter_feedback():
+                    self._write_json_item(f, self._to_rlhf_feedback(record), feedback_count)
+                    feedback_count += 1
+                    
+                f.write('\n  ],\n  "comparisons": [')
+                for record in self.store.iter_comparisons():
+                    self._write_json_item(f, self._to_rlhf_comparison(record), comparison_count)
+                    comparison_count += 1
+                    
+                metadata = {
+                    "timestamp": datetime.now().isoformat(),
+                    "version": "1.0",
+                    "record_count": feedback_count + comparison_count
+                }
+                metadata_json = json.dumps(metadata, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+                f.write(f'\n  ],\n  "metadata": {metadata_json}\n}}\n')
                 
-            logger.info(f"Đã xuất {len(all_feedback)} bản ghi phản hồi đến {export_file}")
+            logger.info(f"Đã xuất {feedback_count + comparison_count} bản ghi phản hồi đến {export_file}")
             return export_file
             
         except Exception as e:
             logger.error(f"Lỗi khi xuất dữ liệu phản hồi: {e}")
             return ""
     
+    def export_feedback_shards(self, export_dir: str,
+                               rows_per_shard: int = DEFAULT_SHARD_OPTIONS["rows_per_shard"],
+                               compression: str = DEFAULT_SHARD_OPTIONS["compression"],
+                               level: int = DEFAULT_SHARD_OPTIONS["level"]) -> str:
+        """
+        Xuất dữ liệu phản hồi ra các file JSONL theo phân đoạn (feedback-*, comparisons-*) kèm
+        manifest, đọc kho phản hồi theo lô nên bộ nhớ không phụ thuộc vào kích thước dữ liệu
+        
+        Args:
+            export_dir: Thư mục đích cho dữ liệu xuất
+            rows_per_shard: Số dòng mỗi file (<= 0 để không chia)
+            compression: none, gzip hoặc zstd
+            level: Mức nén
+            
+        Returns:
+            Đường dẫn đến manifest.json hoặc chuỗi rỗng nếu lỗi
+        """
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_dir = os.path.join(export_dir, f"feedback_export_{timestamp}")
+        
+        try:
+            with ShardedJsonlWriter(output_dir, rows_per_shard, compression, level) as writer:
+                for record in self.store.iter_feedback():
+                    writer.write(self._to_rlhf_feedback(record), "feedback")
+                for record in self.store.iter_comparisons():
+                    writer.write(self._to_rlhf_comparison(record), "comparisons")
+                manifest = writer.close({"version": "1.0", "source": "feedback_collector"})
+                
+            logger.info(f"Đã xuất {manifest['total_rows']} bản ghi phản hồi thành {len(manifest['shards'])} "
+                        f"file trong {output_dir}")
+            return writer.manifest_path
+            
+        except Exception as e:
+            logger.error(f"Lỗi khi xuất dữ liệu phản hồi: {e}")
+            return ""
+    
+    @staticmethod
+    def _write_json_item(f, item: Dict[str, Any], index: int) -> None:
+        """Ghi một phần tử của mảng JSON (thụt lề như json.dump với indent=2)"""
+        separator = ",\n" if index else "\n"
+        f.write(separator + "    " + json.dumps(item, ensure_ascii=False, indent=2).replace("\n", "\n    "))
+    
     def toggle_collection(self, enabled: bool) -> None:
         """
         Bật/tắt thu thập phản hồi
@@ -188,7 +262,7 @@ class FeedbackCollector:
                 del self.feedback_cache[key]
     
     def _create_pairwise_comparisons(self, conversation_id: str, query: str,
-                                    responses: Dict[str, str], selected_response: str) -> None:
+                                    responses: Dict[str, str], selected_response: str) -> List[Dict[str, Any]]:
         """
         Tạo các bản ghi so sánh cặp cho DPO
         
@@ -197,11 +271,16 @@ class FeedbackCollector:
             query: Truy vấn người dùng
             responses: Dict các câu trả lời với key là model_name
             selected_response: Tên mô hình được chọn
+            
+        Returns:
+            Danh sách bản ghi so sánh (chưa lưu)
         """
+        comparisons = []
+        
         # Lấy câu trả lời được chọn
         chosen_text = responses.get(selected_response, "")
         if not chosen_text:
-            return
+            return comparisons
             
         # Tạo các bản ghi so sánh
         for model, response in responses.items():
@@ -210,7 +289,7 @@ class FeedbackCollector:
                 
             # Tạo bản ghi DPO với "chọn" và "từ chối"
             comparison_record = {
-                "id": f"comp_{int(time.time())}_{random.randint(1000, 9999)}",
+                "id": f"comp_{int(time.time())}_{uuid.uuid4().hex[:12]}",
                 "timestamp": datetime.now().isoformat(),
                 "conversation_id": conversation_id,
                 "query": query,
@@ -221,51 +300,46 @@ class FeedbackCollector:
                 "type": "pairwise_comparison"
             }
             
-            # Lưu vào cơ sở dữ liệu
-            self.store.save_comparison(comparison_record)
+            comparisons.append(comparison_record)
+            
+        return comparisons
     
-    def _convert_to_rlhf_format(self, feedback_records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    @staticmethod
+    def _to_rlhf_feedback(record: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Chuyển đổi bản ghi phản hồi sang định dạng thích hợp cho RLHF
+        Chuyển đổi bản ghi phản hồi sang định dạng RLHF
         
         Args:
-            feedback_records: Danh sách các bản ghi phản hồi
+            record: Bản ghi phản hồi
             
         Returns:
-            Dữ liệu đã được chuyển đổi sang định dạng RLHF
+            Bản ghi theo định dạng RLHF
         """
-        rlhf_data = {
-            "metadata": {
-                "timestamp": datetime.now().isoformat(),
-                "version": "1.0",
-                "record_count": len(feedback_records)
-            },
-            "feedback": [],
-            "comparisons": []
+        return {
+            "id": record.get("id"),
+            "prompt": record.get("query"),
+            "response": record.get("responses", {}).get(record.get("selected_response", "")),
+            "model": record.get("selected_response"),
+            "score": record.get("feedback_score"),
+            "feedback": record.get("feedback_text")
         }
+    
+    @staticmethod
+    def _to_rlhf_comparison(record: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Chuyển đổi bản ghi so sánh cặp sang định dạng RLHF
         
-        # Chuyển đổi từng bản ghi
-        for record in feedback_records:
-            if record.get("type") == "pairwise_comparison":
-                # Bản ghi so sánh
-                rlhf_data["comparisons"].append({
-                    "id": record.get("id"),
-                    "prompt": record.get("query"),
-                    "chosen": record.get("chosen"),
-                    "rejected": record.get("rejected"),
-                    "chosen_model": record.get("chosen_model"),
-                    "rejected_model": record.get("rejected_model")
-                })
-            else:
-                # Bản ghi phản hồi
-                rlhf_record = {
-                    "id": record.get("id"),
-                    "prompt": record.get("query"),
-                    "response": record.get("responses", {}).get(record.get("selected_response", "")),
-                    "model": record.get("selected_response"),
-                    "score": record.get("feedback_score"),
-                    "feedback": record.get("feedback_text")
-                }
-                rlhf_data["feedback"].append(rlhf_record)
-                
-        return rlhf_data
\ No newline at end of file
+        Args:
+            record: Bản ghi so sánh
+            
+        Returns:
+            Bản ghi theo định dạng RLHF
+        """
+        return {
+            "id": record.get("id"),
+            "prompt": record.get("query"),
+            "chosen": record.get("chosen"),
+            "rejected": record.get("rejected"),
+            "chosen_model": record.get("chosen_model"),
+            "rejected_model": record.get("rejected_model")
+        }
@@ -6,13 +6,24 @@ import os
 import sqlite3
 import json
 import logging
-from typing import Dict, List, Any, Optional, Tuple, Union
-from datetime import datetime
+import time
+from typing import Dict, List, Any, Optional, Tuple, Union, Iterator, Callable
+from datetime import datetime, timedelta
 import sys
 
 # Thêm đường dẫn hiện tại vào PYTHONPATH
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
+from src.optimization.db_connection import SQLiteConnectionManager
+from src.optimization.retention import DEFAULT_RETENTION_OPTIONS, FeedbackArchive
+from src.optimization.schema_migrations import (BATCH_PAUSE, DEFAULT_BATCH_SIZE, epoch_to_timestamp,
+                                                get_export_seq, get_schema_version, migrate,
+                                                raise_export_seq, retain_rollups, timestamp_to_epoch)
+from src.optimization.text_store import (TextCodec, get_text_stats, load_texts, prune_unreferenced_texts,
+                                         store_texts, text_hash)
+from src.utils.export import (DEFAULT_SQLITE_BACKUP_OPTIONS, backup_sqlite_database, is_sqlite_database,
+                              rotate_backups)
+
 logger = logging.getLogger(__name__)
 
 class FeedbackStore:
@@ -24,243 +35,205 @@ class FeedbackStore:
     - Thống kê sử dụng
     """
     
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, connection_options: Optional[Dict[str, Any]] = None,
+                 migration_batch_size: int = DEFAULT_BATCH_SIZE,
+                 text_compression: Optional[Dict[str, Any]] = None,
+                 backup_options: Optional[Dict[str, Any]] = None,
+                 retention_options: Optional[Dict[str, Any]] = None):
         """
         Khởi tạo kho lưu trữ phản hồi
         
         Args:
             db_path: Đường dẫn đến file cơ sở dữ liệu SQLite
+            connection_options: Ghi đè PRAGMA của kết nối (journal_mode, synchronous,
+                mmap_size, cache_size, busy_timeout)
+            migration_batch_size: Số dòng mỗi lô khi nâng cấp schema
+            text_compression: Cấu hình nén văn bản câu trả lời (algorithm, min_size, level)
+            backup_options: Cấu hình sao lưu (dir, pages, pause, max_restarts, keep)
+            retention_options: Cấu hình lưu trữ dữ liệu cũ (archive_dir, feedback_days, stats_days,
+                batch_size, compresslevel)
         """
         self.db_path = db_path
+        self.migration_batch_size = migration_batch_size
+        self.text_codec = TextCodec(text_compression)
+        
+        self.backup_options = dict(DEFAULT_SQLITE_BACKUP_OPTIONS)
+        self.backup_options.update(backup_options or {})
+        self.backup_dir = self.backup_options.get("dir") or os.path.join(os.path.dirname(db_path), "backups")
+        
+        # Dữ liệu cũ được chuyển ra file nén theo tháng, đọc lại qua include_archived
+        self.retention_options = dict(DEFAULT_RETENTION_OPTIONS)
+        self.retention_options.update(retention_options or {})
+        self.archive = FeedbackArchive(
+            self.retention_options.get("archive_dir") or os.path.join(os.path.dirname(db_path), "archive"),
+            self.retention_options["compresslevel"])
         
         # Đảm bảo thư mục tồn tại
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         
+        # Mỗi luồng dùng lại một kết nối bền vững
+        self.connections = SQLiteConnectionManager(db_path, connection_options)
+        
         # Khởi tạo cơ sở dữ liệu
         try:
             self._initialize_db()
             logger.info(f"Đã khởi tạo cơ sở dữ liệu phản hồi tại {db_path}")
         except Exception as e:
             logger.error(f"Lỗi khi khởi tạo cơ sở dữ liệu: {e}")
-            # Thử sửa chữa database
-            self._fix_database_schema()
         
     def _initialize_db(self) -> None:
-        """Khởi tạo schema cơ sở dữ liệu"""
-        conn = None
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Bảng phản hồi
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS feedback (
-                id TEXT PRIMARY KEY,
-                timestamp TEXT NOT NULL,
-                conversation_id TEXT NOT NULL,
-                query TEXT NOT NULL,
-                responses TEXT NOT NULL,
-                selected_response TEXT NOT NULL,
-                feedback_score REAL,
-                feedback_text TEXT,
-                metadata TEXT
-            )
-            ''')
-            
-            # Bảng so sánh cặp
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS comparisons (
-                id TEXT PRIMARY KEY,
-                timestamp TEXT NOT NULL,
-                conversation_id TEXT NOT NULL,
-                query TEXT NOT NULL,
-                chosen TEXT NOT NULL,
-                rejected TEXT NOT NULL,
-                chosen_model TEXT NOT NULL,
-                rejected_model TEXT NOT NULL,
-                metadata TEXT
-            )
-            ''')
-            
-            # Bảng thống kê
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS stats (
-                id TEXT PRIMARY KEY,
-                timestamp TEXT NOT NULL,
-                stat_type TEXT NOT NULL,
-                value REAL NOT NULL,
-                metadata TEXT
-            )
-            ''')
-            
-            # Chỉ mục
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_conversation ON feedback(conversation_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback(timestamp)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_comparisons_conversation ON comparisons(conversation_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_stats_type ON stats(stat_type)')
-            
-            conn.commit()
+        """Khởi tạo schema cơ sở dữ liệu (áp dụng các bản nâng cấp còn thiếu)"""
+        self.migrate()
+    
+    def migrate(self, target_version: Optional[int] = None) -> int:
+        """
+        Nâng cấp schema lên phiên bản mới nhất (hoặc phiên bản chỉ định)
+        
+        Args:
+            target_version: Phiên bản đích (tùy chọn)
             
-        except Exception as e:
-            logger.error(f"Lỗi khi khởi tạo cơ sở dữ liệu: {e}")
-            if conn:
-                conn.rollback()
-            raise
-        finally:
-            if conn:
-                conn.close()
+        Returns:
+            Phiên bản schema sau khi nâng cấp
+        """
+        conn = self.connections.get_connection()
+        version = get_schema_version(conn)
+        new_version = migrate(conn, self.migration_batch_size, target_version)
+        if new_version != version:
+            logger.info(f"Đã nâng cấp schema cơ sở dữ liệu phản hồi từ phiên bản {version} lên {new_version}")
+        return new_version
     
-    def _fix_database_schema(self) -> bool:
+    def get_schema_version(self) -> int:
         """
-        Sửa lỗi schema trong database
+        Lấy phiên bản schema hiện tại
         
         Returns:
-            True nếu sửa thành công, False nếu không
+            Phiên bản schema (0 nếu cơ sở dữ liệu chưa được khởi tạo)
         """
-        conn = None
-        try:
-            # Sao lưu database trước khi sửa
-            if os.path.exists(self.db_path):
-                backup_path = f"{self.db_path}.backup"
-                with open(self.db_path, 'rb') as src, open(backup_path, 'wb') as dst:
-                    dst.write(src.read())
-                logger.info(f"Đã sao lưu database vào {backup_path}")
-            
-            # Kết nối đến database
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Kiểm tra xem bảng feedback có tồn tại không
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='feedback'")
-            if cursor.fetchone():
-                # Kiểm tra cấu trúc bảng hiện tại
-                cursor.execute("PRAGMA table_info(feedback)")
-                columns = cursor.fetchall()
-                column_names = [col[1] for col in columns]
-                
-                # Kiểm tra xem cột conversation_id có tồn tại không
-                if "conversation_id" not in column_names:
-                    # Tạo bảng tạm để lưu dữ liệu
-                    cursor.execute("CREATE TABLE feedback_temp AS SELECT * FROM feedback")
-                    
-                    # Xóa bảng cũ
-                    cursor.execute("DROP TABLE feedback")
-                    
-                    # Tạo lại bảng với cấu trúc đúng
-                    cursor.execute('''
-                    CREATE TABLE feedback (
-                        id TEXT PRIMARY KEY,
-                        timestamp TEXT NOT NULL,
-                        conversation_id TEXT NOT NULL,
-                        query TEXT NOT NULL,
-                        responses TEXT NOT NULL,
-                        selected_response TEXT NOT NULL,
-                        feedback_score REAL,
-                        feedback_text TEXT,
-                        metadata TEXT
-                    )
-                    ''')
-                    
-                    # Di chuyển dữ liệu từ bảng tạm sang bảng mới nếu có dữ liệu
-                    try:
-                        cursor.execute("SELECT * FROM feedback_temp LIMIT 1")
-                        row = cursor.fetchone()
-                        if row:
-                            # Lấy tên cột từ bảng tạm
-                            cursor.execute("PRAGMA table_info(feedback_temp)")
-                            temp_columns = cursor.fetchall()
-                            temp_column_names = [col[1] for col in temp_columns]
-                            
-                            # Tìm các cột chung giữa hai bảng
-                            common_columns = [col for col in temp_column_names if col != "conversation_id"]
-                            common_columns_str = ", ".join(common_columns)
-                            
-                            # Copy dữ liệu, đặt conversation_id mặc định là empty string
-                            insert_query = f"INSERT INTO feedback ({common_columns_str}, conversation_id) SELECT {common_columns_str}, '' FROM feedback_temp"
-                            cursor.execute(insert_query)
-                            logger.info(f"Đã di chuyển {cursor.rowcount} bản ghi từ bảng tạm")
-                            
-                    except Exception as e:
-                        logger.error(f"Lỗi khi di chuyển dữ liệu: {e}")
-                    
-                    # Xóa bảng tạm
-                    cursor.execute("DROP TABLE IF EXISTS feedback_temp")
-                    
-                    # Tạo lại chỉ mục
-                    cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_conversation ON feedback(conversation_id)')
-                    cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback(timestamp)')
-                    
-                    conn.commit()
-                    logger.info("Đã sửa cấu trúc bảng feedback, thêm cột conversation_id")
-            else:
-                # Tạo bảng feedback mới nếu chưa tồn tại
-                cursor.execute('''
-                CREATE TABLE feedback (
-                    id TEXT PRIMARY KEY,
-                    timestamp TEXT NOT NULL,
-                    conversation_id TEXT NOT NULL,
-                    query TEXT NOT NULL,
-                    responses TEXT NOT NULL,
-                    selected_response TEXT NOT NULL,
-                    feedback_score REAL,
-                    feedback_text TEXT,
-                    metadata TEXT
-                )
-                ''')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_conversation ON feedback(conversation_id)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback(timestamp)')
-                conn.commit()
-                logger.info("Đã tạo bảng feedback mới")
-            
-            # Kiểm tra bảng comparisons
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='comparisons'")
-            if not cursor.fetchone():
-                # Tạo bảng comparisons nếu chưa tồn tại
-                cursor.execute('''
-                CREATE TABLE comparisons (
-                    id TEXT PRIMARY KEY,
-                    timestamp TEXT NOT NULL,
-                    conversation_id TEXT NOT NULL,
-                    query TEXT NOT NULL,
-                    chosen TEXT NOT NULL,
-                    rejected TEXT NOT NULL,
-                    chosen_model TEXT NOT NULL,
-                    rejected_model TEXT NOT NULL,
-                    metadata TEXT
-                )
-                ''')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_comparisons_conversation ON comparisons(conversation_id)')
-                conn.commit()
-                logger.info("Đã tạo bảng comparisons")
-            
-            # Kiểm tra bảng stats
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='stats'")
-            if not cursor.fetchone():
-                # Tạo bảng stats nếu chưa tồn tại
-                cursor.execute('''
-                CREATE TABLE stats (
-                    id TEXT PRIMARY KEY,
-                    timestamp TEXT NOT NULL,
-                    stat_type TEXT NOT NULL,
-                    value REAL NOT NULL,
-                    metadata TEXT
-                )
-                ''')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_stats_type ON stats(stat_type)')
-                conn.commit()
-                logger.info("Đã tạo bảng stats")
-            
-            logger.info("Đã hoàn thành sửa chữa cấu trúc database")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Lỗi khi sửa chữa database: {e}")
-            if conn:
-                conn.rollback()
-            return False
-        finally:
-            if conn:
-                conn.close()
+        return get_schema_version(self.connections.get_connection())
+    
+    # Ghi đè bằng UPSERT (không dùng INSERT OR REPLACE) để trigger UPDATE trừ dòng cũ khỏi bảng tổng hợp
+    _FEEDBACK_INSERT = '''
+    INSERT INTO feedback 
+    (id, timestamp, conversation_id, query, responses, selected_response, 
+     feedback_score, feedback_text, metadata, ts_epoch, response_hashes, model_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, (SELECT id FROM models WHERE name = ?))
+    ON CONFLICT(id) DO UPDATE SET
+        timestamp = excluded.timestamp, conversation_id = excluded.conversation_id,
+        query = excluded.query, responses = excluded.responses,
+        selected_response = excluded.selected_response, feedback_score = excluded.feedback_score,
+        feedback_text = excluded.feedback_text, metadata = excluded.metadata,
+        ts_epoch = excluded.ts_epoch, response_hashes = excluded.response_hashes,
+        model_id = excluded.model_id
+    '''
+    
+    _COMPARISON_INSERT = '''
+    INSERT INTO comparisons 
+    (id, timestamp, conversation_id, query, chosen, rejected, 
+     chosen_model, rejected_model, metadata, ts_epoch, chosen_hash, rejected_hash,
+     chosen_model_id, rejected_model_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
+            (SELECT id FROM models WHERE name = ?), (SELECT id FROM models WHERE name = ?))
+    ON CONFLICT(id) DO UPDATE SET
+        timestamp = excluded.timestamp, conversation_id = excluded.conversation_id,
+        query = excluded.query, chosen = excluded.chosen, rejected = excluded.rejected,
+        chosen_model = excluded.chosen_model, rejected_model = excluded.rejected_model,
+        metadata = excluded.metadata, ts_epoch = excluded.ts_epoch,
+        chosen_hash = excluded.chosen_hash, rejected_hash = excluded.rejected_hash,
+        chosen_model_id = excluded.chosen_model_id, rejected_model_id = excluded.rejected_model_id
+    '''
+    
+    _MODEL_INSERT = "INSERT OR IGNORE INTO models (name) VALUES (?)"
+    
+    def _write_references(self, conn: sqlite3.Connection, feedback_rows: List[Tuple],
+                          comparison_rows: List[Tuple], texts: Dict[str, str]) -> None:
+        """
+        Thêm tên mô hình mới vào bảng models và văn bản mới vào bảng texts (trong giao dịch của
+        lệnh INSERT đi kèm)
+        """
+        names = {row[5] for row in feedback_rows}
+        for row in comparison_rows:
+            names.update((row[6], row[7]))
+        conn.executemany(self._MODEL_INSERT, [(name,) for name in names])
+        store_texts(conn, texts, self.text_codec)
+    
+    @staticmethod
+    def _text_reference(text: Any, texts: Dict[str, str]) -> str:
+        """Thêm văn bản vào texts và trả về hash của nó"""
+        if not isinstance(text, str):
+            text = json.dumps(text, ensure_ascii=False)
+        hash_value = text_hash(text)
+        texts[hash_value] = text
+        return hash_value
+    
+    @classmethod
+    def _feedback_row(cls, feedback_data: Dict[str, Any], texts: Dict[str, str]) -> Tuple:
+        """
+        Chuyển bản ghi phản hồi thành bộ giá trị cho câu lệnh INSERT; nội dung câu trả lời
+        được thêm vào texts (hash -> văn bản), bản ghi chỉ giữ hash
+        """
+        # Chuyển đổi metadata thành JSON
+        metadata = {k: v for k, v in feedback_data.items() 
+                  if k not in ["id", "timestamp", "conversation_id", "query", 
+                              "responses", "selected_response", 
+                              "feedback_score", "feedback_text", "model_id", "ts_epoch",
+                              "response_hashes"]}
+        metadata_json = json.dumps(metadata, ensure_ascii=False) if metadata else None
+        timestamp = feedback_data.get("timestamp", datetime.now().isoformat())
+        selected_response = feedback_data.get("selected_response", "")
+        
+        response_hashes = {model_name: cls._text_reference(text, texts)
+                           for model_name, text in (feedback_data.get("responses") or {}).items()}
+        
+        return (
+            feedback_data.get("id"),
+            timestamp,
+            # Đảm bảo conversation_id không bị null
+            feedback_data.get("conversation_id", ""),
+            feedback_data.get("query", ""),
+            "",
+            selected_response,
+            feedback_data.get("feedback_score"),
+            feedback_data.get("feedback_text"),
+            metadata_json,
+            timestamp_to_epoch(timestamp),
+            json.dumps(response_hashes, ensure_ascii=False),
+            selected_response
+        )
+    
+    @classmethod
+    def _comparison_row(cls, comparison_data: Dict[str, Any], texts: Dict[str, str]) -> Tuple:
+        """
+        Chuyển bản ghi so sánh thành bộ giá trị cho câu lệnh INSERT; câu trả lời được chọn và bị
+        từ chối được thêm vào texts, bản ghi chỉ giữ hash
+        """
+        # Chuyển đổi metadata thành JSON
+        metadata = {k: v for k, v in comparison_data.items() 
+                  if k not in ["id", "timestamp", "conversation_id", "query", 
+                             "chosen", "rejected", "chosen_model", "rejected_model",
+                             "chosen_model_id", "rejected_model_id", "ts_epoch",
+                             "chosen_hash", "rejected_hash"]}
+        metadata_json = json.dumps(metadata, ensure_ascii=False) if metadata else None
+        timestamp = comparison_data.get("timestamp", datetime.now().isoformat())
+        chosen_model = comparison_data.get("chosen_model", "")
+        rejected_model = comparison_data.get("rejected_model", "")
+        
+        return (
+            comparison_data.get("id"),
+            timestamp,
+            # Đảm bảo conversation_id không bị null
+            comparison_data.get("conversation_id", ""),
+            comparison_data.get("query", ""),
+            "",
+            "",
+            chosen_model,
+            rejected_model,
+            metadata_json,
+            timestamp_to_epoch(timestamp),
+            cls._text_reference(comparison_data.get("chosen", ""), texts),
+            cls._text_reference(comparison_data.get("rejected", ""), texts),
+            chosen_model,
+            rejected_model
+        )
     
     def save_feedback(self, feedback_data: Dict[str, Any]) -> Optional[str]:
         """
@@ -274,7 +247,7 @@ class FeedbackStore:
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.connections.get_connection()
             cursor = conn.cursor()
             
             # Chuẩn bị dữ liệu
@@ -282,37 +255,11 @@ class FeedbackStore:
             if not feedback_id:
                 return None
                 
-            # Đảm bảo conversation_id không bị null
-            conversation_id = feedback_data.get("conversation_id", "")
-            
-            # Chuyển đổi responses thành JSON
-            responses_json = json.dumps(feedback_data.get("responses", {}), 
-                                      ensure_ascii=False)
-            
-            # Chuyển đổi metadata thành JSON
-            metadata = {k: v for k, v in feedback_data.items() 
-                      if k not in ["id", "timestamp", "conversation_id", "query", 
-                                  "responses", "selected_response", 
-                                  "feedback_score", "feedback_text"]}
-            metadata_json = json.dumps(metadata, ensure_ascii=False) if metadata else None
-            
             # Chèn vào cơ sở dữ liệu
-            cursor.execute('''
-            INSERT OR REPLACE INTO feedback 
-            (id, timestamp, conversation_id, query, responses, selected_response, 
-             feedback_score, feedback_text, metadata)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                feedback_id,
-                feedback_data.get("timestamp", datetime.now().isoformat()),
-                conversation_id,
-                feedback_data.get("query", ""),
-                responses_json,
-                feedback_data.get("selected_response", ""),
-                feedback_data.get("feedback_score"),
-                feedback_data.get("feedback_text"),
-                metadata_json
-            ))
+            texts: Dict[str, str] = {}
+            row = self._feedback_row(feedback_data, texts)
+            self._write_references(conn, [row], [], texts)
+            cursor.execute(self._FEEDBACK_INSERT, row)
             
             conn.commit()
             return feedback_id
@@ -321,14 +268,7 @@ class FeedbackStore:
             logger.error(f"Lỗi khi lưu phản hồi: {e}")
             if conn:
                 conn.rollback()
-            # Thử sửa lỗi schema và thử lại
-            if "no such column: conversation_id" in str(e):
-                self._fix_database_schema()
-                return self.save_feedback(feedback_data)
             return None
-        finally:
-            if conn:
-                conn.close()
     
     def save_comparison(self, comparison_data: Dict[str, Any]) -> Optional[str]:
         """
@@ -342,7 +282,7 @@ class FeedbackStore:
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.connections.get_connection()
             cursor = conn.cursor()
             
             # Chuẩn bị dữ liệu
@@ -350,32 +290,11 @@ class FeedbackStore:
             if not comparison_id:
                 return None
                 
-            # Đảm bảo conversation_id không bị null
-            conversation_id = comparison_data.get("conversation_id", "")
-                
-            # Chuyển đổi metadata thành JSON
-            metadata = {k: v for k, v in comparison_data.items() 
-                      if k not in ["id", "timestamp", "conversation_id", "query", 
-                                 "chosen", "rejected", "chosen_model", "rejected_model"]}
-            metadata_json = json.dumps(metadata, ensure_ascii=False) if metadata else None
-            
             # Chèn vào cơ sở dữ liệu
-            cursor.execute('''
-            INSERT OR REPLACE INTO comparisons 
-            (id, timestamp, conversation_id, query, chosen, rejected, 
-             chosen_model, rejected_model, metadata)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                comparison_id,
-                comparison_data.get("timestamp", datetime.now().isoformat()),
-                conversation_id,
-                comparison_data.get("query", ""),
-                comparison_data.get("chosen", ""),
-                comparison_data.get("rejected", ""),
-                comparison_data.get("chosen_model", ""),
-                comparison_data.get("rejected_model", ""),
-                metadata_json
-            ))
+            texts: Dict[str, str] = {}
+            row = self._comparison_row(comparison_data, texts)
+            self._write_references(conn, [], [row], texts)
+            cursor.execute(self._COMPARISON_INSERT, row)
             
             conn.commit()
             return comparison_id
@@ -384,14 +303,67 @@ class FeedbackStore:
             logger.error(f"Lỗi khi lưu so sánh: {e}")
             if conn:
                 conn.rollback()
-            # Thử sửa lỗi schema và thử lại
-            if "no such column: conversation_id" in str(e):
-                self._fix_database_schema()
-                return self.save_comparison(comparison_data)
             return None
-        finally:
-            if conn:
-                conn.close()
+                
+    def save_feedback_batch(self, feedback_list: List[Dict[str, Any]],
+                            comparisons: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+        """
+        Lưu nhiều bản ghi phản hồi (và các so sánh cặp đi kèm) trong một giao dịch
+        
+        Args:
+            feedback_list: Danh sách bản ghi phản hồi
+            comparisons: Danh sách bản ghi so sánh ghi cùng giao dịch (tùy chọn)
+            
+        Returns:
+            Danh sách ID phản hồi đã lưu (rỗng nếu thất bại, khi đó không bản ghi nào được lưu)
+        """
+        texts: Dict[str, str] = {}
+        feedback_rows = [self._feedback_row(data, texts) for data in feedback_list if data.get("id")]
+        comparison_rows = [self._comparison_row(data, texts) for data in comparisons or [] if data.get("id")]
+        if not feedback_rows and not comparison_rows:
+            return []
+            
+        try:
+            conn = self.connections.get_connection()
+            with conn:
+                self._write_references(conn, feedback_rows, comparison_rows, texts)
+                if feedback_rows:
+                    conn.executemany(self._FEEDBACK_INSERT, feedback_rows)
+                if comparison_rows:
+                    conn.executemany(self._COMPARISON_INSERT, comparison_rows)
+                    
+            return [row[0] for row in feedback_rows]
+            
+        except Exception as e:
+            logger.error(f"Lỗi khi lưu lô phản hồi: {e}")
+            return []
+    
+    def save_comparisons_batch(self, comparisons: List[Dict[str, Any]]) -> List[str]:
+        """
+        Lưu nhiều bản ghi so sánh cặp trong một giao dịch
+        
+        Args:
+            comparisons: Danh sách bản ghi so sánh
+            
+        Returns:
+            Danh sách ID so sánh đã lưu (rỗng nếu thất bại)
+        """
+        texts: Dict[str, str] = {}
+        comparison_rows = [self._comparison_row(data, texts) for data in comparisons if data.get("id")]
+        if not comparison_rows:
+            return []
+            
+        try:
+            conn = self.connections.get_connection()
+            with conn:
+                self._write_references(conn, [], comparison_rows, texts)
+                conn.executemany(self._COMPARISON_INSERT, comparison_rows)
+                
+            return [row[0] for row in comparison_rows]
+            
+        except Exception as e:
+            logger.error(f"Lỗi khi lưu lô so sánh: {e}")
+            return []
                 
     # Các phương thức khác giữ nguyên...
     # (Các phương thức get_feedback, get_comparison, get_all_feedback, v.v.)
@@ -408,9 +380,9 @@ class FeedbackStore:
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
+            conn = self.connections.get_connection()
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             
             # Truy vấn cơ sở dữ liệu
             cursor.execute('''
@@ -421,26 +393,11 @@ class FeedbackStore:
             if not row:
                 return None
                 
-            # Chuyển đổi từ Row sang Dict
-            feedback_data = dict(row)
-            
-            # Chuyển đổi JSON thành Dict
-            feedback_data["responses"] = json.loads(feedback_data["responses"])
-            if feedback_data["metadata"]:
-                metadata = json.loads(feedback_data["metadata"])
-                for key, value in metadata.items():
-                    feedback_data[key] = value
-                    
-            del feedback_data["metadata"]
-            
-            return feedback_data
+            return self._parse_feedback_rows([row])[0]
             
         except Exception as e:
             logger.error(f"Lỗi khi lấy phản hồi: {e}")
             return None
-        finally:
-            if conn:
-                conn.close()
     
     def get_comparison(self, comparison_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -454,9 +411,9 @@ class FeedbackStore:
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
+            conn = self.connections.get_connection()
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             
             # Truy vấn cơ sở dữ liệu
             cursor.execute('''
@@ -467,38 +424,28 @@ class FeedbackStore:
             if not row:
                 return None
                 
-            # Chuyển đổi từ Row sang Dict
-            comparison_data = dict(row)
-            
-            # Chuyển đổi JSON thành Dict
-            if comparison_data["metadata"]:
-                metadata = json.loads(comparison_data["metadata"])
-                for key, value in metadata.items():
-                    comparison_data[key] = value
-                    
-            del comparison_data["metadata"]
+            comparison_data = self._parse_comparison_rows([row])[0]
+            del comparison_data["type"]
             
             return comparison_data
             
         except Exception as e:
             logger.error(f"Lỗi khi lấy so sánh: {e}")
             return None
-        finally:
-            if conn:
-                conn.close()
     
     def get_all_feedback(self) -> List[Dict[str, Any]]:
         """
-        Lấy tất cả bản ghi phản hồi
+        Lấy tất cả bản ghi phản hồi (nạp toàn bộ vào bộ nhớ; với cơ sở dữ liệu lớn
+        nên dùng iter_feedback và iter_comparisons)
         
         Returns:
             Danh sách các Dict chứa dữ liệu phản hồi
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
+            conn = self.connections.get_connection()
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             
             # Lấy tất cả phản hồi
             try:
@@ -506,11 +453,7 @@ class FeedbackStore:
                 SELECT * FROM feedback ORDER BY timestamp DESC
                 ''')
                 feedback_rows = cursor.fetchall()
-            except sqlite3.OperationalError as e:
-                if "no such column: conversation_id" in str(e):
-                    self._fix_database_schema()
-                    conn.close()
-                    return self.get_all_feedback()
+            except sqlite3.OperationalError:
                 feedback_rows = []
             
             # Lấy tất cả so sánh
@@ -522,45 +465,295 @@ class FeedbackStore:
             except sqlite3.OperationalError:
                 comparison_rows = []
             
-            results = []
-            
-            # Xử lý các bản ghi phản hồi
-            for row in feedback_rows:
-                feedback_data = dict(row)
-                
-                # Chuyển đổi JSON thành Dict
-                feedback_data["responses"] = json.loads(feedback_data["responses"])
-                if feedback_data["metadata"]:
-                    metadata = json.loads(feedback_data["metadata"])
-                    for key, value in metadata.items():
-                        feedback_data[key] = value
-                        
-                del feedback_data["metadata"]
-                results.append(feedback_data)
-                
-            # Xử lý các bản ghi so sánh
-            for row in comparison_rows:
-                comparison_data = dict(row)
-                
-                # Chuyển đổi JSON thành Dict
-                if comparison_data["metadata"]:
-                    metadata = json.loads(comparison_data["metadata"])
-                    for key, value in metadata.items():
-                        comparison_data[key] = value
-                        
-                comparison_data["type"] = "pairwise_comparison"
-                del comparison_data["metadata"]
-                results.append(comparison_data)
+            # Xử lý các bản ghi phản hồi và so sánh
+            results = self._parse_feedback_rows(feedback_rows)
+            results.extend(self._parse_comparison_rows(comparison_rows))
                 
             return results
             
         except Exception as e:
             logger.error(f"Lỗi khi lấy tất cả phản hồi: {e}")
             return []
-        finally:
-            if conn:
-                conn.close()
+
+    # Cột phục vụ truy vấn (thời gian số nguyên, khóa mô hình, hash văn bản), không thuộc bản ghi trả về
+    _INTERNAL_COLUMNS = ("ts_epoch", "model_id", "chosen_model_id", "rejected_model_id",
+                         "response_hashes", "chosen_hash", "rejected_hash", "export_seq")
+    
+    @classmethod
+    def _row_to_dict(cls, row: sqlite3.Row) -> Dict[str, Any]:
+        """Chuyển một dòng thành Dict, bỏ các cột nội bộ"""
+        return {key: row[key] for key in row.keys() if key not in cls._INTERNAL_COLUMNS}
+    
+    def _parse_feedback_rows(self, rows: List[sqlite3.Row]) -> List[Dict[str, Any]]:
+        """Chuyển các dòng của bảng feedback thành Dict, đọc văn bản câu trả lời theo lô"""
+        hashes = []
+        for row in rows:
+            if row["response_hashes"]:
+                hashes.extend(json.loads(row["response_hashes"]).values())
+        texts = load_texts(self.connections.get_connection(), hashes)
+        return [self._parse_feedback_row(row, texts) for row in rows]
+    
+    def _parse_comparison_rows(self, rows: List[sqlite3.Row]) -> List[Dict[str, Any]]:
+        """Chuyển các dòng của bảng comparisons thành Dict, đọc văn bản câu trả lời theo lô"""
+        hashes = [hash_value for row in rows for hash_value in (row["chosen_hash"], row["rejected_hash"])]
+        texts = load_texts(self.connections.get_connection(), hashes)
+        return [self._parse_comparison_row(row, texts) for row in rows]
+    
+    @classmethod
+    def _parse_feedback_row(cls, row: sqlite3.Row, texts: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Chuyển một dòng của bảng feedback thành Dict, giải mã JSON và gộp metadata
+        
+        Args:
+            row: Dòng của bảng feedback
+            texts: Dict hash -> văn bản đã đọc từ bảng texts
+            
+        Returns:
+            Dict chứa dữ liệu phản hồi
+        """
+        feedback_data = cls._row_to_dict(row)
+        
+        # Chuyển đổi JSON thành Dict (dòng ghi trước khi có bảng texts giữ nguyên văn bản)
+        if row["response_hashes"]:
+            feedback_data["responses"] = {model_name: texts.get(hash_value, "")
+                                          for model_name, hash_value in json.loads(row["response_hashes"]).items()}
+        else:
+            feedback_data["responses"] = json.loads(feedback_data["responses"])
+        if feedback_data["metadata"]:
+            metadata = json.loads(feedback_data["metadata"])
+            for key, value in metadata.items():
+                feedback_data[key] = value
+                
+        del feedback_data["metadata"]
+        return feedback_data
+    
+    @classmethod
+    def _parse_comparison_row(cls, row: sqlite3.Row, texts: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Chuyển một dòng của bảng comparisons thành Dict, gộp metadata
+        
+        Args:
+            row: Dòng của bảng comparisons
+            texts: Dict hash -> văn bản đã đọc từ bảng texts
+            
+        Returns:
+            Dict chứa dữ liệu so sánh
+        """
+        comparison_data = cls._row_to_dict(row)
+        if row["chosen_hash"]:
+            comparison_data["chosen"] = texts.get(row["chosen_hash"], "")
+        if row["rejected_hash"]:
+            comparison_data["rejected"] = texts.get(row["rejected_hash"], "")
+        
+        # Chuyển đổi JSON thành Dict
+        if comparison_data["metadata"]:
+            metadata = json.loads(comparison_data["metadata"])
+            for key, value in metadata.items():
+                comparison_data[key] = value
+                
+        comparison_data["type"] = "pairwise_comparison"
+        del comparison_data["metadata"]
+        return comparison_data
+    
+    def _iter_keyset(self, table: str, conditions: List[str], params: List[Any],
+                     batch_size: int, descending: bool, columns: str = "*") -> Iterator[List[sqlite3.Row]]:
+        """
+        Đọc lần lượt các dòng của bảng theo thứ tự (timestamp, id), mỗi trang là một truy vấn
+        riêng bắt đầu sau khóa cuối của trang trước (phân trang theo khóa). Không giữ giao dịch
+        đọc mở giữa các trang nên không chặn checkpoint WAL.
+        
+        Args:
+            table: Tên bảng (feedback hoặc comparisons)
+            conditions: Các điều kiện lọc SQL
+            params: Tham số cho các điều kiện lọc
+            batch_size: Số dòng mỗi trang
+            descending: True để đọc từ mới đến cũ
+            columns: Các cột cần đọc (phải gồm timestamp và id)
+            
+        Yields:
+            Danh sách dòng sqlite3.Row của từng trang
+        """
+        direction = "DESC" if descending else "ASC"
+        comparison = "<" if descending else ">"
+        last_key = None
+        
+        while True:
+            page_conditions = list(conditions)
+            page_params = list(params)
+            if last_key is not None:
+                page_conditions.append(f"(timestamp, id) {comparison} (?, ?)")
+                page_params.extend(last_key)
+                
+            where = f"WHERE {' AND '.join(page_conditions)}" if page_conditions else ""
+            conn = self.connections.get_connection()
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            cursor.execute(f'''
+            SELECT {columns} FROM {table} {where}
+            ORDER BY timestamp {direction}, id {direction}
+            LIMIT ?
+            ''', page_params + [batch_size])
+            rows = cursor.fetchmany(batch_size)
+            cursor.close()
+            
+            if not rows:
+                break
+                
+            yield rows
+                
+            if len(rows) < batch_size:
+                break
+            last_key = (rows[-1]["timestamp"], rows[-1]["id"])
+    
+    def iter_feedback(self, since: Optional[str] = None, until: Optional[str] = None,
+                      model: Optional[str] = None, min_score: Optional[float] = None,
+                      max_score: Optional[float] = None, batch_size: int = 1000,
+                      descending: bool = False, include_archived: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Duyệt các bản ghi phản hồi theo lô mà không nạp toàn bộ vào bộ nhớ
+        
+        Args:
+            since: Chỉ lấy bản ghi có timestamp >= since (ISO, tùy chọn)
+            until: Chỉ lấy bản ghi có timestamp < until (ISO, tùy chọn)
+            model: Chỉ lấy bản ghi có mô hình được chọn này (tùy chọn)
+            min_score: Điểm tối thiểu (tùy chọn)
+            max_score: Điểm tối đa (tùy chọn)
+            batch_size: Số bản ghi đọc mỗi lô
+            descending: True để duyệt từ mới đến cũ
+            include_archived: True để đọc cả bản ghi đã chuyển vào kho lưu trữ (cũ hơn mọi bản
+                ghi còn trong cơ sở dữ liệu)
+            
+        Yields:
+            Dict chứa dữ liệu phản hồi
+        """
+        conditions, params = [], []
+        if since:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            conditions.append("timestamp < ?")
+            params.append(until)
+        if model:
+            conditions.append("model_id = (SELECT id FROM models WHERE name = ?)")
+            params.append(model)
+        if min_score is not None:
+            conditions.append("feedback_score >= ?")
+            params.append(min_score)
+        if max_score is not None:
+            conditions.append("feedback_score <= ?")
+            params.append(max_score)
+            
+        def matches(record: Dict[str, Any]) -> bool:
+            score = record.get("feedback_score")
+            return ((not model or record.get("selected_response") == model)
+                    and (min_score is None or (score is not None and score >= min_score))
+                    and (max_score is None or (score is not None and score <= max_score)))
+            
+        if include_archived and not descending:
+            yield from self.archive.iter_records("feedback", since, until, matches)
+        for rows in self._iter_keyset("feedback", conditions, params, batch_size, descending):
+            yield from self._parse_feedback_rows(rows)
+        if include_archived and descending:
+            yield from self.archive.iter_records("feedback", since, until, matches, descending=True)
+    
+    def iter_comparisons(self, since: Optional[str] = None, until: Optional[str] = None,
+                         model: Optional[str] = None, batch_size: int = 1000,
+                         descending: bool = False, include_archived: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Duyệt các bản ghi so sánh cặp theo lô mà không nạp toàn bộ vào bộ nhớ
+        
+        Args:
+            since: Chỉ lấy bản ghi có timestamp >= since (ISO, tùy chọn)
+            until: Chỉ lấy bản ghi có timestamp < until (ISO, tùy chọn)
+            model: Chỉ lấy so sánh có mô hình này ở vị trí được chọn hoặc bị từ chối (tùy chọn)
+            batch_size: Số bản ghi đọc mỗi lô
+            descending: True để duyệt từ mới đến cũ
+            include_archived: True để đọc cả bản ghi đã chuyển vào kho lưu trữ
+            
+        Yields:
+            Dict chứa dữ liệu so sánh (type = "pairwise_comparison")
+        """
+        conditions, params = [], []
+        if since:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            conditions.append("timestamp < ?")
+            params.append(until)
+        if model:
+            conditions.append("(chosen_model_id = (SELECT id FROM models WHERE name = ?) "
+                              "OR rejected_model_id = (SELECT id FROM models WHERE name = ?))")
+            params.extend([model, model])
+            
+        def matches(record: Dict[str, Any]) -> bool:
+            return not model or model in (record.get("chosen_model"), record.get("rejected_model"))
+            
+        if include_archived and not descending:
+            yield from self.archive.iter_records("comparisons", since, until, matches)
+        for rows in self._iter_keyset("comparisons", conditions, params, batch_size, descending):
+            yield from self._parse_comparison_rows(rows)
+        if include_archived and descending:
+            yield from self.archive.iter_records("comparisons", since, until, matches, descending=True)
+
+    def get_export_seq(self) -> int:
+        """
+        Giá trị hiện tại của bộ đếm thay đổi export_seq (mốc cho xuất tăng dần). Mỗi lần thêm
+        hoặc cập nhật phản hồi/so sánh nhận giá trị tiếp theo; bộ đếm không bao giờ giảm.
+        
+        Returns:
+            Giá trị bộ đếm (0 nếu chưa có thay đổi nào)
+        """
+        return get_export_seq(self.connections.get_connection())
     
+    def iter_changes(self, table: str, after_seq: int, until_seq: int,
+                     batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Duyệt các bản ghi được thêm hoặc cập nhật sau một mốc export_seq theo thứ tự thay đổi,
+        phân trang theo chỉ mục export_seq nên chỉ đọc phần dữ liệu mới
+        
+        Args:
+            table: feedback hoặc comparisons
+            after_seq: Chỉ lấy dòng có export_seq > after_seq
+            until_seq: Chỉ lấy dòng có export_seq <= until_seq (cố định trước khi duyệt để
+                dòng được ghi trong lúc duyệt thuộc về lần xuất sau)
+            batch_size: Số bản ghi đọc mỗi lô
+            
+        Yields:
+            Dict chứa dữ liệu phản hồi hoặc so sánh
+        """
+        parse = self._parse_feedback_rows if table == "feedback" else self._parse_comparison_rows
+        while after_seq < until_seq:
+            cursor = self.connections.get_connection().cursor()
+            cursor.row_factory = sqlite3.Row
+            rows = cursor.execute(f'''
+            SELECT * FROM {table}
+            WHERE export_seq > ? AND export_seq <= ?
+            ORDER BY export_seq
+            LIMIT ?
+            ''', (after_seq, until_seq, batch_size)).fetchall()
+            cursor.close()
+            
+            if not rows:
+                break
+            yield from parse(rows)
+            after_seq = rows[-1]["export_seq"]
+    
+    def iter_comparison_pairs(self, batch_size: int = 50000) -> Iterator[List[Tuple[str, str, str]]]:
+        """
+        Đọc lần lượt các so sánh cặp theo lô, chỉ lấy các cột cần để ước lượng
+        độ mạnh mô hình (không đọc nội dung câu trả lời). Mỗi lô là một truy vấn phân trang
+        theo khóa, nên không giữ giao dịch đọc mở trong khi bên gọi xử lý lô.
+
+        Args:
+            batch_size: Số bản ghi mỗi lô
+
+        Yields:
+            Danh sách tuple (query, chosen_model, rejected_model)
+        """
+        for rows in self._iter_keyset("comparisons", [], [], batch_size, False,
+                                      "timestamp, id, query, chosen_model, rejected_model"):
+            yield [(row["query"], row["chosen_model"], row["rejected_model"]) for row in rows]
+
     def get_feedback_by_conversation(self, conversation_id: str) -> List[Dict[str, Any]]:
         """
         Lấy tất cả bản ghi phản hồi cho một cuộc hội thoại
@@ -573,9 +766,9 @@ class FeedbackStore:
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
+            conn = self.connections.get_connection()
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             
             # Truy vấn cơ sở dữ liệu
             cursor.execute('''
@@ -584,33 +777,11 @@ class FeedbackStore:
             ORDER BY timestamp DESC
             ''', (conversation_id,))
             
-            rows = cursor.fetchall()
-            results = []
-            
-            for row in rows:
-                feedback_data = dict(row)
-                
-                # Chuyển đổi JSON thành Dict
-                feedback_data["responses"] = json.loads(feedback_data["responses"])
-                if feedback_data["metadata"]:
-                    metadata = json.loads(feedback_data["metadata"])
-                    for key, value in metadata.items():
-                        feedback_data[key] = value
-                        
-                del feedback_data["metadata"]
-                results.append(feedback_data)
-                
-            return results
+            return self._parse_feedback_rows(cursor.fetchall())
             
         except Exception as e:
             logger.error(f"Lỗi khi lấy phản hồi theo cuộc hội thoại: {e}")
-            if "no such column: conversation_id" in str(e):
-                self._fix_database_schema()
-                return self.get_feedback_by_conversation(conversation_id)
             return []
-        finally:
-            if conn:
-                conn.close()
     
     def get_comparisons_by_conversation(self, conversation_id: str) -> List[Dict[str, Any]]:
         """
@@ -624,9 +795,9 @@ class FeedbackStore:
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
+            conn = self.connections.get_connection()
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             
             # Truy vấn cơ sở dữ liệu
             cursor.execute('''
@@ -635,33 +806,11 @@ class FeedbackStore:
             ORDER BY timestamp DESC
             ''', (conversation_id,))
             
-            rows = cursor.fetchall()
-            results = []
-            
-            for row in rows:
-                comparison_data = dict(row)
-                
-                # Chuyển đổi JSON thành Dict
-                if comparison_data["metadata"]:
-                    metadata = json.loads(comparison_data["metadata"])
-                    for key, value in metadata.items():
-                        comparison_data[key] = value
-                        
-                comparison_data["type"] = "pairwise_comparison"
-                del comparison_data["metadata"]
-                results.append(comparison_data)
-                
-            return results
+            return self._parse_comparison_rows(cursor.fetchall())
             
         except Exception as e:
             logger.error(f"Lỗi khi lấy so sánh theo cuộc hội thoại: {e}")
-            if "no such column: conversation_id" in str(e):
-                self._fix_database_schema()
-                return self.get_comparisons_by_conversation(conversation_id)
             return []
-        finally:
-            if conn:
-                conn.close()
     
     def get_total_count(self) -> int:
         """
@@ -672,26 +821,63 @@ class FeedbackStore:
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.connections.get_connection()
             cursor = conn.cursor()
             
-            cursor.execute('SELECT COUNT(*) FROM feedback')
+            # Đọc từ bảng tổng hợp thay vì đếm lại toàn bộ bảng
+            cursor.execute('SELECT IFNULL(SUM(feedback_count), 0) FROM feedback_rollup')
             feedback_count = cursor.fetchone()[0]
             
-            cursor.execute('SELECT COUNT(*) FROM comparisons')
+            cursor.execute('SELECT IFNULL(SUM(wins), 0) FROM comparison_rollup')
             comparison_count = cursor.fetchone()[0]
             
             return feedback_count + comparison_count
             
         except Exception as e:
             logger.error(f"Lỗi khi lấy tổng số bản ghi: {e}")
-            if "no such column: conversation_id" in str(e):
-                self._fix_database_schema()
-                return self.get_total_count()
             return 0
-        finally:
-            if conn:
-                conn.close()
+    
+    def get_summary_counts(self) -> Dict[str, Any]:
+        """
+        Lấy các số đếm tổng từ bảng tổng hợp (feedback_rollup, comparison_rollup), không phụ thuộc
+        số bản ghi phản hồi
+        
+        Returns:
+            Dict với feedback_count, comparison_count, score_count, score_sum, score_ge_08,
+            score_ge_07, score_le_03 (rỗng nếu lỗi)
+        """
+        try:
+            conn = self.connections.get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+            SELECT 
+                IFNULL(SUM(feedback_count), 0),
+                IFNULL(SUM(score_count), 0),
+                IFNULL(SUM(score_sum), 0.0),
+                IFNULL(SUM(score_ge_08), 0),
+                IFNULL(SUM(score_ge_07), 0),
+                IFNULL(SUM(score_le_03), 0)
+            FROM feedback_rollup
+            ''')
+            row = cursor.fetchone()
+            
+            cursor.execute('SELECT IFNULL(SUM(wins), 0) FROM comparison_rollup')
+            comparison_count = cursor.fetchone()[0]
+            
+            return {
+                "feedback_count": row[0],
+                "comparison_count": comparison_count,
+                "score_count": row[1],
+                "score_sum": row[2],
+                "score_ge_08": row[3],
+                "score_ge_07": row[4],
+                "score_le_03": row[5]
+            }
+            
+        except Exception as e:
+            logger.error(f"Lỗi khi lấy số đếm tổng hợp: {e}")
+            return {}
     
     def get_count_by_score(self, min_score: Optional[float] = None, 
                           max_score: Optional[float] = None) -> int:
@@ -707,7 +893,7 @@ class FeedbackStore:
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.connections.get_connection()
             cursor = conn.cursor()
             
             # Xây dựng truy vấn dựa trên điều kiện
@@ -729,13 +915,7 @@ class FeedbackStore:
             
         except Exception as e:
             logger.error(f"Lỗi khi lấy số lượng phản hồi theo điểm: {e}")
-            if "no such column: conversation_id" in str(e):
-                self._fix_database_schema()
-                return self.get_count_by_score(min_score, max_score)
             return 0
-        finally:
-            if conn:
-                conn.close()
     
     def delete_feedback(self, feedback_id: str) -> bool:
         """
@@ -749,7 +929,7 @@ class FeedbackStore:
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.connections.get_connection()
             cursor = conn.cursor()
             
             cursor.execute('DELETE FROM feedback WHERE id = ?', (feedback_id,))
@@ -762,9 +942,6 @@ class FeedbackStore:
             if conn:
                 conn.rollback()
             return False
-        finally:
-            if conn:
-                conn.close()
     
     def delete_comparison(self, comparison_id: str) -> bool:
         """
@@ -778,7 +955,7 @@ class FeedbackStore:
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.connections.get_connection()
             cursor = conn.cursor()
             
             cursor.execute('DELETE FROM comparisons WHERE id = ?', (comparison_id,))
@@ -791,9 +968,34 @@ class FeedbackStore:
             if conn:
                 conn.rollback()
             return False
-        finally:
-            if conn:
-                conn.close()
+    
+    def prune_texts(self) -> int:
+        """
+        Xóa các văn bản câu trả lời không còn bản ghi nào tham chiếu (sau khi xóa hoặc ghi đè)
+        
+        Returns:
+            Số văn bản đã xóa
+        """
+        try:
+            count = prune_unreferenced_texts(self.connections.get_connection())
+            logger.info(f"Đã xóa {count} văn bản không còn được tham chiếu")
+            return count
+        except Exception as e:
+            logger.error(f"Lỗi khi dọn bảng texts: {e}")
+            return 0
+    
+    def get_text_stats(self) -> Dict[str, int]:
+        """
+        Lấy thống kê bảng texts
+        
+        Returns:
+            Dict với số văn bản, tổng kích thước gốc và đã lưu (rỗng nếu lỗi)
+        """
+        try:
+            return get_text_stats(self.connections.get_connection())
+        except Exception as e:
+            logger.error(f"Lỗi khi lấy thống kê bảng texts: {e}")
+            return {}
     
     def clear_all_data(self) -> bool:
         """
@@ -804,12 +1006,16 @@ class FeedbackStore:
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.connections.get_connection()
             cursor = conn.cursor()
             
             cursor.execute('DELETE FROM feedback')
             cursor.execute('DELETE FROM comparisons')
             cursor.execute('DELETE FROM stats')
+            cursor.execute('DELETE FROM feedback_rollup')
+            cursor.execute('DELETE FROM comparison_rollup')
+            cursor.execute('DELETE FROM stats_rollup')
+            cursor.execute('DELETE FROM texts')
             conn.commit()
             
             return True
@@ -819,9 +1025,6 @@ class FeedbackStore:
             if conn:
                 conn.rollback()
             return False
-        finally:
-            if conn:
-                conn.close()
                 
     def update_stat(self, stat_type: str, value: float, metadata: Optional[Dict] = None) -> bool:
         """
@@ -837,7 +1040,7 @@ class FeedbackStore:
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.connections.get_connection()
             cursor = conn.cursor()
             
             # Tạo ID thống kê
@@ -866,9 +1069,6 @@ class FeedbackStore:
             if conn:
                 conn.rollback()
             return False
-        finally:
-            if conn:
-                conn.close()
     
     def get_stats(self, stat_type: Optional[str] = None, 
                 limit: int = 100) -> List[Dict[str, Any]]:
@@ -884,9 +1084,9 @@ class FeedbackStore:
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
+            conn = self.connections.get_connection()
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             
             # Xây dựng truy vấn
             query = 'SELECT * FROM stats'
@@ -900,150 +1100,476 @@ class FeedbackStore:
             params.append(limit)
             
             cursor.execute(query, params)
-            rows = cursor.fetchall()
-            results = []
-            
-            for row in rows:
-                stat_data = dict(row)
-                
-                # Chuyển đổi JSON thành Dict
-                if stat_data["metadata"]:
-                    metadata = json.loads(stat_data["metadata"])
-                    for key, value in metadata.items():
-                        stat_data[key] = value
-                        
-                del stat_data["metadata"]
-                results.append(stat_data)
-                
-            return results
+            return [self._parse_stat_row(row) for row in cursor.fetchall()]
             
         except Exception as e:
             logger.error(f"Lỗi khi lấy thống kê: {e}")
             return []
-        finally:
-            if conn:
-                conn.close()
+    
+    @staticmethod
+    def _parse_stat_row(row: sqlite3.Row) -> Dict[str, Any]:
+        """Chuyển một dòng của bảng stats thành Dict, gộp metadata"""
+        stat_data = dict(row)
+        
+        # Chuyển đổi JSON thành Dict
+        if stat_data["metadata"]:
+            metadata = json.loads(stat_data["metadata"])
+            for key, value in metadata.items():
+                stat_data[key] = value
+                
+        del stat_data["metadata"]
+        return stat_data
+    
+    def get_stat_summary(self, stat_type: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Tổng hợp thống kê theo loại, gồm cả các dòng đã chuyển vào kho lưu trữ
+        
+        Args:
+            stat_type: Loại thống kê (tùy chọn)
+            
+        Returns:
+            Dict loại thống kê -> số lượng, tổng, trung bình, nhỏ nhất, lớn nhất
+        """
+        where = "WHERE stat_type = ?" if stat_type else ""
+        params = [stat_type] * 2 if stat_type else []
+        try:
+            conn = self.connections.get_connection()
+            rows = conn.execute(f'''
+            SELECT stat_type, SUM(stat_count), SUM(value_sum), MIN(value_min), MAX(value_max) FROM (
+                SELECT stat_type, COUNT(*) AS stat_count, SUM(value) AS value_sum,
+                       MIN(value) AS value_min, MAX(value) AS value_max
+                FROM stats {where} GROUP BY stat_type
+                UNION ALL
+                SELECT stat_type, SUM(stat_count), SUM(value_sum), MIN(value_min), MAX(value_max)
+                FROM stats_rollup {where} GROUP BY stat_type
+            )
+            GROUP BY stat_type
+            ''', params).fetchall()
+            
+            return {
+                name: {"count": count, "sum": total, "mean": total / count if count else 0.0,
+                       "min": minimum, "max": maximum}
+                for name, count, total, minimum, maximum in rows
+            }
+            
+        except Exception as e:
+            logger.error(f"Lỗi khi tổng hợp thống kê: {e}")
+            return {}
+    
+    def archive_old_data(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Chuyển các dòng quá hạn lưu giữ vào kho lưu trữ (file JSONL nén theo tháng). Bảng tổng hợp
+        vẫn giữ số liệu của các dòng đã chuyển, nên thống kê tổng không đổi; cơ sở dữ liệu chỉ còn
+        dữ liệu gần đây và các trang trống được dùng lại cho dữ liệu mới.
+        
+        Args:
+            now: Thời điểm tính hạn lưu giữ (mặc định: hiện tại)
+            
+        Returns:
+            Dict bảng -> số dòng đã chuyển
+        """
+        now = now or datetime.now()
+        cutoffs = {
+            "feedback": now - timedelta(days=self.retention_options["feedback_days"]),
+            "comparisons": now - timedelta(days=self.retention_options["feedback_days"]),
+            "stats": now - timedelta(days=self.retention_options["stats_days"])
+        }
+        
+        archived = {}
+        try:
+            for table, cutoff in cutoffs.items():
+                archived[table] = self._archive_table(table, cutoff.isoformat(), self.retention_options["batch_size"])
+                if archived[table]:
+                    logger.info(f"Đã chuyển {archived[table]} dòng của bảng {table} trước {cutoff.date()} "
+                                f"vào {self.archive.archive_dir}")
+                    
+            if archived["feedback"] or archived["comparisons"]:
+                self.prune_texts()
+                
+        except Exception as e:
+            logger.error(f"Lỗi khi lưu trữ dữ liệu cũ: {e}")
+            
+        return archived
+    
+    def _archive_table(self, table: str, cutoff: str, batch_size: int) -> int:
+        """
+        Chuyển các dòng có timestamp < cutoff của một bảng vào kho lưu trữ theo lô. Mỗi lô được
+        đọc, ghi ra file và xóa trong cùng một giao dịch ghi; nếu bị ngắt sau khi ghi file, lần sau
+        ghi lại lô đó và bản ghi trùng được bỏ qua khi đọc.
+        
+        Args:
+            table: Tên bảng
+            cutoff: Thời điểm ISO
+            batch_size: Số dòng mỗi lô
+            
+        Returns:
+            Số dòng đã chuyển
+        """
+        parsers = {
+            "feedback": self._parse_feedback_rows,
+            "comparisons": self._parse_comparison_rows,
+            "stats": lambda rows: [self._parse_stat_row(row) for row in rows]
+        }
+        
+        conn = self.connections.get_connection()
+        archived = 0
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            with conn:
+                cursor = conn.cursor()
+                cursor.row_factory = sqlite3.Row
+                rows = cursor.execute(f'''
+                SELECT * FROM {table} WHERE timestamp < ?
+                ORDER BY timestamp, id
+                LIMIT ?
+                ''', (cutoff, batch_size)).fetchall()
+                
+                if rows:
+                    self.archive.append(table, parsers[table](rows))
+                    
+                    # Đúng các dòng vừa đọc: khóa (timestamp, id) không lớn hơn dòng cuối của lô
+                    condition = "timestamp < ? AND (timestamp, id) <= (?, ?)"
+                    params = [cutoff, rows[-1]["timestamp"], rows[-1]["id"]]
+                    retain_rollups(conn, table, condition, params)
+                    conn.execute(f"DELETE FROM {table} WHERE {condition}", params)
+                    
+            archived += len(rows)
+            if len(rows) < batch_size:
+                return archived
+            # Nhường khóa ghi cho ứng dụng giữa các lô
+            time.sleep(BATCH_PAUSE)
                 
     def get_feedback_stats(self) -> Dict[str, Any]:
         """
-        Lấy các thống kê phản hồi tổng hợp
+        Lấy các thống kê phản hồi tổng hợp (đọc từ bảng tổng hợp do trigger duy trì nên chi phí
+        không tăng theo số bản ghi phản hồi)
         
         Returns:
             Dict chứa các thống kê về phản hồi
         """
         conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.connections.get_connection()
             cursor = conn.cursor()
             
-            # Số lượng phản hồi theo khoảng điểm
-            cursor.execute('''
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN feedback_score >= 0.8 THEN 1 ELSE 0 END) as positive,
-                SUM(CASE WHEN feedback_score <= 0.3 THEN 1 ELSE 0 END) as negative,
-                SUM(CASE WHEN feedback_score > 0.3 AND feedback_score < 0.8 THEN 1 ELSE 0 END) as neutral,
-                AVG(feedback_score) as avg_score
-            FROM feedback
-            WHERE feedback_score IS NOT NULL
-            ''')
-            
-            score_stats = cursor.fetchone()
+            summary = self.get_summary_counts()
+            if not summary:
+                return {}
             
             # Số lượng phản hồi theo mô hình
             cursor.execute('''
-            SELECT selected_response, COUNT(*) as count
-            FROM feedback
-            GROUP BY selected_response
-            ORDER BY count DESC
+            SELECT m.name, g.count
+            FROM (SELECT model_id, SUM(feedback_count) as count FROM feedback_rollup GROUP BY model_id) g
+            JOIN models m ON m.id = g.model_id
+            WHERE g.count > 0
+            ORDER BY g.count DESC
             ''')
             
             model_stats = {row[0]: row[1] for row in cursor.fetchall()}
             
-            # Số lượng so sánh cặp
-            cursor.execute('SELECT COUNT(*) FROM comparisons')
-            comparison_count = cursor.fetchone()[0]
+            # Số lượng và điểm trung bình theo mẫu prompt
+            cursor.execute('''
+            SELECT template, SUM(feedback_count), SUM(score_sum), SUM(score_count)
+            FROM feedback_rollup
+            WHERE template != ''
+            GROUP BY template
+            HAVING SUM(feedback_count) > 0
+            ''')
+            
+            template_stats = {
+                row[0]: {"count": row[1], "average_score": row[2] / row[3] if row[3] else None}
+                for row in cursor.fetchall()
+            }
             
             # Thống kê theo thời gian
             cursor.execute('''
             SELECT 
-                strftime('%Y-%m-%d', timestamp) as date,
-                COUNT(*) as count
-            FROM feedback
-            GROUP BY date
-            ORDER BY date DESC
+                date(day * 86400, 'unixepoch') as date,
+                SUM(feedback_count) as count
+            FROM feedback_rollup
+            WHERE day >= 0
+            GROUP BY day
+            HAVING count > 0
+            ORDER BY day DESC
             LIMIT 30
             ''')
             
             daily_stats = {row[0]: row[1] for row in cursor.fetchall()}
             
+            scored = summary["score_count"]
             return {
-                "total_feedback": score_stats[0] if score_stats else 0,
-                "positive_feedback": score_stats[1] if score_stats else 0,
-                "negative_feedback": score_stats[2] if score_stats else 0,
-                "neutral_feedback": score_stats[3] if score_stats else 0,
-                "average_score": score_stats[4] if score_stats else 0,
+                "total_feedback": scored,
+                "positive_feedback": summary["score_ge_08"],
+                "negative_feedback": summary["score_le_03"],
+                "neutral_feedback": scored - summary["score_ge_08"] - summary["score_le_03"],
+                "average_score": summary["score_sum"] / scored if scored else None,
                 "model_distribution": model_stats,
-                "comparison_count": comparison_count,
+                "template_stats": template_stats,
+                "comparison_count": summary["comparison_count"],
                 "daily_stats": daily_stats
             }
             
         except Exception as e:
             logger.error(f"Lỗi khi lấy thống kê phản hồi: {e}")
-            if "no such column: conversation_id" in str(e):
-                self._fix_database_schema()
-                return self.get_feedback_stats()
             return {}
-        finally:
-            if conn:
-                conn.close()
                 
-    def backup_database(self, backup_path: Optional[str] = None) -> bool:
+    def get_report_stats(self, since: Optional[str] = None, until: Optional[str] = None,
+                         model: Optional[str] = None, include_archived: bool = True) -> Dict[str, Any]:
         """
-        Sao lưu cơ sở dữ liệu
+        Tổng hợp số liệu cho báo cáo hiệu suất bằng GROUP BY trong SQL: số lượng và điểm theo
+        mô hình, phân bố điểm, thắng/thua từ so sánh cặp và xu hướng theo ngày
+        
+        Các truy vấn lọc theo ts_epoch và gom nhóm theo khóa mô hình nên chỉ đọc các chỉ mục
+        bao phủ (idx_feedback_epoch_model, idx_comparisons_epoch_models). Bản ghi đã chuyển vào
+        kho lưu trữ được cộng thêm bằng cách đọc các file của những tháng giao với khoảng thời gian.
+        
+        Args:
+            since: Chỉ tính bản ghi có timestamp >= since (ISO, tùy chọn)
+            until: Chỉ tính bản ghi có timestamp < until (ISO, tùy chọn)
+            model: Chỉ tính phản hồi chọn mô hình này và so sánh có mô hình này (tùy chọn)
+            include_archived: True để tính cả bản ghi đã chuyển vào kho lưu trữ
+            
+        Returns:
+            Dict với các khóa general (kèm số bản ghi đọc từ kho lưu trữ), models, daily
+            (rỗng nếu lỗi)
+        """
+        time_conditions, time_params = [], []
+        if since:
+            time_conditions.append("ts_epoch >= ?")
+            time_params.append(timestamp_to_epoch(since))
+        if until:
+            time_conditions.append("ts_epoch < ?")
+            time_params.append(timestamp_to_epoch(until))
+            
+        feedback_conditions, feedback_params = list(time_conditions), list(time_params)
+        comparison_conditions, comparison_params = list(time_conditions), list(time_params)
+        if model:
+            model_id = "(SELECT id FROM models WHERE name = ?)"
+            feedback_conditions.append(f"model_id = {model_id}")
+            feedback_params.append(model)
+            comparison_conditions.append(f"(chosen_model_id = {model_id} OR rejected_model_id = {model_id})")
+            comparison_params.extend([model, model])
+            
+        feedback_where = f"WHERE {' AND '.join(feedback_conditions)}" if feedback_conditions else ""
+        comparison_where = f"WHERE {' AND '.join(comparison_conditions)}" if comparison_conditions else ""
+        
+        try:
+            conn = self.connections.get_connection()
+            cursor = conn.cursor()
+            
+            # Tổng quan và phân bố điểm phản hồi
+            cursor.execute(f'''
+            SELECT 
+                COUNT(*),
+                SUM(feedback_score),
+                COUNT(feedback_score),
+                SUM(CASE WHEN feedback_score >= 0.8 THEN 1 ELSE 0 END),
+                SUM(CASE WHEN feedback_score >= 0.6 AND feedback_score < 0.8 THEN 1 ELSE 0 END),
+                SUM(CASE WHEN feedback_score >= 0.4 AND feedback_score < 0.6 THEN 1 ELSE 0 END),
+                SUM(CASE WHEN feedback_score >= 0.2 AND feedback_score < 0.4 THEN 1 ELSE 0 END),
+                SUM(CASE WHEN feedback_score < 0.2 THEN 1 ELSE 0 END),
+                MIN(ts_epoch),
+                MAX(ts_epoch)
+            FROM feedback {feedback_where}
+            ''', feedback_params)
+            feedback_row = cursor.fetchone()
+            
+            cursor.execute(f'''
+            SELECT COUNT(*), MIN(ts_epoch), MAX(ts_epoch) FROM comparisons {comparison_where}
+            ''', comparison_params)
+            comparison_row = cursor.fetchone()
+            
+            # Số lượng và điểm theo mô hình
+            models: Dict[str, Dict[str, Any]] = {}
+            
+            def model_entry(name: str) -> Dict[str, Any]:
+                return models.setdefault(name, {"count": 0, "score_sum": 0.0, "score_count": 0,
+                                                "wins": 0, "losses": 0})
+                
+            cursor.execute(f'''
+            SELECT m.name, g.count, g.score_sum, g.score_count
+            FROM (
+                SELECT model_id, COUNT(*) AS count, SUM(feedback_score) AS score_sum,
+                       COUNT(feedback_score) AS score_count
+                FROM feedback {feedback_where}
+                GROUP BY model_id
+            ) g
+            JOIN models m ON m.id = g.model_id
+            ''', feedback_params)
+            for name, count, score_sum, score_count in cursor.fetchall():
+                entry = model_entry(name)
+                entry.update({"count": count, "score_sum": score_sum or 0.0, "score_count": score_count})
+                
+            # Thắng/thua từ so sánh cặp
+            for column, key in [("chosen_model_id", "wins"), ("rejected_model_id", "losses")]:
+                cursor.execute(f'''
+                SELECT m.name, g.count
+                FROM (SELECT {column} AS model_id, COUNT(*) AS count FROM comparisons {comparison_where}
+                      GROUP BY {column}) g
+                JOIN models m ON m.id = g.model_id
+                ''', comparison_params)
+                for name, count in cursor.fetchall():
+                    model_entry(name)[key] = count
+                    
+            # Xu hướng theo ngày (ts_epoch theo UTC, cùng quy ước với timestamp không múi giờ)
+            daily: Dict[str, Dict[str, Any]] = {}
+            cursor.execute(f'''
+            SELECT date(ts_epoch / 86400 * 86400, 'unixepoch') AS day,
+                   COUNT(*), SUM(feedback_score), COUNT(feedback_score)
+            FROM feedback {feedback_where}
+            GROUP BY ts_epoch / 86400
+            ''', feedback_params)
+            for day, count, score_sum, score_count in cursor.fetchall():
+                if day is None:
+                    continue
+                daily[day] = {"feedback_count": count, "comparison_count": 0,
+                              "score_sum": score_sum or 0.0, "score_count": score_count}
+                              
+            cursor.execute(f'''
+            SELECT date(ts_epoch / 86400 * 86400, 'unixepoch') AS day, COUNT(*)
+            FROM comparisons {comparison_where}
+            GROUP BY ts_epoch / 86400
+            ''', comparison_params)
+            for day, count in cursor.fetchall():
+                if day is None:
+                    continue
+                daily.setdefault(day, {"feedback_count": 0, "comparison_count": 0,
+                                       "score_sum": 0.0, "score_count": 0})["comparison_count"] = count
+                                       
+            timestamps = [value for value in [feedback_row[8], feedback_row[9],
+                                              comparison_row[1], comparison_row[2]] if value is not None]
+            
+            general = {
+                "total_feedback": feedback_row[0],
+                "total_comparisons": comparison_row[0],
+                "score_sum": feedback_row[1] or 0.0,
+                "score_count": feedback_row[2],
+                "score_distribution": {
+                    "excellent": feedback_row[3] or 0,
+                    "good": feedback_row[4] or 0,
+                    "average": feedback_row[5] or 0,
+                    "poor": feedback_row[6] or 0,
+                    "bad": feedback_row[7] or 0
+                },
+                "archived_feedback": 0,
+                "archived_comparisons": 0
+            }
+            if include_archived:
+                timestamps += self._add_archived_report_stats(general, model_entry, daily, since, until, model)
+            general["earliest"] = epoch_to_timestamp(min(timestamps)) if timestamps else None
+            general["latest"] = epoch_to_timestamp(max(timestamps)) if timestamps else None
+            
+            return {
+                "general": general,
+                "models": models,
+                "daily": daily
+            }
+            
+        except Exception as e:
+            logger.error(f"Lỗi khi tổng hợp thống kê báo cáo: {e}")
+            return {}
+                
+    def _add_archived_report_stats(self, general: Dict[str, Any], model_entry: Callable[[str], Dict[str, Any]],
+                                   daily: Dict[str, Dict[str, Any]], since: Optional[str], until: Optional[str],
+                                   model: Optional[str]) -> List[int]:
+        """
+        Cộng các bản ghi đã lưu trữ trong khoảng [since, until) vào số liệu báo cáo (cùng cách
+        phân loại như các truy vấn SQL của get_report_stats)
+        
+        Args:
+            general: Số liệu tổng quan (được cập nhật)
+            model_entry: Hàm lấy số liệu của một mô hình
+            daily: Số liệu theo ngày (được cập nhật)
+            since: Thời điểm bắt đầu (ISO, tùy chọn)
+            until: Thời điểm kết thúc (ISO, tùy chọn)
+            model: Tên mô hình cần lọc (tùy chọn)
+            
+        Returns:
+            ts_epoch nhỏ nhất và lớn nhất của các bản ghi đã lưu trữ được tính (rỗng nếu không có)
+        """
+        def day_entry(epoch: int) -> Dict[str, Any]:
+            return daily.setdefault(epoch_to_timestamp(epoch // 86400 * 86400)[:10],
+                                    {"feedback_count": 0, "comparison_count": 0, "score_sum": 0.0, "score_count": 0})
+            
+        distribution = general["score_distribution"]
+        epochs: List[int] = []
+        for record in self.archive.iter_records("feedback", since, until,
+                                                lambda record: not model or record.get("selected_response") == model):
+            score = record.get("feedback_score")
+            epoch = timestamp_to_epoch(record.get("timestamp"))
+            entry = model_entry(record.get("selected_response") or "")
+            general["total_feedback"] += 1
+            general["archived_feedback"] += 1
+            entry["count"] += 1
+            if score is not None:
+                general["score_sum"] += score
+                general["score_count"] += 1
+                entry["score_sum"] += score
+                entry["score_count"] += 1
+                bucket = ("excellent" if score >= 0.8 else "good" if score >= 0.6 else
+                          "average" if score >= 0.4 else "poor" if score >= 0.2 else "bad")
+                distribution[bucket] += 1
+            if epoch is not None:
+                epochs.append(epoch)
+                day = day_entry(epoch)
+                day["feedback_count"] += 1
+                if score is not None:
+                    day["score_sum"] += score
+                    day["score_count"] += 1
+                    
+        for record in self.archive.iter_records("comparisons", since, until,
+                                                lambda record: not model or model in (record.get("chosen_model"),
+                                                                                      record.get("rejected_model"))):
+            epoch = timestamp_to_epoch(record.get("timestamp"))
+            general["total_comparisons"] += 1
+            general["archived_comparisons"] += 1
+            model_entry(record.get("chosen_model") or "")["wins"] += 1
+            model_entry(record.get("rejected_model") or "")["losses"] += 1
+            if epoch is not None:
+                epochs.append(epoch)
+                day_entry(epoch)["comparison_count"] += 1
+                
+        return [min(epochs), max(epochs)] if epochs else []
+    
+    def backup_database(self, backup_path: Optional[str] = None,
+                        progress: Optional[Callable[[int, int], None]] = None) -> bool:
+        """
+        Sao lưu trực tuyến cơ sở dữ liệu bằng SQLite backup API (chép theo bước, có nghỉ giữa
+        các bước để không chặn người ghi). Bản sao lưu đặt tên tự động được xoay vòng theo
+        cấu hình keep.
         
         Args:
             backup_path: Đường dẫn đến file sao lưu (tùy chọn)
+            progress: Hàm nhận (số trang đã chép, tổng số trang) sau mỗi bước (tùy chọn)
             
         Returns:
             True nếu sao lưu thành công, False nếu không
         """
+        rotate = not backup_path
         if not backup_path:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_dir = os.path.join(os.path.dirname(self.db_path), "backups")
-            os.makedirs(backup_dir, exist_ok=True)
-            backup_path = os.path.join(backup_dir, f"feedback_backup_{timestamp}.db")
-            
-        source_conn = None
-        dest_conn = None
+            backup_path = os.path.join(self.backup_dir, f"feedback_backup_{timestamp}.db")
         
         try:
-            # Kết nối đến cơ sở dữ liệu nguồn
-            source_conn = sqlite3.connect(self.db_path)
-            
-            # Đảm bảo thư mục đích tồn tại
-            os.makedirs(os.path.dirname(backup_path), exist_ok=True)
-            
-            # Sao lưu cơ sở dữ liệu
-            with open(backup_path, 'wb') as f:
-                for line in source_conn.iterdump():
-                    f.write(f"{line}\n".encode('utf-8'))
-                    
-            logger.info(f"Đã sao lưu cơ sở dữ liệu đến {backup_path}")
+            start = time.perf_counter()
+            backup_sqlite_database(self.connections.get_connection(), backup_path,
+                                   pages=self.backup_options["pages"], pause=self.backup_options["pause"],
+                                   progress=progress, max_restarts=self.backup_options["max_restarts"])
+            logger.info(f"Đã sao lưu cơ sở dữ liệu đến {backup_path} "
+                        f"({os.path.getsize(backup_path) / (1024 * 1024):.1f}MB, {time.perf_counter() - start:.2f}s)")
+            
+            if rotate:
+                rotate_backups(self.backup_dir, "feedback_backup_", ".db", self.backup_options["keep"])
             return True
             
         except Exception as e:
             logger.error(f"Lỗi khi sao lưu cơ sở dữ liệu: {e}")
             return False
-        finally:
-            if source_conn:
-                source_conn.close()
-            if dest_conn:
-                dest_conn.close()
                 
     def restore_database(self, backup_path: str) -> bool:
         """
-        Khôi phục cơ sở dữ liệu từ bản sao lưu
+        Khôi phục cơ sở dữ liệu từ bản sao lưu. Bản sao lưu SQLite được chép thẳng vào
+        cơ sở dữ liệu hiện tại bằng backup API; bản dump SQL (định dạng cũ) được thực thi lại.
         
         Args:
             backup_path: Đường dẫn đến file sao lưu
@@ -1055,34 +1581,52 @@ class FeedbackStore:
             logger.error(f"File sao lưu không tồn tại: {backup_path}")
             return False
             
-        # Tạo bản sao lưu trước khi khôi phục
-        self.backup_database()
+        # Tạo bản sao lưu trước khi khôi phục; chỉ xoay vòng sau khi khôi phục xong để không
+        # xóa mất chính bản sao lưu đang được khôi phục
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.backup_database(os.path.join(self.backup_dir, f"feedback_backup_{timestamp}_pre_restore.db"))
         
-        conn = None
         try:
-            # Xóa cơ sở dữ liệu hiện tại
-            if os.path.exists(self.db_path):
-                os.remove(self.db_path)
-                
-            # Khởi tạo cơ sở dữ liệu mới
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            export_seq = self.get_export_seq()
+            if is_sqlite_database(backup_path):
+                self._restore_from_sqlite(backup_path)
+            else:
+                self._restore_from_dump(backup_path)
             
-            # Đọc và thực thi các lệnh SQL từ file sao lưu
-            with open(backup_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip() and not line.startswith('PRAGMA') and not line.startswith('BEGIN') and not line.startswith('COMMIT'):
-                        cursor.execute(line)
-                        
-            conn.commit()
+            # Đưa schema của bản sao lưu cũ về phiên bản hiện tại
+            self.migrate()
+            # Bộ đếm của bản sao lưu thấp hơn mốc của các lần xuất tăng dần đã chạy: giữ bộ đếm
+            # cũ để dòng ghi sau khi khôi phục vẫn được xuất
+            raise_export_seq(self.connections.get_connection(), export_seq)
             logger.info(f"Đã khôi phục cơ sở dữ liệu từ {backup_path}")
+            
+            rotate_backups(self.backup_dir, "feedback_backup_", ".db", self.backup_options["keep"])
             return True
             
         except Exception as e:
             logger.error(f"Lỗi khi khôi phục cơ sở dữ liệu: {e}")
-            if conn:
-                conn.rollback()
             return False
+    
+    def _restore_from_sqlite(self, backup_path: str) -> None:
+        """Thay toàn bộ nội dung cơ sở dữ liệu bằng bản sao lưu SQLite (một bước, trong khóa ghi)"""
+        source = sqlite3.connect(backup_path)
+        try:
+            source.backup(self.connections.get_connection())
         finally:
-            if conn:
-                conn.close()
\ No newline at end of file
+            source.close()
+    
+    def _restore_from_dump(self, backup_path: str) -> None:
+        """Tạo lại cơ sở dữ liệu từ bản dump SQL (iterdump) của phiên bản cũ"""
+        # Đóng mọi kết nối đang mở rồi xóa cơ sở dữ liệu hiện tại (kể cả file WAL)
+        self.connections.close_all()
+        for path in [self.db_path, f"{self.db_path}-wal", f"{self.db_path}-shm"]:
+            if os.path.exists(path):
+                os.remove(path)
+        
+        # executescript xử lý cả câu lệnh nhiều dòng (trigger, chuỗi có xuống dòng)
+        with open(backup_path, 'r', encoding='utf-8') as f:
+            self.connections.get_connection().executescript(f.read())
+
+    def close(self) -> None:
+        """Đóng mọi kết nối cơ sở dữ liệu đang mở"""
+        self.connections.close_all()
@@ -0,0 +1,115 @@
+"""
+Module định tuyến mô hình theo chất lượng, độ trễ thực đo và chi phí
+"""
+
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+
+from src.optimization.bandit_router import estimate_model_cost
+
+logger = logging.getLogger(__name__)
+
+class LatencyAwareRouter:
+    """
+    Định tuyến mô hình kết hợp:
+    - Điểm chất lượng theo điểm mạnh (PreferenceOptimizer)
+    - Độ trễ p50/p95 thực đo của từng mô hình so với SLO độ trễ
+    - Chi phí tương đối của mô hình
+    Khi truy vấn khẩn cấp hoặc hệ thống quá tải, ưu tiên mô hình nhanh.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Khởi tạo router
+
+        Args:
+            config: Cấu hình hệ thống
+        """
+        self.config = config
+        self.routing_config = config.get("optimization", {}).get("routing", {})
+
+        self.latency_slo = self.routing_config.get("latency_slo", 8.0)
+        self.latency_weight = self.routing_config.get("latency_weight", 0.2)
+        self.slo_penalty = self.routing_config.get("slo_penalty", 0.5)
+        self.cost_weight = self.routing_config.get("cost_weight", 0.2)
+        self.fast_model = self.routing_config.get("fast_model", "deepseek-r1:1.5b")
+        self.load_threshold = self.routing_config.get("load_threshold", 4)
+        self.min_latency_samples = self.routing_config.get("min_latency_samples", 5)
+        self.model_costs = dict(self.routing_config.get("model_costs", {}))
+
+    def select(self, query_analysis: Dict[str, Any], quality_scores: Dict[str, float],
+               latency_stats: Optional[Dict[str, Dict[str, Any]]] = None,
+               active_requests: int = 0) -> Tuple[Optional[str], Dict[str, Any]]:
+        """
+        Chọn mô hình và ghi lại lý do lựa chọn
+
+        Args:
+            query_analysis: Kết quả phân tích truy vấn
+            quality_scores: Điểm chất lượng của từng mô hình khả dụng
+            latency_stats: Thống kê độ trễ p50/p95 theo mô hình (ModelManager.get_latency_stats)
+            active_requests: Số yêu cầu đang xử lý
+
+        Returns:
+            Tuple (tên mô hình hoặc None, thông tin lý do lựa chọn)
+        """
+        if not quality_scores:
+            return None, {"strategy": "latency_aware", "reason": "Không có mô hình khả dụng"}
+
+        latency_stats = latency_stats or {}
+        urgent = query_analysis.get("urgency") == "high"
+        overloaded = self.load_threshold > 0 and active_requests >= self.load_threshold
+
+        info = {
+            "strategy": "latency_aware",
+            "latency_slo": self.latency_slo,
+            "urgency": query_analysis.get("urgency", "normal"),
+            "active_requests": active_requests
+        }
+
+        # Truy vấn khẩn cấp hoặc quá tải: ưu tiên mô hình nhanh
+        if (urgent or overloaded) and self.fast_model in quality_scores:
+            if urgent:
+                info["reason"] = f"Truy vấn khẩn cấp, ưu tiên mô hình nhanh {self.fast_model}"
+            else:
+                info["reason"] = (f"Hệ thống đang tải cao ({active_requests} yêu cầu đang xử lý), "
+                                  f"ưu tiên mô hình nhanh {self.fast_model}")
+            info["fast_path"] = True
+            return self.fast_model, info
+
+        # Chuẩn hóa điểm chất lượng về 0-1 theo mô hình tốt nhất
+        best_quality = max(quality_scores.values())
+        candidates = {}
+        for model_name, quality in quality_scores.items():
+            normalized_quality = quality / best_quality if best_quality > 0 else 0.0
+            utility = normalized_quality - self.cost_weight * self._get_model_cost(model_name)
+
+            stats = latency_stats.get(model_name, {})
+            candidate = {"quality": round(normalized_quality, 4)}
+            if stats.get("samples", 0) >= self.min_latency_samples and self.latency_slo > 0:
+                p50 = stats.get("p50", 0.0)
+                p95 = stats.get("p95", 0.0)
+                utility -= self.latency_weight * min(p50 / self.latency_slo, 2.0)
+                utility -= self.slo_penalty * min(max(0.0, p95 - self.latency_slo) / self.latency_slo, 2.0)
+                candidate["p50"] = round(p50, 3)
+                candidate["p95"] = round(p95, 3)
+
+            candidate["utility"] = round(utility, 4)
+            candidates[model_name] = candidate
+
+        best_model = max(candidates.items(), key=lambda x: x[1]["utility"])[0]
+        best = candidates[best_model]
+
+        if "p95" in best:
+            info["reason"] = (f"Cân bằng chất lượng ({best['quality']}) với độ trễ p95 "
+                              f"{best['p95']}s so với SLO {self.latency_slo}s")
+        else:
+            info["reason"] = "Dựa trên điểm mạnh của mô hình (chưa đủ dữ liệu độ trễ)"
+        info["candidates"] = candidates
+
+        return best_model, info
+
+    def _get_model_cost(self, model_name: str) -> float:
+        """Lấy chi phí tương đối của mô hình"""
+        if model_name not in self.model_costs:
+            self.model_costs[model_name] = estimate_model_cost(model_name, self.config.get("models", []))
+        return float(self.model_costs[model_name])
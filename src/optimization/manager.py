@@ -4,12 +4,16 @@ Module quản lý tối ưu hóa phản hồi dựa trên RLHF và DPO
 
 import logging
 import os
+import time
 from typing import Dict, List, Any, Optional, Tuple
 
 from src.optimization.feedback_collector import FeedbackCollector
 from src.optimization.feedback_store import FeedbackStore
 from src.optimization.preference_optimizer import PreferenceOptimizer
 from src.optimization.response_optimizer import ResponseOptimizer
+from src.optimization.bandit_router import LinUCBRouter
+from src.optimization.latency_router import LatencyAwareRouter
+from src.optimization.state_store import StateStore
 
 logger = logging.getLogger(__name__)
 
@@ -21,14 +25,16 @@ class FeedbackOptimizationManager:
     - Phân tích và tối ưu hóa truy vấn/câu trả lời
     """
     
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], model_manager=None):
         """
         Khởi tạo Feedback Optimization Manager
         
         Args:
             config: Cấu hình hệ thống
+            model_manager: ModelManager cung cấp độ trễ thực đo (tùy chọn)
         """
         self.config = config
+        self.model_manager = model_manager
         self.optimization_config = config.get("optimization", {})
         self.enabled = self.optimization_config.get("enabled", True)
         
@@ -37,7 +43,13 @@ class FeedbackOptimizationManager:
         os.makedirs(os.path.dirname(feedback_db_path), exist_ok=True)
         
         # Khởi tạo kho lưu trữ phản hồi
-        self.feedback_store = FeedbackStore(feedback_db_path)
+        self.feedback_store = FeedbackStore(
+            feedback_db_path,
+            config.get("system", {}).get("feedback_db_options"),
+            text_compression=config.get("system", {}).get("feedback_text_compression"),
+            backup_options=config.get("system", {}).get("feedback_backup"),
+            retention_options=config.get("system", {}).get("feedback_retention")
+        )
         
         # Khởi tạo bộ tối ưu hóa sở thích
         self.preference_optimizer = PreferenceOptimizer(config)
@@ -51,6 +63,26 @@ class FeedbackOptimizationManager:
         # Khởi tạo bộ tối ưu hóa câu trả lời
         self.response_optimizer = ResponseOptimizer(config)
         
+        # Chiến lược định tuyến mô hình: "strengths" (điểm mạnh + trọng số), "linucb" hoặc "latency_aware"
+        self.routing_strategy = self.optimization_config.get("routing", {}).get("strategy", "strengths")
+        self.bandit_router = LinUCBRouter(config) if self.routing_strategy == "linucb" else None
+        self.latency_router = LatencyAwareRouter(config) if self.routing_strategy == "latency_aware" else None
+        
+        # Snapshot trạng thái tối ưu hóa: ghi sau mỗi snapshot_every phản hồi hoặc snapshot_interval giây
+        state_config = self.optimization_config.get("state", {})
+        self.snapshot_every = state_config.get("snapshot_every", 20)
+        self.snapshot_interval = state_config.get("snapshot_interval", 300)
+        self.rebuild_from_feedback = state_config.get("rebuild_from_feedback", True)
+        self.state_store = None
+        if state_config.get("enabled", True):
+            self.state_store = StateStore(state_config.get("path", "data/optimizer_state.json"))
+        self._last_feedback_seq = 0
+        self._feedback_since_snapshot = 0
+        self._last_snapshot_time = time.time()
+        
+        if self.state_store is not None:
+            self.restore_state()
+        
         logger.info("Đã khởi tạo Feedback Optimization Manager")
         
     def optimize_query(self, query: str, user_info: Optional[Dict] = None, 
@@ -90,8 +122,24 @@ class FeedbackOptimizationManager:
         Returns:
             Tên của mô hình được chọn hoặc None
         """
+        best_model, _ = self.select_model_with_info(query, analysis, available_models)
+        return best_model
+    
+    def select_model_with_info(self, query: str, analysis: Optional[Dict] = None,
+                               available_models: Optional[List[Dict]] = None) -> Tuple[Optional[str], Dict[str, Any]]:
+        """
+        Chọn mô hình tốt nhất và trả về lý do lựa chọn
+        
+        Args:
+            query: Truy vấn người dùng
+            analysis: Kết quả phân tích truy vấn (tùy chọn)
+            available_models: Danh sách mô hình khả dụng (tùy chọn)
+            
+        Returns:
+            Tuple (tên mô hình hoặc None, thông tin lý do lựa chọn)
+        """
         if not self.enabled:
-            return None
+            return None, {}
             
         try:
             # Phân tích truy vấn nếu chưa có
@@ -102,18 +150,42 @@ class FeedbackOptimizationManager:
             if available_models is None:
                 available_models = self.config.get("models", [])
                 
+            # Định tuyến bằng contextual bandit, dùng điểm theo điểm mạnh làm tiên nghiệm
+            if self.bandit_router is not None:
+                prior_scores = self.preference_optimizer.score_models(analysis, available_models, query)
+                best_model = self.bandit_router.select(analysis, list(prior_scores), prior_scores)
+                return best_model, {
+                    "strategy": "linucb",
+                    "reason": "Contextual bandit (LinUCB) theo đặc trưng câu hỏi, chất lượng, độ trễ và chi phí"
+                }
+                
+            # Định tuyến theo chất lượng kết hợp độ trễ thực đo và chi phí
+            if self.latency_router is not None:
+                quality_scores = self.preference_optimizer.score_models(analysis, available_models, query)
+                latency_stats = {}
+                active_requests = 0
+                if self.model_manager is not None:
+                    latency_stats = self.model_manager.get_latency_stats()
+                    active_requests = self.model_manager.active_requests
+                return self.latency_router.select(analysis, quality_scores, latency_stats, active_requests)
+                
             # Chọn mô hình tốt nhất bằng PreferenceOptimizer
             best_model = self.preference_optimizer.select_best_model(
-                analysis, available_models)
+                analysis, available_models, query)
                 
-            return best_model
+            return best_model, {
+                "strategy": "strengths",
+                "reason": "Dựa trên phân tích điểm mạnh của mô hình và yêu cầu của câu hỏi"
+            }
         except Exception as e:
             logger.error(f"Lỗi khi chọn mô hình tốt nhất: {e}")
-            return None
+            return None, {}
     
     def process_feedback(self, conversation_id: str, query: str, responses: Dict[str, str],
                         selected_response: str, feedback_score: Optional[float] = None,
-                        feedback_text: Optional[str] = None) -> bool:
+                        feedback_text: Optional[str] = None,
+                        latencies: Optional[Dict[str, float]] = None,
+                        template_used: Optional[str] = None) -> bool:
         """
         Xử lý phản hồi của người dùng và cập nhật các mô hình tối ưu
         
@@ -124,6 +196,8 @@ class FeedbackOptimizationManager:
             selected_response: Tên mô hình được chọn
             feedback_score: Điểm đánh giá (0-1, tùy chọn)
             feedback_text: Phản hồi dạng văn bản (tùy chọn)
+            latencies: Thời gian trả lời (giây) của từng mô hình (tùy chọn)
+            template_used: Mẫu prompt trong kết quả optimize_query của truy vấn (tùy chọn)
             
         Returns:
             True nếu xử lý thành công, False nếu không
@@ -132,24 +206,25 @@ class FeedbackOptimizationManager:
             return False
             
         try:
-            # Lưu phản hồi vào kho lưu trữ
-            feedback_id = self.feedback_collector.collect_feedback(
+            # Mẫu prompt đã dùng được lưu kèm phản hồi để có thể dựng lại trạng thái sau này
+            saved_record = self.feedback_collector.collect_feedback(
                 conversation_id=conversation_id,
                 query=query,
                 responses=responses,
                 selected_response=selected_response,
                 feedback_score=feedback_score,
-                feedback_text=feedback_text
+                feedback_text=feedback_text,
+                metadata={"template_used": template_used} if template_used else None
             )
             
-            if feedback_id:
-                # Cập nhật trọng số sở thích
-                self.preference_optimizer.update_weights_from_feedback(
-                    query, responses, selected_response, feedback_score
-                )
+            if saved_record:
+                self._apply_feedback(query, responses, selected_response, feedback_score,
+                                     latencies, template_used, deferred=True)
                 
-                # Cập nhật hiệu suất mẫu prompt
-                self._update_template_performance(query, selected_response, feedback_score)
+                # Mốc của snapshot là bộ đếm export_seq sau khi lưu, để restore_state bỏ qua đúng bản ghi này
+                self._last_feedback_seq = max(self._last_feedback_seq, self.feedback_store.get_export_seq())
+                self._feedback_since_snapshot += 1
+                self._maybe_snapshot()
                 
                 return True
                 
@@ -158,8 +233,66 @@ class FeedbackOptimizationManager:
             logger.error(f"Lỗi khi xử lý phản hồi: {e}")
             return False
     
+    def _apply_feedback(self, query: str, responses: Dict[str, str], selected_response: str,
+                        feedback_score: Optional[float], latencies: Optional[Dict[str, float]],
+                        template_used: Optional[str], deferred: bool = False) -> None:
+        """
+        Áp dụng một phản hồi vào các bộ tối ưu hóa
+        
+        Args:
+            query: Truy vấn người dùng
+            responses: Dict các câu trả lời với key là model_name
+            selected_response: Tên mô hình được chọn
+            feedback_score: Điểm đánh giá (0-1, tùy chọn)
+            latencies: Thời gian trả lời (giây) của từng mô hình (tùy chọn)
+            template_used: Tên mẫu prompt đã dùng (None nếu không rõ)
+            deferred: True để xếp hàng cập nhật trọng số theo lô (periodic_update), False để cập nhật ngay
+        """
+        # Cập nhật trọng số sở thích
+        if deferred:
+            self.preference_optimizer.submit_feedback(query, responses, selected_response, feedback_score)
+        else:
+            self.preference_optimizer.update_weights_from_feedback(
+                query, responses, selected_response, feedback_score
+            )
+        
+        # Cập nhật router
+        self._update_router(query, responses, selected_response, feedback_score, latencies)
+        
+        # Cập nhật hiệu suất mẫu prompt
+        if template_used:
+            self._update_template_performance(query, selected_response, feedback_score, template_used)
+    
+    def _update_router(self, query: str, responses: Dict[str, str], selected_response: str,
+                       feedback_score: Optional[float], latencies: Optional[Dict[str, float]]) -> None:
+        """
+        Cập nhật contextual bandit router từ phản hồi
+        
+        Args:
+            query: Truy vấn người dùng
+            responses: Dict các câu trả lời với key là model_name
+            selected_response: Tên mô hình được chọn
+            feedback_score: Điểm đánh giá (None: coi mô hình được chọn là đạt yêu cầu)
+            latencies: Thời gian trả lời (giây) của từng mô hình
+        """
+        if self.bandit_router is None or not selected_response:
+            return
+            
+        analysis = self.response_optimizer.analyze_query(query)
+        latencies = latencies or {}
+        
+        quality = feedback_score if feedback_score is not None else 1.0
+        self.bandit_router.update(analysis, selected_response, quality, latencies.get(selected_response))
+        
+        # Trong so sánh, các mô hình không được chọn nhận điểm chất lượng 0
+        if len(responses) > 1:
+            for model_name in responses:
+                if model_name != selected_response:
+                    self.bandit_router.update(analysis, model_name, 0.0, latencies.get(model_name))
+    
     def _update_template_performance(self, query: str, selected_model: str, 
-                                    feedback_score: Optional[float]) -> None:
+                                    feedback_score: Optional[float],
+                                    template_used: str) -> None:
         """
         Cập nhật hiệu suất mẫu prompt dựa trên phản hồi
         
@@ -167,17 +300,140 @@ class FeedbackOptimizationManager:
             query: Truy vấn người dùng
             selected_model: Mô hình được chọn
             feedback_score: Điểm đánh giá
+            template_used: Tên mẫu prompt đã dùng (từ kết quả optimize_query)
         """
         if feedback_score is None:
             return
             
-        # Lấy thông tin về mẫu prompt được sử dụng
-        query_result = self.response_optimizer.query_analysis_cache.get(query, {})
-        template_used = query_result.get("template_used", "default")
-        
         # Cập nhật hiệu suất mẫu
         self.response_optimizer.update_template_performance(template_used, feedback_score)
     
+    def save_state(self) -> bool:
+        """
+        Ghi snapshot trạng thái của các bộ tối ưu hóa
+        
+        Returns:
+            True nếu ghi thành công, False nếu không
+        """
+        if self.state_store is None:
+            return False
+            
+        try:
+            # Áp dụng các phản hồi đang chờ để snapshot khớp với last_feedback_seq
+            self.preference_optimizer.flush_pending_updates()
+            components = {
+                "preference_optimizer": self.preference_optimizer.get_state(),
+                "response_optimizer": self.response_optimizer.get_state()
+            }
+            if self.bandit_router is not None:
+                components["bandit_router"] = self.bandit_router.get_state()
+        except Exception as e:
+            logger.error(f"Lỗi khi lấy trạng thái tối ưu hóa: {e}")
+            return False
+            
+        saved = self.state_store.save(components, self._last_feedback_seq)
+        if saved:
+            self._feedback_since_snapshot = 0
+            self._last_snapshot_time = time.time()
+        return saved
+    
+    def restore_state(self) -> int:
+        """
+        Khôi phục trạng thái từ snapshot, sau đó (nếu bật rebuild_from_feedback) áp dụng
+        lại các phản hồi mới hơn snapshot. Khi chưa có snapshot, các bộ tối ưu hóa giữ trạng
+        thái khởi đầu: dựng lại từ toàn bộ phản hồi đã lưu phải được yêu cầu qua rebuild_state().
+        
+        Returns:
+            Số phản hồi đã áp dụng lại
+        """
+        if self.state_store is None:
+            return 0
+            
+        snapshot = self.state_store.load()
+        if snapshot is None:
+            logger.info(f"Chưa có snapshot tại {self.state_store.path}, "
+                        f"dùng rebuild_state() để dựng lại trạng thái từ phản hồi đã lưu")
+            return 0
+            
+        components = snapshot["components"]
+        try:
+            self.preference_optimizer.load_state(components.get("preference_optimizer", {}))
+            self.response_optimizer.load_state(components.get("response_optimizer", {}))
+            if self.bandit_router is not None and "bandit_router" in components:
+                self.bandit_router.load_state(components["bandit_router"])
+            self._last_feedback_seq = snapshot.get("last_feedback_seq", 0)
+            logger.info(f"Đã khôi phục trạng thái tối ưu hóa từ {self.state_store.path}")
+        except Exception as e:
+            logger.error(f"Lỗi khi khôi phục trạng thái tối ưu hóa: {e}")
+                
+        if not self.rebuild_from_feedback:
+            return 0
+            
+        try:
+            replayed = self._replay_feedback()
+        except Exception as e:
+            logger.error(f"Lỗi khi áp dụng lại phản hồi mới hơn snapshot: {e}")
+            return 0
+        if replayed:
+            logger.info(f"Đã áp dụng lại {replayed} phản hồi mới hơn snapshot")
+            self.save_state()
+            
+        return replayed
+    
+    def rebuild_state(self) -> int:
+        """
+        Dựng lại trạng thái tối ưu hóa từ đầu bằng cách áp dụng lại toàn bộ phản hồi đã lưu,
+        rồi ghi snapshot. Thời gian tỷ lệ với kích thước kho phản hồi nên không chạy khi khởi tạo.
+        
+        Returns:
+            Số phản hồi đã áp dụng lại
+        """
+        self.preference_optimizer.stop_updates()
+        self.preference_optimizer = PreferenceOptimizer(self.config)
+        self.response_optimizer = ResponseOptimizer(self.config)
+        if self.bandit_router is not None:
+            self.bandit_router = LinUCBRouter(self.config)
+        self._last_feedback_seq = 0
+        
+        replayed = self._replay_feedback()
+        logger.info(f"Đã dựng lại trạng thái tối ưu hóa từ {replayed} phản hồi")
+        self.save_state()
+        return replayed
+    
+    def _replay_feedback(self) -> int:
+        """
+        Áp dụng lại các phản hồi được lưu sau mốc _last_feedback_seq (toàn bộ nếu chưa có mốc)
+        theo thứ tự export_seq. Bộ đếm tăng đơn điệu nên không bỏ sót hay lặp lại phản hồi có
+        cùng timestamp như khi dùng mốc thời gian.
+        
+        Returns:
+            Số phản hồi đã áp dụng lại
+        """
+        replayed = 0
+        until_seq = self.feedback_store.get_export_seq()
+        for row in self.feedback_store.iter_changes("feedback", self._last_feedback_seq, until_seq):
+            try:
+                self._apply_feedback(row.get("query", ""), row.get("responses", {}),
+                                     row.get("selected_response", ""), row.get("feedback_score"),
+                                     None, row.get("template_used"))
+                replayed += 1
+            except Exception as e:
+                logger.error(f"Lỗi khi áp dụng lại phản hồi {row.get('id')}: {e}")
+        self._last_feedback_seq = max(self._last_feedback_seq, until_seq)
+            
+        return replayed
+    
+    def _maybe_snapshot(self) -> None:
+        """Ghi snapshot khi đủ số phản hồi mới hoặc đã quá chu kỳ snapshot"""
+        if self.state_store is None:
+            return
+            
+        due_by_count = self.snapshot_every > 0 and self._feedback_since_snapshot >= self.snapshot_every
+        due_by_time = (self.snapshot_interval > 0
+                       and time.time() - self._last_snapshot_time >= self.snapshot_interval)
+        if due_by_count or due_by_time:
+            self.save_state()
+    
     def export_feedback_data(self, export_dir: Optional[str] = None) -> str:
         """
         Xuất dữ liệu phản hồi để huấn luyện RLHF
@@ -208,18 +464,28 @@ class FeedbackOptimizationManager:
         Returns:
             Dict chứa các thống kê
         """
+        # Số đếm lấy từ bảng tổng hợp của kho phản hồi, không quét lại bảng phản hồi
+        counts = self.feedback_store.get_summary_counts()
+        positive = counts.get("score_ge_07", 0)
+        negative = counts.get("score_le_03", 0)
+        
         stats = {
             "enabled": self.enabled,
             "feedback_collection": {
-                "total_samples": self.feedback_store.get_total_count(),
-                "positive_samples": self.feedback_store.get_count_by_score(min_score=0.7),
-                "negative_samples": self.feedback_store.get_count_by_score(max_score=0.3),
-                "neutral_samples": self.feedback_store.get_count_by_score(min_score=0.3, max_score=0.7)
+                "total_samples": counts.get("feedback_count", 0) + counts.get("comparison_count", 0),
+                "positive_samples": positive,
+                "negative_samples": negative,
+                "neutral_samples": counts.get("score_count", 0) - positive - negative
             },
             "model_preferences": self.preference_optimizer.get_model_weights(),
+            "keyword_performance": self.preference_optimizer.keyword_sketch.get_stats(),
+            "preference_updates": self.preference_optimizer.get_update_stats(),
             "template_performance": self.response_optimizer.template_performance_history
         }
         
+        if self.bandit_router is not None:
+            stats["routing"] = self.bandit_router.get_stats()
+        
         return stats
     
     def toggle_optimization(self, enabled: bool) -> None:
@@ -243,4 +509,14 @@ class FeedbackOptimizationManager:
     def clear_caches(self) -> None:
         """Xóa tất cả bộ nhớ cache"""
         self.response_optimizer.clear_cache()
-        self.preference_optimizer.clear_cache()
\ No newline at end of file
+        self.preference_optimizer.clear_cache()
+        
+    def close(self) -> None:
+        """
+        Dừng luồng cập nhật nền sau khi áp dụng các phản hồi đang chờ, ghi snapshot trạng thái
+        và đóng kết nối của kho phản hồi. Gọi khi tắt hệ thống để không mất cập nhật trọng số.
+        """
+        self.preference_optimizer.stop_updates()
+        self.save_state()
+        self.feedback_store.close()
+        logger.info("Đã đóng Feedback Optimization Manager")
\ No newline at end of file
@@ -0,0 +1,206 @@
+"""
+Module ước lượng hiệu suất mô hình theo từ khóa bằng count-min sketch
+"""
+
+import hashlib
+import logging
+from array import array
+from typing import Dict, List, Any, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+class KeywordPerformanceSketch:
+    """
+    Theo dõi điểm phản hồi trung bình của từng mô hình theo từ khóa với bộ nhớ cố định.
+
+    Mỗi mô hình có hai bảng count-min kích thước depth x width (mảng double liên tục):
+    số lần xuất hiện và tổng điểm.
+    Một từ khóa được băm vào một ô trên mỗi hàng; khi ước lượng, chọn hàng có số đếm nhỏ nhất
+    (ít bị va chạm nhất) và lấy tổng điểm của chính ô đó, nên điểm ước lượng luôn là trung bình
+    của các phản hồi thật (của từ khóa và các từ khóa va chạm cùng ô).
+    Bộ nhớ: 2 * depth * width * 8 byte cho mỗi mô hình, không phụ thuộc vào số từ khóa.
+
+    copy() tạo bản sao dùng chung các bảng; bảng của một mô hình chỉ được chép khi một trong hai
+    bản ghi vào nó lần đầu, nên luồng ghi có thể cập nhật bản sao rồi gán thay thế trong khi
+    luồng đọc tiếp tục dùng bản cũ mà không cần khóa.
+    """
+
+    def __init__(self, width: int = 1024, depth: int = 4, min_count: int = 3):
+        """
+        Khởi tạo sketch
+
+        Args:
+            width: Số ô trên mỗi hàng
+            depth: Số hàng (số hàm băm)
+            min_count: Số lần xuất hiện tối thiểu để dùng ước lượng của từ khóa
+        """
+        self.width = max(1, int(width))
+        self.depth = max(1, min(int(depth), 16))
+        self.min_count = min_count
+
+        # Tên mô hình -> (bảng số đếm, bảng tổng điểm), lưu phẳng theo hàng
+        self._tables: Dict[str, Tuple[array, array]] = {}
+        self._update_count = 0
+
+        # Các mô hình có bảng thuộc riêng bản này (được sửa tại chỗ), bảng còn lại dùng chung
+        self._owned: Set[str] = set()
+
+    def add(self, keyword: str, model_name: str, score: float) -> None:
+        """
+        Ghi nhận một điểm phản hồi của mô hình cho từ khóa
+
+        Args:
+            keyword: Từ khóa
+            model_name: Tên mô hình
+            score: Điểm phản hồi (0-1)
+        """
+        counts, sums = self._get_tables(model_name)
+        for cell in self._cells(keyword):
+            counts[cell] += 1.0
+            sums[cell] += score
+        self._update_count += 1
+
+    def estimate(self, keyword: str, model_name: str) -> Optional[Tuple[float, int]]:
+        """
+        Ước lượng điểm trung bình và số lần xuất hiện của từ khóa với mô hình
+
+        Args:
+            keyword: Từ khóa
+            model_name: Tên mô hình
+
+        Returns:
+            Tuple (điểm trung bình, số lần) hoặc None nếu chưa có dữ liệu
+        """
+        tables = self._tables.get(model_name)
+        if tables is None:
+            return None
+
+        counts, sums = tables
+        cell = min(self._cells(keyword), key=counts.__getitem__)
+        count = counts[cell]
+        if count <= 0:
+            return None
+
+        return sums[cell] / count, int(count)
+
+    def query_feature(self, keywords: List[str], model_name: str) -> Optional[float]:
+        """
+        Điểm hiệu suất của mô hình cho một truy vấn: trung bình có trọng số theo số lần
+        của các từ khóa đủ dữ liệu
+
+        Args:
+            keywords: Từ khóa của truy vấn
+            model_name: Tên mô hình
+
+        Returns:
+            Điểm (0-1) hoặc None nếu không có từ khóa nào đủ dữ liệu
+        """
+        total = 0.0
+        total_count = 0
+        for keyword in keywords:
+            estimate = self.estimate(keyword, model_name)
+            if estimate is None or estimate[1] < self.min_count:
+                continue
+            score, count = estimate
+            total += score * count
+            total_count += count
+
+        if total_count == 0:
+            return None
+
+        return total / total_count
+
+    def memory_bytes(self) -> int:
+        """Dung lượng bộ nhớ của các bảng (byte)"""
+        return sum((len(counts) + len(sums)) * counts.itemsize for counts, sums in self._tables.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Lấy thống kê của sketch
+
+        Returns:
+            Dict chứa kích thước, số mô hình, số cập nhật và bộ nhớ sử dụng
+        """
+        return {
+            "width": self.width,
+            "depth": self.depth,
+            "models": len(self._tables),
+            "updates": self._update_count,
+            "memory_bytes": self.memory_bytes(),
+            "memory_bytes_per_model": 2 * self.depth * self.width * 8
+        }
+
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Lấy trạng thái để lưu snapshot (chỉ lưu các ô khác 0)
+
+        Returns:
+            Dict chứa kích thước và các ô khác 0 của từng mô hình
+        """
+        models = {}
+        for model_name, (counts, sums) in self._tables.items():
+            cells = [cell for cell, count in enumerate(counts) if count]
+            models[model_name] = {
+                "cells": cells,
+                "counts": [counts[cell] for cell in cells],
+                "sums": [sums[cell] for cell in cells]
+            }
+
+        return {"width": self.width, "depth": self.depth, "updates": self._update_count, "models": models}
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        """
+        Khôi phục trạng thái từ snapshot (bỏ qua nếu kích thước sketch đã thay đổi)
+
+        Args:
+            state: Trạng thái do get_state tạo ra
+        """
+        if state.get("width") != self.width or state.get("depth") != self.depth:
+            logger.warning("Bỏ qua trạng thái sketch hiệu suất do kích thước không khớp")
+            return
+
+        for model_name, data in state.get("models", {}).items():
+            counts, sums = self._get_tables(model_name)
+            for cell, count, total in zip(data.get("cells", []), data.get("counts", []), data.get("sums", [])):
+                counts[cell] = count
+                sums[cell] = total
+        self._update_count = state.get("updates", self._update_count)
+
+    def copy(self) -> "KeywordPerformanceSketch":
+        """
+        Tạo bản sao dùng chung các bảng (chép khi ghi)
+
+        Returns:
+            Sketch mới có cùng dữ liệu
+        """
+        sketch = KeywordPerformanceSketch(self.width, self.depth, self.min_count)
+        sketch._tables = dict(self._tables)
+        sketch._update_count = self._update_count
+        # Bảng đã dùng chung: cả hai bản đều phải chép trước khi ghi
+        self._owned.clear()
+        return sketch
+
+    def clear(self) -> None:
+        """Xóa toàn bộ dữ liệu"""
+        self._tables.clear()
+        self._owned.clear()
+        self._update_count = 0
+
+    def _get_tables(self, model_name: str) -> Tuple[array, array]:
+        """Lấy bảng của mô hình để ghi: khởi tạo nếu chưa có, chép nếu đang dùng chung"""
+        tables = self._tables.get(model_name)
+        if tables is None:
+            size = self.depth * self.width
+            tables = (array("d", bytes(8 * size)), array("d", bytes(8 * size)))
+            self._tables[model_name] = tables
+        elif model_name not in self._owned:
+            tables = (array("d", tables[0]), array("d", tables[1]))
+            self._tables[model_name] = tables
+        self._owned.add(model_name)
+        return tables
+
+    def _cells(self, keyword: str) -> List[int]:
+        """Băm từ khóa thành chỉ số ô (đã phẳng) trên từng hàng, ổn định giữa các lần chạy"""
+        digest = hashlib.blake2b(keyword.encode("utf-8"), digest_size=4 * self.depth).digest()
+        return [row * self.width + int.from_bytes(digest[4 * row:4 * row + 4], "little") % self.width
+                for row in range(self.depth)]
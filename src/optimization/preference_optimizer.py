@@ -5,11 +5,47 @@ Module tối ưu hóa sở thích mô hình dựa trên phân tích điểm mạ
 import logging
 import json
 import random
+import threading
 import time
+from collections import deque
 from typing import Dict, List, Any, Optional, Tuple, Union, Set
 
+import numpy as np
+
+from src.optimization.performance_sketch import KeywordPerformanceSketch
+
 logger = logging.getLogger(__name__)
 
+# Quy tắc xác định điểm mạnh cần thiết: (đặc trưng, giá trị, mức ưu tiên).
+# Áp dụng theo thứ tự, quy tắc sau ghi đè mức ưu tiên của quy tắc trước.
+REQUIRED_STRENGTH_RULES = [
+    ("requires_code", True, {"programming": 0.9, "algorithms": 0.7, "technical_explanation": 0.6}),
+    ("requires_reasoning", True, {"reasoning": 0.8, "critical_thinking": 0.7, "analysis": 0.7, "evaluation": 0.6}),
+    ("requires_creativity", True, {"creative": 0.9}),
+    # Dựa vào độ phức tạp
+    ("complexity_level", "high", {"comprehensive": 0.8, "thorough": 0.7, "balanced": 0.6}),
+    ("complexity_level", "low", {"conciseness": 0.8, "clarity": 0.7}),
+    # Dựa vào loại truy vấn
+    ("query_type", "how_to", {"technical_explanation": 0.7, "clarity": 0.7}),
+    ("query_type", "comparison", {"balanced": 0.8, "analysis": 0.7}),
+    ("query_type", "what_is", {"general_knowledge": 0.7, "clarity": 0.6}),
+    ("query_type", "opinion", {"critical_thinking": 0.8, "evaluation": 0.7}),
+    ("query_type", "list", {"comprehensive": 0.7, "clarity": 0.6}),
+    # Dựa vào yêu cầu định dạng
+    ("requires_step_by_step", True, {"clarity": 0.8}),
+    ("requires_examples", True, {"technical_explanation": 0.7}),
+    ("requires_comparison", True, {"balanced": 0.8, "analysis": 0.7}),
+    # Dựa vào lĩnh vực
+    ("domain", "technology", {"technical_explanation": 0.8, "programming": 0.7}),
+    ("domain", "science", {"analysis": 0.8, "reasoning": 0.7}),
+    ("domain", "business", {"analysis": 0.7, "balanced": 0.7}),
+    ("domain", "arts", {"creative": 0.8}),
+]
+
+# Giá trị của query_type/domain có quy tắc riêng (giá trị khác được gộp chung khi tạo chữ ký)
+_RULE_QUERY_TYPES = frozenset(value for feature, value, _ in REQUIRED_STRENGTH_RULES if feature == "query_type")
+_RULE_DOMAINS = frozenset(value for feature, value, _ in REQUIRED_STRENGTH_RULES if feature == "domain")
+
 class PreferenceOptimizer:
     """
     Tối ưu hóa sở thích mô hình dựa trên:
@@ -50,29 +86,64 @@ class PreferenceOptimizer:
         self.min_weight = self.preference_config.get("min_weight", 0.5)
         self.max_weight = self.preference_config.get("max_weight", 2.0)
         
-        # Theo dõi số lần chọn và điểm số
+        # Trạng thái học được (trọng số, tỷ lệ thắng, điểm trung bình, số phản hồi, hiệu suất theo
+        # loại truy vấn) là một bộ dict không bị sửa tại chỗ: luồng ghi duy nhất (giữ _update_lock)
+        # cập nhật trên bản sao rồi gán thay thế cả bộ, nên luồng đọc không cần khóa và luôn thấy
+        # trạng thái nhất quán.
+        # Số phản hồi (hệ số suy giảm tỷ lệ thắng) chỉ thay đổi khi áp dụng phản hồi, nên cập nhật
+        # theo lô cho cùng kết quả với cập nhật tuần tự dù xen kẽ với chọn mô hình
+        self._learned_state: Tuple[Dict[str, float], Dict[str, float], Dict[str, float], Dict[str, int],
+                                   Dict[str, Dict[str, Dict[str, float]]]] = ({}, {}, {}, {}, {})
+        self._update_lock = threading.Lock()
+        
+        # Số lần chọn được tăng trên luồng xử lý yêu cầu nên có khóa riêng
         self.model_selection_count = {}
-        self.model_win_rate = {}
-        self.model_avg_score = {}
-        self.model_weights = {}
-        
-        # Cache cho hiệu suất mô hình theo loại truy vấn
-        self.model_performance_cache = {}
+        self._selection_lock = threading.Lock()
+        
+        # Hiệu suất theo từ khóa: count-min sketch có bộ nhớ cố định thay vì từ điển tăng theo từ vựng.
+        # Cũng được thay thế cả đối tượng như _learned_state: luồng ghi cập nhật bản sao (copy())
+        self.keyword_sketch = KeywordPerformanceSketch(
+            width=self.preference_config.get("keyword_sketch_width", 1024),
+            depth=self.preference_config.get("keyword_sketch_depth", 4),
+            min_count=self.preference_config.get("keyword_min_count", 3)
+        )
+        self.keyword_performance_weight = self.preference_config.get("keyword_performance_weight", 0.0)
         
         # Khởi tạo trọng số mặc định
         self._initialize_weights()
         
-    def _load_model_strengths(self) -> Dict[str, Dict[str, float]]:
+        # Cập nhật trọng số theo lô: phản hồi được xếp hàng và áp dụng sau mỗi update_interval
+        # phản hồi hoặc update_max_delay giây trên một luồng nền, ngoài luồng xử lý yêu cầu
+        self.periodic_update = self.preference_config.get("periodic_update", False)
+        self.update_interval = max(1, self.preference_config.get("update_interval", 10))
+        self.update_max_delay = self.preference_config.get("update_max_delay", 5.0)
+        self._pending_updates: deque = deque()
+        self._flush_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._update_thread: Optional[threading.Thread] = None
+        self._applied_updates = 0
+        self._applied_batches = 0
+        
+        # Vector yêu cầu theo chữ ký phân tích và ma trận điểm mạnh (mô hình x danh mục)
+        self._required_vector_cache: Dict[Tuple, Tuple[np.ndarray, np.ndarray, float]] = {}
+        self._strength_table = self._build_strength_table(self.model_strengths)
+        
+    def _load_model_strengths(self, models_config: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Dict[str, float]]:
         """
         Tải điểm mạnh của mô hình từ cấu hình
         
+        Args:
+            models_config: Danh sách cấu hình mô hình (mặc định: self.models_config)
+        
         Returns:
             Dict chứa điểm mạnh của mỗi mô hình
         """
         model_strengths = {}
+        if models_config is None:
+            models_config = self.models_config
         
         # Lấy điểm mạnh từ cấu hình
-        for model_config in self.models_config:
+        for model_config in models_config:
             model_name = model_config.get("name")
             if not model_name:
                 continue
@@ -100,22 +171,105 @@ class PreferenceOptimizer:
             
         return model_strengths
     
-    def _initialize_weights(self) -> None:
-        """Khởi tạo trọng số mặc định cho mỗi mô hình"""
-        for model_name in self.model_strengths.keys():
-            self.model_weights[model_name] = self.default_weight
-            self.model_selection_count[model_name] = 0
-            self.model_win_rate[model_name] = 0.5  # Tỷ lệ thắng mặc định là 50%
-            self.model_avg_score[model_name] = 0.5  # Điểm trung bình mặc định là 0.5
+    @property
+    def model_weights(self) -> Dict[str, float]:
+        """Trọng số hiện tại của các mô hình (không sửa trực tiếp)"""
+        return self._learned_state[0]
+    
+    @property
+    def model_win_rate(self) -> Dict[str, float]:
+        """Tỷ lệ thắng hiện tại của các mô hình (không sửa trực tiếp)"""
+        return self._learned_state[1]
+    
+    @property
+    def model_avg_score(self) -> Dict[str, float]:
+        """Điểm trung bình hiện tại của các mô hình (không sửa trực tiếp)"""
+        return self._learned_state[2]
+    
+    @property
+    def model_performance_cache(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Hiệu suất theo loại truy vấn ("type:<loại>" -> mô hình -> điểm/số lần, không sửa trực tiếp)"""
+        return self._learned_state[4]
+    
+    def _initialize_weights(self, model_names: Optional[List[str]] = None) -> None:
+        """
+        Khởi tạo trọng số mặc định cho các mô hình chưa có trọng số
+        
+        Args:
+            model_names: Danh sách mô hình (mặc định: các mô hình trong bảng điểm mạnh)
+        """
+        if model_names is None:
+            model_names = list(self.model_strengths.keys())
+            
+        with self._update_lock:
+            weights, win_rates, avg_scores, feedback_counts, performance_cache = (
+                dict(values) for values in self._learned_state)
+            for model_name in model_names:
+                if model_name in weights:
+                    continue
+                weights[model_name] = self.default_weight
+                win_rates[model_name] = 0.5  # Tỷ lệ thắng mặc định là 50%
+                avg_scores[model_name] = 0.5  # Điểm trung bình mặc định là 0.5
+                feedback_counts.setdefault(model_name, 0)
+                with self._selection_lock:
+                    self.model_selection_count.setdefault(model_name, 0)
+            self._learned_state = (weights, win_rates, avg_scores, feedback_counts, performance_cache)
+    
+    def _build_strength_table(self, model_strengths: Dict[str, Dict[str, float]]) -> Tuple[Dict[str, int], np.ndarray, np.ndarray, Dict]:
+        """
+        Dựng ma trận điểm mạnh dày đặc từ điểm mạnh của các mô hình
+        
+        Args:
+            model_strengths: Điểm mạnh của mỗi mô hình
+            
+        Returns:
+            Tuple (tên mô hình -> chỉ số hàng, ma trận mô hình x danh mục,
+                   điểm mạnh trung bình của mỗi mô hình, bộ nhớ tạm điểm theo chữ ký)
+        """
+        row_index = {name: row for row, name in enumerate(model_strengths)}
+        matrix = np.array([[strengths.get(category, 0.5) for category in self.strength_categories]
+                           for strengths in model_strengths.values()], dtype=np.float64)
+        matrix = matrix.reshape(len(model_strengths), len(self.strength_categories))
+        
+        # Trung bình dùng khi không có điểm mạnh nào được ưu tiên (cộng tuần tự như cách tính cũ)
+        means = np.array([sum(strengths.values()) / len(strengths) if strengths else 0.5
+                          for strengths in model_strengths.values()], dtype=np.float64)
+        
+        return row_index, matrix, means, {}
+    
+    def reload_models(self) -> None:
+        """
+        Tải lại điểm mạnh mô hình từ cấu hình hiện tại mà không mất trọng số đã học
+        
+        Mô hình mới được khởi tạo trọng số mặc định trước khi bảng điểm mạnh
+        mới được gán thay thế; trọng số, hiệu suất theo truy vấn và sketch từ khóa
+        đã học được giữ nguyên (dùng clear_cache() để xóa chúng một cách tường minh).
+        """
+        models_config = self.config.get("models", [])
+        model_strengths = self._load_model_strengths(models_config)
+        
+        self._initialize_weights(list(model_strengths))
+        
+        strength_table = self._build_strength_table(model_strengths)
+        
+        # Điểm đã tính theo chữ ký nằm trong bảng điểm mạnh nên được làm mới cùng bảng;
+        # vector yêu cầu chỉ phụ thuộc chữ ký phân tích nên vẫn dùng được
+        self._strength_table = strength_table
+        self.model_strengths = model_strengths
+        self.models_config = models_config
+        
+        logger.info(f"Đã tải lại điểm mạnh cho {len(model_strengths)} mô hình")
     
     def select_best_model(self, query_analysis: Dict[str, Any], 
-                         available_models: Optional[List[Dict[str, Any]]] = None) -> Optional[str]:
+                         available_models: Optional[List[Dict[str, Any]]] = None,
+                         query: Optional[str] = None) -> Optional[str]:
         """
         Chọn mô hình tốt nhất dựa trên phân tích truy vấn và điểm mạnh
         
         Args:
             query_analysis: Kết quả phân tích truy vấn
             available_models: Danh sách mô hình khả dụng (tùy chọn)
+            query: Truy vấn gốc, dùng cho hiệu suất theo từ khóa (tùy chọn)
             
         Returns:
             Tên của mô hình được chọn hoặc None
@@ -124,46 +278,157 @@ class PreferenceOptimizer:
         if not available_models and not self.model_strengths:
             return None
             
+        # Tính điểm cho mỗi mô hình (đã điều chỉnh theo trọng số)
+        model_scores = self.score_models(query_analysis, available_models, query)
+        if not model_scores:
+            return None
+            
+        # Chọn mô hình có điểm cao nhất (mô hình đứng trước thắng khi hòa)
+        best_model = max(model_scores.items(), key=lambda x: x[1])[0]
+        
+        # Cập nhật số lần chọn
+        with self._selection_lock:
+            self.model_selection_count[best_model] = self.model_selection_count.get(best_model, 0) + 1
+        
+        return best_model
+    
+    def score_models(self, query_analysis: Dict[str, Any],
+                     available_models: Optional[List[Dict[str, Any]]] = None,
+                     query: Optional[str] = None) -> Dict[str, float]:
+        """
+        Tính điểm của các mô hình theo điểm mạnh và trọng số (không cập nhật số lần chọn)
+        
+        Args:
+            query_analysis: Kết quả phân tích truy vấn
+            available_models: Danh sách mô hình khả dụng (tùy chọn)
+            query: Truy vấn gốc; khi có và keyword_performance_weight > 0, điểm được điều chỉnh
+                theo hiệu suất của mô hình với các từ khóa của truy vấn
+            
+        Returns:
+            Dict tên mô hình -> điểm, theo thứ tự danh sách mô hình
+        """
         # Lấy danh sách mô hình từ tham số hoặc cấu hình
-        model_list = []
-        if available_models:
-            model_list = available_models
-        else:
-            model_list = self.models_config
+        model_list = available_models if available_models else self.models_config
             
-        # Danh sách tên mô hình
+        # Danh sách tên mô hình (bỏ trùng lặp, giữ thứ tự)
+        strength_table = self._strength_table
         model_names = [model.get("name") for model in model_list if model.get("name")]
-        model_names = [name for name in model_names if name in self.model_strengths]
+        model_names = list(dict.fromkeys(name for name in model_names if name in strength_table[0]))
         
         if not model_names:
-            return None
-            
-        # Xác định điểm mạnh cần thiết từ phân tích truy vấn
-        required_strengths = self._determine_required_strengths(query_analysis)
-        
-        # Tính điểm cho mỗi mô hình
-        model_scores = {}
-        for model_name in model_names:
-            strengths = self.model_strengths.get(model_name, {})
-            score = self._calculate_model_score(strengths, required_strengths)
+            return {}
             
-            # Điều chỉnh điểm dựa trên trọng số
-            weight = self.model_weights.get(model_name, self.default_weight)
-            adjusted_score = score * weight
-            
-            model_scores[model_name] = adjusted_score
-            
-        # Chọn mô hình có điểm cao nhất
-        if model_scores:
-            best_model = max(model_scores.items(), key=lambda x: x[1])[0]
+        scores = self._score_models(model_names, query_analysis, strength_table)
+        
+        if query and self.keyword_performance_weight > 0:
+            keywords = self._extract_keywords(query)
+            keyword_sketch = self.keyword_sketch
+            for i, model_name in enumerate(model_names):
+                performance = keyword_sketch.query_feature(keywords, model_name)
+                if performance is not None:
+                    scores[i] *= 1.0 + self.keyword_performance_weight * (performance - 0.5)
+                    
+        return dict(zip(model_names, scores.tolist()))
+    
+    def _score_models(self, model_names: List[str], query_analysis: Dict[str, Any],
+                      strength_table: Optional[Tuple] = None) -> np.ndarray:
+        """
+        Tính điểm đã điều chỉnh trọng số cho danh sách mô hình bằng phép toán ma trận
+        
+        Args:
+            model_names: Tên các mô hình (phải có trong bảng điểm mạnh)
+            query_analysis: Kết quả phân tích truy vấn
+            strength_table: Bảng điểm mạnh dùng để tính (mặc định: bảng hiện tại)
             
-            # Cập nhật số lần chọn
-            self.model_selection_count[best_model] = self.model_selection_count.get(best_model, 0) + 1
+        Returns:
+            Mảng điểm theo thứ tự của model_names
+        """
+        row_index, matrix, means, score_cache = strength_table if strength_table is not None else self._strength_table
+        signature = self._strength_signature(query_analysis)
+        
+        # Điểm chưa nhân trọng số của mọi mô hình chỉ phụ thuộc vào chữ ký phân tích
+        base_scores = score_cache.get(signature)
+        if base_scores is None:
+            indices, importances, total_weight = self._required_strength_vector(signature)
+            if total_weight == 0:
+                # Không có điểm mạnh nào được ưu tiên: dùng điểm mạnh trung bình
+                base_scores = means
+            else:
+                # Cộng dồn tuần tự theo thứ tự danh mục để kết quả trùng khớp cách tính từng mô hình
+                weighted = matrix[:, indices] * importances
+                base_scores = np.cumsum(weighted, axis=1)[:, -1] / total_weight
+            score_cache[signature] = base_scores
+            
+        scores = base_scores[[row_index[name] for name in model_names]]
+        model_weights = self.model_weights
+        weights = np.fromiter((model_weights.get(name, self.default_weight) for name in model_names),
+                              dtype=np.float64, count=len(model_names))
+        return scores * weights
+    
+    def _strength_signature(self, query_analysis: Dict[str, Any]) -> Tuple:
+        """Tạo chữ ký phân tích gồm các đặc trưng mà quy tắc điểm mạnh sử dụng"""
+        complexity = query_analysis.get("complexity", 0)
+        format_reqs = query_analysis.get("format_requirements", {})
+        query_type = query_analysis.get("query_type", "")
+        domain = query_analysis.get("domain", "")
+        
+        return (
+            bool(query_analysis.get("requires_code", False)),
+            bool(query_analysis.get("requires_reasoning", False)),
+            bool(query_analysis.get("requires_creativity", False)),
+            "high" if complexity > 7 else "low" if complexity < 3 else "medium",
+            query_type if query_type in _RULE_QUERY_TYPES else "",
+            bool(format_reqs.get("requires_step_by_step", False)),
+            bool(format_reqs.get("requires_examples", False)),
+            bool(format_reqs.get("requires_comparison", False)),
+            domain if domain in _RULE_DOMAINS else ""
+        )
+    
+    def _required_strength_vector(self, signature: Tuple) -> Tuple[np.ndarray, np.ndarray, float]:
+        """
+        Lấy vector điểm mạnh cần thiết (chỉ các danh mục được ưu tiên), lưu tạm theo chữ ký
+        
+        Args:
+            signature: Chữ ký phân tích (xem _strength_signature)
             
-            return best_model
+        Returns:
+            Tuple (chỉ số danh mục, mức ưu tiên, tổng mức ưu tiên)
+        """
+        cached = self._required_vector_cache.get(signature)
+        if cached is not None:
+            return cached
             
-        # Mặc định chọn mô hình đầu tiên nếu không tính được điểm
-        return model_names[0] if model_names else None
+        required_strengths = self._required_strengths_for_signature(signature)
+        
+        indices = []
+        importances = []
+        total_weight = 0.0
+        for index, category in enumerate(self.strength_categories):
+            importance = required_strengths[category]
+            if importance > 0.1:  # Chỉ xem xét những điểm mạnh được ưu tiên
+                indices.append(index)
+                importances.append(importance)
+                total_weight += importance
+                
+        cached = (np.array(indices, dtype=np.intp), np.array(importances, dtype=np.float64), total_weight)
+        self._required_vector_cache[signature] = cached
+        return cached
+    
+    def _required_strengths_for_signature(self, signature: Tuple) -> Dict[str, float]:
+        """Áp dụng bảng quy tắc cho một chữ ký phân tích"""
+        features = dict(zip(
+            ("requires_code", "requires_reasoning", "requires_creativity", "complexity_level", "query_type",
+             "requires_step_by_step", "requires_examples", "requires_comparison", "domain"),
+            signature))
+        
+        # Mặc định mỗi điểm mạnh có mức ưu tiên thấp
+        required_strengths = {category: 0.1 for category in self.strength_categories}
+        
+        for feature, value, priorities in REQUIRED_STRENGTH_RULES:
+            if features[feature] == value:
+                required_strengths.update(priorities)
+                
+        return required_strengths
     
     def update_weights_from_feedback(self, query: str, responses: Dict[str, str],
                                     selected_response: str, feedback_score: Optional[float] = None) -> None:
@@ -176,7 +441,46 @@ class PreferenceOptimizer:
             selected_response: Tên mô hình được chọn
             feedback_score: Điểm đánh giá (0-1, tùy chọn)
         """
-        if not selected_response or selected_response not in self.model_weights:
+        with self._update_lock:
+            self._apply_feedback_batch([(query, responses, selected_response, feedback_score)])
+    
+    def _apply_feedback_batch(self, events: List[Tuple[str, Dict[str, str], str, Optional[float]]]) -> int:
+        """
+        Áp dụng tuần tự một lô phản hồi trên bản sao trạng thái rồi gán thay thế một lần.
+        Phải được gọi khi đang giữ _update_lock.
+        
+        Args:
+            events: Danh sách (query, responses, selected_response, feedback_score)
+            
+        Returns:
+            Số phản hồi đã áp dụng
+        """
+        # Hiệu suất theo loại truy vấn chỉ chép dict ngoài, dict của từng loại được chép khi ghi
+        weights, win_rates, avg_scores, feedback_counts, performance_cache = (
+            dict(values) for values in self._learned_state)
+        keyword_sketch = self.keyword_sketch.copy()
+        
+        applied = 0
+        for query, responses, selected_response, feedback_score in events:
+            try:
+                self._apply_feedback(weights, win_rates, avg_scores, feedback_counts, performance_cache,
+                                     keyword_sketch, query, responses, selected_response, feedback_score)
+                applied += 1
+            except Exception as e:
+                logger.error(f"Lỗi khi áp dụng phản hồi cho {selected_response}: {e}")
+                
+        self._learned_state = (weights, win_rates, avg_scores, feedback_counts, performance_cache)
+        self.keyword_sketch = keyword_sketch
+        return applied
+    
+    def _apply_feedback(self, weights: Dict[str, float], win_rates: Dict[str, float],
+                        avg_scores: Dict[str, float], feedback_counts: Dict[str, int],
+                        performance_cache: Dict[str, Dict[str, Dict[str, float]]],
+                        keyword_sketch: KeywordPerformanceSketch,
+                        query: str, responses: Dict[str, str],
+                        selected_response: str, feedback_score: Optional[float]) -> None:
+        """Áp dụng một phản hồi lên các dict trạng thái đang cập nhật"""
+        if not selected_response or selected_response not in weights:
             return
             
         # Cập nhật tỷ lệ thắng
@@ -184,21 +488,21 @@ class PreferenceOptimizer:
         if len(participating_models) > 1 and selected_response in participating_models:
             for model in participating_models:
                 if model == selected_response:
-                    self._update_win_rate(model, True)
+                    self._update_win_rate(model, True, win_rates, feedback_counts)
                 else:
-                    self._update_win_rate(model, False)
+                    self._update_win_rate(model, False, win_rates, feedback_counts)
                     
         # Cập nhật điểm trung bình
         if feedback_score is not None:
-            current_avg = self.model_avg_score.get(selected_response, 0.5)
-            count = self.model_selection_count.get(selected_response, 1)
+            current_avg = avg_scores.get(selected_response, 0.5)
+            count = max(1, feedback_counts.get(selected_response, 1))
             # Trung bình có trọng số, ưu tiên giá trị mới hơn
             new_avg = (current_avg * 0.9 * count + feedback_score * 0.1 * count) / count
-            self.model_avg_score[selected_response] = new_avg
+            avg_scores[selected_response] = new_avg
             
         # Cập nhật trọng số
-        win_rate = self.model_win_rate.get(selected_response, 0.5)
-        avg_score = self.model_avg_score.get(selected_response, 0.5)
+        win_rate = win_rates.get(selected_response, 0.5)
+        avg_score = avg_scores.get(selected_response, 0.5)
         
         # Tính toán trọng số mới dựa trên tỷ lệ thắng và điểm trung bình
         performance_score = (
@@ -207,32 +511,122 @@ class PreferenceOptimizer:
         )
         
         # Điều chỉnh trọng số
-        current_weight = self.model_weights.get(selected_response, self.default_weight)
+        current_weight = weights.get(selected_response, self.default_weight)
         adjustment = (performance_score - 0.5) * self.weight_update_factor
         
         new_weight = current_weight + adjustment
         new_weight = max(self.min_weight, min(self.max_weight, new_weight))
         
-        self.model_weights[selected_response] = new_weight
+        weights[selected_response] = new_weight
         
         # Cập nhật cache hiệu suất
-        self._update_performance_cache(query, selected_response, feedback_score)
+        self._update_performance_cache(query, selected_response, feedback_score, keyword_sketch,
+                                       performance_cache)
+    
+    def submit_feedback(self, query: str, responses: Dict[str, str],
+                        selected_response: str, feedback_score: Optional[float] = None) -> None:
+        """
+        Ghi nhận phản hồi để cập nhật trọng số. Khi bật periodic_update, phản hồi được xếp hàng
+        và áp dụng theo lô trên luồng nền; nếu không, cập nhật ngay như update_weights_from_feedback.
+        
+        Args:
+            query: Truy vấn người dùng
+            responses: Dict các câu trả lời với key là model_name
+            selected_response: Tên mô hình được chọn
+            feedback_score: Điểm đánh giá (0-1, tùy chọn)
+        """
+        if not self.periodic_update:
+            with self._update_lock:
+                self._applied_updates += self._apply_feedback_batch(
+                    [(query, responses, selected_response, feedback_score)])
+            return
+            
+        self._pending_updates.append((query, responses, selected_response, feedback_score))
+        self._ensure_update_thread()
+        if len(self._pending_updates) >= self.update_interval:
+            self._flush_event.set()
+    
+    def flush_pending_updates(self) -> int:
+        """
+        Áp dụng ngay các phản hồi đang chờ, tuần tự theo thứ tự nhận được nên kết quả
+        giống hệt khi áp dụng từng phản hồi một
+        
+        Returns:
+            Số phản hồi đã áp dụng
+        """
+        with self._update_lock:
+            # Chỉ lấy các phản hồi đã có lúc bắt đầu, phản hồi đến sau thuộc lô kế tiếp
+            events = [self._pending_updates.popleft() for _ in range(len(self._pending_updates))]
+            applied = self._apply_feedback_batch(events) if events else 0
+                    
+            if applied:
+                self._applied_updates += applied
+                self._applied_batches += 1
+                
+        return applied
+    
+    def stop_updates(self) -> None:
+        """Dừng luồng cập nhật nền và áp dụng các phản hồi còn lại"""
+        self._stop_event.set()
+        self._flush_event.set()
+        if self._update_thread is not None:
+            self._update_thread.join(timeout=self.update_max_delay + 1)
+            self._update_thread = None
+        self.flush_pending_updates()
+    
+    def get_update_stats(self) -> Dict[str, Any]:
+        """
+        Lấy thống kê cập nhật trọng số
+        
+        Returns:
+            Dict chứa chế độ cập nhật, số phản hồi đang chờ và đã áp dụng
+        """
+        return {
+            "periodic_update": self.periodic_update,
+            "update_interval": self.update_interval,
+            "pending": len(self._pending_updates),
+            "applied": self._applied_updates,
+            "batches": self._applied_batches
+        }
     
-    def _update_win_rate(self, model_name: str, is_win: bool) -> None:
+    def _ensure_update_thread(self) -> None:
+        """Khởi động luồng cập nhật nền nếu chưa chạy"""
+        if self._update_thread is not None and self._update_thread.is_alive():
+            return
+            
+        with self._update_lock:
+            if self._update_thread is not None and self._update_thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._update_thread = threading.Thread(target=self._run_updates, name="preference-updates",
+                                                   daemon=True)
+            self._update_thread.start()
+    
+    def _run_updates(self) -> None:
+        """Vòng lặp của luồng cập nhật: áp dụng lô khi đủ số phản hồi hoặc hết thời gian chờ"""
+        while not self._stop_event.is_set():
+            self._flush_event.wait(timeout=self.update_max_delay)
+            self._flush_event.clear()
+            if self._pending_updates:
+                self.flush_pending_updates()
+    
+    def _update_win_rate(self, model_name: str, is_win: bool, win_rates: Dict[str, float],
+                         feedback_counts: Dict[str, int]) -> None:
         """
         Cập nhật tỷ lệ thắng của mô hình
         
         Args:
             model_name: Tên mô hình
             is_win: True nếu mô hình được chọn, False nếu không
+            win_rates: Dict tỷ lệ thắng đang cập nhật
+            feedback_counts: Dict số phản hồi đang cập nhật
         """
-        if model_name not in self.model_win_rate:
-            self.model_win_rate[model_name] = 0.5
-            self.model_selection_count[model_name] = 0
+        if model_name not in win_rates:
+            feedback_counts[model_name] = 0
+        new_count = feedback_counts.get(model_name, 0) + 1
+        feedback_counts[model_name] = new_count
             
-        current_rate = self.model_win_rate[model_name]
-        count = self.model_selection_count[model_name]
-        new_count = count + 1
+        current_rate = win_rates.get(model_name, 0.5)
         
         # Tỷ lệ thắng mới với trọng số giảm dần theo thời gian
         decay_factor = min(100, new_count) / (min(100, new_count) + 10)
@@ -240,8 +634,7 @@ class PreferenceOptimizer:
         
         new_rate = current_rate * decay_factor + win_value * (1 - decay_factor)
         
-        self.model_win_rate[model_name] = new_rate
-        self.model_selection_count[model_name] = new_count
+        win_rates[model_name] = new_rate
     
     def _determine_required_strengths(self, query_analysis: Dict[str, Any]) -> Dict[str, float]:
         """
@@ -253,80 +646,7 @@ class PreferenceOptimizer:
         Returns:
             Dict chứa điểm mạnh cần thiết và mức độ ưu tiên
         """
-        required_strengths = {}
-        
-        # Mặc định mỗi điểm mạnh có mức ưu tiên thấp
-        for category in self.strength_categories:
-            required_strengths[category] = 0.1
-            
-        # Dựa vào phân tích, điều chỉnh mức ưu tiên
-        if query_analysis.get("requires_code", False):
-            required_strengths["programming"] = 0.9
-            required_strengths["algorithms"] = 0.7
-            required_strengths["technical_explanation"] = 0.6
-            
-        if query_analysis.get("requires_reasoning", False):
-            required_strengths["reasoning"] = 0.8
-            required_strengths["critical_thinking"] = 0.7
-            required_strengths["analysis"] = 0.7
-            required_strengths["evaluation"] = 0.6
-            
-        if query_analysis.get("requires_creativity", False):
-            required_strengths["creative"] = 0.9
-            
-        # Dựa vào độ phức tạp
-        complexity = query_analysis.get("complexity", 0)
-        if complexity > 7:
-            required_strengths["comprehensive"] = 0.8
-            required_strengths["thorough"] = 0.7
-            required_strengths["balanced"] = 0.6
-        elif complexity < 3:
-            required_strengths["conciseness"] = 0.8
-            required_strengths["clarity"] = 0.7
-            
-        # Dựa vào loại truy vấn
-        query_type = query_analysis.get("query_type", "")
-        if query_type == "how_to":
-            required_strengths["technical_explanation"] = 0.7
-            required_strengths["clarity"] = 0.7
-        elif query_type == "comparison":
-            required_strengths["balanced"] = 0.8
-            required_strengths["analysis"] = 0.7
-        elif query_type == "what_is":
-            required_strengths["general_knowledge"] = 0.7
-            required_strengths["clarity"] = 0.6
-        elif query_type == "opinion":
-            required_strengths["critical_thinking"] = 0.8
-            required_strengths["evaluation"] = 0.7
-        elif query_type == "list":
-            required_strengths["comprehensive"] = 0.7
-            required_strengths["clarity"] = 0.6
-            
-        # Dựa vào yêu cầu định dạng
-        format_reqs = query_analysis.get("format_requirements", {})
-        if format_reqs.get("requires_step_by_step", False):
-            required_strengths["clarity"] = 0.8
-        if format_reqs.get("requires_examples", False):
-            required_strengths["technical_explanation"] = 0.7
-        if format_reqs.get("requires_comparison", False):
-            required_strengths["balanced"] = 0.8
-            required_strengths["analysis"] = 0.7
-            
-        # Xem xét lĩnh vực
-        domain = query_analysis.get("domain", "")
-        if domain == "technology":
-            required_strengths["technical_explanation"] = 0.8
-            required_strengths["programming"] = 0.7
-        elif domain == "science":
-            required_strengths["analysis"] = 0.8
-            required_strengths["reasoning"] = 0.7
-        elif domain == "business":
-            required_strengths["analysis"] = 0.7
-            required_strengths["balanced"] = 0.7
-        elif domain == "arts":
-            required_strengths["creative"] = 0.8
-            
-        return required_strengths
+        return self._required_strengths_for_signature(self._strength_signature(query_analysis))
     
     def _calculate_model_score(self, model_strengths: Dict[str, float],
                               required_strengths: Dict[str, float]) -> float:
@@ -356,7 +676,9 @@ class PreferenceOptimizer:
         return score / total_weight
     
     def _update_performance_cache(self, query: str, model_name: str, 
-                                feedback_score: Optional[float]) -> None:
+                                feedback_score: Optional[float],
+                                keyword_sketch: KeywordPerformanceSketch,
+                                performance_cache: Dict[str, Dict[str, Dict[str, float]]]) -> None:
         """
         Cập nhật bộ nhớ cache hiệu suất mô hình
         
@@ -364,51 +686,32 @@ class PreferenceOptimizer:
             query: Truy vấn người dùng
             model_name: Tên mô hình
             feedback_score: Điểm đánh giá
+            keyword_sketch: Bản sao sketch đang được cập nhật
+            performance_cache: Bản sao hiệu suất theo loại truy vấn đang được cập nhật
         """
         if feedback_score is None:
             return
             
         # Trích xuất từ khóa
         keywords = self._extract_keywords(query)
-        query_type = self._infer_query_type(query)
+        query_type = self.infer_query_type(query)
         
-        # Cập nhật cache cho từng từ khóa
+        # Cập nhật sketch cho từng từ khóa
         for keyword in keywords:
-            if keyword not in self.model_performance_cache:
-                self.model_performance_cache[keyword] = {}
-                
-            if model_name not in self.model_performance_cache[keyword]:
-                self.model_performance_cache[keyword][model_name] = {
-                    "score": 0.5,
-                    "count": 0
-                }
-                
-            current = self.model_performance_cache[keyword][model_name]
-            new_score = (current["score"] * current["count"] + feedback_score) / (current["count"] + 1)
-            
-            self.model_performance_cache[keyword][model_name] = {
-                "score": new_score,
-                "count": current["count"] + 1
-            }
+            keyword_sketch.add(keyword, model_name, feedback_score)
             
-        # Cập nhật cache cho loại truy vấn
+        # Cập nhật cache cho loại truy vấn: dict của loại có thể đang được luồng đọc dùng nên
+        # chép rồi gán thay thế, bản ghi của mô hình cũng được tạo mới
         query_key = f"type:{query_type}"
-        if query_key not in self.model_performance_cache:
-            self.model_performance_cache[query_key] = {}
-            
-        if model_name not in self.model_performance_cache[query_key]:
-            self.model_performance_cache[query_key][model_name] = {
-                "score": 0.5,
-                "count": 0
-            }
-            
-        current = self.model_performance_cache[query_key][model_name]
+        models = dict(performance_cache.get(query_key, {}))
+        current = models.get(model_name, {"score": 0.5, "count": 0})
         new_score = (current["score"] * current["count"] + feedback_score) / (current["count"] + 1)
         
-        self.model_performance_cache[query_key][model_name] = {
+        models[model_name] = {
             "score": new_score,
             "count": current["count"] + 1
         }
+        performance_cache[query_key] = models
     
     def _extract_keywords(self, query: str) -> List[str]:
         """
@@ -433,9 +736,9 @@ class PreferenceOptimizer:
         
         return keywords
     
-    def _infer_query_type(self, query: str) -> str:
+    def infer_query_type(self, query: str) -> str:
         """
-        Suy luận loại truy vấn
+        Suy luận loại truy vấn (khóa "type:<loại>" của model_performance_cache)
         
         Args:
             query: Truy vấn người dùng
@@ -481,23 +784,94 @@ class PreferenceOptimizer:
             Dict chứa thống kê về mỗi mô hình
         """
         stats = {}
+        weights, win_rates, avg_scores, feedback_counts, _ = self._learned_state
+        with self._selection_lock:
+            selection_count = dict(self.model_selection_count)
         
-        for model_name in self.model_weights.keys():
+        for model_name in weights.keys():
             stats[model_name] = {
-                "weight": self.model_weights.get(model_name, self.default_weight),
-                "win_rate": self.model_win_rate.get(model_name, 0.5),
-                "avg_score": self.model_avg_score.get(model_name, 0.5),
-                "selection_count": self.model_selection_count.get(model_name, 0),
+                "weight": weights.get(model_name, self.default_weight),
+                "win_rate": win_rates.get(model_name, 0.5),
+                "avg_score": avg_scores.get(model_name, 0.5),
+                "selection_count": selection_count.get(model_name, 0),
+                "feedback_count": feedback_counts.get(model_name, 0),
                 "strengths": self.model_strengths.get(model_name, {})
             }
             
         return stats
-    
+
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Lấy trạng thái học được từ phản hồi để lưu snapshot
+
+        Returns:
+            Dict chứa trọng số, tỷ lệ thắng, điểm trung bình, số lần chọn, số phản hồi và cache hiệu suất
+        """
+        # Trạng thái học được và sketch được gán thay thế riêng rẽ nên đọc khi giữ khóa ghi để hai phần khớp nhau
+        with self._update_lock:
+            weights, win_rates, avg_scores, feedback_counts, performance_cache = self._learned_state
+            with self._selection_lock:
+                selection_count = dict(self.model_selection_count)
+            return {
+                "model_weights": dict(weights),
+                "model_win_rate": dict(win_rates),
+                "model_avg_score": dict(avg_scores),
+                "model_selection_count": selection_count,
+                "model_feedback_count": dict(feedback_counts),
+                "model_performance_cache": {
+                    key: {model_name: dict(perf) for model_name, perf in models.items()}
+                    for key, models in performance_cache.items()
+                },
+                "keyword_sketch": self.keyword_sketch.get_state()
+            }
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        """
+        Khôi phục trạng thái từ snapshot
+
+        Mô hình không còn trong cấu hình vẫn được giữ lại để không mất dữ liệu khi
+        cấu hình mô hình thay đổi tạm thời.
+
+        Args:
+            state: Trạng thái do get_state tạo ra
+        """
+        with self._update_lock:
+            weights, win_rates, avg_scores, feedback_counts, performance_cache = (
+                dict(values) for values in self._learned_state)
+            weights.update({
+                model_name: max(self.min_weight, min(self.max_weight, float(weight)))
+                for model_name, weight in state.get("model_weights", {}).items()
+            })
+            win_rates.update(state.get("model_win_rate", {}))
+            avg_scores.update(state.get("model_avg_score", {}))
+            # Snapshot cũ chỉ có bộ đếm chung của lần chọn và phản hồi: dùng nó làm số phản hồi
+            feedback_counts.update(state.get("model_feedback_count", state.get("model_selection_count", {})))
+            # Snapshot cũ có thể chứa mục theo từ khóa, chỉ giữ mục theo loại truy vấn
+            performance_cache.update({
+                key: {model_name: dict(perf) for model_name, perf in models.items()}
+                for key, models in state.get("model_performance_cache", {}).items()
+                if key.startswith("type:")
+            })
+            self._learned_state = (weights, win_rates, avg_scores, feedback_counts, performance_cache)
+            
+            with self._selection_lock:
+                self.model_selection_count.update(state.get("model_selection_count", {}))
+            if "keyword_sketch" in state:
+                keyword_sketch = self.keyword_sketch.copy()
+                keyword_sketch.load_state(state["keyword_sketch"])
+                self.keyword_sketch = keyword_sketch
+
     def clear_cache(self) -> None:
         """Xóa bộ nhớ cache hiệu suất"""
-        self.model_performance_cache.clear()
+        with self._update_lock:
+            self._learned_state = self._learned_state[:4] + ({},)
+            keyword_sketch = self.keyword_sketch.copy()
+            keyword_sketch.clear()
+            self.keyword_sketch = keyword_sketch
         
     def reset_weights(self) -> None:
         """Đặt lại trọng số về mặc định"""
-        for model_name in self.model_weights.keys():
-            self.model_weights[model_name] = self.default_weight
\ No newline at end of file
+        with self._update_lock:
+            weights = self._learned_state[0]
+            self._learned_state = (({model_name: self.default_weight for model_name in weights},)
+                                   + self._learned_state[1:])
\ No newline at end of file
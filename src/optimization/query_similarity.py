@@ -0,0 +1,269 @@
+"""
+Module chỉ mục tương đồng cho các truy vấn đã được phân tích
+"""
+
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class QuerySimilarityIndex:
+    """
+    Chỉ mục tương đồng cho truy vấn dựa trên MinHash LSH:
+    - Truy vấn được chuẩn hóa và tách thành các n-gram ký tự
+    - Chữ ký MinHash được tính theo dạng vector hóa bằng numpy
+    - Chữ ký được chia thành các dải (band) để tìm ứng viên bằng tra cứu dict
+    - Ứng viên được lọc bằng độ tương đồng ước lượng từ chữ ký, rồi xác nhận bằng
+      độ tương đồng Jaccard chính xác
+
+    Xác suất một truy vấn có độ tương đồng s trở thành ứng viên là 1 - (1 - s^r)^b
+    (b dải, r hàng mỗi dải). Mặc định 8 dải x 4 hàng đặt điểm giữa của đường cong
+    (1/b)^(1/r) ≈ 0.59, thấp hơn nhiều so với ngưỡng 0.85: ở ngưỡng chỉ bỏ sót khoảng 0.3%.
+    """
+
+    _WHITESPACE_PATTERN = re.compile(r"\s+")
+
+    # Ứng viên có tỷ lệ hàm băm trùng khớp thấp hơn ngưỡng quá mức này bị loại trước khi tính
+    # Jaccard chính xác (với 32 hàm băm, khoảng 4 độ lệch chuẩn của ước lượng ở ngưỡng 0.85)
+    ESTIMATE_MARGIN = 0.25
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 32, bands: int = 8,
+                 ngram_size: int = 3, max_entries: int = 1000000, seed: int = 42):
+        """
+        Khởi tạo chỉ mục tương đồng
+
+        Args:
+            threshold: Ngưỡng tương đồng Jaccard để tái sử dụng kết quả
+            num_perm: Số hàm băm trong chữ ký MinHash
+            bands: Số dải LSH (num_perm phải chia hết cho bands)
+            ngram_size: Độ dài n-gram ký tự
+            max_entries: Số lượng truy vấn tối đa lưu trong chỉ mục
+            seed: Hạt giống sinh các hàm băm
+        """
+        if num_perm % bands != 0:
+            raise ValueError(f"num_perm ({num_perm}) phải chia hết cho bands ({bands})")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.ngram_size = ngram_size
+        self.max_entries = max_entries
+
+        # Hàm băm dạng multiply-shift: h(x) = (a * x + b) >> 32, a lẻ
+        rng = np.random.default_rng(seed)
+        self._hash_a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._hash_b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+        # Bảng băm cho từng dải: band_key -> id hoặc danh sách id
+        self._buckets: List[Dict[int, Any]] = [{} for _ in range(bands)]
+
+        # id -> (truy vấn đã chuẩn hóa, giá trị, chữ ký MinHash dạng bytes)
+        self._entries: "OrderedDict[int, Tuple[str, Any, bytes]]" = OrderedDict()
+        self._key_to_id: Dict[Hashable, int] = {}
+        self._next_id = 0
+
+        # Chỉ mục được dùng chung giữa các luồng xử lý truy vấn
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, query: str, value: Any) -> None:
+        """
+        Thêm truy vấn và giá trị đi kèm vào chỉ mục
+
+        Args:
+            query: Truy vấn gốc
+            value: Giá trị lưu kèm (ví dụ: kết quả phân tích)
+        """
+        normalized = self._normalize(query)
+        if not normalized:
+            return
+
+        signature = self._signature(self._shingles(normalized))
+        with self._lock:
+            self._add_locked(normalized, value, signature)
+
+    def _add_locked(self, normalized: str, value: Any, signature: np.ndarray) -> None:
+        """Thêm mục vào chỉ mục (gọi khi đang giữ khóa)"""
+        # Cập nhật giá trị nếu truy vấn đã tồn tại
+        existing_id = self._key_to_id.get(normalized)
+        if existing_id is not None:
+            _, _, signature_bytes = self._entries[existing_id]
+            self._entries[existing_id] = (normalized, value, signature_bytes)
+            return
+
+        entry_id = self._next_id
+        self._next_id += 1
+
+        for band, band_key in enumerate(self._band_keys(signature)):
+            bucket = self._buckets[band]
+            current = bucket.get(band_key)
+            if current is None:
+                bucket[band_key] = entry_id
+            elif isinstance(current, list):
+                current.append(entry_id)
+            else:
+                bucket[band_key] = [current, entry_id]
+
+        self._entries[entry_id] = (normalized, value, signature.tobytes())
+        self._key_to_id[normalized] = entry_id
+
+        # Giới hạn kích thước chỉ mục (loại bỏ mục cũ nhất)
+        while len(self._entries) > self.max_entries:
+            self._evict_oldest()
+
+    def lookup(self, query: str) -> Optional[Tuple[Any, float]]:
+        """
+        Tìm truy vấn tương tự nhất vượt ngưỡng
+
+        Args:
+            query: Truy vấn cần tìm
+
+        Returns:
+            Tuple (giá trị, độ tương đồng) hoặc None nếu không có truy vấn đủ tương tự
+        """
+        normalized = self._normalize(query)
+        if not normalized or not self._entries:
+            return None
+
+        # Trùng khớp sau chuẩn hóa
+        with self._lock:
+            exact_id = self._key_to_id.get(normalized)
+            if exact_id is not None:
+                return self._entries[exact_id][1], 1.0
+
+        shingles = self._shingles(normalized)
+        signature = self._signature(shingles)
+
+        with self._lock:
+            candidates: Set[int] = set()
+            for band, band_key in enumerate(self._band_keys(signature)):
+                current = self._buckets[band].get(band_key)
+                if current is None:
+                    continue
+                if isinstance(current, list):
+                    candidates.update(current)
+                else:
+                    candidates.add(current)
+
+            candidate_entries = [self._entries[entry_id] for entry_id in candidates]
+
+        if not candidate_entries:
+            return None
+
+        # Lọc theo tỷ lệ hàm băm trùng khớp (ước lượng Jaccard) trên toàn bộ ứng viên cùng lúc
+        candidate_signatures = np.frombuffer(b"".join(entry[2] for entry in candidate_entries),
+                                             dtype=np.uint32).reshape(len(candidate_entries), self.num_perm)
+        estimates = (candidate_signatures == signature).mean(axis=1)
+        min_estimate = self.threshold - self.ESTIMATE_MARGIN
+
+        best_value = None
+        best_similarity = 0.0
+        for (candidate_text, value, _), estimate in zip(candidate_entries, estimates):
+            if estimate < min_estimate:
+                continue
+            similarity = self._jaccard(shingles, self._shingles(candidate_text))
+            if similarity > best_similarity:
+                best_similarity = similarity
+                best_value = value
+
+        if best_value is not None and best_similarity >= self.threshold:
+            return best_value, best_similarity
+
+        return None
+
+    def clear(self) -> None:
+        """Xóa toàn bộ chỉ mục"""
+        with self._lock:
+            for bucket in self._buckets:
+                bucket.clear()
+            self._entries.clear()
+            self._key_to_id.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Lấy thống kê về chỉ mục
+
+        Returns:
+            Dict chứa số lượng mục, số bucket của mỗi dải và xác suất tìm thấy ứng viên ở ngưỡng
+        """
+        return {
+            "entries": len(self._entries),
+            "threshold": self.threshold,
+            "num_perm": self.num_perm,
+            "bands": self.bands,
+            "candidate_probability": self.candidate_probability(self.threshold),
+            "buckets_per_band": [len(bucket) for bucket in self._buckets]
+        }
+
+    def candidate_probability(self, similarity: float) -> float:
+        """
+        Xác suất một truy vấn đã lưu có độ tương đồng similarity trở thành ứng viên
+
+        Args:
+            similarity: Độ tương đồng Jaccard
+
+        Returns:
+            1 - (1 - similarity^r)^b
+        """
+        return 1.0 - (1.0 - similarity ** self.rows_per_band) ** self.bands
+
+    def _normalize(self, query: str) -> str:
+        """Chuẩn hóa truy vấn: chữ thường, gộp khoảng trắng"""
+        return self._WHITESPACE_PATTERN.sub(" ", query.lower()).strip()
+
+    def _shingles(self, text: str) -> Set[str]:
+        """Tách văn bản thành tập n-gram ký tự"""
+        n = self.ngram_size
+        if len(text) <= n:
+            return {text}
+        return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+    def _signature(self, shingles: Set[str]) -> np.ndarray:
+        """Tính chữ ký MinHash (num_perm giá trị 32 bit)"""
+        values = np.fromiter((hash(s) & 0xFFFFFFFF for s in shingles),
+                             dtype=np.uint64, count=len(shingles))
+
+        # Ma trận (số n-gram x num_perm), tràn số uint64 là chủ ý (multiply-shift)
+        hashed = (np.multiply.outer(values, self._hash_a) + self._hash_b) >> np.uint64(32)
+        return hashed.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> Tuple[int, ...]:
+        """Tính khóa băm cho từng dải của chữ ký"""
+        r = self.rows_per_band
+        return tuple(hash(signature[band * r:(band + 1) * r].tobytes())
+                     for band in range(self.bands))
+
+    @staticmethod
+    def _jaccard(first: Set[str], second: Set[str]) -> float:
+        """Độ tương đồng Jaccard giữa hai tập n-gram"""
+        if not first or not second:
+            return 0.0
+        intersection = len(first & second)
+        return intersection / (len(first) + len(second) - intersection)
+
+    def _evict_oldest(self) -> None:
+        """Loại bỏ mục cũ nhất khỏi chỉ mục"""
+        entry_id, (normalized, _, signature_bytes) = self._entries.popitem(last=False)
+        self._key_to_id.pop(normalized, None)
+
+        band_keys = self._band_keys(np.frombuffer(signature_bytes, dtype=np.uint32))
+        for band, band_key in enumerate(band_keys):
+            bucket = self._buckets[band]
+            current = bucket.get(band_key)
+            if isinstance(current, list):
+                if entry_id in current:
+                    current.remove(entry_id)
+                if len(current) == 1:
+                    bucket[band_key] = current[0]
+                elif not current:
+                    del bucket[band_key]
+            elif current == entry_id:
+                del bucket[band_key]
@@ -4,11 +4,28 @@ Module cho việc tối ưu hóa câu trả lời dựa trên phân tích truy v
 
 import logging
 import os
+import threading
 import yaml
 from typing import Dict, List, Any, Optional, Tuple
 
+from src.optimization.query_similarity import QuerySimilarityIndex
+from src.optimization.template_index import TemplateIndex
+from src.utils.prompt_templates import compile_template
+
 logger = logging.getLogger(__name__)
 
+# Hướng dẫn tương ứng với từng yêu cầu định dạng
+FORMAT_INSTRUCTIONS = {
+    "requires_list": "Trình bày kết quả dưới dạng danh sách có cấu trúc.",
+    "requires_step_by_step": "Cung cấp hướng dẫn từng bước chi tiết.",
+    "requires_examples": "Đưa ra các ví dụ cụ thể để minh họa.",
+    "requires_summary": "Kèm theo tóm tắt ngắn gọn các điểm chính.",
+    "requires_comparison": "So sánh rõ ràng các khía cạnh khác nhau.",
+    "requires_pros_cons": "Liệt kê ưu điểm và nhược điểm.",
+    "requires_table": "Trình bày dữ liệu dưới dạng bảng nếu phù hợp.",
+    "requires_diagram": "Mô tả bằng sơ đồ hoặc biểu đồ nếu có thể."
+}
+
 class ResponseOptimizer:
     """
     Tối ưu hóa câu trả lời dựa trên phân tích truy vấn người dùng,
@@ -27,6 +44,7 @@ class ResponseOptimizer:
         
         # Tải các mẫu prompt
         self.prompt_templates = self._load_prompt_templates()
+        self.template_index = TemplateIndex(self.prompt_templates)
         logger.info(f"Đã tải {len(self.prompt_templates)} mẫu prompt từ {self._get_template_path()}")
         
         # Cấu hình tối ưu
@@ -41,7 +59,24 @@ class ResponseOptimizer:
         
         # Bộ nhớ tạm cho các phân tích trước đó
         self.query_analysis_cache = {}
+        
+        # Hiệu suất mẫu được cập nhật trên bản sao rồi gán thay thế (một luồng ghi giữ khóa),
+        # luồng chọn mẫu đọc không cần khóa
         self.template_performance_history = {}
+        self._performance_lock = threading.Lock()
+        
+        # Bộ nhớ tạm các đoạn hướng dẫn theo chữ ký phân tích
+        self._format_fragment_cache: Dict[Tuple, str] = {}
+        self._instruction_fragment_cache: Dict[Tuple, str] = {}
+        
+        # Tái sử dụng phân loại của truy vấn tương tự
+        self.query_analysis_config = config.get("optimization", {}).get("query_analysis", {})
+        self.use_cached_categories = self.query_analysis_config.get("use_cached_categories", False)
+        self.similarity_index = None
+        if self.use_cached_categories:
+            self.similarity_index = QuerySimilarityIndex(
+                threshold=self.query_analysis_config.get("category_similarity_threshold", 0.85),
+                max_entries=self.query_analysis_config.get("similarity_index_size", 1000000))
         
     def _get_template_path(self) -> str:
         """Lấy đường dẫn đến file mẫu prompt"""
@@ -51,14 +86,43 @@ class ResponseOptimizer:
     def _load_prompt_templates(self) -> List[Dict[str, Any]]:
         """Tải các mẫu prompt từ file cấu hình"""
         try:
-            template_path = self._get_template_path()
-            with open(template_path, 'r', encoding='utf-8') as f:
-                templates_data = yaml.safe_load(f)
-            return templates_data.get("templates", [])
+            return self._read_prompt_templates()
         except Exception as e:
             logger.error(f"Lỗi khi tải mẫu prompt: {e}")
             return []
     
+    def _read_prompt_templates(self) -> List[Dict[str, Any]]:
+        """Đọc các mẫu prompt từ file cấu hình (ném ngoại lệ nếu lỗi)"""
+        template_path = self._get_template_path()
+        with open(template_path, 'r', encoding='utf-8') as f:
+            templates_data = yaml.safe_load(f)
+        return (templates_data or {}).get("templates", [])
+    
+    def reload_templates(self) -> bool:
+        """
+        Tải lại mẫu prompt từ file cấu hình mà không cần khởi động lại
+        
+        Chỉ mục mới được dựng xong trước khi thay thế, các yêu cầu đang xử lý
+        tiếp tục dùng chỉ mục cũ. Nếu file lỗi, giữ nguyên mẫu hiện tại.
+        
+        Returns:
+            True nếu tải lại thành công
+        """
+        try:
+            templates = self._read_prompt_templates()
+        except Exception as e:
+            logger.error(f"Lỗi khi tải lại mẫu prompt, giữ nguyên {len(self.prompt_templates)} mẫu hiện tại: {e}")
+            return False
+            
+        template_index = TemplateIndex(templates)
+        
+        # Gán thay thế (nguyên tử): bộ chọn mẫu chỉ đọc qua template_index
+        self.template_index = template_index
+        self.prompt_templates = templates
+        
+        logger.info(f"Đã tải lại {len(templates)} mẫu prompt từ {self._get_template_path()}")
+        return True
+    
     def analyze_query(self, query: str, user_info: Optional[Dict] = None, 
                      conversation_history: Optional[List] = None) -> Dict[str, Any]:
         """
@@ -73,28 +137,38 @@ class ResponseOptimizer:
             Dict chứa kết quả phân tích
         """
         # Kiểm tra bộ nhớ cache
-        if query in self.query_analysis_cache:
-            return self.query_analysis_cache[query].copy()
-        
-        # Tính độ phức tạp của truy vấn
-        complexity_score = self._calculate_complexity(query)
-        
-        # Xác định lĩnh vực và chủ đề
-        domain, topics = self._identify_domain_and_topics(query)
-        
-        # Xác định kiểu truy vấn
-        query_type = self._determine_query_type(query)
-        
-        # Xác định yêu cầu về định dạng
-        format_requirements = self._detect_format_requirements(query)
+        cached_analysis = self.query_analysis_cache.get(query)
+        if cached_analysis is not None:
+            return cached_analysis.copy()
+        
+        # Phân loại (lĩnh vực, chủ đề, kiểu, độ phức tạp) của truy vấn tương tự được dùng lại nếu
+        # vượt ngưỡng; các đặc điểm riêng của từng truy vấn luôn được tính lại
+        category = None
+        if self.similarity_index is not None:
+            match = self.similarity_index.lookup(query)
+            if match is not None:
+                category, similarity = match
+                logger.debug(f"Tái sử dụng phân loại của truy vấn tương tự (độ tương đồng {similarity:.2f})")
+        
+        if category is None:
+            # Xác định lĩnh vực và chủ đề
+            domain, topics = self._identify_domain_and_topics(query)
+            category = {
+                "complexity": self._calculate_complexity(query),
+                "domain": domain,
+                "topics": topics,
+                "query_type": self._determine_query_type(query)
+            }
+            if self.similarity_index is not None:
+                self.similarity_index.add(query, category)
         
         # Tổng hợp kết quả phân tích
         analysis_result = {
-            "complexity": complexity_score,
-            "domain": domain,
-            "topics": topics,
-            "query_type": query_type,
-            "format_requirements": format_requirements,
+            "complexity": category["complexity"],
+            "domain": category["domain"],
+            "topics": list(category["topics"]),
+            "query_type": category["query_type"],
+            "format_requirements": self._detect_format_requirements(query),
             "requires_code": self._requires_code(query),
             "requires_reasoning": self._requires_reasoning(query),
             "requires_creativity": self._requires_creativity(query),
@@ -320,7 +394,7 @@ class ResponseOptimizer:
         Returns:
             Mẫu prompt được chọn
         """
-        if not self.prompt_templates:
+        if not self.template_index.templates:
             # Trả về mẫu mặc định nếu không có mẫu nào
             return {
                 "name": "default",
@@ -340,44 +414,13 @@ class ResponseOptimizer:
     
     def _select_best_match_template(self, analysis: Dict[str, Any]) -> Dict[str, Any]:
         """Chọn mẫu phù hợp nhất dựa trên đối sánh với phân tích"""
-        scores = []
-        
-        for template in self.prompt_templates:
-            score = 0
-            
-            # Điểm cho lĩnh vực phù hợp
-            if analysis.get("domain") in template.get("domains", []):
-                score += 3
-            elif "general" in template.get("domains", []):
-                score += 1
-                
-            # Điểm cho trường hợp sử dụng
-            for use_case in template.get("use_cases", []):
-                if use_case == analysis.get("query_type"):
-                    score += 2
-                if use_case == "code" and analysis.get("requires_code"):
-                    score += 2
-                if use_case == "reasoning" and analysis.get("requires_reasoning"):
-                    score += 2
-                if use_case == "creative" and analysis.get("requires_creativity"):
-                    score += 2
-                    
-            # Điểm cho độ phức tạp
-            template_complexity = template.get("complexity", "medium")
-            if (template_complexity == "high" and analysis.get("complexity", 0) > 7) or \
-               (template_complexity == "medium" and 3 <= analysis.get("complexity", 0) <= 7) or \
-               (template_complexity == "low" and analysis.get("complexity", 0) < 3):
-                score += 2
-                
-            scores.append((template, score))
-            
-        # Chọn mẫu có điểm cao nhất
-        if scores:
-            best_template = max(scores, key=lambda x: x[1])[0]
+        # Chỉ mục chỉ chấm điểm các mẫu ứng viên theo lĩnh vực, trường hợp sử dụng và độ phức tạp
+        best_template = self.template_index.best_match(analysis)
+        if best_template is not None:
             return best_template
         
-        # Trả về mẫu mặc định nếu không có điểm nào
-        return self.prompt_templates[0] if self.prompt_templates else {
+        # Trả về mẫu mặc định nếu không có mẫu nào
+        return {
             "name": "default",
             "template": "{query}"
         }
@@ -385,20 +428,18 @@ class ResponseOptimizer:
     def _select_performance_based_template(self, analysis: Dict[str, Any]) -> Dict[str, Any]:
         """Chọn mẫu dựa trên hiệu suất trong quá khứ"""
         # Lọc các mẫu phù hợp với phân tích
-        matching_templates = []
-        for template in self.prompt_templates:
-            if (analysis.get("domain") in template.get("domains", []) or
-                "general" in template.get("domains", [])):
-                matching_templates.append(template)
+        template_index = self.template_index
+        matching_templates = template_index.domain_matches(analysis.get("domain"))
                 
         if not matching_templates:
-            matching_templates = self.prompt_templates
+            matching_templates = template_index.templates
             
         # Sắp xếp theo hiệu suất trong quá khứ
+        performance_history = self.template_performance_history
         templates_with_scores = []
         for template in matching_templates:
             template_name = template.get("name")
-            performance_score = self.template_performance_history.get(template_name, {}).get("score", 0.5)
+            performance_score = performance_history.get(template_name, {}).get("score", 0.5)
             templates_with_scores.append((template, performance_score))
             
         # Chọn mẫu có điểm hiệu suất cao nhất
@@ -425,89 +466,102 @@ class ResponseOptimizer:
         Returns:
             Prompt đã được tối ưu hóa
         """
-        # Lấy mẫu prompt
-        prompt_template = template.get("template", "{query}")
-        
-        # Các thay thế cơ bản
-        replacements = {
-            "{query}": query,
-            "{domain}": analysis.get("domain", "general"),
-            "{complexity}": str(analysis.get("complexity", 0)),
-            "{query_type}": analysis.get("query_type", "general"),
-            "{topics}": ", ".join(analysis.get("topics", [])),
-            "{requires_code}": "true" if analysis.get("requires_code") else "false",
-            "{requires_reasoning}": "true" if analysis.get("requires_reasoning") else "false",
-            "{requires_creativity}": "true" if analysis.get("requires_creativity") else "false",
-            "{format_requirements}": self._format_requirements_to_string(analysis.get("format_requirements", {})),
-            "{sentiment}": analysis.get("sentiment", "neutral"),
-            "{urgency}": analysis.get("urgency", "normal"),
-            "{languages}": ", ".join(analysis.get("languages", ["vietnamese"])),
-        }
+        # Mẫu được biên dịch một lần và lưu tạm
+        compiled = compile_template(template.get("template", "{query}"))
         
-        # Thực hiện các thay thế
-        optimized_prompt = prompt_template
-        for key, value in replacements.items():
-            optimized_prompt = optimized_prompt.replace(key, value)
+        # Chỉ tính giá trị cho các placeholder có trong mẫu
+        values = {}
+        for name in compiled.placeholders:
+            builder = self._PLACEHOLDER_BUILDERS.get(name)
+            if builder is not None:
+                values[name] = builder(self, query, analysis)
+        
+        optimized_prompt = compiled.render(values)
             
         # Thêm hướng dẫn bổ sung nếu cần
         if self.dynamic_instruction_tuning:
             additional_instructions = self._generate_additional_instructions(analysis)
             if additional_instructions:
-                optimized_prompt += f"\n\n{additional_instructions}"
+                optimized_prompt = "\n\n".join((optimized_prompt, additional_instructions))
                 
         return optimized_prompt
     
+    # Cách tính giá trị cho từng placeholder của mẫu
+    _PLACEHOLDER_BUILDERS = {
+        "query": lambda self, query, analysis: query,
+        "domain": lambda self, query, analysis: analysis.get("domain", "general"),
+        "complexity": lambda self, query, analysis: str(analysis.get("complexity", 0)),
+        "query_type": lambda self, query, analysis: analysis.get("query_type", "general"),
+        "topics": lambda self, query, analysis: ", ".join(analysis.get("topics", [])),
+        "requires_code": lambda self, query, analysis: "true" if analysis.get("requires_code") else "false",
+        "requires_reasoning": lambda self, query, analysis: "true" if analysis.get("requires_reasoning") else "false",
+        "requires_creativity": lambda self, query, analysis: "true" if analysis.get("requires_creativity") else "false",
+        "format_requirements": lambda self, query, analysis: self._format_requirements_to_string(
+            analysis.get("format_requirements", {})),
+        "sentiment": lambda self, query, analysis: analysis.get("sentiment", "neutral"),
+        "urgency": lambda self, query, analysis: analysis.get("urgency", "normal"),
+        "languages": lambda self, query, analysis: ", ".join(analysis.get("languages", ["vietnamese"])),
+    }
+    
     def _format_requirements_to_string(self, format_reqs: Dict[str, bool]) -> str:
         """Chuyển đổi yêu cầu định dạng thành chuỗi hướng dẫn"""
-        instructions = []
+        signature = tuple(format_reqs.items())
         
-        for req, value in format_reqs.items():
-            if value:
-                if req == "requires_list":
-                    instructions.append("Trình bày kết quả dưới dạng danh sách có cấu trúc.")
-                elif req == "requires_step_by_step":
-                    instructions.append("Cung cấp hướng dẫn từng bước chi tiết.")
-                elif req == "requires_examples":
-                    instructions.append("Đưa ra các ví dụ cụ thể để minh họa.")
-                elif req == "requires_summary":
-                    instructions.append("Kèm theo tóm tắt ngắn gọn các điểm chính.")
-                elif req == "requires_comparison":
-                    instructions.append("So sánh rõ ràng các khía cạnh khác nhau.")
-                elif req == "requires_pros_cons":
-                    instructions.append("Liệt kê ưu điểm và nhược điểm.")
-                elif req == "requires_table":
-                    instructions.append("Trình bày dữ liệu dưới dạng bảng nếu phù hợp.")
-                elif req == "requires_diagram":
-                    instructions.append("Mô tả bằng sơ đồ hoặc biểu đồ nếu có thể.")
-                    
-        return " ".join(instructions)
+        fragment = self._format_fragment_cache.get(signature)
+        if fragment is None:
+            fragment = " ".join(FORMAT_INSTRUCTIONS[req] for req, value in signature
+                                if value and req in FORMAT_INSTRUCTIONS)
+            self._format_fragment_cache[signature] = fragment
+            
+        return fragment
     
     def _generate_additional_instructions(self, analysis: Dict[str, Any]) -> str:
         """Tạo hướng dẫn bổ sung dựa trên phân tích"""
+        complexity = analysis.get("complexity", 0)
+        signature = (
+            "high" if complexity > 7 else "low" if complexity < 3 else "medium",
+            bool(analysis.get("requires_code")),
+            bool(analysis.get("requires_reasoning")),
+            bool(analysis.get("requires_creativity")),
+            "vietnamese" in analysis.get("languages", []),
+            analysis.get("urgency") == "high"
+        )
+        
+        fragment = self._instruction_fragment_cache.get(signature)
+        if fragment is None:
+            fragment = self._build_additional_instructions(*signature)
+            self._instruction_fragment_cache[signature] = fragment
+            
+        return fragment
+    
+    def _build_additional_instructions(self, complexity_level: str, requires_code: bool,
+                                       requires_reasoning: bool, requires_creativity: bool,
+                                       vietnamese: bool, high_urgency: bool) -> str:
+        """Tạo chuỗi hướng dẫn bổ sung cho một chữ ký phân tích"""
         instructions = []
         
         # Thêm hướng dẫn dựa trên độ phức tạp
-        if analysis.get("complexity", 0) > 7:
+        if complexity_level == "high":
             instructions.append("Phân tích vấn đề một cách toàn diện, xem xét nhiều khía cạnh và cung cấp phân tích sâu.")
-        elif analysis.get("complexity", 0) < 3:
+        elif complexity_level == "low":
             instructions.append("Cung cấp câu trả lời ngắn gọn, súc tích và dễ hiểu.")
             
         # Thêm hướng dẫn dựa trên yêu cầu
-        if analysis.get("requires_code"):
+        if requires_code:
             instructions.append("Đưa ra mã nguồn rõ ràng, có chú thích và tuân thủ các nguyên tắc clean code.")
             
-        if analysis.get("requires_reasoning"):
+        if requires_reasoning:
             instructions.append("Giải thích logic và lý luận chi tiết, đưa ra các luận điểm có cơ sở.")
             
-        if analysis.get("requires_creativity"):
+        if requires_creativity:
             instructions.append("Thể hiện sự sáng tạo, độc đáo và tư duy ngoài khuôn khổ.")
             
         # Thêm hướng dẫn dựa trên ngôn ngữ
-        if "vietnamese" in analysis.get("languages", []):
+        if vietnamese:
             instructions.append("Trả lời bằng tiếng Việt, sử dụng các thuật ngữ phù hợp với văn phong tự nhiên.")
             
         # Thêm hướng dẫn dựa trên mức độ khẩn cấp
-        if analysis.get("urgency") == "high":
+        if high_urgency:
             instructions.append("Ưu tiên cung cấp thông tin thiết yếu và giải pháp nhanh chóng.")
             
         return " ".join(instructions)
@@ -520,24 +574,48 @@ class ResponseOptimizer:
             template_name: Tên của mẫu
             feedback_score: Điểm phản hồi (0-1)
         """
-        if template_name not in self.template_performance_history:
-            self.template_performance_history[template_name] = {
-                "score": 0.5,
-                "count": 0
-            }
+        with self._performance_lock:
+            history = dict(self.template_performance_history)
+            current = history.get(template_name, {"score": 0.5, "count": 0})
+            current_count = current["count"]
+            current_score = current["score"]
             
-        current = self.template_performance_history[template_name]
-        current_count = current["count"]
-        current_score = current["score"]
-        
-        # Cập nhật điểm với trọng số giảm dần
-        updated_score = (current_score * current_count + feedback_score) / (current_count + 1)
-        
-        self.template_performance_history[template_name] = {
-            "score": updated_score,
-            "count": current_count + 1
+            # Cập nhật điểm với trọng số giảm dần
+            updated_score = (current_score * current_count + feedback_score) / (current_count + 1)
+            
+            history[template_name] = {
+                "score": updated_score,
+                "count": current_count + 1
+            }
+            self.template_performance_history = history
+
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Lấy trạng thái hiệu suất mẫu prompt để lưu snapshot
+
+        Returns:
+            Dict chứa lịch sử hiệu suất của các mẫu
+        """
+        return {
+            "template_performance_history": {
+                name: dict(perf) for name, perf in self.template_performance_history.items()
+            }
         }
-        
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        """
+        Khôi phục hiệu suất mẫu prompt từ snapshot
+
+        Args:
+            state: Trạng thái do get_state tạo ra
+        """
+        with self._performance_lock:
+            history = dict(self.template_performance_history)
+            history.update(state.get("template_performance_history", {}))
+            self.template_performance_history = history
+
     def clear_cache(self) -> None:
         """Xóa bộ nhớ cache"""
-        self.query_analysis_cache.clear()
\ No newline at end of file
+        self.query_analysis_cache.clear()
+        if self.similarity_index is not None:
+            self.similarity_index.clear()
\ No newline at end of file
@@ -0,0 +1,154 @@
+"""
+Module lưu trữ dữ liệu cũ: chuyển các dòng quá hạn của feedback, comparisons và stats ra file
+JSONL nén gzip theo tháng, và đọc lại chúng cùng với dữ liệu còn trong cơ sở dữ liệu
+"""
+
+import gzip
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Cấu hình lưu trữ mặc định
+DEFAULT_RETENTION_OPTIONS = {
+    "archive_dir": None,    # Mặc định: thư mục archive cạnh file cơ sở dữ liệu
+    "feedback_days": 365,   # Phản hồi và so sánh cũ hơn số ngày này được chuyển vào kho lưu trữ
+    "stats_days": 90,       # Thống kê cũ hơn số ngày này được chuyển vào kho lưu trữ
+    "batch_size": 5000,     # Số dòng mỗi giao dịch khi chuyển
+    "compresslevel": 6
+}
+
+# Các bảng được lưu trữ
+ARCHIVE_TABLES = ["feedback", "comparisons", "stats"]
+
+class FeedbackArchive:
+    """
+    Kho lưu trữ dạng file: mỗi bảng một thư mục, mỗi tháng một file {bảng}_{YYYY-MM}.jsonl.gz.
+    Các lần lưu trữ sau ghi thêm một member gzip vào cuối file của tháng; với dòng trùng id
+    (lần lưu trữ trước bị ngắt sau khi đã ghi file) chỉ bản ghi sau cùng được đọc.
+    """
+
+    def __init__(self, archive_dir: str, compresslevel: int = DEFAULT_RETENTION_OPTIONS["compresslevel"]):
+        """
+        Khởi tạo kho lưu trữ
+
+        Args:
+            archive_dir: Thư mục lưu trữ
+            compresslevel: Mức nén gzip
+        """
+        self.archive_dir = archive_dir
+        self.compresslevel = compresslevel
+
+    def path(self, table: str, month: str) -> str:
+        """Đường dẫn file lưu trữ của một bảng trong một tháng (YYYY-MM)"""
+        return os.path.join(self.archive_dir, table, f"{table}_{month}.jsonl.gz")
+
+    def months(self, table: str) -> List[str]:
+        """
+        Các tháng đã có dữ liệu lưu trữ
+
+        Args:
+            table: Tên bảng
+
+        Returns:
+            Danh sách tháng (YYYY-MM) theo thứ tự tăng dần
+        """
+        table_dir = os.path.join(self.archive_dir, table)
+        if not os.path.isdir(table_dir):
+            return []
+        prefix, suffix = f"{table}_", ".jsonl.gz"
+        return sorted(name[len(prefix):-len(suffix)] for name in os.listdir(table_dir)
+                      if name.startswith(prefix) and name.endswith(suffix))
+
+    def append(self, table: str, records: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Ghi thêm các bản ghi vào file của tháng tương ứng (theo timestamp) và đồng bộ xuống đĩa
+
+        Args:
+            table: Tên bảng
+            records: Các bản ghi (theo thứ tự thời gian)
+
+        Returns:
+            Dict tháng -> số bản ghi đã ghi
+        """
+        by_month: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            by_month.setdefault(str(record.get("timestamp", ""))[:7] or "unknown", []).append(record)
+
+        for month, month_records in by_month.items():
+            path = self.path(table, month)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "ab") as raw:
+                with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=self.compresslevel) as f:
+                    f.write("".join(json.dumps(record, ensure_ascii=False) + "\n"
+                                    for record in month_records).encode("utf-8"))
+                raw.flush()
+                os.fsync(raw.fileno())
+
+        return {month: len(month_records) for month, month_records in by_month.items()}
+
+    def _read_month(self, table: str, month: str) -> List[Dict[str, Any]]:
+        """Đọc các bản ghi của một tháng; với bản ghi trùng id, giữ bản được ghi sau cùng"""
+        records: Dict[Any, Dict[str, Any]] = {}
+        with gzip.open(self.path(table, month), "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    records[record.get("id")] = record
+        return list(records.values())
+
+    def iter_records(self, table: str, since: Optional[str] = None, until: Optional[str] = None,
+                     predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                     descending: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Duyệt các bản ghi đã lưu trữ theo thứ tự (timestamp, id); chỉ mở file của các tháng giao với
+        khoảng [since, until), mỗi lần nạp và sắp xếp một tháng trong bộ nhớ.
+
+        Args:
+            table: Tên bảng
+            since: Chỉ lấy bản ghi có timestamp >= since (ISO, tùy chọn)
+            until: Chỉ lấy bản ghi có timestamp < until (ISO, tùy chọn)
+            predicate: Điều kiện lọc thêm (tùy chọn)
+            descending: True để duyệt từ mới đến cũ
+
+        Yields:
+            Dict chứa bản ghi đã lưu trữ
+        """
+        months = [month for month in self.months(table)
+                  if (not since or month >= since[:7]) and (not until or month <= until[:7])]
+        if descending:
+            months.reverse()
+
+        for month in months:
+            # Lần lưu trữ sau có thể ghi thêm dòng cũ hơn (ghi trễ) vào cuối file của tháng
+            records = sorted(self._read_month(table, month),
+                             key=lambda record: (record.get("timestamp", ""), record.get("id", "")),
+                             reverse=descending)
+            for record in records:
+                timestamp = record.get("timestamp", "")
+                if since and timestamp < since:
+                    continue
+                if until and timestamp >= until:
+                    continue
+                if predicate and not predicate(record):
+                    continue
+                yield record
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Thống kê kho lưu trữ
+
+        Returns:
+            Dict bảng -> số tháng, danh sách tháng và tổng kích thước file (byte)
+        """
+        stats = {}
+        for table in ARCHIVE_TABLES:
+            months = self.months(table)
+            stats[table] = {
+                "months": months,
+                "files": len(months),
+                "bytes": sum(os.path.getsize(self.path(table, month)) for month in months)
+            }
+        return stats
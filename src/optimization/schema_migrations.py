@@ -0,0 +1,677 @@
+"""
+Module nâng cấp schema cơ sở dữ liệu phản hồi theo phiên bản (PRAGMA user_version)
+"""
+
+import calendar
+import json
+import logging
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.optimization.text_store import TextCodec, store_texts, text_hash
+
+logger = logging.getLogger(__name__)
+
+# Số dòng cập nhật mỗi giao dịch khi điền dữ liệu cho cột mới
+DEFAULT_BATCH_SIZE = 5000
+
+# Thời gian nghỉ giữa các lô (giây) để nhường khóa ghi cho ứng dụng
+BATCH_PAUSE = 0.05
+
+FEEDBACK_COLUMNS = '''
+    id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    query TEXT NOT NULL,
+    responses TEXT NOT NULL,
+    selected_response TEXT NOT NULL,
+    feedback_score REAL,
+    feedback_text TEXT,
+    metadata TEXT
+'''
+
+COMPARISON_COLUMNS = '''
+    id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    query TEXT NOT NULL,
+    chosen TEXT NOT NULL,
+    rejected TEXT NOT NULL,
+    chosen_model TEXT NOT NULL,
+    rejected_model TEXT NOT NULL,
+    metadata TEXT
+'''
+
+STATS_COLUMNS = '''
+    id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    stat_type TEXT NOT NULL,
+    value REAL NOT NULL,
+    metadata TEXT
+'''
+
+def timestamp_to_epoch(timestamp: Optional[str]) -> Optional[int]:
+    """
+    Đổi timestamp ISO sang số giây kể từ epoch, cùng quy ước với strftime('%s') của SQLite
+    (thời điểm không có múi giờ được coi là UTC)
+
+    Args:
+        timestamp: Thời điểm ISO
+
+    Returns:
+        Số giây kể từ epoch hoặc None nếu không hợp lệ
+    """
+    if not timestamp:
+        return None
+    try:
+        parsed = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is not None:
+        return int(parsed.timestamp() // 1)
+    return calendar.timegm(parsed.timetuple())
+
+def epoch_to_timestamp(epoch: int) -> str:
+    """
+    Đổi số giây kể từ epoch về timestamp ISO không múi giờ (UTC), ngược với timestamp_to_epoch
+
+    Args:
+        epoch: Số giây kể từ epoch
+
+    Returns:
+        Thời điểm ISO
+    """
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None).isoformat()
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Phiên bản schema hiện tại của cơ sở dữ liệu"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def _column_names(conn: sqlite3.Connection, table: str) -> List[str]:
+    """Danh sách tên cột của bảng (rỗng nếu bảng chưa tồn tại)"""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+def _add_column(conn: sqlite3.Connection, table: str, column: str, definition: str) -> None:
+    """Thêm cột nếu chưa có (ALTER TABLE ADD COLUMN không cần chép lại bảng)"""
+    if column not in _column_names(conn, table):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def _rowid_ranges(conn: sqlite3.Connection, table: str, batch_size: int) -> Iterator[Tuple[int, int]]:
+    """
+    Chia bảng thành các khoảng rowid (start, end] cho việc điền dữ liệu theo lô. Giữa các lô
+    tạm nghỉ để luồng/tiến trình khác lấy được khóa ghi (trình chờ khóa của SQLite chỉ thử lại
+    theo chu kỳ nên khó giành được khóa nếu các lô nối tiếp nhau liên tục).
+
+    Args:
+        conn: Kết nối SQLite
+        table: Tên bảng
+        batch_size: Số rowid mỗi lô
+
+    Yields:
+        Tuple (start, end) của từng lô
+    """
+    low = 0
+    # Đọc lại rowid lớn nhất sau mỗi lượt để điền cả các dòng được ghi trong lúc nâng cấp
+    high = conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] or 0
+    while low < high:
+        for start in range(low, high, batch_size):
+            yield start, start + batch_size
+            time.sleep(BATCH_PAUSE)
+
+        low = high
+        high = conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] or 0
+
+def _backfill(conn: sqlite3.Connection, table: str, assignment: str, pending: str, batch_size: int) -> int:
+    """
+    Điền dữ liệu cho cột mới theo từng khoảng rowid, mỗi khoảng một giao dịch ngắn
+
+    Args:
+        conn: Kết nối SQLite
+        table: Tên bảng
+        assignment: Biểu thức SET
+        pending: Điều kiện chọn các dòng chưa được điền
+        batch_size: Số rowid mỗi lô
+
+    Returns:
+        Tổng số dòng đã cập nhật
+    """
+    total = 0
+    for start, end in _rowid_ranges(conn, table, batch_size):
+        with conn:
+            cursor = conn.execute(f'''
+            UPDATE {table} SET {assignment}
+            WHERE rowid > ? AND rowid <= ? AND ({pending})
+            ''', (start, end))
+        total += max(cursor.rowcount, 0)
+        logger.debug(f"Đã điền {total} dòng của bảng {table}")
+    return total
+
+def _create_indexes(conn: sqlite3.Connection, statements: List[str]) -> None:
+    """Tạo lần lượt các chỉ mục, mỗi chỉ mục một giao dịch và nghỉ giữa các lần để nhường khóa ghi"""
+    for statement in statements:
+        with conn:
+            conn.execute(statement)
+        time.sleep(BATCH_PAUSE)
+
+def _rebuild_without_conversation_id(conn: sqlite3.Connection, table: str, columns: str) -> None:
+    """Dựng lại bảng cũ chưa có cột conversation_id, giữ nguyên dữ liệu"""
+    existing = ", ".join(column for column in _column_names(conn, table) if column != "conversation_id")
+    conn.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+    conn.execute(f"CREATE TABLE {table} ({columns})")
+    conn.execute(f"INSERT INTO {table} ({existing}, conversation_id) SELECT {existing}, '' FROM {table}_legacy")
+    conn.execute(f"DROP TABLE {table}_legacy")
+    logger.info(f"Đã thêm cột conversation_id cho bảng {table}")
+
+def _migrate_base_schema(conn: sqlite3.Connection, batch_size: int) -> None:
+    """Tạo các bảng gốc; sửa bảng từ phiên bản cũ thiếu cột conversation_id"""
+    for table, columns in [("feedback", FEEDBACK_COLUMNS), ("comparisons", COMPARISON_COLUMNS)]:
+        existing = _column_names(conn, table)
+        if not existing:
+            conn.execute(f"CREATE TABLE {table} ({columns})")
+        elif "conversation_id" not in existing:
+            _rebuild_without_conversation_id(conn, table, columns)
+
+    conn.execute(f"CREATE TABLE IF NOT EXISTS stats ({STATS_COLUMNS})")
+
+def _migrate_base_indexes(conn: sqlite3.Connection, batch_size: int) -> None:
+    """Chỉ mục theo hội thoại, loại thống kê và khóa phân trang (timestamp, id)"""
+    _create_indexes(conn, [
+        'CREATE INDEX IF NOT EXISTS idx_feedback_conversation ON feedback(conversation_id)',
+        'CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback(timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_comparisons_conversation ON comparisons(conversation_id)',
+        'CREATE INDEX IF NOT EXISTS idx_stats_type ON stats(stat_type)',
+        'CREATE INDEX IF NOT EXISTS idx_feedback_timestamp_id ON feedback(timestamp, id)',
+        'CREATE INDEX IF NOT EXISTS idx_comparisons_timestamp_id ON comparisons(timestamp, id)'
+    ])
+
+def _migrate_epoch_timestamps(conn: sqlite3.Connection, batch_size: int) -> None:
+    """Thêm cột ts_epoch (số giây kể từ epoch) để lọc và gom nhóm theo thời gian trên số nguyên"""
+    for table in ["feedback", "comparisons"]:
+        with conn:
+            _add_column(conn, table, "ts_epoch", "INTEGER")
+        count = _backfill(conn, table, "ts_epoch = CAST(strftime('%s', timestamp) AS INTEGER)",
+                          "ts_epoch IS NULL AND strftime('%s', timestamp) IS NOT NULL", batch_size)
+        if count:
+            logger.info(f"Đã điền ts_epoch cho {count} dòng của bảng {table}")
+
+def _migrate_model_table(conn: sqlite3.Connection, batch_size: int) -> None:
+    """
+    Chuẩn hóa tên mô hình vào bảng models, thêm cột khóa mô hình và các chỉ mục bao phủ cho
+    truy vấn báo cáo/xuất dữ liệu
+    """
+    with conn:
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS models (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+        ''')
+        _add_column(conn, "feedback", "model_id", "INTEGER REFERENCES models(id)")
+        _add_column(conn, "comparisons", "chosen_model_id", "INTEGER REFERENCES models(id)")
+        _add_column(conn, "comparisons", "rejected_model_id", "INTEGER REFERENCES models(id)")
+        conn.execute('''
+        INSERT OR IGNORE INTO models (name)
+        SELECT selected_response FROM feedback
+        UNION SELECT chosen_model FROM comparisons
+        UNION SELECT rejected_model FROM comparisons
+        ''')
+
+    model_id = "(SELECT id FROM models WHERE name = {column})"
+    _backfill(conn, "feedback", f"model_id = {model_id.format(column='selected_response')}",
+              "model_id IS NULL", batch_size)
+    _backfill(conn, "comparisons",
+              f"chosen_model_id = {model_id.format(column='chosen_model')}, "
+              f"rejected_model_id = {model_id.format(column='rejected_model')}",
+              "chosen_model_id IS NULL OR rejected_model_id IS NULL", batch_size)
+
+    # Chỉ mục bao phủ: lọc theo thời gian rồi gom nhóm theo mô hình mà không đọc bảng chính;
+    # thay thế các chỉ mục báo cáo trên cột văn bản
+    _create_indexes(conn, [
+        'CREATE INDEX IF NOT EXISTS idx_feedback_epoch_model ON feedback(ts_epoch, model_id, feedback_score)',
+        'CREATE INDEX IF NOT EXISTS idx_feedback_model_epoch ON feedback(model_id, ts_epoch, feedback_score)',
+        'CREATE INDEX IF NOT EXISTS idx_comparisons_epoch_models '
+        'ON comparisons(ts_epoch, chosen_model_id, rejected_model_id)',
+        'CREATE INDEX IF NOT EXISTS idx_comparisons_chosen_model ON comparisons(chosen_model_id, ts_epoch)',
+        'CREATE INDEX IF NOT EXISTS idx_comparisons_rejected_model ON comparisons(rejected_model_id, ts_epoch)',
+        'DROP INDEX IF EXISTS idx_feedback_report',
+        'DROP INDEX IF EXISTS idx_comparisons_report'
+    ])
+
+# Cột và biểu thức của bảng tổng hợp phản hồi; {row} là NEW hoặc OLD trong trigger
+_FEEDBACK_ROLLUP_KEY = {
+    "day": "IFNULL({row}.ts_epoch / 86400, -1)",
+    "model_id": "IFNULL({row}.model_id, 0)",
+    "template": "IFNULL(json_extract({row}.metadata, '$.template_used'), '')"
+}
+_FEEDBACK_ROLLUP_VALUES = {
+    "feedback_count": "1",
+    "score_count": "{row}.feedback_score IS NOT NULL",
+    "score_sum": "IFNULL({row}.feedback_score, 0)",
+    "score_ge_08": "IFNULL({row}.feedback_score >= 0.8, 0)",
+    "score_ge_07": "IFNULL({row}.feedback_score >= 0.7, 0)",
+    "score_le_03": "IFNULL({row}.feedback_score <= 0.3, 0)"
+}
+
+def _rollup_upsert(table: str, key: Dict[str, str], values: Dict[str, str], row: str, sign: int) -> str:
+    """Câu lệnh cộng (sign = 1) hoặc trừ (sign = -1) một dòng vào bảng tổng hợp"""
+    columns = list(key) + list(values)
+    expressions = [expression.format(row=row) for expression in key.values()]
+    expressions += [f"{sign} * ({expression.format(row=row)})" for expression in values.values()]
+    updates = ", ".join(f"{column} = {column} + excluded.{column}" for column in values)
+    return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(expressions)}) "
+            f"ON CONFLICT({', '.join(key)}) DO UPDATE SET {updates};")
+
+def _rollup_triggers(source: str, statements: Callable[[str, int], List[str]],
+                     events: Tuple[str, ...] = ("insert", "update", "delete"), when: str = "") -> List[str]:
+    """Các trigger INSERT/UPDATE/DELETE giữ bảng tổng hợp khớp với bảng nguồn"""
+    bodies = {
+        "insert": statements("NEW", 1),
+        "update": statements("OLD", -1) + statements("NEW", 1),
+        "delete": statements("OLD", -1)
+    }
+    condition = f"WHEN {when} " if when else ""
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS trg_{source}_rollup_{event} AFTER {event.upper()} ON {source} "
+        f"{condition}BEGIN {' '.join(bodies[event])} END"
+        for event in events
+    ]
+
+def _feedback_rollup_statements(row: str, sign: int) -> List[str]:
+    """Cập nhật feedback_rollup theo một dòng phản hồi"""
+    return [_rollup_upsert("feedback_rollup", _FEEDBACK_ROLLUP_KEY, _FEEDBACK_ROLLUP_VALUES, row, sign)]
+
+def _comparison_rollup_statements(row: str, sign: int) -> List[str]:
+    """Cập nhật comparison_rollup theo một dòng so sánh (thắng cho mô hình được chọn, thua cho mô hình bị từ chối)"""
+    day = "IFNULL({row}.ts_epoch / 86400, -1)"
+    return [
+        _rollup_upsert("comparison_rollup", {"day": day, "model_id": "IFNULL({row}.chosen_model_id, 0)"},
+                       {"wins": "1", "losses": "0"}, row, sign),
+        _rollup_upsert("comparison_rollup", {"day": day, "model_id": "IFNULL({row}.rejected_model_id, 0)"},
+                       {"wins": "0", "losses": "1"}, row, sign)
+    ]
+
+def rebuild_rollups(conn: sqlite3.Connection) -> None:
+    """
+    Tính lại toàn bộ bảng tổng hợp từ bảng nguồn (gọi trong giao dịch để không bỏ sót dòng
+    được ghi đồng thời). Số liệu của các dòng đã chuyển vào kho lưu trữ sẽ bị mất.
+
+    Args:
+        conn: Kết nối SQLite
+    """
+    key = {column: expression.format(row="feedback") for column, expression in _FEEDBACK_ROLLUP_KEY.items()}
+    values = {column: f"SUM({expression.format(row='feedback')})"
+              for column, expression in _FEEDBACK_ROLLUP_VALUES.items()}
+    conn.execute("DELETE FROM feedback_rollup")
+    conn.execute(f'''
+    INSERT INTO feedback_rollup ({", ".join(list(key) + list(values))})
+    SELECT {", ".join(list(key.values()) + list(values.values()))}
+    FROM feedback
+    GROUP BY 1, 2, 3
+    ''')
+
+    conn.execute("DELETE FROM comparison_rollup")
+    conn.execute('''
+    INSERT INTO comparison_rollup (day, model_id, wins, losses)
+    SELECT day, model_id, SUM(wins), SUM(losses) FROM (
+        SELECT IFNULL(ts_epoch / 86400, -1) AS day, IFNULL(chosen_model_id, 0) AS model_id,
+               1 AS wins, 0 AS losses
+        FROM comparisons
+        UNION ALL
+        SELECT IFNULL(ts_epoch / 86400, -1), IFNULL(rejected_model_id, 0), 0, 1
+        FROM comparisons
+    )
+    GROUP BY day, model_id
+    ''')
+
+def retain_rollups(conn: sqlite3.Connection, table: str, condition: str, params: List) -> None:
+    """
+    Cộng thêm đóng góp của các dòng sắp bị xóa vào bảng tổng hợp, để trigger DELETE trừ đi
+    và tổng không đổi (dùng khi chuyển dòng cũ vào kho lưu trữ; gọi trong cùng giao dịch với DELETE)
+
+    Args:
+        conn: Kết nối SQLite
+        table: Bảng nguồn (feedback, comparisons hoặc stats)
+        condition: Điều kiện SQL chọn các dòng sắp bị xóa
+        params: Tham số của điều kiện
+    """
+    if table == "feedback":
+        key = {column: expression.format(row="feedback") for column, expression in _FEEDBACK_ROLLUP_KEY.items()}
+        values = {column: f"SUM({expression.format(row='feedback')})"
+                  for column, expression in _FEEDBACK_ROLLUP_VALUES.items()}
+        updates = ", ".join(f"{column} = {column} + excluded.{column}" for column in values)
+        conn.execute(f'''
+        INSERT INTO feedback_rollup ({", ".join(list(key) + list(values))})
+        SELECT {", ".join(list(key.values()) + list(values.values()))}
+        FROM feedback WHERE {condition}
+        GROUP BY 1, 2, 3
+        ON CONFLICT(day, model_id, template) DO UPDATE SET {updates}
+        ''', params)
+    elif table == "comparisons":
+        conn.execute(f'''
+        INSERT INTO comparison_rollup (day, model_id, wins, losses)
+        SELECT day, model_id, SUM(wins), SUM(losses) FROM (
+            SELECT IFNULL(ts_epoch / 86400, -1) AS day, IFNULL(chosen_model_id, 0) AS model_id,
+                   1 AS wins, 0 AS losses
+            FROM comparisons WHERE {condition}
+            UNION ALL
+            SELECT IFNULL(ts_epoch / 86400, -1), IFNULL(rejected_model_id, 0), 0, 1
+            FROM comparisons WHERE {condition}
+        ) WHERE 1
+        GROUP BY day, model_id
+        ON CONFLICT(day, model_id) DO UPDATE SET wins = wins + excluded.wins, losses = losses + excluded.losses
+        ''', list(params) * 2)
+    elif table == "stats":
+        # Bảng stats không có trigger: tổng hợp chỉ chứa các dòng đã lưu trữ
+        conn.execute(f'''
+        INSERT INTO stats_rollup (month, stat_type, stat_count, value_sum, value_min, value_max)
+        SELECT substr(timestamp, 1, 7), stat_type, COUNT(*), SUM(value), MIN(value), MAX(value)
+        FROM stats WHERE {condition}
+        GROUP BY 1, 2
+        ON CONFLICT(month, stat_type) DO UPDATE SET
+            stat_count = stat_count + excluded.stat_count,
+            value_sum = value_sum + excluded.value_sum,
+            value_min = MIN(value_min, excluded.value_min),
+            value_max = MAX(value_max, excluded.value_max)
+        ''', params)
+    else:
+        raise ValueError(f"Bảng không có bảng tổng hợp: {table}")
+
+def _rollup_backfill_condition(source: str, row: str) -> str:
+    """
+    Điều kiện để trigger tổng hợp áp dụng cho một dòng trong lúc điền bảng tổng hợp: dòng đã được
+    điền (rowid <= done) hoặc được thêm sau khi bắt đầu (rowid > high); các dòng còn lại do lô điền
+    tính khi tới lượt
+    """
+    return (f"{row}.rowid <= (SELECT done FROM rollup_backfill WHERE source = '{source}') "
+            f"OR {row}.rowid > (SELECT high FROM rollup_backfill WHERE source = '{source}')")
+
+def _migrate_rollup_tables(conn: sqlite3.Connection, batch_size: int) -> None:
+    """
+    Bảng tổng hợp theo ngày/mô hình/mẫu prompt, được trigger cập nhật ở mỗi lần ghi để thống kê
+    không phải quét lại toàn bộ bảng phản hồi. Trigger được tạo trước (có điều kiện theo tiến độ
+    điền), sau đó các dòng hiện có được cộng vào bảng tổng hợp theo từng khoảng rowid, mỗi khoảng
+    một giao dịch ngắn, nên khóa ghi không bị giữ trong suốt quá trình tính.
+    """
+    sources = {"feedback": _feedback_rollup_statements, "comparisons": _comparison_rollup_statements}
+    
+    conn.execute("BEGIN IMMEDIATE")
+    with conn:
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS feedback_rollup (
+            day INTEGER NOT NULL,
+            model_id INTEGER NOT NULL,
+            template TEXT NOT NULL,
+            feedback_count INTEGER NOT NULL DEFAULT 0,
+            score_count INTEGER NOT NULL DEFAULT 0,
+            score_sum REAL NOT NULL DEFAULT 0,
+            score_ge_08 INTEGER NOT NULL DEFAULT 0,
+            score_ge_07 INTEGER NOT NULL DEFAULT 0,
+            score_le_03 INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, model_id, template)
+        ) WITHOUT ROWID
+        ''')
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS comparison_rollup (
+            day INTEGER NOT NULL,
+            model_id INTEGER NOT NULL,
+            wins INTEGER NOT NULL DEFAULT 0,
+            losses INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, model_id)
+        ) WITHOUT ROWID
+        ''')
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_backfill (
+            source TEXT PRIMARY KEY,
+            done INTEGER NOT NULL,
+            high INTEGER NOT NULL
+        )
+        ''')
+        # Làm lại từ đầu nếu lần nâng cấp trước bị ngắt giữa chừng
+        conn.execute("DELETE FROM feedback_rollup")
+        conn.execute("DELETE FROM comparison_rollup")
+        for source, statements in sources.items():
+            high = conn.execute(f"SELECT MAX(rowid) FROM {source}").fetchone()[0] or 0
+            conn.execute("INSERT OR REPLACE INTO rollup_backfill (source, done, high) VALUES (?, 0, ?)",
+                         (source, high))
+            for event in ("insert", "update", "delete"):
+                conn.execute(f"DROP TRIGGER IF EXISTS trg_{source}_rollup_{event}")
+            for statement in (_rollup_triggers(source, statements, ("insert",),
+                                               _rollup_backfill_condition(source, "NEW"))
+                              + _rollup_triggers(source, statements, ("update", "delete"),
+                                                 _rollup_backfill_condition(source, "OLD"))):
+                conn.execute(statement)
+    
+    for source in sources:
+        high = conn.execute("SELECT high FROM rollup_backfill WHERE source = ?", (source,)).fetchone()[0]
+        for start in range(0, high, batch_size):
+            end = min(start + batch_size, high)
+            conn.execute("BEGIN IMMEDIATE")
+            with conn:
+                # Cùng phép cộng đóng góp của các dòng như khi chuyển dòng vào kho lưu trữ
+                retain_rollups(conn, source, "rowid > ? AND rowid <= ?", [start, end])
+                conn.execute("UPDATE rollup_backfill SET done = ? WHERE source = ?", (end, source))
+            time.sleep(BATCH_PAUSE)
+        logger.debug(f"Đã điền bảng tổng hợp của bảng {source}")
+    
+    # Mọi dòng đã được điền: thay bằng trigger không điều kiện
+    conn.execute("BEGIN IMMEDIATE")
+    with conn:
+        for source, statements in sources.items():
+            for event in ("insert", "update", "delete"):
+                conn.execute(f"DROP TRIGGER IF EXISTS trg_{source}_rollup_{event}")
+            for statement in _rollup_triggers(source, statements):
+                conn.execute(statement)
+        conn.execute("DROP TABLE rollup_backfill")
+
+def _migrate_text_store(conn: sqlite3.Connection, batch_size: int) -> None:
+    """
+    Lưu nội dung câu trả lời một lần trong bảng texts (khóa theo hash nội dung); phản hồi và so sánh
+    chỉ giữ hash. Văn bản của các dòng hiện có được chuyển sang theo lô với cấu hình nén mặc định.
+    """
+    with conn:
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS texts (
+            hash TEXT PRIMARY KEY,
+            compression TEXT NOT NULL,
+            content BLOB NOT NULL,
+            size INTEGER NOT NULL
+        )
+        ''')
+        _add_column(conn, "feedback", "response_hashes", "TEXT")
+        _add_column(conn, "comparisons", "chosen_hash", "TEXT")
+        _add_column(conn, "comparisons", "rejected_hash", "TEXT")
+
+    codec = TextCodec()
+    moved = 0
+    for start, end in _rowid_ranges(conn, "feedback", batch_size):
+        # Đọc và ghi trong cùng giao dịch ghi để không ghi đè dòng vừa được ứng dụng cập nhật
+        conn.execute("BEGIN IMMEDIATE")
+        with conn:
+            rows = conn.execute('''
+            SELECT rowid, responses FROM feedback
+            WHERE rowid > ? AND rowid <= ? AND response_hashes IS NULL
+            ''', (start, end)).fetchall()
+            texts, updates = {}, []
+            for rowid, responses in rows:
+                hashes = {}
+                for model_name, text in json.loads(responses or "{}").items():
+                    text = text if isinstance(text, str) else json.dumps(text, ensure_ascii=False)
+                    hashes[model_name] = text_hash(text)
+                    texts[hashes[model_name]] = text
+                updates.append((json.dumps(hashes, ensure_ascii=False), rowid))
+            store_texts(conn, texts, codec)
+            conn.executemany("UPDATE feedback SET responses = '', response_hashes = ? WHERE rowid = ?", updates)
+        moved += len(rows)
+
+    for start, end in _rowid_ranges(conn, "comparisons", batch_size):
+        # Đọc và ghi trong cùng giao dịch ghi để không ghi đè dòng vừa được ứng dụng cập nhật
+        conn.execute("BEGIN IMMEDIATE")
+        with conn:
+            rows = conn.execute('''
+            SELECT rowid, chosen, rejected FROM comparisons
+            WHERE rowid > ? AND rowid <= ? AND chosen_hash IS NULL
+            ''', (start, end)).fetchall()
+            texts, updates = {}, []
+            for rowid, chosen, rejected in rows:
+                chosen_hash, rejected_hash = text_hash(chosen), text_hash(rejected)
+                texts[chosen_hash] = chosen
+                texts[rejected_hash] = rejected
+                updates.append((chosen_hash, rejected_hash, rowid))
+            store_texts(conn, texts, codec)
+            conn.executemany('''
+            UPDATE comparisons SET chosen = '', rejected = '', chosen_hash = ?, rejected_hash = ?
+            WHERE rowid = ?
+            ''', updates)
+        moved += len(rows)
+
+    if moved:
+        logger.info(f"Đã chuyển văn bản của {moved} bản ghi sang bảng texts")
+
+def _migrate_stats_rollup(conn: sqlite3.Connection, batch_size: int) -> None:
+    """
+    Bảng tổng hợp theo tháng của các thống kê đã chuyển vào kho lưu trữ, và khóa (timestamp, id)
+    để chọn dòng cũ của bảng stats
+    """
+    with conn:
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS stats_rollup (
+            month TEXT NOT NULL,
+            stat_type TEXT NOT NULL,
+            stat_count INTEGER NOT NULL DEFAULT 0,
+            value_sum REAL NOT NULL DEFAULT 0,
+            value_min REAL,
+            value_max REAL,
+            PRIMARY KEY (month, stat_type)
+        ) WITHOUT ROWID
+        ''')
+    _create_indexes(conn, ['CREATE INDEX IF NOT EXISTS idx_stats_timestamp_id ON stats(timestamp, id)'])
+
+# Bảng có thứ tự thay đổi export_seq cho xuất tăng dần
+EXPORT_SEQ_TABLES = ["feedback", "comparisons"]
+
+def _export_seq_triggers(table: str) -> List[str]:
+    """
+    Trigger gán giá trị tiếp theo của bộ đếm export_counter cho dòng vừa được thêm hoặc cập nhật.
+    Câu UPDATE gán export_seq đổi giá trị của cột này nên không kích hoạt lại trigger UPDATE.
+    """
+    body = (f"UPDATE export_counter SET seq = seq + 1 WHERE id = 1; "
+            f"UPDATE {table} SET export_seq = (SELECT seq FROM export_counter WHERE id = 1) "
+            f"WHERE rowid = NEW.rowid;")
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_export_seq_insert AFTER INSERT ON {table} BEGIN {body} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_export_seq_update AFTER UPDATE ON {table} "
+        f"WHEN NEW.export_seq IS OLD.export_seq BEGIN {body} END"
+    ]
+
+def get_export_seq(conn: sqlite3.Connection) -> int:
+    """Giá trị hiện tại của bộ đếm export_seq (0 nếu schema chưa có bộ đếm)"""
+    try:
+        row = conn.execute("SELECT seq FROM export_counter WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+def raise_export_seq(conn: sqlite3.Connection, seq: int) -> None:
+    """
+    Đưa bộ đếm export_seq lên ít nhất seq (sau khi khôi phục bản sao lưu cũ, để dòng mới không
+    nhận lại các giá trị đã được xuất)
+
+    Args:
+        conn: Kết nối SQLite
+        seq: Giá trị tối thiểu của bộ đếm
+    """
+    with conn:
+        conn.execute("UPDATE export_counter SET seq = MAX(seq, ?) WHERE id = 1", (seq,))
+
+def _migrate_export_seq(conn: sqlite3.Connection, batch_size: int) -> None:
+    """
+    Thứ tự thay đổi tăng dần export_seq cho feedback và comparisons. rowid không tăng đơn điệu
+    (bảng không dùng AUTOINCREMENT nên rowid được dùng lại sau khi xóa), còn bộ đếm export_counter
+    chỉ tăng, kể cả khi dòng bị xóa, bị ghi đè bằng UPSERT hay bảng bị xóa hết.
+    """
+    # Bộ đếm bắt đầu trên mọi giá trị được điền cho dòng hiện có (feedback: rowid, comparisons:
+    # MAX(rowid của feedback) + rowid); dòng ghi trong lúc điền nhận giá trị từ trigger
+    conn.execute("BEGIN IMMEDIATE")
+    with conn:
+        for table in EXPORT_SEQ_TABLES:
+            _add_column(conn, table, "export_seq", "INTEGER")
+        max_rowids = {table: conn.execute(f"SELECT IFNULL(MAX(rowid), 0) FROM {table}").fetchone()[0]
+                      for table in EXPORT_SEQ_TABLES}
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS export_counter (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            seq INTEGER NOT NULL
+        )
+        ''')
+        conn.execute("INSERT OR IGNORE INTO export_counter (id, seq) VALUES (1, ?)",
+                     (sum(max_rowids.values()),))
+        for table in EXPORT_SEQ_TABLES:
+            for statement in _export_seq_triggers(table):
+                conn.execute(statement)
+
+        # Câu UPDATE chỉ gán export_seq không đổi dữ liệu: trigger tổng hợp bỏ qua thay vì trừ rồi cộng lại
+        conn.execute("DROP TRIGGER IF EXISTS trg_feedback_rollup_update")
+        conn.execute("DROP TRIGGER IF EXISTS trg_comparisons_rollup_update")
+        when = "NEW.export_seq IS OLD.export_seq"
+        for statement in (_rollup_triggers("feedback", _feedback_rollup_statements, ("update",), when)
+                          + _rollup_triggers("comparisons", _comparison_rollup_statements, ("update",), when)):
+            conn.execute(statement)
+
+    _backfill(conn, "feedback", "export_seq = rowid",
+              f"export_seq IS NULL AND rowid <= {max_rowids['feedback']}", batch_size)
+    _backfill(conn, "comparisons", f"export_seq = rowid + {max_rowids['feedback']}",
+              f"export_seq IS NULL AND rowid <= {max_rowids['comparisons']}", batch_size)
+    _create_indexes(conn, [
+        'CREATE INDEX IF NOT EXISTS idx_feedback_export_seq ON feedback(export_seq)',
+        'CREATE INDEX IF NOT EXISTS idx_comparisons_export_seq ON comparisons(export_seq)'
+    ])
+
+# (phiên bản, mô tả, hàm nâng cấp)
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection, int], None]]] = [
+    (1, "Bảng feedback, comparisons, stats", _migrate_base_schema),
+    (2, "Chỉ mục cơ bản và khóa phân trang", _migrate_base_indexes),
+    (3, "Cột thời gian ts_epoch dạng số nguyên", _migrate_epoch_timestamps),
+    (4, "Bảng models và chỉ mục bao phủ theo mô hình", _migrate_model_table),
+    (5, "Bảng tổng hợp theo ngày/mô hình/mẫu prompt duy trì bằng trigger", _migrate_rollup_tables),
+    (6, "Bảng texts lưu câu trả lời theo hash nội dung", _migrate_text_store),
+    (7, "Bảng tổng hợp thống kê đã lưu trữ và khóa thời gian của bảng stats", _migrate_stats_rollup),
+    (8, "Thứ tự thay đổi export_seq cho xuất tăng dần", _migrate_export_seq),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def migrate(conn: sqlite3.Connection, batch_size: int = DEFAULT_BATCH_SIZE,
+            target_version: Optional[int] = None) -> int:
+    """
+    Áp dụng lần lượt các bản nâng cấp còn thiếu. Mỗi bản nâng cấp chỉ ghi phiên bản mới sau khi
+    hoàn tất, nên nếu bị ngắt giữa chừng sẽ được chạy lại (các bước đều chạy lại được an toàn).
+    Dữ liệu của cột mới được điền theo lô nên ứng dụng khác vẫn ghi được trong lúc nâng cấp.
+
+    Args:
+        conn: Kết nối SQLite
+        batch_size: Số dòng mỗi lô khi điền dữ liệu
+        target_version: Phiên bản đích (mặc định: mới nhất)
+
+    Returns:
+        Phiên bản schema sau khi nâng cấp
+    """
+    target_version = SCHEMA_VERSION if target_version is None else target_version
+    current_version = get_schema_version(conn)
+
+    if current_version > SCHEMA_VERSION:
+        logger.warning(f"Schema phiên bản {current_version} mới hơn phiên bản được hỗ trợ ({SCHEMA_VERSION})")
+        return current_version
+
+    for version, description, upgrade in MIGRATIONS:
+        if version <= current_version or version > target_version:
+            continue
+
+        logger.info(f"Đang nâng cấp schema lên phiên bản {version}: {description}")
+        upgrade(conn, batch_size)
+        with conn:
+            conn.execute(f"PRAGMA user_version = {version}")
+        current_version = version
+
+    return current_version
@@ -0,0 +1,98 @@
+"""
+Module lưu và khôi phục trạng thái của các bộ tối ưu hóa (snapshot)
+"""
+
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Phiên bản định dạng snapshot, tăng khi cấu trúc trạng thái thay đổi không tương thích
+STATE_FORMAT_VERSION = 2
+
+class StateStore:
+    """
+    Lưu trạng thái học được (trọng số mô hình, tỷ lệ thắng, hiệu suất mẫu prompt, router)
+    vào một file JSON gọn:
+    - Có số phiên bản, snapshot khác phiên bản bị bỏ qua khi tải
+    - Ghi nguyên tử: ghi ra file tạm trong cùng thư mục rồi os.replace, nên khi tiến trình
+      dừng giữa chừng file cũ vẫn còn nguyên vẹn
+    """
+
+    def __init__(self, path: str):
+        """
+        Khởi tạo kho trạng thái
+
+        Args:
+            path: Đường dẫn file snapshot
+        """
+        self.path = path
+
+    def save(self, components: Dict[str, Any], last_feedback_seq: int = 0) -> bool:
+        """
+        Ghi snapshot trạng thái
+
+        Args:
+            components: Dict tên thành phần -> trạng thái (phải tuần tự hóa được bằng JSON)
+            last_feedback_seq: Giá trị export_seq của kho phản hồi mà mọi phản hồi đến mốc này
+                đã được áp dụng vào trạng thái
+
+        Returns:
+            True nếu ghi thành công, False nếu không
+        """
+        snapshot = {
+            "version": STATE_FORMAT_VERSION,
+            "saved_at": time.time(),
+            "last_feedback_seq": last_feedback_seq,
+            "components": components
+        }
+
+        directory = os.path.dirname(self.path) or "."
+        temp_path = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(prefix=".state-", suffix=".tmp", dir=directory)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            temp_path = None
+            return True
+        except Exception as e:
+            logger.error(f"Lỗi khi lưu trạng thái tối ưu hóa vào {self.path}: {e}")
+            return False
+        finally:
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """
+        Đọc snapshot trạng thái
+
+        Returns:
+            Dict snapshot (version, saved_at, last_feedback_seq, components)
+            hoặc None nếu không có file, file hỏng hoặc khác phiên bản
+        """
+        if not os.path.exists(self.path):
+            return None
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except Exception as e:
+            logger.error(f"Lỗi khi đọc trạng thái tối ưu hóa từ {self.path}: {e}")
+            return None
+
+        version = snapshot.get("version") if isinstance(snapshot, dict) else None
+        if version != STATE_FORMAT_VERSION:
+            logger.warning(f"Bỏ qua snapshot trạng thái phiên bản {version} "
+                           f"(phiên bản hiện tại {STATE_FORMAT_VERSION})")
+            return None
+
+        snapshot.setdefault("components", {})
+        return snapshot
@@ -0,0 +1,166 @@
+"""
+Module chỉ mục mẫu prompt để lựa chọn mẫu nhanh
+"""
+
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class TemplateIndex:
+    """
+    Chỉ mục mẫu prompt được xây dựng một lần khi tải mẫu:
+    - Nhóm mẫu theo lĩnh vực, trường hợp sử dụng và mức độ phức tạp
+    - Chỉ chấm điểm tập ứng viên nhỏ thay vì toàn bộ thư viện mẫu
+    - Ghi nhớ kết quả theo chữ ký phân tích để các lần chọn sau chỉ là tra cứu dict
+    """
+
+    def __init__(self, templates: List[Dict[str, Any]]):
+        """
+        Khởi tạo chỉ mục
+
+        Args:
+            templates: Danh sách mẫu prompt theo thứ tự trong file cấu hình
+        """
+        self.templates = templates
+
+        self._by_domain: Dict[str, List[int]] = {}
+        self._by_use_case: Dict[str, List[int]] = {}
+        self._by_complexity: Dict[str, List[int]] = {}
+        self._general: List[int] = []
+
+        # Đặc trưng đã tính sẵn của từng mẫu: (tập lĩnh vực, số lần xuất hiện use case, độ phức tạp)
+        self._features: List[Tuple[frozenset, Counter, str]] = []
+
+        # Bộ nhớ tạm kết quả
+        self._best_match_cache: Dict[Tuple, int] = {}
+        self._domain_cache: Dict[str, List[Dict[str, Any]]] = {}
+
+        for idx, template in enumerate(templates):
+            domains = frozenset(template.get("domains", []))
+            use_cases = Counter(template.get("use_cases", []))
+            complexity = template.get("complexity", "medium")
+            self._features.append((domains, use_cases, complexity))
+
+            for domain in domains:
+                self._by_domain.setdefault(domain, []).append(idx)
+            if "general" in domains:
+                self._general.append(idx)
+            for use_case in use_cases:
+                self._by_use_case.setdefault(use_case, []).append(idx)
+            self._by_complexity.setdefault(complexity, []).append(idx)
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    @staticmethod
+    def complexity_bucket(complexity: float) -> str:
+        """
+        Xác định mức độ phức tạp tương ứng với điểm phức tạp
+
+        Args:
+            complexity: Điểm phức tạp (0-10)
+
+        Returns:
+            "high", "medium" hoặc "low"
+        """
+        if complexity > 7:
+            return "high"
+        if complexity >= 3:
+            return "medium"
+        return "low"
+
+    def best_match(self, analysis: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Chọn mẫu phù hợp nhất với kết quả phân tích
+
+        Điểm và cách phá hòa (mẫu đứng trước thắng) giống hệt việc chấm điểm
+        toàn bộ danh sách mẫu.
+
+        Args:
+            analysis: Kết quả phân tích truy vấn
+
+        Returns:
+            Mẫu được chọn hoặc None nếu chỉ mục rỗng
+        """
+        if not self.templates:
+            return None
+
+        signature = (
+            analysis.get("domain"),
+            analysis.get("query_type"),
+            bool(analysis.get("requires_code")),
+            bool(analysis.get("requires_reasoning")),
+            bool(analysis.get("requires_creativity")),
+            self.complexity_bucket(analysis.get("complexity", 0))
+        )
+
+        best_idx = self._best_match_cache.get(signature)
+        if best_idx is None:
+            best_idx = self._score_candidates(signature)
+            self._best_match_cache[signature] = best_idx
+
+        return self.templates[best_idx]
+
+    def domain_matches(self, domain: str) -> List[Dict[str, Any]]:
+        """
+        Lấy các mẫu thuộc lĩnh vực hoặc lĩnh vực chung, giữ nguyên thứ tự gốc
+
+        Args:
+            domain: Lĩnh vực của truy vấn
+
+        Returns:
+            Danh sách mẫu phù hợp (danh sách rỗng nếu không có)
+        """
+        matches = self._domain_cache.get(domain)
+        if matches is None:
+            indices = set(self._by_domain.get(domain, []))
+            indices.update(self._general)
+            matches = [self.templates[idx] for idx in sorted(indices)]
+            self._domain_cache[domain] = matches
+        return matches
+
+    def _score_candidates(self, signature: Tuple) -> int:
+        """Chấm điểm tập ứng viên và trả về chỉ số mẫu tốt nhất"""
+        domain, query_type, requires_code, requires_reasoning, requires_creativity, bucket = signature
+        flags = {
+            "code": requires_code,
+            "reasoning": requires_reasoning,
+            "creative": requires_creativity
+        }
+
+        # Ứng viên: mọi mẫu có thể nhận điểm dương
+        candidates = set(self._by_domain.get(domain, []))
+        candidates.update(self._general)
+        candidates.update(self._by_use_case.get(query_type, []))
+        for use_case, active in flags.items():
+            if active:
+                candidates.update(self._by_use_case.get(use_case, []))
+        candidates.update(self._by_complexity.get(bucket, []))
+
+        # Không có ứng viên nào: mọi mẫu đều 0 điểm, mẫu đầu tiên thắng
+        best_idx = 0
+        best_score = 0
+        for idx in sorted(candidates):
+            domains, use_cases, complexity = self._features[idx]
+            score = 0
+
+            if domain in domains:
+                score += 3
+            elif "general" in domains:
+                score += 1
+
+            score += 2 * use_cases.get(query_type, 0)
+            for use_case, active in flags.items():
+                if active:
+                    score += 2 * use_cases.get(use_case, 0)
+
+            if complexity == bucket:
+                score += 2
+
+            if score > best_score:
+                best_score = score
+                best_idx = idx
+
+        return best_idx
@@ -0,0 +1,193 @@
+"""
+Module lưu nội dung câu trả lời theo địa chỉ nội dung (hash) trong bảng texts, có nén tùy chọn
+"""
+
+import hashlib
+import logging
+import sqlite3
+import zlib
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Cấu hình nén mặc định: chỉ nén văn bản đủ dài để đáng chi phí giải nén
+DEFAULT_TEXT_COMPRESSION = {
+    "algorithm": "zlib",    # none, zlib hoặc zstd (cần gói zstandard)
+    "min_size": 512,        # Số byte tối thiểu để nén
+    "level": 6
+}
+
+# Số hash mỗi truy vấn IN (...)
+_LOOKUP_CHUNK = 500
+
+def text_hash(text: str) -> str:
+    """
+    Tính hash nội dung của văn bản (BLAKE2b 128 bit)
+
+    Args:
+        text: Văn bản
+
+    Returns:
+        Chuỗi hex của hash
+    """
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+def decode_text(compression: str, content: bytes) -> str:
+    """
+    Giải nén nội dung đã lưu trong bảng texts
+
+    Args:
+        compression: Thuật toán nén ("" nếu không nén)
+        content: Dữ liệu đã lưu
+
+    Returns:
+        Văn bản gốc
+    """
+    if compression == "zlib":
+        content = zlib.decompress(content)
+    elif compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Cần gói zstandard để đọc văn bản nén bằng zstd")
+        content = zstandard.ZstdDecompressor().decompress(content)
+    return bytes(content).decode("utf-8")
+
+class TextCodec:
+    """Nén văn bản trước khi ghi vào bảng texts theo cấu hình"""
+
+    def __init__(self, options: Optional[Dict[str, Any]] = None):
+        """
+        Khởi tạo bộ nén
+
+        Args:
+            options: Ghi đè cấu hình nén mặc định (algorithm, min_size, level)
+        """
+        settings = dict(DEFAULT_TEXT_COMPRESSION)
+        settings.update(options or {})
+
+        self.algorithm = settings["algorithm"] or "none"
+        self.min_size = settings["min_size"]
+        self.level = settings["level"]
+
+        if self.algorithm == "zstd" and zstandard is None:
+            logger.warning("Không có gói zstandard, dùng zlib để nén văn bản")
+            self.algorithm = "zlib"
+        if self.algorithm not in ("none", "zlib", "zstd"):
+            logger.warning(f"Thuật toán nén không hợp lệ: {self.algorithm}, không nén văn bản")
+            self.algorithm = "none"
+
+        self._zstd = zstandard.ZstdCompressor(level=self.level) if self.algorithm == "zstd" else None
+
+    def encode(self, text: str) -> Tuple[str, bytes]:
+        """
+        Nén văn bản nếu đủ dài và kết quả nhỏ hơn bản gốc
+
+        Args:
+            text: Văn bản
+
+        Returns:
+            Tuple (thuật toán nén hoặc "", dữ liệu)
+        """
+        data = text.encode("utf-8")
+        if self.algorithm == "none" or len(data) < self.min_size:
+            return "", data
+
+        if self.algorithm == "zstd":
+            compressed = self._zstd.compress(data)
+        else:
+            compressed = zlib.compress(data, self.level)
+
+        if len(compressed) >= len(data):
+            return "", data
+        return self.algorithm, compressed
+
+def store_texts(conn: sqlite3.Connection, texts: Dict[str, str], codec: TextCodec) -> int:
+    """
+    Ghi các văn bản chưa có vào bảng texts (gọi trong giao dịch của lệnh ghi bản ghi tham chiếu).
+    Chỉ nén các văn bản thực sự mới.
+
+    Args:
+        conn: Kết nối SQLite
+        texts: Dict hash -> văn bản
+        codec: Bộ nén
+
+    Returns:
+        Số văn bản mới được ghi
+    """
+    hashes = list(texts)
+    existing = set()
+    for start in range(0, len(hashes), _LOOKUP_CHUNK):
+        chunk = hashes[start:start + _LOOKUP_CHUNK]
+        placeholders = ", ".join("?" * len(chunk))
+        existing.update(row[0] for row in conn.execute(
+            f"SELECT hash FROM texts WHERE hash IN ({placeholders})", chunk))
+
+    rows = []
+    for hash_value in hashes:
+        if hash_value in existing:
+            continue
+        text = texts[hash_value]
+        compression, content = codec.encode(text)
+        rows.append((hash_value, compression, content, len(text.encode("utf-8"))))
+
+    conn.executemany("INSERT OR IGNORE INTO texts (hash, compression, content, size) VALUES (?, ?, ?, ?)", rows)
+    return len(rows)
+
+def load_texts(conn: sqlite3.Connection, hashes: Iterable[str]) -> Dict[str, str]:
+    """
+    Đọc và giải nén các văn bản theo hash
+
+    Args:
+        conn: Kết nối SQLite
+        hashes: Các hash cần đọc
+
+    Returns:
+        Dict hash -> văn bản (thiếu các hash không tồn tại)
+    """
+    hashes = [hash_value for hash_value in set(hashes) if hash_value]
+    texts = {}
+    for start in range(0, len(hashes), _LOOKUP_CHUNK):
+        chunk = hashes[start:start + _LOOKUP_CHUNK]
+        placeholders = ", ".join("?" * len(chunk))
+        for hash_value, compression, content in conn.execute(
+                f"SELECT hash, compression, content FROM texts WHERE hash IN ({placeholders})", chunk):
+            texts[hash_value] = decode_text(compression, content)
+    return texts
+
+def prune_unreferenced_texts(conn: sqlite3.Connection) -> int:
+    """
+    Xóa các văn bản không còn được phản hồi hoặc so sánh nào tham chiếu (sau khi xóa/ghi đè bản ghi)
+
+    Args:
+        conn: Kết nối SQLite
+
+    Returns:
+        Số văn bản đã xóa
+    """
+    with conn:
+        cursor = conn.execute('''
+        DELETE FROM texts WHERE hash NOT IN (
+            SELECT chosen_hash FROM comparisons WHERE chosen_hash IS NOT NULL
+            UNION SELECT rejected_hash FROM comparisons WHERE rejected_hash IS NOT NULL
+            UNION SELECT json_each.value FROM feedback, json_each(feedback.response_hashes)
+            WHERE feedback.response_hashes IS NOT NULL
+        )
+        ''')
+    return cursor.rowcount
+
+def get_text_stats(conn: sqlite3.Connection) -> Dict[str, int]:
+    """
+    Thống kê bảng texts
+
+    Args:
+        conn: Kết nối SQLite
+
+    Returns:
+        Dict với số văn bản, tổng kích thước gốc và tổng kích thước đã lưu (byte)
+    """
+    row = conn.execute("SELECT COUNT(*), IFNULL(SUM(size), 0), IFNULL(SUM(length(content)), 0) FROM texts").fetchone()
+    return {"texts": row[0], "original_bytes": row[1], "stored_bytes": row[2]}
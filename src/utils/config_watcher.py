@@ -0,0 +1,164 @@
+"""
+Theo dõi thay đổi của các file cấu hình và tải lại khi cần.
+Dùng cơ chế kiểm tra định kỳ thời gian sửa đổi (mtime) nên không cần thư viện ngoài.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Dict, Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class ConfigWatcher:
+    """
+    Theo dõi các file cấu hình bằng cách kiểm tra mtime định kỳ trên một luồng nền.
+    Khi file thay đổi, hàm callback đã đăng ký được gọi để tải lại. Callback chịu
+    trách nhiệm dựng đối tượng mới rồi gán thay thế, nên các yêu cầu đang xử lý
+    luôn thấy trọn vẹn phiên bản cũ hoặc phiên bản mới.
+    """
+
+    def __init__(self, interval: float = 2.0):
+        """
+        Khởi tạo bộ theo dõi.
+
+        Args:
+            interval: Chu kỳ kiểm tra (giây)
+        """
+        self.interval = interval
+
+        # Đường dẫn -> (callback, dấu thời gian lần cuối)
+        self._watches: Dict[str, Tuple[Callable[[str], Any], Optional[Tuple[int, int]]]] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, path: str, callback: Callable[[str], Any]) -> None:
+        """
+        Đăng ký theo dõi một file.
+
+        Args:
+            path: Đường dẫn file
+            callback: Hàm được gọi với đường dẫn file khi file thay đổi
+        """
+        with self._lock:
+            self._watches[path] = (callback, self._signature(path))
+            self._stats.setdefault(path, {
+                "reload_count": 0,
+                "error_count": 0,
+                "last_reload": None,
+                "last_duration_ms": 0.0,
+                "total_duration_ms": 0.0,
+                "last_error": None
+            })
+        logger.debug(f"Đang theo dõi thay đổi của {path}")
+
+    def start(self) -> None:
+        """Bắt đầu luồng theo dõi nền."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Đã bật tự động tải lại cấu hình (chu kỳ {self.interval}s, {len(self._watches)} file)")
+
+    def stop(self) -> None:
+        """Dừng luồng theo dõi nền."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def check_now(self) -> int:
+        """
+        Kiểm tra ngay tất cả file đang theo dõi và tải lại file đã thay đổi.
+
+        Returns:
+            Số file đã được tải lại
+        """
+        with self._lock:
+            watches = list(self._watches.items())
+
+        reloaded = 0
+        for path, (callback, last_signature) in watches:
+            signature = self._signature(path)
+            if signature is None or signature == last_signature:
+                continue
+
+            with self._lock:
+                self._watches[path] = (callback, signature)
+
+            if self._reload(path, callback):
+                reloaded += 1
+
+        return reloaded
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Lấy thống kê tải lại.
+
+        Returns:
+            Dict chứa số lần tải lại, thời gian và lỗi của từng file
+        """
+        with self._lock:
+            files = {path: dict(stats) for path, stats in self._stats.items()}
+
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "interval": self.interval,
+            "reload_count": sum(stats["reload_count"] for stats in files.values()),
+            "error_count": sum(stats["error_count"] for stats in files.values()),
+            "files": files
+        }
+
+    def _run(self) -> None:
+        """Vòng lặp của luồng theo dõi."""
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.check_now()
+            except Exception as e:
+                logger.error(f"Lỗi khi kiểm tra thay đổi cấu hình: {e}")
+
+    def _reload(self, path: str, callback: Callable[[str], Any]) -> bool:
+        """Gọi callback tải lại và ghi nhận thống kê."""
+        start_time = time.perf_counter()
+        error = None
+        try:
+            # Callback trả về False khi không tải lại được (giữ nguyên cấu hình cũ)
+            success = callback(path) is not False
+            if not success:
+                error = "callback trả về False"
+        except Exception as e:
+            success = False
+            error = str(e)
+        duration_ms = (time.perf_counter() - start_time) * 1000
+
+        with self._lock:
+            stats = self._stats[path]
+            if success:
+                stats["reload_count"] += 1
+                stats["last_reload"] = time.time()
+                stats["last_duration_ms"] = duration_ms
+                stats["total_duration_ms"] += duration_ms
+            else:
+                stats["error_count"] += 1
+                stats["last_error"] = error
+
+        if success:
+            logger.info(f"Đã tải lại {path} trong {duration_ms:.1f}ms")
+        else:
+            logger.error(f"Lỗi khi tải lại {path}, giữ nguyên cấu hình cũ: {error}")
+
+        return success
+
+    @staticmethod
+    def _signature(path: str) -> Optional[Tuple[int, int]]:
+        """Lấy dấu thời gian sửa đổi và kích thước file (None nếu không tồn tại)."""
+        try:
+            stat = os.stat(path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
@@ -7,12 +7,429 @@ import os
 import json
 import logging
 import csv
-from typing import Dict, List, Any, Optional, Union
+import gzip
+import hashlib
+import io
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Any, Optional, Union, Callable, Iterable
 from datetime import datetime
 import shutil
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 logger = logging.getLogger(__name__)
 
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+# Cấu hình sao lưu SQLite mặc định
+DEFAULT_SQLITE_BACKUP_OPTIONS = {
+    "pages": 1024,          # Số trang chép mỗi bước (4MB với trang 4KB)
+    "pause": 0.01,          # Nghỉ giữa các bước (giây) để người ghi lấy được khóa
+    "max_restarts": 3,      # Số lần chép lại do nguồn thay đổi trước khi chép một lần
+    "keep": 7               # Số bản sao lưu giữ lại khi xoay vòng (0 = giữ tất cả)
+}
+
+class _BackupRestarted(Exception):
+    """Nguồn bị ghi quá nhiều lần trong lúc sao lưu theo bước"""
+
+# Cấu hình xuất JSONL theo phân đoạn mặc định
+DEFAULT_SHARD_OPTIONS = {
+    "rows_per_shard": 100000,   # Số dòng mỗi file phân đoạn (<= 0 để không chia)
+    "compression": "gzip",      # none, gzip hoặc zstd (cần gói zstandard)
+    "level": 6                  # Mức nén
+}
+
+# Cấu hình pipeline xuất song song mặc định
+DEFAULT_PIPELINE_OPTIONS = {
+    "queue_size": 8,        # Số lô tối đa chờ trong hàng đợi của mỗi bộ ghi
+    "batch_size": 500       # Số bản ghi mỗi lô chuyển cho bộ ghi
+}
+
+# Số nhóm (bucket) khi chia train/eval theo hash: tỷ lệ eval được làm tròn theo 1/SPLIT_BUCKETS
+SPLIT_BUCKETS = 10000
+
+# Phần mở rộng file theo thuật toán nén
+SHARD_EXTENSIONS = {"none": ".jsonl", "gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+
+# Số byte gom lại trước mỗi lần ghi vào bộ nén
+_SHARD_BUFFER_BYTES = 1 << 20
+
+class _HashingFile:
+    """File nhị phân tính SHA-256 và đếm số byte của dữ liệu được ghi"""
+    
+    def __init__(self, path: str):
+        self._file = open(path, 'wb')
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        
+    def write(self, data: bytes) -> int:
+        self.sha256.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+    
+    def flush(self) -> None:
+        self._file.flush()
+        
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+    
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+class ShardedJsonlWriter:
+    """
+    Ghi bản ghi ra các file JSONL theo phân đoạn, có nén tùy chọn, với bộ nhớ không đổi:
+    - Mỗi luồng dữ liệu (ví dụ feedback, comparisons) có dãy file {luồng}-00000.jsonl[.gz|.zst] riêng
+    - Sang file mới sau mỗi rows_per_shard dòng
+    - close() ghi manifest.json (số dòng, kích thước, SHA-256 của từng file); export chưa có
+      manifest là export chưa hoàn tất
+    """
+    
+    def __init__(self, output_dir: str, rows_per_shard: int = DEFAULT_SHARD_OPTIONS["rows_per_shard"],
+                 compression: str = DEFAULT_SHARD_OPTIONS["compression"],
+                 level: int = DEFAULT_SHARD_OPTIONS["level"]):
+        """
+        Khởi tạo bộ ghi
+        
+        Args:
+            output_dir: Thư mục xuất
+            rows_per_shard: Số dòng mỗi file (<= 0 để không chia)
+            compression: none, gzip hoặc zstd
+            level: Mức nén
+        """
+        compression = compression or "none"
+        if compression == "zstd" and zstandard is None:
+            logger.warning("Không có gói zstandard, dùng gzip để nén dữ liệu xuất")
+            compression = "gzip"
+        if compression not in SHARD_EXTENSIONS:
+            logger.warning(f"Thuật toán nén không hợp lệ: {compression}, không nén dữ liệu xuất")
+            compression = "none"
+            
+        self.output_dir = output_dir
+        self.rows_per_shard = rows_per_shard
+        self.compression = compression
+        self.level = level
+        self.manifest_path = os.path.join(output_dir, "manifest.json")
+        
+        self._open_shards: Dict[str, Dict[str, Any]] = {}
+        self._shard_counts: Dict[str, int] = {}
+        self._stream_rows: Dict[str, int] = {}
+        self._shards: List[Dict[str, Any]] = []
+        self._manifest: Optional[Dict[str, Any]] = None
+        
+        os.makedirs(output_dir, exist_ok=True)
+        
+    def __enter__(self) -> "ShardedJsonlWriter":
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+    
+    def abort(self) -> None:
+        """Đóng các file phân đoạn mà không ghi manifest (export bị lỗi, chưa hoàn tất)"""
+        if self._manifest is None:
+            self._close_shards()
+    
+    def write(self, record: Dict[str, Any], stream: str = "data") -> None:
+        """
+        Ghi một bản ghi vào luồng dữ liệu
+        
+        Args:
+            record: Bản ghi (chuyển được sang JSON)
+            stream: Tên luồng dữ liệu
+        """
+        self.write_line(json.dumps(record, ensure_ascii=False), stream)
+    
+    def write_line(self, line: str, stream: str = "data") -> None:
+        """
+        Ghi một dòng JSON đã mã hóa sẵn (ví dụ khi ghép các file phân đoạn có sẵn)
+        
+        Args:
+            line: Dòng JSON (không cần ký tự xuống dòng)
+            stream: Tên luồng dữ liệu
+        """
+        shard = self._open_shards.get(stream) or self._open_shard(stream)
+        line = line.rstrip("\n") + "\n"
+        shard["buffer"].append(line)
+        shard["buffered"] += len(line)
+        shard["rows"] += 1
+        self._stream_rows[stream] = self._stream_rows.get(stream, 0) + 1
+        
+        if shard["buffered"] >= _SHARD_BUFFER_BYTES:
+            self._flush(shard)
+        if 0 < self.rows_per_shard <= shard["rows"]:
+            self._finish_shard(stream)
+    
+    def _open_shard(self, stream: str) -> Dict[str, Any]:
+        """Mở file phân đoạn tiếp theo của luồng dữ liệu"""
+        index = self._shard_counts.get(stream, 0)
+        self._shard_counts[stream] = index + 1
+        filename = f"{stream}-{index:05d}{SHARD_EXTENSIONS[self.compression]}"
+        raw = _HashingFile(os.path.join(self.output_dir, filename))
+        
+        if self.compression == "gzip":
+            # mtime=0 để cùng dữ liệu cho cùng checksum
+            writer = gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=self.level, mtime=0)
+        elif self.compression == "zstd":
+            writer = zstandard.ZstdCompressor(level=self.level).stream_writer(raw, closefd=False)
+        else:
+            writer = raw
+            
+        shard = {"file": filename, "raw": raw, "writer": writer, "buffer": [], "buffered": 0, "rows": 0}
+        self._open_shards[stream] = shard
+        return shard
+    
+    @staticmethod
+    def _flush(shard: Dict[str, Any]) -> None:
+        """Ghi phần đệm của file phân đoạn vào bộ nén"""
+        if shard["buffer"]:
+            shard["writer"].write("".join(shard["buffer"]).encode("utf-8"))
+            shard["buffer"] = []
+            shard["buffered"] = 0
+    
+    def _finish_shard(self, stream: str) -> None:
+        """Đóng file phân đoạn hiện tại của luồng dữ liệu và ghi nhận vào manifest"""
+        shard = self._open_shards.pop(stream)
+        self._flush(shard)
+        if shard["writer"] is not shard["raw"]:
+            shard["writer"].close()
+        shard["raw"].close()
+        self._shards.append({
+            "file": shard["file"],
+            "stream": stream,
+            "rows": shard["rows"],
+            "bytes": shard["raw"].size,
+            "sha256": shard["raw"].sha256.hexdigest()
+        })
+    
+    def _close_shards(self) -> None:
+        """Đóng mọi file phân đoạn đang mở"""
+        for stream in list(self._open_shards):
+            self._finish_shard(stream)
+    
+    def close(self, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Đóng các file phân đoạn và ghi manifest (các lần gọi sau trả về manifest đã ghi)
+        
+        Args:
+            metadata: Thông tin bổ sung cho manifest (tùy chọn)
+            
+        Returns:
+            Nội dung manifest
+        """
+        if self._manifest is not None:
+            return self._manifest
+            
+        self._close_shards()
+        manifest = {
+            "format_version": "1.0",
+            "created_at": datetime.now().isoformat(),
+            "compression": self.compression,
+            "rows_per_shard": self.rows_per_shard,
+            "total_rows": sum(self._stream_rows.values()),
+            "streams": dict(self._stream_rows),
+            "shards": sorted(self._shards, key=lambda shard: shard["file"]),
+            "metadata": metadata or {}
+        }
+        with open(self.manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        self._manifest = manifest
+        return manifest
+
+def open_shard(path: str):
+    """
+    Mở một file phân đoạn JSONL để đọc theo dòng (giải nén theo phần mở rộng)
+    
+    Args:
+        path: Đường dẫn file phân đoạn
+        
+    Returns:
+        File văn bản
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("Cần gói zstandard để đọc file nén bằng zstd")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True),
+                                encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+def verify_manifest(manifest_path: str) -> List[str]:
+    """
+    Kiểm tra các file phân đoạn của một export theo manifest (kích thước và SHA-256)
+    
+    Args:
+        manifest_path: Đường dẫn manifest.json
+        
+    Returns:
+        Danh sách file bị thiếu hoặc không khớp (rỗng nếu hợp lệ)
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+        
+    invalid = []
+    output_dir = os.path.dirname(manifest_path)
+    for shard in manifest["shards"]:
+        path = os.path.join(output_dir, shard["file"])
+        if not os.path.exists(path) or os.path.getsize(path) != shard["bytes"]:
+            invalid.append(shard["file"])
+            continue
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as shard_file:
+            for chunk in iter(lambda: shard_file.read(_SHARD_BUFFER_BYTES), b""):
+                sha256.update(chunk)
+        if sha256.hexdigest() != shard["sha256"]:
+            invalid.append(shard["file"])
+    return invalid
+
+def hash_split(key: str, eval_ratio: float, seed: str = "", buckets: int = SPLIT_BUCKETS) -> str:
+    """
+    Chia train/eval tất định theo hash của một khóa ổn định: cùng khóa (ví dụ cùng hội thoại)
+    luôn thuộc cùng một tập ở mọi lần xuất, không cần đọc trước hay xáo trộn toàn bộ dữ liệu
+    
+    Args:
+        key: Khóa chia tập (conversation_id, prompt, ...)
+        eval_ratio: Tỷ lệ nhóm thuộc tập eval
+        seed: Chuỗi trộn vào hash để có cách chia khác
+        buckets: Số nhóm
+        
+    Returns:
+        "eval" hoặc "train"
+    """
+    digest = hashlib.blake2b(f"{seed}\x00{key}".encode("utf-8"), digest_size=8).digest()
+    bucket = int.from_bytes(digest, "big") % buckets
+    return "eval" if bucket < round(eval_ratio * buckets) else "train"
+
+class ExportPipeline:
+    """
+    Pipeline xuất một lượt đọc, nhiều đầu ra: luồng gọi run() đọc dữ liệu một lần và chuyển
+    từng lô cho mọi bộ ghi, mỗi bộ ghi chạy trên thread riêng với hàng đợi giới hạn (bộ ghi chậm
+    nhất điều tiết tốc độ đọc, bộ nhớ không tăng theo số bản ghi).
+    
+    Bộ ghi là đối tượng có write(record) và close() (trả về kết quả của bộ ghi), tùy chọn
+    abort() để dọn dẹp khi pipeline thất bại. Mọi bộ ghi ghi xong trước khi bộ nào được đóng,
+    nên khi một bộ ghi lỗi, không bộ ghi nào hoàn tất đầu ra của mình.
+    """
+    
+    def __init__(self, sinks: Dict[str, Any], queue_size: int = DEFAULT_PIPELINE_OPTIONS["queue_size"],
+                 batch_size: int = DEFAULT_PIPELINE_OPTIONS["batch_size"]):
+        """
+        Khởi tạo pipeline
+        
+        Args:
+            sinks: Dict tên -> bộ ghi
+            queue_size: Số lô tối đa chờ trong hàng đợi của mỗi bộ ghi
+            batch_size: Số bản ghi mỗi lô
+        """
+        self.sinks = sinks
+        self.queue_size = max(1, queue_size)
+        self.batch_size = max(1, batch_size)
+        self._failed = threading.Event()
+        self._errors: Dict[str, BaseException] = {}
+        self._results: Dict[str, Any] = {}
+        self._writes_done = threading.Barrier(max(1, len(sinks)))
+        
+    def _run_sink(self, name: str, sink: Any, batches: "queue.Queue") -> None:
+        """Vòng lặp của thread bộ ghi: ghi các lô đến khi gặp None, rồi đóng bộ ghi"""
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            # Sau khi lỗi vẫn lấy hết hàng đợi để luồng đọc không bị chặn
+            if self._failed.is_set():
+                continue
+            try:
+                for record in batch:
+                    sink.write(record)
+            except Exception as e:
+                logger.error(f"Lỗi khi ghi {name}: {e}")
+                self._errors[name] = e
+                self._failed.set()
+                
+        # Chờ mọi bộ ghi ghi xong để quyết định đóng hay hủy dựa trên kết quả của tất cả
+        self._writes_done.wait()
+        try:
+            if self._failed.is_set():
+                if hasattr(sink, "abort"):
+                    sink.abort()
+            else:
+                self._results[name] = sink.close()
+        except Exception as e:
+            logger.error(f"Lỗi khi đóng {name}: {e}")
+            self._errors[name] = e
+            self._failed.set()
+    
+    def run(self, records: Iterable[Any]) -> Dict[str, Any]:
+        """
+        Đọc dữ liệu một lần và ghi ra mọi bộ ghi
+        
+        Args:
+            records: Các bản ghi (có thể là iterator)
+            
+        Returns:
+            Dict với số bản ghi (rows), thời gian (seconds), thông lượng (rows_per_sec) và
+            kết quả close() của từng bộ ghi (results)
+            
+        Raises:
+            RuntimeError: Nếu một bộ ghi lỗi (các bộ ghi còn lại bị hủy)
+        """
+        queues = {name: queue.Queue(maxsize=self.queue_size) for name in self.sinks}
+        threads = [threading.Thread(target=self._run_sink, args=(name, sink, queues[name]),
+                                    name=f"export-{name}", daemon=True)
+                   for name, sink in self.sinks.items()]
+        for thread in threads:
+            thread.start()
+            
+        start = time.perf_counter()
+        rows = 0
+        try:
+            batch = []
+            for record in records:
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    if self._failed.is_set():
+                        break
+                    for batch_queue in queues.values():
+                        batch_queue.put(batch)
+                    rows += len(batch)
+                    batch = []
+            if batch and not self._failed.is_set():
+                for batch_queue in queues.values():
+                    batch_queue.put(batch)
+                rows += len(batch)
+        except Exception:
+            self._failed.set()
+            raise
+        finally:
+            for batch_queue in queues.values():
+                batch_queue.put(None)
+            for thread in threads:
+                thread.join()
+                
+        if self._errors:
+            raise RuntimeError("Pipeline xuất thất bại: " +
+                               ", ".join(f"{name}: {error}" for name, error in self._errors.items()))
+        
+        elapsed = time.perf_counter() - start
+        return {
+            "rows": rows,
+            "seconds": elapsed,
+            "rows_per_sec": rows / elapsed if elapsed > 0 else 0.0,
+            "results": dict(self._results)
+        }
+
 def export_rlhf_data(rlhf_data: Dict[str, Any], export_dir: str) -> str:
     """
     Xuất dữ liệu RLHF ra file.
@@ -483,13 +900,116 @@ def _export_conversation_as_html(conversation_data: Dict[str, Any], output_path:
     with open(output_path, 'w', encoding='utf-8') as f:
         f.write(html_content)
 
-def create_backup(source_path: str, backup_dir: Optional[str] = None) -> str:
+def is_sqlite_database(path: str) -> bool:
+    """
+    Kiểm tra file có phải cơ sở dữ liệu SQLite không (theo header)
+    
+    Args:
+        path: Đường dẫn đến file
+        
+    Returns:
+        True nếu là file SQLite
+    """
+    try:
+        with open(path, 'rb') as f:
+            return f.read(16) == SQLITE_HEADER
+    except OSError:
+        return False
+
+def backup_sqlite_database(source: sqlite3.Connection, backup_path: str,
+                           pages: int = DEFAULT_SQLITE_BACKUP_OPTIONS["pages"],
+                           pause: float = DEFAULT_SQLITE_BACKUP_OPTIONS["pause"],
+                           progress: Optional[Callable[[int, int], None]] = None,
+                           max_restarts: int = DEFAULT_SQLITE_BACKUP_OPTIONS["max_restarts"]) -> str:
+    """
+    Sao lưu trực tuyến bằng SQLite backup API: chép từng nhóm trang, nghỉ giữa các bước để
+    không chiếm khóa lâu. Bản sao được ghi ra file tạm rồi đổi tên, nên không bao giờ dở dang.
+    
+    Nếu kết nối khác ghi vào nguồn giữa các bước, SQLite chép lại từ đầu; sau max_restarts lần
+    như vậy, toàn bộ được chép lại trong một bước (với WAL, bước đọc này không chặn người ghi).
+    
+    Args:
+        source: Kết nối đến cơ sở dữ liệu nguồn
+        backup_path: Đường dẫn file sao lưu
+        pages: Số trang chép mỗi bước (<= 0 để chép một lần)
+        pause: Thời gian nghỉ giữa các bước (giây)
+        progress: Hàm nhận (số trang đã chép, tổng số trang) sau mỗi bước
+        max_restarts: Số lần chép lại tối đa trước khi chuyển sang chép một lần
+        
+    Returns:
+        Đường dẫn đến file sao lưu
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(backup_path)), exist_ok=True)
+    tmp_path = f"{backup_path}.tmp"
+    
+    state = {"remaining": None, "restarts": 0}
+    
+    def on_progress(status: int, remaining: int, total: int) -> None:
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > max_restarts:
+                raise _BackupRestarted()
+        state["remaining"] = remaining
+        if progress:
+            progress(total - remaining, total)
+        if pause and remaining:
+            time.sleep(pause)
+    
+    for step_pages in ([pages, -1] if pages > 0 else [-1]):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        target = sqlite3.connect(tmp_path)
+        try:
+            source.backup(target, pages=step_pages, progress=on_progress)
+            break
+        except _BackupRestarted:
+            logger.info("Cơ sở dữ liệu thay đổi liên tục trong lúc sao lưu, chép lại toàn bộ trong một bước")
+        finally:
+            target.close()
+    
+    os.replace(tmp_path, backup_path)
+    return backup_path
+
+def rotate_backups(backup_dir: str, prefix: str, suffix: str = "", keep: int = 0) -> List[str]:
+    """
+    Xóa các bản sao lưu cũ, chỉ giữ keep bản mới nhất
+    
+    Args:
+        backup_dir: Thư mục chứa bản sao lưu
+        prefix: Tiền tố tên file sao lưu
+        suffix: Hậu tố tên file sao lưu
+        keep: Số bản giữ lại (<= 0 để giữ tất cả)
+        
+    Returns:
+        Danh sách file đã xóa
+    """
+    if keep <= 0 or not os.path.isdir(backup_dir):
+        return []
+    
+    backups = [os.path.join(backup_dir, name) for name in os.listdir(backup_dir)
+               if name.startswith(prefix) and name.endswith(suffix)]
+    backups.sort(key=lambda path: (os.path.getmtime(path), path), reverse=True)
+    
+    removed = []
+    for path in backups[keep:]:
+        try:
+            os.remove(path)
+            removed.append(path)
+        except OSError as e:
+            logger.warning(f"Không thể xóa bản sao lưu cũ {path}: {e}")
+    if removed:
+        logger.info(f"Đã xóa {len(removed)} bản sao lưu cũ trong {backup_dir}")
+    return removed
+
+def create_backup(source_path: str, backup_dir: Optional[str] = None, keep: int = 0) -> str:
     """
-    Tạo bản sao lưu của một file.
+    Tạo bản sao lưu của một file. Cơ sở dữ liệu SQLite được sao lưu bằng backup API
+    để an toàn khi đang có người ghi.
     
     Args:
         source_path: Đường dẫn đến file nguồn
         backup_dir: Thư mục lưu bản sao (mặc định là thư mục chứa file nguồn + /backups)
+        keep: Số bản sao lưu của file này được giữ lại (<= 0 để giữ tất cả)
         
     Returns:
         Đường dẫn đến file bản sao
@@ -505,12 +1025,21 @@ def create_backup(source_path: str, backup_dir: Optional[str] = None) -> str:
     
     # Tạo tên file backup
     filename = os.path.basename(source_path)
+    stem, extension = os.path.splitext(filename)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_filename = f"{os.path.splitext(filename)[0]}_{timestamp}{os.path.splitext(filename)[1]}.bak"
+    backup_filename = f"{stem}_{timestamp}{extension}.bak"
     backup_path = os.path.join(backup_dir, backup_filename)
     
     # Sao chép file
-    shutil.copy2(source_path, backup_path)
+    if is_sqlite_database(source_path):
+        source = sqlite3.connect(source_path)
+        try:
+            backup_sqlite_database(source, backup_path)
+        finally:
+            source.close()
+    else:
+        shutil.copy2(source_path, backup_path)
     logger.info(f"Đã tạo bản sao lưu tại: {backup_path}")
     
-    return backup_path
\ No newline at end of file
+    rotate_backups(backup_dir, f"{stem}_", f"{extension}.bak", keep)
+    return backup_path
@@ -7,11 +7,114 @@ import os
 import yaml
 import logging
 import re
-from typing import Dict, Any, Optional, List, Union
-from string import Template
+from functools import lru_cache
+from typing import Dict, Any, Optional, List, Union, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Cú pháp placeholder được hỗ trợ
+# - "brace": {name} (mẫu của ResponseOptimizer)
+# - "dollar": ${name}, $name và $$ (tương thích string.Template)
+_BRACE_PATTERN = re.compile(r"\{([_a-zA-Z][_a-zA-Z0-9]*)\}")
+_DOLLAR_PATTERN = re.compile(r"\$(?:(\$)|\{([_a-zA-Z][_a-zA-Z0-9]*)\}|([_a-zA-Z][_a-zA-Z0-9]*))")
+
+class CompiledTemplate:
+    """
+    Mẫu đã được phân tích một lần thành các đoạn văn bản cố định và placeholder.
+    Khi định dạng chỉ cần điền giá trị vào các vị trí placeholder và nối một lần.
+    """
+    
+    def __init__(self, template_str: str, syntax: str = "brace"):
+        """
+        Phân tích chuỗi mẫu.
+        
+        Args:
+            template_str: Chuỗi mẫu
+            syntax: Cú pháp placeholder ("brace" hoặc "dollar")
+        """
+        if syntax not in ("brace", "dollar"):
+            raise ValueError(f"Cú pháp mẫu không hợp lệ: {syntax}")
+            
+        self.template_str = template_str
+        self.syntax = syntax
+        
+        # Các đoạn của mẫu; vị trí placeholder giữ văn bản gốc để dùng khi thiếu giá trị
+        self._parts: List[str] = []
+        # (vị trí trong _parts, tên placeholder)
+        self._slots: List[Tuple[int, str]] = []
+        
+        pattern = _BRACE_PATTERN if syntax == "brace" else _DOLLAR_PATTERN
+        literal = []
+        position = 0
+        for match in pattern.finditer(template_str):
+            literal.append(template_str[position:match.start()])
+            position = match.end()
+            
+            if syntax == "dollar" and match.group(1):
+                # $$ là ký tự $ thoát
+                literal.append("$")
+                continue
+                
+            name = match.group(1) if syntax == "brace" else (match.group(2) or match.group(3))
+            self._parts.append("".join(literal))
+            literal = []
+            self._slots.append((len(self._parts), name))
+            self._parts.append(match.group(0))
+            
+        literal.append(template_str[position:])
+        self._parts.append("".join(literal))
+        
+        self.placeholders = frozenset(name for _, name in self._slots)
+    
+    def render(self, values: Dict[str, Any]) -> str:
+        """
+        Định dạng mẫu trong một lần nối chuỗi.
+        
+        Args:
+            values: Giá trị (chuỗi) cho các placeholder
+            
+        Returns:
+            Chuỗi đã định dạng (placeholder thiếu giá trị được giữ nguyên)
+        """
+        if not self._slots:
+            return self._parts[0]
+            
+        parts = self._parts[:]
+        get = values.get
+        for index, name in self._slots:
+            value = get(name)
+            if value is not None:
+                parts[index] = value
+        return "".join(parts)
+    
+    def missing(self, values: Dict[str, Any]) -> List[str]:
+        """
+        Lấy danh sách placeholder chưa có giá trị.
+        
+        Args:
+            values: Giá trị cho các placeholder
+            
+        Returns:
+            Danh sách tên placeholder bị thiếu
+        """
+        return sorted(name for name in self.placeholders if name not in values)
+
+
+@lru_cache(maxsize=4096)
+def compile_template(template_str: str, syntax: str = "brace") -> CompiledTemplate:
+    """
+    Biên dịch chuỗi mẫu, kết quả được lưu tạm nên mỗi mẫu chỉ phân tích một lần.
+    
+    Args:
+        template_str: Chuỗi mẫu
+        syntax: Cú pháp placeholder ("brace" hoặc "dollar")
+        
+    Returns:
+        Đối tượng CompiledTemplate
+    """
+    return CompiledTemplate(template_str, syntax)
+
+
 class PromptTemplate:
     """Lớp quản lý và tùy chỉnh các mẫu prompt."""
     
@@ -20,10 +123,10 @@ class PromptTemplate:
         Khởi tạo mẫu prompt.
         
         Args:
-            template_str: Chuỗi mẫu
+            template_str: Chuỗi mẫu (cú pháp ${name})
         """
         self.template_str = template_str
-        self.template = Template(template_str)
+        self.template = compile_template(template_str, "dollar")
     
     def format(self, **kwargs) -> str:
         """
@@ -35,12 +138,11 @@ class PromptTemplate:
         Returns:
             Chuỗi đã định dạng
         """
-        try:
-            return self.template.substitute(**kwargs)
-        except KeyError as e:
-            logger.warning(f"Thiếu tham số {e} khi định dạng mẫu prompt")
-            # Sử dụng safe_substitute để tránh lỗi khi thiếu tham số
-            return self.template.safe_substitute(**kwargs)
+        missing = self.template.missing(kwargs)
+        if missing:
+            # Giữ nguyên placeholder thiếu tham số thay vì báo lỗi
+            logger.warning(f"Thiếu tham số {', '.join(missing)} khi định dạng mẫu prompt")
+        return self.template.render({key: str(value) for key, value in kwargs.items()})
     
     def __str__(self) -> str:
         """Lấy chuỗi mẫu."""
@@ -61,28 +163,50 @@ class PromptLibrary:
         self.templates = {}
         self.load_templates()
     
+    def _get_template_path(self) -> str:
+        """Lấy đường dẫn đến file mẫu prompt."""
+        config_dir = self.config.get("system", {}).get("config_dir", "config")
+        return os.path.join(config_dir, "prompt_templates.yml")
+    
+    def _read_templates(self, template_path: str) -> Dict[str, Dict[str, PromptTemplate]]:
+        """
+        Đọc các mẫu prompt từ file cấu hình.
+        
+        Args:
+            template_path: Đường dẫn file mẫu
+            
+        Returns:
+            Dict vai trò -> tên mẫu -> PromptTemplate
+            
+        Raises:
+            ValueError: Nếu file không đúng định dạng
+        """
+        with open(template_path, 'r', encoding='utf-8') as f:
+            templates_config = yaml.safe_load(f)
+            
+        if not templates_config or not isinstance(templates_config, dict):
+            raise ValueError(f"File mẫu prompt không đúng định dạng: {template_path}")
+            
+        templates = {}
+        for role, role_templates in templates_config.items():
+            if isinstance(role_templates, dict):
+                templates[role] = {}
+                for template_name, template_str in role_templates.items():
+                    if isinstance(template_str, str):
+                        templates[role][template_name] = PromptTemplate(template_str)
+        return templates
+    
     def load_templates(self) -> None:
         """Tải các mẫu prompt từ file cấu hình."""
-        config_dir = self.config.get("system", {}).get("config_dir", "config")
-        template_path = os.path.join(config_dir, "prompt_templates.yml")
+        template_path = self._get_template_path()
         
         if os.path.exists(template_path):
             try:
-                with open(template_path, 'r', encoding='utf-8') as f:
-                    templates_config = yaml.safe_load(f)
-                    
-                if templates_config and isinstance(templates_config, dict):
-                    for role, role_templates in templates_config.items():
-                        if isinstance(role_templates, dict):
-                            self.templates[role] = {}
-                            for template_name, template_str in role_templates.items():
-                                if isinstance(template_str, str):
-                                    self.templates[role][template_name] = PromptTemplate(template_str)
-                                    
-                    logger.info(f"Đã tải {self._count_templates()} mẫu prompt từ {template_path}")
-                else:
-                    logger.warning(f"File mẫu prompt không đúng định dạng: {template_path}")
-                    self._load_default_templates()
+                self.templates = self._read_templates(template_path)
+                logger.info(f"Đã tải {self._count_templates()} mẫu prompt từ {template_path}")
+            except ValueError as e:
+                logger.warning(str(e))
+                self._load_default_templates()
             except Exception as e:
                 logger.error(f"Lỗi khi tải mẫu prompt từ {template_path}: {e}")
                 self._load_default_templates()
@@ -90,6 +214,27 @@ class PromptLibrary:
             logger.warning(f"Không tìm thấy file mẫu prompt: {template_path}")
             self._load_default_templates()
     
+    def reload(self) -> bool:
+        """
+        Tải lại mẫu prompt mà không cần khởi động lại.
+        
+        Bộ mẫu mới được dựng xong rồi mới thay thế bộ cũ; nếu file lỗi,
+        giữ nguyên các mẫu hiện tại.
+        
+        Returns:
+            True nếu tải lại thành công
+        """
+        template_path = self._get_template_path()
+        try:
+            templates = self._read_templates(template_path)
+        except Exception as e:
+            logger.error(f"Lỗi khi tải lại mẫu prompt từ {template_path}, giữ nguyên mẫu hiện tại: {e}")
+            return False
+            
+        self.templates = templates
+        logger.info(f"Đã tải lại {self._count_templates()} mẫu prompt từ {template_path}")
+        return True
+    
     def _count_templates(self) -> int:
         """
         Đếm tổng số mẫu prompt đã tải.
@@ -0,0 +1,152 @@
+"""
+Fixture dùng chung cho các bài kiểm thử
+"""
+
+import copy
+import json
+import os
+import random
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+# Các script (benchmarks, export_rlhf, ...) được import như module
+sys.path.insert(0, os.path.join(ROOT_DIR, "scripts"))
+
+MODELS = [f"model-{i}" for i in range(4)]
+WORDS = ["python", "dữ liệu", "mô hình", "phân tích", "hàm", "lớp", "vòng lặp", "thuật toán",
+         "kinh tế", "lịch sử", "sức khỏe", "giáo dục", "ngôn ngữ", "câu hỏi", "ví dụ", "so sánh"]
+
+from src.integration.interfaces import AssistantFactory
+from src.optimization.feedback_store import FeedbackStore
+from src.optimization.schema_migrations import COMPARISON_COLUMNS, FEEDBACK_COLUMNS, STATS_COLUMNS, rebuild_rollups
+from src.utils.export import open_shard
+
+@pytest.fixture(scope="session")
+def base_config() -> Dict[str, Any]:
+    """Cấu hình mặc định của dự án (config/default.yml)"""
+    return AssistantFactory.load_config(os.path.join(ROOT_DIR, "config", "default.yml"))
+
+@pytest.fixture
+def config(base_config, tmp_path) -> Dict[str, Any]:
+    """Bản sao cấu hình với cơ sở dữ liệu phản hồi và snapshot trạng thái trong thư mục tạm"""
+    config = copy.deepcopy(base_config)
+    config.setdefault("system", {})["feedback_db"] = str(tmp_path / "feedback.db")
+    config.setdefault("optimization", {})["state"] = {
+        "enabled": True,
+        "path": str(tmp_path / "optimizer_state.json"),
+        "rebuild_from_feedback": True
+    }
+    return config
+
+@pytest.fixture
+def store(tmp_path):
+    """FeedbackStore rỗng trong thư mục tạm"""
+    feedback_store = FeedbackStore(str(tmp_path / "feedback.db"))
+    yield feedback_store
+    feedback_store.close()
+
+@pytest.fixture
+def make_records():
+    """
+    Hàm sinh bản ghi phản hồi và so sánh tất định: make_records(count, first=0, start=..., step=...)
+    trả về (danh sách phản hồi, danh sách so sánh), bản ghi thứ i có id fb_i và comp_i
+    """
+    def make(count: int, first: int = 0, start: datetime = datetime(2024, 1, 1),
+             step: timedelta = timedelta(minutes=1), conversations: int = 50,
+             seed: int = 0) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        rng = random.Random(seed + first)
+        feedback, comparisons = [], []
+        for i in range(first, first + count):
+            timestamp = (start + step * i).isoformat()
+            chosen, rejected = rng.sample(MODELS, 2)
+            query = " ".join(rng.choice(WORDS) for _ in range(6)) + f" {i}?"
+            responses = {chosen: f"Trả lời {rng.randrange(20)} của {chosen}",
+                         rejected: f"Trả lời {rng.randrange(20)} của {rejected}"}
+            conversation_id = f"conv_{rng.randrange(conversations)}"
+            feedback.append({"id": f"fb_{i}", "timestamp": timestamp, "conversation_id": conversation_id,
+                             "query": query, "responses": responses, "selected_response": chosen,
+                             "feedback_score": rng.choice([None, round(rng.random(), 2)]),
+                             "template_used": f"template-{i % 3}"})
+            comparisons.append({"id": f"comp_{i}", "timestamp": timestamp, "conversation_id": conversation_id,
+                                "query": query, "chosen": responses[chosen], "rejected": responses[rejected],
+                                "chosen_model": chosen, "rejected_model": rejected})
+        return feedback, comparisons
+
+    return make
+
+@pytest.fixture
+def create_legacy_database():
+    """
+    Hàm tạo cơ sở dữ liệu trước khi có nâng cấp schema (user_version = 0, văn bản lưu trực tiếp):
+    create_legacy_database(path, feedback, comparisons)
+    """
+    def create(path: str, feedback: List[Dict[str, Any]], comparisons: List[Dict[str, Any]]) -> None:
+        conn = sqlite3.connect(path)
+        conn.execute(f"CREATE TABLE feedback ({FEEDBACK_COLUMNS})")
+        conn.execute(f"CREATE TABLE comparisons ({COMPARISON_COLUMNS})")
+        conn.execute(f"CREATE TABLE stats ({STATS_COLUMNS})")
+        conn.executemany("INSERT INTO feedback VALUES (?, ?, '', ?, ?, ?, ?, NULL, NULL)", [
+            (record["id"], record["timestamp"], record["query"], json.dumps(record["responses"], ensure_ascii=False),
+             record["selected_response"], record["feedback_score"])
+            for record in feedback
+        ])
+        conn.executemany("INSERT INTO comparisons VALUES (?, ?, '', ?, ?, ?, ?, ?, NULL)", [
+            (record["id"], record["timestamp"], record["query"], record["chosen"], record["rejected"],
+             record["chosen_model"], record["rejected_model"])
+            for record in comparisons
+        ])
+        conn.commit()
+        conn.close()
+
+    return create
+
+def rollup_rows(conn: sqlite3.Connection) -> Tuple[List[Tuple], List[Tuple]]:
+    """Các dòng khác 0 của bảng tổng hợp (trigger trừ về 0 thay vì xóa dòng)"""
+    feedback = conn.execute('''
+    SELECT day, model_id, template, feedback_count, score_count, ROUND(score_sum, 6),
+           score_ge_08, score_ge_07, score_le_03
+    FROM feedback_rollup WHERE feedback_count != 0 ORDER BY 1, 2, 3
+    ''').fetchall()
+    comparisons = conn.execute('''
+    SELECT day, model_id, wins, losses FROM comparison_rollup
+    WHERE wins != 0 OR losses != 0 ORDER BY 1, 2
+    ''').fetchall()
+    return [tuple(row) for row in feedback], [tuple(row) for row in comparisons]
+
+@pytest.fixture
+def assert_rollups_match_source():
+    """Hàm kiểm tra bảng tổng hợp do trigger duy trì giống kết quả tính lại từ bảng nguồn"""
+    def check(store: FeedbackStore) -> None:
+        conn = store.connections.get_connection()
+        maintained = rollup_rows(conn)
+        conn.execute("SAVEPOINT recompute")
+        try:
+            rebuild_rollups(conn)
+            recomputed = rollup_rows(conn)
+        finally:
+            conn.execute("ROLLBACK TO recompute")
+            conn.execute("RELEASE recompute")
+        assert maintained == recomputed
+
+    return check
+
+@pytest.fixture
+def read_streams():
+    """Hàm đọc các bản ghi của từng luồng dữ liệu theo manifest: read_streams(manifest_path)"""
+    def read(manifest_path: str) -> Dict[str, List[Dict[str, Any]]]:
+        output_dir = os.path.dirname(manifest_path)
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        streams: Dict[str, List[Dict[str, Any]]] = {}
+        for shard in manifest["shards"]:
+            with open_shard(os.path.join(output_dir, shard["file"])) as shard_file:
+                streams.setdefault(shard["stream"], []).extend(json.loads(line) for line in shard_file)
+        return streams
+
+    return read
@@ -0,0 +1,24 @@
+"""
+Kiểm thử sao lưu trực tuyến và khôi phục kho phản hồi
+"""
+
+def test_backup_and_restore(store, make_records, tmp_path, assert_rollups_match_source):
+    feedback, comparisons = make_records(150)
+    store.save_feedback_batch(feedback, comparisons)
+    counts = store.get_summary_counts()
+    rows = list(store.iter_feedback())
+
+    progress = []
+    backup_path = str(tmp_path / "backup.db")
+    assert store.backup_database(backup_path, progress=lambda copied, total: progress.append((copied, total)))
+    assert progress and progress[-1][0] == progress[-1][1]
+
+    store.save_feedback_batch(*make_records(40, first=150))
+    for record in feedback[:30]:
+        store.delete_feedback(record["id"])
+    assert store.get_summary_counts() != counts
+
+    assert store.restore_database(backup_path)
+    assert store.get_summary_counts() == counts
+    assert list(store.iter_feedback()) == rows
+    assert_rollups_match_source(store)
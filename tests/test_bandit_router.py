@@ -0,0 +1,141 @@
+"""
+Kiểm thử LinUCBRouter: cập nhật Sherman-Morrison phải trùng với hồi quy ridge tính trực tiếp
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from src.optimization.bandit_router import FEATURE_NAMES, LinUCBRouter, estimate_model_cost
+
+from benchmarks.common import analysis_fixture_grid
+
+MODELS = [{"name": "small:1b"}, {"name": "medium:8b"}, {"name": "large:70b"}, {"name": "unnamed"}]
+
+def make_router(**routing) -> LinUCBRouter:
+    return LinUCBRouter({"models": MODELS, "optimization": {"routing": routing}})
+
+def test_update_matches_ridge_regression():
+    rng = random.Random(2)
+    router = make_router(ridge_lambda=2.0, latency_reference=10.0)
+    grid = analysis_fixture_grid()
+
+    features, rewards = [], []
+    for _ in range(300):
+        analysis = rng.choice(grid)
+        reward = router.update(analysis, "medium:8b", rng.random(), latency=rng.uniform(0, 20))
+        features.append(router.build_features(analysis))
+        rewards.append(reward)
+
+    x = np.array(features)
+    a = x.T @ x + 2.0 * np.eye(len(FEATURE_NAMES))
+    a_inv, theta = router._get_arm("medium:8b")
+    assert a_inv == pytest.approx(np.linalg.inv(a), abs=1e-9)
+    assert theta == pytest.approx(np.linalg.solve(a, x.T @ np.array(rewards)), abs=1e-9)
+    assert router.get_stats()["update_count"] == {"medium:8b": 300}
+
+def test_score_is_expected_reward_plus_bonus():
+    router = make_router(alpha=0.5, prior_weight=0.1)
+    analysis = {"requires_code": True, "complexity": 6, "query_type": "how_to", "domain": "technology",
+                "format_requirements": {"requires_examples": True}}
+    for _ in range(5):
+        router.update(analysis, "small:1b", 0.9)
+
+    features = router.build_features(analysis)
+    scores = router.score(analysis, ["small:1b", "large:70b"], {"large:70b": 0.8})
+    for model_name, prior in [("small:1b", 0.0), ("large:70b", 0.8)]:
+        a_inv, theta = router._get_arm(model_name)
+        expected = theta @ features + 0.5 * np.sqrt(features @ a_inv @ features) + 0.1 * prior
+        assert scores[model_name] == pytest.approx(expected)
+
+    # Nhánh chưa có dữ liệu chỉ có phần thưởng bằng 0 cộng phần khám phá
+    assert scores["large:70b"] == pytest.approx(0.5 * np.linalg.norm(features) + 0.08)
+
+def test_learns_best_model_per_context():
+    rng = random.Random(4)
+    router = make_router(alpha=0.2, cost_weight=0.0, latency_weight=0.0)
+    names = [model["name"] for model in MODELS]
+    code = {"requires_code": True, "query_type": "how_to", "domain": "technology"}
+    creative = {"requires_creativity": True, "query_type": "opinion", "domain": "arts"}
+    # Mỗi ngữ cảnh có một mô hình tốt nhất khác nhau
+    best = {id(code): "large:70b", id(creative): "small:1b"}
+
+    for _ in range(400):
+        analysis = rng.choice([code, creative])
+        model_name = router.select(analysis, names)
+        router.update(analysis, model_name, 0.9 if model_name == best[id(analysis)] else 0.2)
+
+    assert router.select(code, names) == "large:70b"
+    assert router.select(creative, names) == "small:1b"
+
+def test_reward_penalizes_latency_and_cost():
+    router = make_router(latency_weight=0.2, latency_reference=10.0, cost_weight=0.3, model_costs={"unnamed": 0.4})
+
+    assert estimate_model_cost("medium:8b", MODELS) == pytest.approx(8 / 70)
+    assert estimate_model_cost("unnamed", MODELS) == 0.5
+    assert router.compute_reward("large:70b", 0.8) == pytest.approx(0.5)
+    assert router.compute_reward("unnamed", 0.8, latency=5.0) == pytest.approx(0.8 - 0.12 - 0.1)
+    # Độ trễ chuẩn hóa bị chặn ở 1
+    assert router.compute_reward("unnamed", 0.8, latency=100.0) == pytest.approx(0.8 - 0.12 - 0.2)
+
+def test_state_round_trip():
+    rng = random.Random(8)
+    router = make_router()
+    grid = analysis_fixture_grid()
+    for _ in range(50):
+        analysis = rng.choice(grid)
+        router.update(analysis, rng.choice(["small:1b", "large:70b"]), rng.random())
+
+    restored = make_router()
+    restored.load_state(router.get_state())
+    names = [model["name"] for model in MODELS]
+    for analysis in grid[::97]:
+        assert restored.score(analysis, names) == pytest.approx(router.score(analysis, names))
+
+    # Số chiều đặc trưng khác: bỏ qua trạng thái
+    ignored = make_router()
+    ignored.load_state(dict(router.get_state(), dimension=3))
+    assert ignored.get_state()["arms"] == {}
+
+def test_concurrent_score_and_update_see_consistent_arms():
+    import threading
+
+    router = make_router()
+    names = [model["name"] for model in MODELS]
+    grid = analysis_fixture_grid()
+    events = [(grid[(i * 31) % len(grid)], names[i % 3], (i % 10) / 10) for i in range(3000)]
+    errors = []
+    done = threading.Event()
+
+    def reader(offset: int) -> None:
+        try:
+            i = offset
+            while not done.is_set():
+                router.score(grid[i % len(grid)], names)
+                # Mỗi bộ tham số được gán thay thế một lần: theta luôn bằng A^-1 b của cùng bộ
+                for a_inv, b, theta in list(router._arms.values()):
+                    if not np.allclose(theta, a_inv @ b):
+                        errors.append("torn arm")
+                i += 1
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=reader, args=(i * 101,)) for i in range(3)]
+    for thread in readers:
+        thread.start()
+    for analysis, model_name, quality in events:
+        router.update(analysis, model_name, quality)
+    done.set()
+    for thread in readers:
+        thread.join()
+
+    sequential = make_router()
+    for analysis, model_name, quality in events:
+        sequential.update(analysis, model_name, quality)
+
+    assert errors == []
+    # Nhánh chỉ được đọc (chưa cập nhật) được khởi tạo một lần, không ghi đè nhánh đã cập nhật
+    assert router.get_state()["arms"].keys() == set(names)
+    for analysis in grid[::211]:
+        assert router.score(analysis, names) == pytest.approx(sequential.score(analysis, names))
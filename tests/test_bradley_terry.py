@@ -0,0 +1,80 @@
+"""
+Kiểm thử ước lượng Bradley-Terry từ so sánh cặp
+"""
+
+import numpy as np
+import pytest
+
+from src.optimization.bradley_terry import build_win_matrices, expected_win_rates, fit_bradley_terry
+
+@pytest.mark.parametrize("shape", [(0, 0), (1, 1), (3, 1, 1), (2, 0, 0)])
+def test_fewer_than_two_items_gives_unit_strengths(shape):
+    strengths = fit_bradley_terry(np.zeros(shape))
+
+    assert strengths.shape == shape[:-1]
+    assert np.all(strengths == 1.0)
+    assert np.all(expected_win_rates(strengths) == 0.5)
+
+def test_self_comparisons_are_dropped():
+    winners = np.array([0, 1, 1, 2, 2])
+    losers = np.array([0, 0, 1, 1, 2])
+    groups = np.array([0, 0, 1, 1, 0])
+
+    wins = build_win_matrices(winners, losers, groups, 3, 2)
+    assert wins.sum() == 2
+    assert wins[0, 1, 0] == 1 and wins[1, 2, 1] == 1
+    assert np.all(np.diagonal(wins, axis1=1, axis2=2) == 0)
+
+    # Chỉ có so sánh với chính mình: không có thông tin, mọi mô hình bằng nhau
+    wins = build_win_matrices(np.array([0, 1]), np.array([0, 1]), np.array([0, 0]), 2, 1)
+    assert np.all(np.isfinite(fit_bradley_terry(wins)))
+    assert fit_bradley_terry(wins) == pytest.approx(np.ones((1, 2)))
+
+def simulate(rng: np.random.Generator, strengths: np.ndarray, games_per_pair: int):
+    """Sinh so sánh cặp theo mô hình Bradley-Terry với độ mạnh đã biết"""
+    winners, losers = [], []
+    n_items = len(strengths)
+    for i in range(n_items):
+        for j in range(i + 1, n_items):
+            i_wins = rng.random(games_per_pair) < strengths[i] / (strengths[i] + strengths[j])
+            winners.extend(np.where(i_wins, i, j))
+            losers.extend(np.where(i_wins, j, i))
+    return np.array(winners), np.array(losers)
+
+def test_recovers_known_strengths():
+    rng = np.random.default_rng(0)
+    truths = [np.array([4.0, 2.0, 1.0, 0.5, 0.25]), np.array([0.5, 1.0, 3.0, 1.0, 2.0])]
+
+    winners, losers, groups = [], [], []
+    for group, truth in enumerate(truths):
+        group_winners, group_losers = simulate(rng, truth, 4000)
+        winners.append(group_winners)
+        losers.append(group_losers)
+        groups.append(np.full(len(group_winners), group))
+    wins = build_win_matrices(np.concatenate(winners), np.concatenate(losers), np.concatenate(groups), 5, 2)
+
+    strengths = fit_bradley_terry(wins, prior=0.0)
+    for group, truth in enumerate(truths):
+        # So sánh sau khi chuẩn hóa trung bình nhân về 1
+        expected = truth / np.exp(np.log(truth).mean())
+        assert np.exp(np.log(strengths[group]).mean()) == pytest.approx(1.0)
+        assert np.log(strengths[group]) == pytest.approx(np.log(expected), abs=0.08)
+
+    # Ước lượng đơn nhóm bằng ước lượng của nhóm đó trong lô nhiều nhóm
+    assert fit_bradley_terry(wins[0], prior=0.0) == pytest.approx(strengths[0], rel=1e-6)
+
+def test_fit_satisfies_likelihood_equations():
+    rng = np.random.default_rng(1)
+    winners, losers = simulate(rng, np.array([3.0, 1.0, 1.0, 0.3]), 200)
+    wins = build_win_matrices(winners, losers, np.zeros(len(winners), dtype=np.int64), 4, 1)[0]
+
+    strengths = fit_bradley_terry(wins, prior=0.0, tolerance=1e-12)
+    # Điểm cực đại khả năng: số trận thắng thực tế bằng số trận thắng kỳ vọng của mỗi mô hình
+    games = wins + wins.T
+    expected_wins = (games * strengths[:, None] / (strengths[:, None] + strengths[None, :])).sum(axis=1)
+    assert expected_wins == pytest.approx(wins.sum(axis=1), rel=1e-6)
+
+def test_expected_win_rates_against_uniform_opponent():
+    strengths = np.array([3.0, 1.0, 1.0])
+    # Mô hình 0 gặp hai đối thủ độ mạnh 1: xác suất thắng 3/4
+    assert expected_win_rates(strengths) == pytest.approx([0.75, (0.25 + 0.5) / 2, (0.25 + 0.5) / 2])
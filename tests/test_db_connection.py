@@ -0,0 +1,76 @@
+"""
+Kiểm thử kết nối SQLite dùng lại theo luồng: đọc/ghi đồng thời qua FeedbackStore, WAL và đóng/mở lại kết nối
+"""
+
+import threading
+
+def test_concurrent_reads_and_writes(store, make_records):
+    writers, per_writer = 4, 50
+    batches = [make_records(per_writer, first=w * per_writer) for w in range(writers)]
+    errors = []
+    done = threading.Event()
+
+    def write(feedback, comparisons):
+        try:
+            for fb, comp in zip(feedback, comparisons):
+                assert store.save_feedback(fb) == fb["id"]
+                assert store.save_comparison(comp) == comp["id"]
+        except Exception as e:
+            errors.append(e)
+
+    def read():
+        try:
+            while not done.is_set():
+                for i in range(0, writers * per_writer, 7):
+                    record = store.get_feedback(f"fb_{i}")
+                    # Bản ghi chưa được ghi thì chưa có, nhưng nếu có thì phải đầy đủ
+                    assert record is None or record["id"] == f"fb_{i}"
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    threads = [threading.Thread(target=write, args=batch) for batch in batches]
+    for thread in readers + threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done.set()
+    for thread in readers:
+        thread.join()
+
+    assert errors == []
+    for feedback, comparisons in batches:
+        for fb, comp in zip(feedback, comparisons):
+            assert store.get_feedback(fb["id"])["selected_response"] == fb["selected_response"]
+            assert store.get_comparison(comp["id"])["chosen_model"] == comp["chosen_model"]
+
+    stats = store.connections.get_stats()
+    assert store.connections.get_connection().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    # Mỗi luồng mở đúng một kết nối, cộng thêm kết nối của luồng chính
+    assert stats["connections_opened"] <= len(readers) + len(threads) + 2
+
+def test_connection_reused_within_thread(store):
+    assert store.connections.get_connection() is store.connections.get_connection()
+
+def test_finished_threads_are_pruned(store, make_records):
+    feedback, _ = make_records(3)
+    for fb in feedback:
+        thread = threading.Thread(target=store.save_feedback, args=(fb,))
+        thread.start()
+        thread.join()
+
+    store.get_feedback("fb_0")
+    # Kết nối của các luồng đã kết thúc được gỡ khi có luồng mới mở kết nối
+    assert store.connections.get_stats()["open_connections"] <= 2
+
+def test_store_usable_after_close_all(store, make_records):
+    feedback, _ = make_records(2)
+    store.save_feedback(feedback[0])
+    before = store.connections.get_connection()
+
+    store.connections.close_all()
+    assert store.connections.get_stats()["open_connections"] == 0
+
+    assert store.save_feedback(feedback[1]) == "fb_1"
+    assert store.connections.get_connection() is not before
+    assert store.get_feedback("fb_0") is not None
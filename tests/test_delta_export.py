@@ -0,0 +1,61 @@
+"""
+Kiểm thử xuất tăng dần theo mốc export_seq và ghép các phần tăng dần thành bản đầy đủ
+"""
+
+import json
+import os
+from typing import Any, Dict
+
+from src.optimization.delta_export import WATERMARK_FILE, consolidate, export_delta
+from src.utils.export import verify_manifest
+
+from export_rlhf import to_delta_item
+
+def read_manifest(manifest_path: str) -> Dict[str, Any]:
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def test_delta_export_and_consolidate(store, make_records, tmp_path, read_streams):
+    target_dir = str(tmp_path / "target")
+    feedback, comparisons = make_records(100)
+    store.save_feedback_batch(feedback, comparisons)
+
+    first = export_delta(store, target_dir, to_delta_item, rows_per_shard=30)
+    assert read_manifest(first)["streams"] == {"feedback": 100, "comparisons": 100}
+    assert export_delta(store, target_dir, to_delta_item) is None
+
+    # Thêm mới, ghi đè và xóa rồi thêm lại cùng id với nội dung khác
+    store.save_feedback_batch(*make_records(20, first=100))
+    store.save_feedback_batch([dict(feedback[5], feedback_score=0.01)], [])
+    store.delete_feedback("fb_7")
+    store.delete_comparison("comp_8")
+    store.save_feedback_batch([dict(feedback[7], query="câu hỏi mới", selected_response="model-9",
+                                    responses={"model-9": "câu trả lời mới"})],
+                              [dict(comparisons[8], chosen="bản được chọn mới")])
+
+    second = export_delta(store, target_dir, to_delta_item, rows_per_shard=30)
+    delta_ids = {stream: sorted(record["id"] for record in records)
+                 for stream, records in read_streams(second).items()}
+    assert delta_ids["feedback"] == sorted(["fb_5", "fb_7"] + [f"fb_{i}" for i in range(100, 120)])
+    assert delta_ids["comparisons"] == sorted(["comp_8"] + [f"comp_{i}" for i in range(100, 120)])
+
+    snapshot = consolidate(target_dir, rows_per_shard=50)
+    assert verify_manifest(snapshot) == []
+    streams = read_streams(snapshot)
+    by_id = {stream: {record["id"]: record for record in records} for stream, records in streams.items()}
+    # Mỗi id xuất hiện một lần, với bản mới nhất
+    for stream, records in streams.items():
+        assert len(records) == len(by_id[stream]) == 120
+    assert by_id["feedback"]["fb_5"]["score"] == 0.01
+    assert by_id["feedback"]["fb_7"]["prompt"] == "câu hỏi mới"
+    assert by_id["feedback"]["fb_7"]["response"] == "câu trả lời mới"
+    assert by_id["comparisons"]["comp_8"]["chosen"] == "bản được chọn mới"
+
+    # Bản ghi bị xóa vẫn nằm trong bản đầy đủ; ghép với prune chỉ còn bản đầy đủ mới
+    store.delete_feedback("fb_10")
+    store.save_feedback_batch(*make_records(5, first=120))
+    export_delta(store, target_dir, to_delta_item)
+    final = consolidate(target_dir, prune=True)
+    assert {stream: len(records) for stream, records in read_streams(final).items()} == \
+        {"feedback": 125, "comparisons": 125}
+    assert sorted(os.listdir(target_dir)) == sorted([os.path.basename(os.path.dirname(final)), WATERMARK_FILE])
@@ -0,0 +1,55 @@
+"""
+Kiểm thử pipeline xuất nhiều định dạng: mọi định dạng được ghi trong một lần đọc, lỗi không để lại file dở dang
+"""
+
+import json
+import os
+from typing import Any, Dict, Iterator
+
+import pytest
+
+from src.utils.export import verify_manifest
+
+import export_rlhf
+from export_rlhf import export_feedback_pipeline, iter_export_records
+
+def read_manifest(manifest_path: str) -> Dict[str, Any]:
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def test_pipeline_writes_every_format(store, make_records, tmp_path):
+    store.save_feedback_batch(*make_records(200))
+    output_dir = str(tmp_path / "exports")
+
+    results = export_feedback_pipeline(iter_export_records(store), output_dir, ["jsonl", "json", "csv"],
+                                       "test", rows_per_shard=64)
+    assert results["rows"] == 400
+    manifest_path = os.path.join(output_dir, "rlhf_export_test", "manifest.json")
+    assert verify_manifest(manifest_path) == []
+    assert read_manifest(manifest_path)["streams"] == {"feedback": 200, "comparisons": 200}
+    assert os.path.exists(os.path.join(output_dir, "rlhf_export_test.json"))
+    assert not [name for name in os.listdir(output_dir) if name.startswith(".")]
+
+@pytest.mark.parametrize("failure", ["source", "sink"])
+def test_pipeline_failure_leaves_no_output(store, make_records, tmp_path, monkeypatch, failure):
+    store.save_feedback_batch(*make_records(3000))
+    output_dir = str(tmp_path / "exports")
+
+    def failing_source() -> Iterator[Dict[str, Any]]:
+        for i, record in enumerate(iter_export_records(store)):
+            if i == 2500:
+                raise IOError("mất kết nối cơ sở dữ liệu")
+            yield record
+
+    if failure == "sink":
+        def failing_write(self, classified):
+            raise IOError("đĩa đầy")
+        monkeypatch.setattr(export_rlhf.CsvSink, "write", failing_write)
+        records, expected = iter_export_records(store), RuntimeError
+    else:
+        records, expected = failing_source(), IOError
+
+    with pytest.raises(expected):
+        export_feedback_pipeline(records, output_dir, ["jsonl", "json", "csv"], "failed", rows_per_shard=500)
+    # Không còn file xuất dở dang hay thư mục tạm
+    assert os.listdir(output_dir) == []
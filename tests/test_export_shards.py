@@ -0,0 +1,30 @@
+"""
+Kiểm thử ghi JSONL theo phân đoạn: manifest đếm đúng số dòng và phát hiện file bị sửa hoặc mất
+"""
+
+import os
+
+from src.utils.export import ShardedJsonlWriter, verify_manifest
+
+def test_verify_manifest_detects_tampering(tmp_path):
+    output_dir = str(tmp_path / "export")
+    with ShardedJsonlWriter(output_dir, rows_per_shard=40) as writer:
+        for i in range(100):
+            writer.write({"id": i, "text": f"dòng {i}"}, "feedback" if i % 2 else "comparisons")
+        manifest = writer.close()
+
+    manifest_path = os.path.join(output_dir, "manifest.json")
+    assert manifest["total_rows"] == 100
+    assert manifest["streams"] == {"feedback": 50, "comparisons": 50}
+    assert len(manifest["shards"]) == 4
+    assert verify_manifest(manifest_path) == []
+
+    # Đổi một byte (giữ kích thước) và xóa một file
+    first, second = manifest["shards"][0]["file"], manifest["shards"][1]["file"]
+    with open(os.path.join(output_dir, first), 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+    os.remove(os.path.join(output_dir, second))
+    assert verify_manifest(manifest_path) == [first, second]
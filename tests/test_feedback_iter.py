@@ -0,0 +1,50 @@
+"""
+Kiểm thử duyệt kho phản hồi theo lô: thứ tự, bộ lọc và lỗi đọc giữa chừng được báo cho bên gọi
+"""
+
+import sqlite3
+
+import pytest
+
+def test_iter_matches_source_order_and_filters(store, make_records):
+    feedback, comparisons = make_records(120)
+    for fb, comp in zip(feedback, comparisons):
+        store.save_feedback(fb)
+        store.save_comparison(comp)
+
+    assert [item["id"] for item in store.iter_feedback(batch_size=7)] == [fb["id"] for fb in feedback]
+    assert [item["id"] for item in store.iter_comparisons(batch_size=7, descending=True)] == \
+        [comp["id"] for comp in reversed(comparisons)]
+
+    since, until = feedback[30]["timestamp"], feedback[90]["timestamp"]
+    expected = [fb["id"] for fb in feedback[30:90] if fb["selected_response"] == "model-1"]
+    assert [item["id"] for item in store.iter_feedback(since=since, until=until, model="model-1",
+                                                       batch_size=5)] == expected
+
+    pairs = [pair for rows in store.iter_comparison_pairs(batch_size=11) for pair in rows]
+    assert pairs == [(comp["query"], comp["chosen_model"], comp["rejected_model"]) for comp in comparisons]
+
+@pytest.mark.parametrize("iterate", [
+    lambda store: list(store.iter_feedback(batch_size=10)),
+    lambda store: list(store.iter_comparisons(batch_size=10)),
+    lambda store: list(store.iter_comparison_pairs(batch_size=10)),
+])
+def test_read_error_propagates(store, make_records, monkeypatch, iterate):
+    feedback, comparisons = make_records(50)
+    for fb, comp in zip(feedback, comparisons):
+        store.save_feedback(fb)
+        store.save_comparison(comp)
+
+    # Trang đầu đọc được, các trang sau lỗi: bên gọi phải nhận lỗi thay vì kết quả bị cắt cụt
+    get_connection = store.connections.get_connection
+    calls = []
+
+    def failing_connection():
+        calls.append(1)
+        if len(calls) > 1:
+            raise sqlite3.OperationalError("disk I/O error")
+        return get_connection()
+
+    monkeypatch.setattr(store.connections, "get_connection", failing_connection)
+    with pytest.raises(sqlite3.OperationalError):
+        iterate(store)
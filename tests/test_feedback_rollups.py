@@ -0,0 +1,58 @@
+"""
+Kiểm thử bảng tổng hợp duy trì bằng trigger: khớp với bảng nguồn sau khi thêm, ghi đè, xóa và nâng cấp
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.optimization.feedback_store import FeedbackStore
+
+def test_rollups_follow_insert_upsert_and_delete(store, make_records, assert_rollups_match_source):
+    feedback, comparisons = make_records(300, step=timedelta(hours=1))
+    assert len(store.save_feedback_batch(feedback, comparisons)) == 300
+    assert_rollups_match_source(store)
+
+    counts = store.get_summary_counts()
+    scores = [record["feedback_score"] for record in feedback if record["feedback_score"] is not None]
+    assert counts["feedback_count"] == 300
+    assert counts["comparison_count"] == 300
+    assert counts["score_count"] == len(scores)
+    assert counts["score_sum"] == pytest.approx(sum(scores))
+    assert counts["score_ge_08"] == sum(score >= 0.8 for score in scores)
+
+    # Ghi đè cùng id với điểm, mô hình, mẫu prompt và ngày khác
+    changed = [dict(record, feedback_score=0.95, selected_response="model-3", template_used="other",
+                    timestamp=(datetime(2024, 3, 1) + timedelta(minutes=i)).isoformat())
+               for i, record in enumerate(feedback[:50])]
+    swapped = [dict(record, chosen_model=record["rejected_model"], rejected_model=record["chosen_model"])
+               for record in comparisons[:50]]
+    store.save_feedback_batch(changed, swapped)
+    assert_rollups_match_source(store)
+    assert store.get_summary_counts()["feedback_count"] == 300
+
+    for record in feedback[100:140]:
+        assert store.delete_feedback(record["id"])
+    for record in comparisons[100:120]:
+        assert store.delete_comparison(record["id"])
+    assert_rollups_match_source(store)
+
+    counts = store.get_summary_counts()
+    assert counts["feedback_count"] == 260
+    assert counts["comparison_count"] == 280
+
+def test_rollups_backfilled_on_upgrade(tmp_path, make_records, create_legacy_database, assert_rollups_match_source):
+    db_path = str(tmp_path / "feedback.db")
+    feedback, comparisons = make_records(120, step=timedelta(hours=5))
+    create_legacy_database(db_path, feedback, comparisons)
+
+    store = FeedbackStore(db_path, migration_batch_size=25)
+    assert_rollups_match_source(store)
+    assert store.get_summary_counts()["feedback_count"] == 120
+
+    # Bản ghi ghi sau khi nâng cấp vẫn được đếm vào bảng tổng hợp
+    extra_feedback, extra_comparisons = make_records(10, first=120)
+    store.save_feedback_batch(extra_feedback, extra_comparisons)
+    assert_rollups_match_source(store)
+    assert store.get_summary_counts()["feedback_count"] == 130
+    store.close()
@@ -0,0 +1,45 @@
+"""
+Kiểm thử script fit_preferences: ghi trạng thái Bradley-Terry vào snapshot
+"""
+
+import random
+
+from src.optimization.manager import FeedbackOptimizationManager
+from src.optimization.state_store import StateStore
+
+from fit_preferences import write_state
+
+def test_write_state_keeps_watermark_and_other_components(config):
+    config["optimization"]["state"].update({"snapshot_every": 0, "snapshot_interval": 0})
+    rng = random.Random(1)
+    model_names = [model["name"] for model in config["models"]]
+
+    def process(manager: FeedbackOptimizationManager, count: int) -> None:
+        for i in range(count):
+            query = rng.choice(["So sánh Python và Java", "Viết hàm sắp xếp nhanh", "Thủ đô của Pháp?"])
+            template_used = manager.optimize_query(query).get("template_used")
+            manager.process_feedback(f"conv_{i}", query, {name: "Trả lời" for name in model_names},
+                                     rng.choice(model_names), round(rng.random(), 2), template_used=template_used)
+
+    live = FeedbackOptimizationManager(config)
+    process(live, 10)
+    assert live.save_state()
+    state_store = StateStore(config["optimization"]["state"]["path"])
+    before = state_store.load()
+    # Phản hồi sau snapshot chưa được áp dụng vào các thành phần trong snapshot
+    process(live, 5)
+    assert live.response_optimizer.get_state() != before["components"]["response_optimizer"]
+
+    fitted_weights = {name: 1.5 for name in model_names}
+    assert write_state(state_store, {"model_weights": fitted_weights})
+
+    after = state_store.load()
+    assert after["last_feedback_seq"] == before["last_feedback_seq"]
+    assert after["components"]["response_optimizer"] == before["components"]["response_optimizer"]
+    assert after["components"]["preference_optimizer"]["model_weights"] == fitted_weights
+
+    # Lần khởi động sau vẫn áp dụng lại 5 phản hồi mới cho mẫu prompt
+    restored = FeedbackOptimizationManager(config)
+    assert restored.response_optimizer.get_state() == live.response_optimizer.get_state()
+    live.close()
+    restored.close()
@@ -0,0 +1,38 @@
+"""
+Kiểm thử chia train/eval theo hash: tất định theo seed và giữ mỗi hội thoại trong một tập
+"""
+
+import os
+from typing import Any, Dict
+
+from src.utils.export import hash_split
+
+from export_rlhf import export_feedback_pipeline, iter_export_records
+
+def test_hash_split_keeps_conversations_together(store, make_records, tmp_path, read_streams):
+    store.save_feedback_batch(*make_records(2000, conversations=400))
+    output_dir = str(tmp_path / "exports")
+
+    def export(timestamp: str, seed: str = "") -> Dict[str, Any]:
+        return export_feedback_pipeline(iter_export_records(store), output_dir, ["jsonl"], timestamp,
+                                        split=True, eval_ratio=0.2, split_seed=seed)["results"]["jsonl"]
+
+    manifest = export("a")
+    streams = read_streams(os.path.join(output_dir, "rlhf_export_a", "manifest.json"))
+    conversations = {part: {record["conversation_id"] for kind in ["feedback", "comparisons"]
+                            for record in streams.get(f"{part}_{kind}", [])}
+                     for part in ["train", "eval"]}
+    # Không hội thoại nào nằm ở cả hai tập
+    assert conversations["train"] and conversations["eval"]
+    assert not conversations["train"] & conversations["eval"]
+    for part, conversation_ids in conversations.items():
+        assert all(hash_split(conversation_id, 0.2) == part for conversation_id in conversation_ids)
+
+    split_counts = manifest["metadata"]["split_counts"]
+    assert split_counts["train"]["total"] + split_counts["eval"]["total"] == 4000
+    assert 0.1 < split_counts["eval"]["total"] / 4000 < 0.3
+
+    # Tất định: cùng seed cho cùng các file, seed khác cho cách chia khác
+    checksums = lambda manifest: {shard["stream"]: shard["sha256"] for shard in manifest["shards"]}
+    assert checksums(export("b")) == checksums(manifest)
+    assert export("c", seed="other")["metadata"]["split_counts"] != split_counts
@@ -0,0 +1,83 @@
+"""
+Kiểm thử LatencyAwareRouter: đường nhanh khi khẩn cấp/quá tải và dự phòng khi thiếu dữ liệu độ trễ
+"""
+
+import pytest
+
+from src.core.models import ModelManager
+from src.optimization.latency_router import LatencyAwareRouter
+
+MODELS = [{"name": "fast:1.5b"}, {"name": "mid:8b"}, {"name": "big:70b"}]
+QUALITY = {"fast:1.5b": 0.5, "mid:8b": 0.8, "big:70b": 1.0}
+
+def make_router(**routing) -> LatencyAwareRouter:
+    routing = dict({"fast_model": "fast:1.5b", "load_threshold": 4, "min_latency_samples": 5,
+                    "latency_slo": 8.0, "latency_weight": 0.2, "slo_penalty": 0.5, "cost_weight": 0.0},
+                   **routing)
+    return LatencyAwareRouter({"models": MODELS, "optimization": {"routing": routing}})
+
+def latency(p50: float, p95: float, samples: int = 20):
+    return {"p50": p50, "p95": p95, "samples": samples, "tokens_per_second": 10.0}
+
+@pytest.mark.parametrize("analysis, active_requests", [({"urgency": "high"}, 0), ({}, 4), ({}, 10)])
+def test_fast_path_when_urgent_or_overloaded(analysis, active_requests):
+    model, info = make_router().select(analysis, QUALITY, active_requests=active_requests)
+
+    assert model == "fast:1.5b"
+    assert info["fast_path"] is True
+    assert "candidates" not in info
+
+def test_fast_path_skipped_when_fast_model_unavailable():
+    quality = {"mid:8b": 0.8, "big:70b": 1.0}
+    model, info = make_router().select({"urgency": "high"}, quality, active_requests=10)
+
+    assert model == "big:70b"
+    assert "fast_path" not in info
+
+def test_load_threshold_zero_disables_overload_path():
+    model, info = make_router(load_threshold=0).select({}, QUALITY, active_requests=100)
+
+    assert model == "big:70b"
+    assert "fast_path" not in info
+
+def test_falls_back_to_quality_without_enough_samples():
+    # Mô hình tốt nhất rất chậm nhưng mới có 4 mẫu: chưa tính độ trễ
+    stats = {"big:70b": latency(30.0, 60.0, samples=4), "mid:8b": latency(1.0, 2.0)}
+    model, info = make_router().select({}, QUALITY, stats)
+
+    assert model == "big:70b"
+    assert "p95" not in info["candidates"]["big:70b"]
+    assert info["candidates"]["mid:8b"]["utility"] == pytest.approx(0.8 - 0.2 * 1.0 / 8.0, abs=1e-4)
+    assert "chưa đủ dữ liệu" in info["reason"]
+
+def test_latency_over_slo_moves_traffic():
+    stats = {"big:70b": latency(9.0, 16.0), "mid:8b": latency(2.0, 4.0), "fast:1.5b": latency(0.5, 1.0)}
+    model, info = make_router().select({}, QUALITY, stats)
+
+    # big: 1.0 - 0.2 * 9/8 - 0.5 * 8/8 = 0.275; mid: 0.8 - 0.2 * 2/8 = 0.75
+    assert model == "mid:8b"
+    assert info["candidates"]["big:70b"]["utility"] == pytest.approx(0.275, abs=1e-4)
+    assert info["candidates"]["mid:8b"]["p95"] == 4.0
+
+def test_cost_penalty_uses_model_size():
+    model, info = make_router(cost_weight=0.5).select({}, QUALITY)
+
+    # big: 1.0 - 0.5; mid: 0.8 - 0.5 * 8/70
+    assert model == "mid:8b"
+
+def test_no_models():
+    assert make_router().select({}, {})[0] is None
+
+def test_model_manager_latency_window():
+    manager = ModelManager({"models": MODELS, "ollama": {"latency_window": 10}})
+    for i in range(1, 31):
+        manager._update_performance_stats("mid:8b", float(i), 100)
+
+    stats = manager.get_latency_stats("mid:8b")
+    # Chỉ giữ 10 mẫu gần nhất (21..30)
+    assert stats["samples"] == 10
+    assert stats["p50"] == 26.0
+    assert stats["p95"] == 30.0
+    assert manager.get_performance_stats("mid:8b")["count"] == 30
+    assert manager.get_latency_stats("big:70b") == {}
+    assert list(manager.get_latency_stats()) == ["mid:8b"]
@@ -0,0 +1,147 @@
+"""
+Kiểm thử snapshot trạng thái tối ưu hóa: lưu/khôi phục, áp dụng lại phản hồi mới hơn snapshot
+và dựng lại toàn bộ từ kho phản hồi
+"""
+
+import json
+import os
+import random
+
+import pytest
+
+from src.optimization.manager import FeedbackOptimizationManager
+from src.optimization.state_store import StateStore
+
+QUERIES = [
+    "Xin chào",
+    "Thủ đô của Pháp là gì?",
+    "Viết code python sắp xếp nhanh và phân tích độ phức tạp thuật toán",
+    "Tại sao lạm phát ảnh hưởng đến chiến lược đầu tư dài hạn? Phân tích chi tiết",
+    "So sánh danh sách và bộ trong Python"
+]
+
+@pytest.fixture
+def state_config(config):
+    optimization = config["optimization"]
+    optimization.setdefault("routing", {})["strategy"] = "linucb"
+    # Phân tích truy vấn tất định để các cách dựng lại cho cùng kết quả
+    optimization.setdefault("query_analysis", {})["use_cached_categories"] = False
+    # Chỉ ghi snapshot khi được yêu cầu
+    optimization["state"].update({"snapshot_every": 0, "snapshot_interval": 0})
+    return config
+
+def with_state_path(config, path):
+    config = json.loads(json.dumps(config))
+    config["optimization"]["state"]["path"] = str(path)
+    return config
+
+def state_of(manager: FeedbackOptimizationManager) -> str:
+    return json.dumps({
+        "preference_optimizer": manager.preference_optimizer.get_state(),
+        "response_optimizer": manager.response_optimizer.get_state(),
+        "bandit_router": manager.bandit_router.get_state()
+    }, sort_keys=True)
+
+def process(manager: FeedbackOptimizationManager, rng: random.Random, count: int) -> None:
+    model_names = [model["name"] for model in manager.config.get("models", [])]
+    for i in range(count):
+        query = rng.choice(QUERIES)
+        template_used = manager.optimize_query(query).get("template_used")
+        manager.process_feedback(f"conv_{i % 7}", query, {name: f"Câu trả lời của {name}" for name in model_names},
+                                 rng.choice(model_names), round(rng.random(), 2), template_used=template_used)
+
+def test_state_store_round_trip_and_version(tmp_path):
+    state_store = StateStore(str(tmp_path / "state.json"))
+    assert state_store.load() is None
+
+    assert state_store.save({"component": {"value": 1}}, 42)
+    snapshot = state_store.load()
+    assert snapshot["components"] == {"component": {"value": 1}}
+    assert snapshot["last_feedback_seq"] == 42
+    assert [path.name for path in tmp_path.iterdir()] == ["state.json"]
+
+    snapshot["version"] = -1
+    (tmp_path / "state.json").write_text(json.dumps(snapshot), encoding="utf-8")
+    assert state_store.load() is None
+
+def test_process_feedback_stores_template_used(state_config):
+    manager = FeedbackOptimizationManager(state_config)
+    process(manager, random.Random(1), 5)
+
+    rows = list(manager.feedback_store.iter_feedback())
+    assert len(rows) == 5
+    assert all(row.get("template_used") for row in rows)
+    assert manager._last_feedback_seq == manager.feedback_store.get_export_seq() > 0
+    manager.close()
+
+def test_restore_without_snapshot_keeps_initial_state(state_config):
+    manager = FeedbackOptimizationManager(state_config)
+    process(manager, random.Random(2), 10)
+    manager.close()
+    os.remove(state_config["optimization"]["state"]["path"])
+
+    fresh = FeedbackOptimizationManager(state_config)
+    assert fresh.restore_state() == 0
+    assert fresh._last_feedback_seq == 0
+    fresh.close()
+
+def test_restore_replays_feedback_newer_than_snapshot(state_config):
+    rng = random.Random(3)
+    live = FeedbackOptimizationManager(state_config)
+    process(live, rng, 15)
+    assert live.save_state()
+    # Phản hồi sau snapshot chỉ có trong kho phản hồi
+    process(live, rng, 10)
+
+    restored = FeedbackOptimizationManager(state_config)
+    assert state_of(restored) == state_of(live)
+    assert restored._last_feedback_seq == live._last_feedback_seq
+    live.close()
+    restored.close()
+
+def test_replay_keeps_feedback_with_snapshot_timestamp(state_config):
+    model_names = [model["name"] for model in state_config["models"]]
+
+    def record(record_id: str, selected: str):
+        return {"id": record_id, "timestamp": "2024-01-01T00:00:00", "conversation_id": "conv",
+                "query": QUERIES[2], "responses": {name: "Trả lời" for name in model_names},
+                "selected_response": selected, "feedback_score": 0.9}
+
+    live = FeedbackOptimizationManager(state_config)
+    live.feedback_store.save_feedback_batch([record("fb_a", model_names[0])], [])
+    assert live._replay_feedback() == 1
+    assert live.save_state()
+
+    # Phản hồi mới có đúng timestamp của phản hồi cuối trong snapshot vẫn phải được áp dụng lại
+    live.feedback_store.save_feedback_batch([record("fb_b", model_names[1])], [])
+    restored = FeedbackOptimizationManager(state_config)
+    assert live._replay_feedback() == 1
+    assert state_of(restored) == state_of(live)
+    live.close()
+    restored.close()
+
+def test_rebuild_matches_live_processing(state_config, tmp_path):
+    live = FeedbackOptimizationManager(state_config)
+    process(live, random.Random(4), 30)
+
+    rebuilt = FeedbackOptimizationManager(with_state_path(state_config, tmp_path / "rebuilt.json"))
+    assert rebuilt.rebuild_state() == 30
+    # Hiệu suất mẫu prompt được dựng lại theo đúng mẫu đã dùng
+    assert state_of(rebuilt) == state_of(live)
+    assert StateStore(str(tmp_path / "rebuilt.json")).load() is not None
+    live.close()
+    rebuilt.close()
+
+def test_close_flushes_deferred_updates(state_config):
+    state_config["optimization"].setdefault("preference", {}).update(
+        {"periodic_update": True, "update_interval": 1000, "update_max_delay": 60})
+    manager = FeedbackOptimizationManager(state_config)
+    process(manager, random.Random(5), 8)
+    assert manager.preference_optimizer.get_update_stats()["pending"] == 8
+
+    manager.close()
+    assert manager.preference_optimizer.get_update_stats()["pending"] == 0
+
+    restored = FeedbackOptimizationManager(state_config)
+    assert restored.preference_optimizer.get_state() == manager.preference_optimizer.get_state()
+    restored.close()
@@ -0,0 +1,96 @@
+"""
+Kiểm thử count-min sketch hiệu suất theo từ khóa: ước lượng so với đếm chính xác và chép khi ghi
+"""
+
+import random
+from collections import defaultdict
+
+import pytest
+
+from src.optimization.performance_sketch import KeywordPerformanceSketch
+
+from conftest import WORDS
+
+def add_events(sketch: KeywordPerformanceSketch, rng: random.Random, events: int, vocabulary: int):
+    """Thêm sự kiện ngẫu nhiên, trả về (số lần, tổng điểm) chính xác theo (từ khóa, mô hình)"""
+    exact = defaultdict(lambda: [0, 0.0])
+    for _ in range(events):
+        # Phân bố lệch: một số từ khóa xuất hiện rất thường xuyên
+        keyword = f"kw{min(int(rng.paretovariate(1.2)), vocabulary)}"
+        model_name = rng.choice(["a", "b"])
+        score = round(rng.random(), 2)
+        sketch.add(keyword, model_name, score)
+        exact[(keyword, model_name)][0] += 1
+        exact[(keyword, model_name)][1] += score
+    return exact
+
+def test_estimate_is_exact_without_collisions():
+    sketch = KeywordPerformanceSketch(width=1 << 16, depth=4)
+    exact = add_events(sketch, random.Random(1), 3000, 200)
+
+    for (keyword, model_name), (count, total) in exact.items():
+        score, estimated_count = sketch.estimate(keyword, model_name)
+        assert estimated_count == count
+        assert score == pytest.approx(total / count)
+    assert sketch.estimate("kw-unknown", "a") is None
+    assert sketch.estimate("kw1", "unknown-model") is None
+
+def test_estimate_never_undercounts_and_stays_a_real_average():
+    sketch = KeywordPerformanceSketch(width=64, depth=4)
+    exact = add_events(sketch, random.Random(2), 20000, 5000)
+
+    errors = []
+    for (keyword, model_name), (count, total) in exact.items():
+        score, estimated_count = sketch.estimate(keyword, model_name)
+        assert estimated_count >= count
+        assert 0.0 <= score <= 1.0
+        if count >= 100:
+            errors.append(abs(score - total / count))
+    # Từ khóa phổ biến chiếm phần lớn ô của nó nên ước lượng gần đúng
+    assert errors and max(errors) < 0.1
+
+def test_query_feature_ignores_rare_keywords():
+    sketch = KeywordPerformanceSketch(width=4096, depth=4, min_count=3)
+    for _ in range(3):
+        sketch.add("python", "a", 1.0)
+    sketch.add("python", "a", 0.0)
+    sketch.add("hiếm", "a", 0.0)
+
+    assert sketch.query_feature(["python", "hiếm"], "a") == pytest.approx(0.75)
+    assert sketch.query_feature(["hiếm"], "a") is None
+
+def test_copy_on_write_isolates_both_copies():
+    rng = random.Random(3)
+    sketch = KeywordPerformanceSketch(width=256, depth=3)
+    for word in WORDS:
+        sketch.add(word, "a", rng.random())
+    before = sketch.get_state()
+
+    copy = sketch.copy()
+    assert copy.get_state() == before
+    # Bảng dùng chung cho đến khi có lần ghi đầu tiên
+    assert copy._tables["a"] is sketch._tables["a"]
+
+    copy.add("python", "a", 1.0)
+    copy.add("python", "b", 1.0)
+    assert sketch.get_state() == before
+    assert copy.estimate("python", "a")[1] == sketch.estimate("python", "a")[1] + 1
+
+    # Bản gốc ghi sau khi đã chia sẻ cũng phải chép bảng trước
+    copied_state = copy.get_state()
+    sketch.add("lịch sử", "a", 0.0)
+    assert copy.get_state() == copied_state
+
+def test_state_round_trip_and_size_mismatch():
+    sketch = KeywordPerformanceSketch(width=128, depth=4)
+    add_events(sketch, random.Random(4), 500, 50)
+
+    restored = KeywordPerformanceSketch(width=128, depth=4)
+    restored.load_state(sketch.get_state())
+    assert restored.get_state() == sketch.get_state()
+    assert restored.get_stats() == sketch.get_stats()
+    assert sketch.get_stats()["memory_bytes"] == 2 * 2 * 4 * 128 * 8
+
+    resized = KeywordPerformanceSketch(width=64, depth=4)
+    resized.load_state(sketch.get_state())
+    assert resized.get_stats()["models"] == 0
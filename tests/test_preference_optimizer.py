@@ -0,0 +1,161 @@
+"""
+Kiểm thử PreferenceOptimizer: chấm điểm dạng ma trận phải trùng với cách tính từng mô hình
+"""
+
+import copy
+import random
+
+import pytest
+
+from src.optimization.preference_optimizer import PreferenceOptimizer
+
+from benchmarks.common import analysis_fixture_grid
+from benchmarks.model_select import reference_required_strengths, reference_select
+
+@pytest.fixture
+def optimizer(base_config) -> PreferenceOptimizer:
+    """Optimizer với các mô hình của cấu hình mặc định cộng thêm mô hình giả lập và trọng số ngẫu nhiên"""
+    config = copy.deepcopy(base_config)
+    rng = random.Random(11)
+    categories = PreferenceOptimizer(config).strength_categories
+    models = list(config.get("models", []))
+    for i in range(12):
+        # Có mô hình thiếu danh mục (điểm mặc định 0.5) và mô hình không có điểm mạnh nào
+        strengths = {category: round(rng.uniform(0.3, 1.0), 2)
+                     for category in rng.sample(categories, rng.randint(0, len(categories)))}
+        models.append({"name": f"synthetic-{i}", "strengths": strengths})
+    config["models"] = models
+
+    optimizer = PreferenceOptimizer(config)
+    optimizer.load_state({"model_weights": {name: round(rng.uniform(0.5, 2.0), 3)
+                                            for name in optimizer.model_weights}})
+    return optimizer
+
+def test_required_strengths_match_reference(optimizer):
+    for analysis in analysis_fixture_grid():
+        signature = optimizer._strength_signature(analysis)
+        assert optimizer._required_strengths_for_signature(signature) == \
+            reference_required_strengths(optimizer.strength_categories, analysis)
+
+def test_selection_matches_reference_scoring(optimizer):
+    model_names = [model["name"] for model in optimizer.models_config]
+    for analysis in analysis_fixture_grid():
+        expected, expected_scores = reference_select(optimizer, model_names, analysis)
+        assert optimizer.select_best_model(analysis) == expected
+        assert optimizer.score_models(analysis) == pytest.approx(expected_scores, rel=1e-12)
+
+def test_available_models_subset_and_unknown_names(optimizer):
+    analysis = {"requires_code": True, "complexity": 8, "query_type": "how_to", "domain": "technology"}
+    subset = [{"name": "synthetic-3"}, {"name": "unknown-model"}, {"name": "synthetic-1"}, {"name": "synthetic-3"}]
+
+    expected, expected_scores = reference_select(optimizer, ["synthetic-3", "synthetic-1"], analysis)
+    assert list(optimizer.score_models(analysis, subset)) == ["synthetic-3", "synthetic-1"]
+    assert optimizer.select_best_model(analysis, subset) == expected
+    assert optimizer.select_best_model(analysis, [{"name": "unknown-model"}]) is None
+
+def feedback_events(model_names, count: int, seed: int):
+    rng = random.Random(seed)
+    events = []
+    for i in range(count):
+        responses = {name: "..." for name in rng.sample(model_names, k=rng.randint(1, len(model_names)))}
+        query = rng.choice(["Viết hàm Python sắp xếp", "So sánh React và Vue", "Tại sao trời xanh?"]) + f" {i}"
+        events.append((query, responses, rng.choice(list(responses)), rng.choice([None, round(rng.random(), 2)])))
+    return events
+
+def learned_state(optimizer: PreferenceOptimizer) -> dict:
+    state = optimizer.get_state()
+    state.pop("model_selection_count")
+    return state
+
+def test_batched_updates_match_sequential_with_interleaved_selections(base_config):
+    config = copy.deepcopy(base_config)
+    config.setdefault("optimization", {}).setdefault("preference", {}).update(
+        {"periodic_update": True, "update_interval": 10 ** 6, "update_max_delay": 60})
+    batched = PreferenceOptimizer(config)
+    sequential = PreferenceOptimizer(base_config)
+    model_names = [model["name"] for model in base_config["models"]]
+    grid = analysis_fixture_grid()
+
+    for i, event in enumerate(feedback_events(model_names, 300, seed=1)):
+        # Chọn mô hình giữa các phản hồi chỉ làm tăng số lần chọn, không ảnh hưởng cập nhật
+        for analysis in grid[i * 7:i * 7 + 7]:
+            batched.select_best_model(analysis)
+        batched.submit_feedback(*event)
+        sequential.submit_feedback(*event)
+        if i % 100 == 99:
+            batched.flush_pending_updates()
+    batched.stop_updates()
+
+    assert learned_state(batched) == learned_state(sequential)
+    assert sum(batched.get_state()["model_selection_count"].values()) == 300 * 7
+    assert sum(sequential.get_state()["model_selection_count"].values()) == 0
+
+def test_performance_cache_is_copy_on_write(base_config):
+    optimizer = PreferenceOptimizer(base_config)
+    model_name = base_config["models"][0]["name"]
+    optimizer.update_weights_from_feedback("So sánh Python và Java?", {model_name: "..."}, model_name, 1.0)
+
+    published = optimizer.model_performance_cache
+    snapshot = copy.deepcopy(published)
+    optimizer.update_weights_from_feedback("So sánh Python và Java?", {model_name: "..."}, model_name, 0.0)
+    optimizer.update_weights_from_feedback("Viết hàm sắp xếp như thế nào?", {model_name: "..."}, model_name, 0.5)
+
+    # Bản đã công bố không bị sửa tại chỗ, bản mới có cả hai cập nhật
+    assert published == snapshot
+    assert optimizer.model_performance_cache != snapshot
+    assert sum(perf["count"] for models in optimizer.model_performance_cache.values()
+               for perf in models.values()) == 3
+
+    optimizer.clear_cache()
+    assert optimizer.model_performance_cache == {}
+    assert published == snapshot
+
+@pytest.mark.parametrize("periodic_update", [False, True])
+def test_concurrent_selection_and_feedback(base_config, periodic_update):
+    import math
+    import threading
+
+    config = copy.deepcopy(base_config)
+    config.setdefault("optimization", {}).setdefault("preference", {}).update(
+        {"keyword_performance_weight": 0.2, "periodic_update": periodic_update, "update_interval": 50})
+    optimizer = PreferenceOptimizer(config)
+    model_names = [model["name"] for model in config["models"]]
+    events = feedback_events(model_names, 2000, seed=2)
+    grid = analysis_fixture_grid()
+    errors = []
+    done = threading.Event()
+
+    def reader(offset: int) -> None:
+        try:
+            i = offset
+            while not done.is_set():
+                analysis = grid[i % len(grid)]
+                assert optimizer.select_best_model(analysis) in model_names
+                # Mọi dict của trạng thái học được thuộc cùng một lần gán
+                weights, win_rates, avg_scores, feedback_counts, performance_cache = optimizer._learned_state
+                assert weights.keys() == win_rates.keys() == avg_scores.keys()
+                assert all(optimizer.min_weight <= weight <= optimizer.max_weight for weight in weights.values())
+                scores = optimizer.score_models(analysis, query=events[i % len(events)][0])
+                assert scores.keys() == set(model_names)
+                assert all(math.isfinite(score) for score in scores.values())
+                optimizer.get_model_stats()
+                i += 1
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=reader, args=(i * 997,)) for i in range(4)]
+    for thread in readers:
+        thread.start()
+    for event in events:
+        optimizer.submit_feedback(*event)
+    optimizer.stop_updates()
+    done.set()
+    for thread in readers:
+        thread.join()
+
+    sequential = PreferenceOptimizer(config)
+    for event in events:
+        sequential.update_weights_from_feedback(*event)
+
+    assert errors == []
+    assert learned_state(optimizer) == learned_state(sequential)
@@ -0,0 +1,67 @@
+"""
+Kiểm thử chỉ mục tương đồng truy vấn (MinHash LSH)
+"""
+
+import random
+
+import pytest
+
+from src.optimization.query_similarity import QuerySimilarityIndex
+
+from conftest import WORDS
+
+def random_query(rng: random.Random, words: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)) + f" {rng.randrange(10 ** 6)}"
+
+def test_exact_match_after_normalization():
+    index = QuerySimilarityIndex()
+    index.add("Viết hàm Python  sắp xếp danh sách", {"id": 1})
+
+    assert index.lookup("  viết hàm python sắp xếp DANH SÁCH ") == ({"id": 1}, 1.0)
+
+def test_near_duplicate_found_and_unrelated_missed():
+    index = QuerySimilarityIndex(threshold=0.85)
+    query = "Giải thích sự khác nhau giữa danh sách và bộ trong Python kèm ví dụ minh họa cụ thể"
+    index.add(query, "stored")
+
+    result = index.lookup(query + " nhé")
+    assert result is not None
+    value, similarity = result
+    assert value == "stored"
+    assert 0.85 <= similarity < 1.0
+
+    assert index.lookup("Thủ đô của nước Pháp là thành phố nào") is None
+
+def test_lookup_recall_at_threshold():
+    rng = random.Random(3)
+    index = QuerySimilarityIndex(threshold=0.85)
+    queries = [random_query(rng, 20) for _ in range(500)]
+    for i, query in enumerate(queries):
+        index.add(query, i)
+
+    # Thêm một từ ngắn vào truy vấn dài giữ độ tương đồng Jaccard trên ngưỡng
+    for i, query in enumerate(queries):
+        result = index.lookup(query + " à")
+        assert result is not None and result[0] == i
+
+def test_candidate_probability_curve():
+    index = QuerySimilarityIndex(threshold=0.85, num_perm=32, bands=8)
+
+    assert index.rows_per_band == 4
+    assert index.candidate_probability(0.85) > 0.99
+    assert index.candidate_probability(0.3) < 0.1
+    assert index.get_stats()["candidate_probability"] == index.candidate_probability(0.85)
+
+def test_eviction_removes_oldest_entry():
+    index = QuerySimilarityIndex(max_entries=2)
+    index.add("truy vấn thứ nhất về lịch sử Việt Nam", 1)
+    index.add("truy vấn thứ hai về thuật toán sắp xếp", 2)
+    index.add("truy vấn thứ ba về kinh tế vĩ mô", 3)
+
+    assert len(index) == 2
+    assert index.lookup("truy vấn thứ nhất về lịch sử Việt Nam") is None
+    assert index.lookup("truy vấn thứ ba về kinh tế vĩ mô") == (3, 1.0)
+
+def test_bands_must_divide_num_perm():
+    with pytest.raises(ValueError):
+        QuerySimilarityIndex(num_perm=30, bands=8)
@@ -0,0 +1,80 @@
+"""
+Kiểm thử get_report_stats: số liệu GROUP BY trong SQL khớp với phép tổng hợp bằng Python trên dữ liệu gốc
+"""
+
+from datetime import timedelta
+
+import pytest
+
+def bucket(score: float) -> str:
+    return ("excellent" if score >= 0.8 else "good" if score >= 0.6 else
+            "average" if score >= 0.4 else "poor" if score >= 0.2 else "bad")
+
+def python_stats(store, since=None, until=None, model=None):
+    """Cùng số liệu với get_report_stats, tổng hợp từng bản ghi đọc qua iter_feedback/iter_comparisons"""
+    general = {"total_feedback": 0, "total_comparisons": 0, "score_sum": 0.0, "score_count": 0,
+               "score_distribution": dict.fromkeys(["excellent", "good", "average", "poor", "bad"], 0)}
+    models, daily, timestamps = {}, {}, []
+
+    def model_entry(name):
+        return models.setdefault(name, {"count": 0, "score_sum": 0.0, "score_count": 0, "wins": 0, "losses": 0})
+
+    def day_entry(timestamp):
+        return daily.setdefault(timestamp[:10], {"feedback_count": 0, "comparison_count": 0,
+                                                 "score_sum": 0.0, "score_count": 0})
+
+    for record in store.iter_feedback(since=since, until=until, model=model):
+        score = record["feedback_score"]
+        entry, day = model_entry(record["selected_response"]), day_entry(record["timestamp"])
+        general["total_feedback"] += 1
+        entry["count"] += 1
+        day["feedback_count"] += 1
+        timestamps.append(record["timestamp"])
+        if score is not None:
+            for target in (general, entry, day):
+                target["score_sum"] += score
+                target["score_count"] += 1
+            general["score_distribution"][bucket(score)] += 1
+
+    for record in store.iter_comparisons(since=since, until=until, model=model):
+        general["total_comparisons"] += 1
+        model_entry(record["chosen_model"])["wins"] += 1
+        model_entry(record["rejected_model"])["losses"] += 1
+        day_entry(record["timestamp"])["comparison_count"] += 1
+        timestamps.append(record["timestamp"])
+
+    general["earliest"] = min(timestamps) if timestamps else None
+    general["latest"] = max(timestamps) if timestamps else None
+    return {"general": general, "models": models, "daily": daily}
+
+def approx_stats(stats):
+    """Tổng điểm là số thực nên so sánh gần đúng"""
+    def approx(value):
+        if isinstance(value, dict):
+            return {key: approx(item) for key, item in value.items()}
+        return pytest.approx(value) if isinstance(value, float) else value
+    return approx(stats)
+
+@pytest.mark.parametrize("window, model", [
+    ((None, None), None),
+    ((100, 400), None),
+    ((None, None), "model-2"),
+    ((50, 300), "model-0"),
+    ((10, 10), None),
+])
+def test_report_stats_match_python_aggregation(store, make_records, window, model):
+    feedback, comparisons = make_records(500, step=timedelta(minutes=37))
+    for fb, comp in zip(feedback, comparisons):
+        store.save_feedback(fb)
+        store.save_comparison(comp)
+
+    since, until = (feedback[i]["timestamp"] if i is not None else None for i in window)
+    stats = store.get_report_stats(since=since, until=until, model=model)
+    expected = python_stats(store, since, until, model)
+
+    assert stats["general"].pop("archived_feedback") == 0
+    assert stats["general"].pop("archived_comparisons") == 0
+    assert stats == approx_stats(expected)
+    # Dữ liệu trải qua nhiều ngày nên xu hướng theo ngày thực sự được gom nhóm
+    if window == (None, None):
+        assert len(stats["daily"]) > 10
@@ -0,0 +1,51 @@
+"""
+Kiểm thử lưu trữ dữ liệu cũ: chuyển bản ghi quá hạn ra file theo tháng, đọc hợp nhất và thống kê không đổi
+"""
+
+from datetime import datetime, timedelta
+from typing import Any
+
+from src.optimization.feedback_store import FeedbackStore
+
+def rounded(value: Any) -> Any:
+    """Làm tròn số thực lồng trong dict/list (tổng điểm cộng theo thứ tự khác nhau)"""
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, dict):
+        return {key: rounded(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [rounded(item) for item in value]
+    return value
+
+def test_archive_and_unified_read(tmp_path, make_records):
+    store = FeedbackStore(str(tmp_path / "feedback.db"), retention_options={"feedback_days": 30, "batch_size": 40})
+    feedback, comparisons = make_records(240, step=timedelta(hours=12))
+    store.save_feedback_batch(feedback, comparisons)
+    report = store.get_report_stats()
+    counts = store.get_summary_counts()
+
+    now = datetime(2024, 4, 1)
+    archived = store.archive_old_data(now)
+    cutoff = (now - timedelta(days=30)).isoformat()
+    expected = sum(record["timestamp"] < cutoff for record in feedback)
+    assert archived["feedback"] == expected > 0
+    assert archived["comparisons"] == expected
+    assert len(list(store.iter_feedback())) == 240 - expected
+
+    # Đọc hợp nhất: kho lưu trữ rồi tới cơ sở dữ liệu, theo thứ tự thời gian
+    unified = list(store.iter_feedback(include_archived=True))
+    assert [record["id"] for record in unified] == [record["id"] for record in feedback]
+    assert unified[0]["responses"] == feedback[0]["responses"]
+    window = list(store.iter_comparisons(since=feedback[10]["timestamp"], until=feedback[200]["timestamp"],
+                                         include_archived=True))
+    assert [record["id"] for record in window] == [record["id"] for record in comparisons[10:200]]
+
+    # Thống kê tổng không đổi sau khi lưu trữ
+    assert store.get_summary_counts() == counts
+    after = store.get_report_stats()
+    assert after["general"]["archived_feedback"] == expected
+    for section in ["models", "daily"]:
+        assert rounded(after[section]) == rounded(report[section])
+    for key in ["total_feedback", "total_comparisons", "score_count", "score_distribution", "earliest", "latest"]:
+        assert after["general"][key] == report["general"][key]
+    store.close()
@@ -0,0 +1,51 @@
+"""
+Kiểm thử nâng cấp schema kho phản hồi: cơ sở dữ liệu cũ được chuyển sang cột thời gian/mô hình có kiểu
+"""
+
+from datetime import timedelta
+
+from src.optimization.feedback_store import FeedbackStore
+from src.optimization.schema_migrations import SCHEMA_VERSION, timestamp_to_epoch
+
+def test_migrates_legacy_database(tmp_path, make_records, create_legacy_database):
+    db_path = str(tmp_path / "feedback.db")
+    feedback, comparisons = make_records(120, step=timedelta(hours=5))
+    create_legacy_database(db_path, feedback, comparisons)
+
+    store = FeedbackStore(db_path, migration_batch_size=25)
+    assert store.get_schema_version() == SCHEMA_VERSION
+
+    # Cột ts_epoch và khóa mô hình được điền cho mọi dòng có sẵn
+    conn = store.connections.get_connection()
+    typed = {row[0]: (row[1], row[2]) for row in conn.execute(
+        "SELECT f.id, f.ts_epoch, m.name FROM feedback f JOIN models m ON m.id = f.model_id")}
+    assert typed == {record["id"]: (timestamp_to_epoch(record["timestamp"]), record["selected_response"])
+                     for record in feedback}
+    typed = {row[0]: (row[1], row[2]) for row in conn.execute('''
+    SELECT c.id, chosen.name, rejected.name FROM comparisons c
+    JOIN models chosen ON chosen.id = c.chosen_model_id
+    JOIN models rejected ON rejected.id = c.rejected_model_id
+    ''')}
+    assert typed == {record["id"]: (record["chosen_model"], record["rejected_model"]) for record in comparisons}
+
+    stats = store.get_report_stats()
+    assert stats["general"]["total_feedback"] == 120
+    assert stats["general"]["total_comparisons"] == 120
+    assert sum(entry["count"] for entry in stats["models"].values()) == 120
+
+    migrated = {record["id"]: record for record in store.iter_feedback()}
+    for record in feedback:
+        assert migrated[record["id"]]["responses"] == record["responses"]
+        assert migrated[record["id"]]["selected_response"] == record["selected_response"]
+    store.close()
+
+def test_migration_is_idempotent(tmp_path, make_records, create_legacy_database):
+    db_path = str(tmp_path / "feedback.db")
+    feedback, comparisons = make_records(40)
+    create_legacy_database(db_path, feedback, comparisons)
+
+    FeedbackStore(db_path, migration_batch_size=7).close()
+    store = FeedbackStore(db_path)
+    assert store.get_schema_version() == SCHEMA_VERSION
+    assert [record["id"] for record in store.iter_feedback()] == [record["id"] for record in feedback]
+    store.close()
@@ -0,0 +1,43 @@
+"""
+Kiểm thử chỉ mục mẫu prompt: kết quả phải giống hệt chấm điểm toàn bộ danh sách mẫu
+"""
+
+import random
+
+from src.optimization.template_index import TemplateIndex
+
+from benchmarks.template_select import full_scan_best_match, generate_analysis, generate_templates
+
+def test_best_match_equals_full_scan():
+    rng = random.Random(5)
+    for size in [1, 5, 50, 300]:
+        templates = generate_templates(rng, size)
+        index = TemplateIndex(templates)
+        for _ in range(500):
+            analysis = generate_analysis(rng)
+            # So sánh theo đối tượng: cách phá hòa (mẫu đứng trước thắng) cũng phải giống
+            assert index.best_match(analysis) is full_scan_best_match(templates, analysis)
+
+def test_cached_result_matches_first_result():
+    rng = random.Random(6)
+    templates = generate_templates(rng, 100)
+    index = TemplateIndex(templates)
+    analyses = [generate_analysis(rng) for _ in range(200)]
+
+    first = [index.best_match(analysis) for analysis in analyses]
+    assert [index.best_match(analysis) for analysis in analyses] == first
+
+def test_empty_index_returns_none():
+    assert TemplateIndex([]).best_match({"domain": "general"}) is None
+
+def test_domain_matches_keeps_original_order():
+    templates = [
+        {"name": "a", "domains": ["science"]},
+        {"name": "b", "domains": ["general"]},
+        {"name": "c", "domains": ["programming", "science"]},
+        {"name": "d", "domains": ["arts"]}
+    ]
+    index = TemplateIndex(templates)
+
+    assert [template["name"] for template in index.domain_matches("science")] == ["a", "b", "c"]
+    assert [template["name"] for template in index.domain_matches("health")] == ["b"]
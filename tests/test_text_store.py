@@ -0,0 +1,42 @@
+"""
+Kiểm thử lưu văn bản theo hash: đọc lại đúng nội dung, khử trùng lặp và dọn văn bản không còn tham chiếu
+"""
+
+import sqlite3
+
+from src.optimization.feedback_store import FeedbackStore
+from src.optimization.schema_migrations import migrate
+from src.optimization.text_store import get_text_stats
+
+def test_text_store_round_trip_and_dedupe(tmp_path, make_records, create_legacy_database):
+    db_path = str(tmp_path / "feedback.db")
+    feedback, comparisons = make_records(200)
+    legacy, recent = (feedback[:100], comparisons[:100]), (feedback[100:], comparisons[100:])
+    create_legacy_database(db_path, *legacy)
+
+    # Dừng ở phiên bản ngay trước bảng texts: bản nâng cấp sau chuyển văn bản có sẵn vào bảng texts
+    conn = sqlite3.connect(db_path)
+    assert migrate(conn, batch_size=30, target_version=5) == 5
+    conn.close()
+    store = FeedbackStore(db_path, migration_batch_size=30, text_compression={"min_size": 16})
+    store.save_feedback_batch(*recent)
+
+    texts = get_text_stats(store.connections.get_connection())
+    distinct = {text for record in feedback for text in record["responses"].values()}
+    assert texts["texts"] == len(distinct)
+
+    for original in feedback:
+        assert store.get_feedback(original["id"])["responses"] == original["responses"]
+    stored_comparisons = {record["id"]: record for record in store.iter_comparisons()}
+    for original in comparisons:
+        assert stored_comparisons[original["id"]]["chosen"] == original["chosen"]
+        assert stored_comparisons[original["id"]]["rejected"] == original["rejected"]
+
+    # Văn bản không còn bản ghi nào tham chiếu được dọn
+    for record in feedback:
+        store.delete_feedback(record["id"])
+    assert store.prune_texts() == 0
+    for record in comparisons:
+        store.delete_comparison(record["id"])
+    assert store.prune_texts() == len(distinct)
+    store.close()